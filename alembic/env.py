@@ -10,6 +10,9 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")
 
 # Import the Pony ORM database
 from librium.database import Base, engine
+from librium.database.sqlalchemy.counts import COUNTER_TABLE
+from librium.database.sqlalchemy.search import SEARCH_TABLES
+from librium.database.sqlalchemy.statistics import STATISTIC_TABLE
 
 # This is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -34,6 +37,17 @@ def get_metadata():
 target_metadata = get_metadata()
 
 
+def include_object(object, name, type_, reflected, compare_to):
+    # The full-text search tables and their shadow tables, the library
+    # counters and statistics are managed by their own modules, not by the
+    # metadata
+    if type_ == "table" and (
+        name.startswith(SEARCH_TABLES) or name in (COUNTER_TABLE, STATISTIC_TABLE)
+    ):
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -48,6 +62,7 @@ def run_migrations_offline():
     context.configure(
         url=db_url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -66,7 +81,11 @@ def run_migrations_online():
     connectable = engine
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+        )
 
         with context.begin_transaction():
             context.run_migrations()
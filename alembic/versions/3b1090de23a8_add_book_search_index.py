@@ -0,0 +1,32 @@
+"""Add full-text search index for books
+
+Revision ID: 3b1090de23a8
+Revises: 13fcd037bb5f
+Create Date: 2026-10-17 02:40:12.000000
+
+"""
+
+from alembic import op
+
+from librium.database.sqlalchemy.search import (
+    create_search_index,
+    drop_search_index,
+    rebuild_search_index,
+)
+
+# revision identifiers, used by Alembic.
+revision = "3b1090de23a8"
+down_revision = "13fcd037bb5f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    create_search_index(connection)
+    # Backfill the index with the existing library
+    rebuild_search_index(connection)
+
+
+def downgrade():
+    drop_search_index(op.get_bind())
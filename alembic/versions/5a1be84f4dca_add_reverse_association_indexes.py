@@ -0,0 +1,47 @@
+"""Index the association tables from the other side
+
+Proposed by utils/index_advisor.py for the genre, publisher, language and
+series filters. The 4efa7212a47a revision dropped the earlier versions.
+
+Revision ID: 5a1be84f4dca
+Revises: c7d14e2a9f30
+Create Date: 2026-10-17 03:23:13.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5a1be84f4dca"
+down_revision = "c7d14e2a9f30"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        "idx_book_genres_genre_id_book_id", "book_genres", ["genre_id", "book_id"]
+    )
+    op.create_index(
+        "idx_book_publishers_publisher_id_book_id",
+        "book_publishers",
+        ["publisher_id", "book_id"],
+    )
+    op.create_index(
+        "idx_book_languages_language_id_book_id",
+        "book_languages",
+        ["language_id", "book_id"],
+    )
+    op.create_index(
+        "idx_series_index_series_id_book_id", "series_index", ["series_id", "book_id"]
+    )
+
+
+def downgrade():
+    op.drop_index("idx_series_index_series_id_book_id", table_name="series_index")
+    op.drop_index("idx_book_languages_language_id_book_id", table_name="book_languages")
+    op.drop_index(
+        "idx_book_publishers_publisher_id_book_id", table_name="book_publishers"
+    )
+    op.drop_index("idx_book_genres_genre_id_book_id", table_name="book_genres")
@@ -0,0 +1,32 @@
+"""Add library counters
+
+Revision ID: 5d7a3c1e9b62
+Revises: 8c5e2f7d9a14
+Create Date: 2026-10-17 03:48:20.000000
+
+"""
+
+from alembic import op
+
+from librium.database.sqlalchemy.counts import (
+    create_counters,
+    drop_counters,
+    rebuild_counters,
+)
+
+# revision identifiers, used by Alembic.
+revision = "5d7a3c1e9b62"
+down_revision = "8c5e2f7d9a14"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    create_counters(connection)
+    # Count the existing library
+    rebuild_counters(connection)
+
+
+def downgrade():
+    drop_counters(op.get_bind())
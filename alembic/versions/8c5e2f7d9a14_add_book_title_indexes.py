@@ -0,0 +1,46 @@
+"""Add trigram and reversed-title indexes for book titles
+
+Revision ID: 8c5e2f7d9a14
+Revises: 3b1090de23a8
+Create Date: 2026-10-17 03:05:41.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+from librium.database.sqlalchemy.search import (
+    create_title_index,
+    drop_title_index,
+    rebuild_title_index,
+    reverse_title,
+)
+
+# revision identifiers, used by Alembic.
+revision = "8c5e2f7d9a14"
+down_revision = "3b1090de23a8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+
+    op.add_column("book", sa.Column("title_reversed", sa.String(), nullable=True))
+    # Backfill the reversed title key of the existing library
+    books = connection.execute(sa.text("SELECT id, title FROM book")).all()
+    if books:
+        connection.execute(
+            sa.text("UPDATE book SET title_reversed = :key WHERE id = :id"),
+            [{"id": id, "key": reverse_title(title)} for id, title in books],
+        )
+    op.create_index("idx_book_title_reversed", "book", ["title_reversed"])
+
+    create_title_index(connection)
+    rebuild_title_index(connection)
+
+
+def downgrade():
+    drop_title_index(op.get_bind())
+    op.drop_index("idx_book_title_reversed", table_name="book")
+    op.drop_column("book", "title_reversed")
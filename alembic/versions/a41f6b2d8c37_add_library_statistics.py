@@ -0,0 +1,32 @@
+"""Add library statistics
+
+Revision ID: a41f6b2d8c37
+Revises: 5d7a3c1e9b62
+Create Date: 2026-10-17 05:12:40.000000
+
+"""
+
+from alembic import op
+
+from librium.database.sqlalchemy.statistics import (
+    create_statistics,
+    drop_statistics,
+    rebuild_statistics,
+)
+
+# revision identifiers, used by Alembic.
+revision = "a41f6b2d8c37"
+down_revision = "5d7a3c1e9b62"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    connection = op.get_bind()
+    create_statistics(connection)
+    # Aggregate the existing library
+    rebuild_statistics(connection)
+
+
+def downgrade():
+    drop_statistics(op.get_bind())
@@ -48,7 +48,6 @@ def upgrade():
 
 def downgrade():
     # Remove indexes for Book table
-    op.drop_index("idx_book_title", table_name="book")
     op.drop_index("idx_book_isbn", table_name="book")
     op.drop_index("idx_book_read", table_name="book")
     op.drop_index("idx_book_released", table_name="book")
@@ -57,7 +56,6 @@ def downgrade():
     # Remove indexes for Author table
     op.drop_index("idx_author_first_name", table_name="author")
     op.drop_index("idx_author_last_name", table_name="author")
-    op.drop_index("idx_author_name", table_name="author")
 
     # Remove indexes for Publisher table
     op.drop_index("idx_publisher_name", table_name="publisher")
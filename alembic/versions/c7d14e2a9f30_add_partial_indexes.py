@@ -0,0 +1,47 @@
+"""Index only the rows that are not soft deleted for the hot lookups
+
+Revision ID: c7d14e2a9f30
+Revises: a41f6b2d8c37
+Create Date: 2026-10-17 06:02:18.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "c7d14e2a9f30"
+down_revision = "a41f6b2d8c37"
+branch_labels = None
+depends_on = None
+
+# Name, table and column of each partial index; the condition must match the
+# one the ORM adds to queries (see exclude_deleted() in db.py)
+PARTIAL_INDEXES = [
+    ("idx_book_title", "book", "title"),
+    ("idx_book_read", "book", "read"),
+    ("idx_book_released", "book", "released"),
+    ("idx_book_uuid", "book", "uuid"),
+    ("idx_book_isbn", "book", "isbn"),
+    ("idx_author_last_name", "author", "last_name"),
+    ("idx_author_name", "author", "name"),
+]
+
+# The full indexes of the previous revision that the partial ones replace,
+# created by add_indexes and soft_delete; the others were dropped by
+# soft_delete or never created, so a downgrade only restores these
+REPLACED_INDEXES = {"idx_book_read", "idx_book_uuid", "idx_author_last_name"}
+
+
+def upgrade():
+    for name, table, column in PARTIAL_INDEXES:
+        # Databases created from the models may have more full indexes
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+        op.create_index(name, table, [column], sqlite_where=sa.text("deleted = 0"))
+
+
+def downgrade():
+    for name, table, column in PARTIAL_INDEXES:
+        op.drop_index(name, table_name=table)
+        if name in REPLACED_INDEXES:
+            op.create_index(name, table, [column])
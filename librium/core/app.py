@@ -1,16 +1,40 @@
+from urllib.parse import urlsplit
+
+import click
 from dotenv import find_dotenv, load_dotenv
-from flask import Flask, render_template, request, url_for, jsonify
+from flask import Flask, abort, g, render_template, request, url_for, jsonify
 from flask_caching import Cache
 from flask_compress import Compress
-from flask_jwt_extended import JWTManager
+from flask_jwt_extended import JWTManager, get_jwt_identity, verify_jwt_in_request
 from flask_limiter import Limiter
+from sqlalchemy import event
 
 from librium.__version__ import __version__
 from librium.core.assets import assets
 from librium.core.config import get_config
-from librium.core.logging import configure_logging, get_logger
+from librium.core.logging import (
+    configure_logging,
+    configure_slow_query_logging,
+    get_logger,
+)
 from librium.core.utils import parse_read_arg
 from librium.core.limit import limiter
+from librium.core.metrics import metrics
+from librium.database import Session, engine, read_engine, tenants
+from librium.database.sqlalchemy import analytics
+from librium.database.sqlalchemy.instrumentation import (
+    QueryBudgetExceeded,
+    instrument_engine,
+    set_slow_query_threshold,
+    start_tracking,
+    stop_tracking,
+)
+from librium.database.sqlalchemy.profiles import use_connection_profile
+from librium.database.sqlalchemy.statistics import (
+    rebuild_statistics,
+    verify_statistics,
+)
+from librium.database.sqlalchemy.tenancy import UnknownTenantError, use_tenant
 from librium.services import BookService
 from librium.views import book, covers, main, manage
 from librium.views.api import bp as api_bp
@@ -47,6 +71,149 @@ def configure_flask_app(app: Flask) -> None:
     logger.info(f"Using configuration: {config_class.__name__}")
 
 
+def configure_database(app: Flask) -> None:
+    """Configure database connection settings."""
+    use_connection_profile(engine, app.config["SQLITE_CONNECTION_PROFILE"])
+    logger.info(
+        f"Using SQLite connection profile: {app.config['SQLITE_CONNECTION_PROFILE']}"
+    )
+
+
+def configure_statistics(app: Flask) -> None:
+    """Warn when the configured statistics backend cannot be used."""
+    if app.config["STATISTICS_BACKEND"] == "numpy" and analytics.np is None:
+        logger.warning(
+            "STATISTICS_BACKEND is 'numpy' but NumPy is not installed; "
+            "the statistics are read from the materialized tables instead"
+        )
+
+
+def configure_query_instrumentation(app: Flask) -> None:
+    """Instrument database statements: query budgets and the slow-query log."""
+    instrument_engine(engine)
+    instrument_engine(read_engine)
+
+    if app.config["SLOW_QUERY_THRESHOLD_MS"]:
+        configure_slow_query_logging()
+    set_slow_query_threshold(app.config["SLOW_QUERY_THRESHOLD_MS"])
+
+    @app.before_request
+    def start_query_tracking():
+        """Start counting the statements of this request."""
+        g.query_tracker, g.query_tracker_token = start_tracking(
+            request.endpoint or request.path
+        )
+
+    @app.after_request
+    def check_query_budget(response):
+        """Report N+1 patterns and enforce the endpoint's query budget."""
+        tracker = g.pop("query_tracker", None)
+        if tracker is None:
+            return response
+
+        endpoint = request.endpoint or request.path
+        metrics.observe("requests.statements", tracker.total)
+
+        for statement, count in tracker.repeated(app.config["N_PLUS_ONE_THRESHOLD"]):
+            metrics.increment("requests.n_plus_one")
+            logger.warning(
+                f"Possible N+1 in {endpoint}: {count} executions of {statement}"
+            )
+
+        budget = app.config["QUERY_BUDGETS"].get(endpoint, app.config["QUERY_BUDGET"])
+        if tracker.total > budget:
+            metrics.increment("requests.over_budget")
+            message = (
+                f"{endpoint} executed {tracker.total} statements " f"(budget: {budget})"
+            )
+            if app.testing:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        if app.debug:
+            response.headers["X-Query-Count"] = str(tracker.total)
+            response.headers["X-Query-Time-Ms"] = f"{tracker.duration * 1000:.1f}"
+        return response
+
+    @app.teardown_request
+    def stop_query_tracking(exc):
+        """Stop counting statements once the request is done."""
+        token = g.pop("query_tracker_token", None)
+        if token is not None:
+            stop_tracking(token)
+
+
+def resolve_tenant(app: Flask) -> str | None:
+    """
+    Get the tenant of the current request.
+
+    With the ``identity`` resolver, the tenant is the identity of the
+    request's JWT, and requests without one use the default database.
+    Otherwise it is the request's host name.
+    """
+    if app.config["TENANT_RESOLVER"] == "identity":
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    return urlsplit(f"//{request.host}").hostname
+
+
+def configure_tenancy(app: Flask) -> None:
+    """Use the database of each request's tenant, if tenancy is configured."""
+    if tenants is None:
+        return
+
+    @app.before_request
+    def enter_tenant():
+        """Answer 404 for unknown tenants, and use the database of the others."""
+        name = resolve_tenant(app)
+        if name is not None:
+            try:
+                tenants.get(name)
+            except UnknownTenantError:
+                metrics.increment("tenants.unknown")
+                abort(404)
+        scope = use_tenant(name)
+        scope.__enter__()
+        g.tenant_scope = scope
+
+    # Registered before the session is removed, so this runs after it
+    @app.teardown_appcontext
+    def exit_tenant(exc):
+        scope = g.pop("tenant_scope", None)
+        if scope is not None:
+            scope.__exit__(None, None, None)
+
+
+def count_loaded(session, instance) -> None:
+    """Count the objects loaded into a session's identity map."""
+    session.info["loaded"] = session.info.get("loaded", 0) + 1
+
+
+def configure_session_lifecycle(app: Flask) -> None:
+    """Scope the database session to each request and report its size."""
+    if not event.contains(Session, "loaded_as_persistent", count_loaded):
+        event.listen(Session, "loaded_as_persistent", count_loaded)
+
+    @app.before_request
+    def remember_endpoint():
+        # The request is gone by the time the app context is torn down
+        g.endpoint = request.endpoint
+
+    @app.teardown_appcontext
+    def remove_session(exc):
+        """Close the session, ending its read snapshot and identity map."""
+        if Session.registry.has():
+            # The identity map only holds weak references, so by now it has
+            # lost whatever the request no longer uses; count the loads
+            size = Session().info.get("loaded", 0)
+            metrics.observe("requests.identity_map", size)
+            if size > app.config["SESSION_IDENTITY_MAP_LIMIT"]:
+                metrics.increment("requests.identity_map.over_limit")
+                scope = g.get("endpoint", "app context")
+                logger.warning(f"{scope} loaded {size} objects into the session")
+        Session.remove()
+
+
 def configure_jinja_env(app: Flask) -> None:
     """Configure Jinja environment settings and filters."""
     app.jinja_env.add_extension("jinja2.ext.do")
@@ -148,6 +315,35 @@ def register_error_handlers(app: Flask) -> None:
         )
 
 
+def register_commands(app: Flask) -> None:
+    """Register the command-line commands of the application."""
+
+    @app.cli.command("rebuild-statistics")
+    @click.option(
+        "--check", is_flag=True, help="Only compare, without rebuilding anything."
+    )
+    def rebuild_statistics_command(check):
+        """Verify the materialized statistics and rebuild them."""
+        with engine.begin() as connection:
+            if check:
+                differences = verify_statistics(connection)
+            else:
+                differences = rebuild_statistics(connection)
+        for kind, bucket, stored, expected in differences:
+            click.echo(f"{kind} {bucket}: stored {stored}, expected {expected}")
+        click.echo(f"{len(differences)} differing statistics")
+        if check and differences:
+            raise SystemExit(1)
+
+    @app.cli.command("create-tenant")
+    @click.argument("name")
+    def create_tenant_command(name):
+        """Create the database of a tenant with an empty library."""
+        if tenants is None:
+            raise click.UsageError("TENANT_DATABASE_DIR is not set")
+        click.echo(f"Created {tenants.create_tenant(name)}")
+
+
 def create_app():
     """Create and configure the Flask application."""
     app = Flask(FLASK_APP_NAME)
@@ -164,6 +360,11 @@ def create_app():
 
     # Configure application
     configure_flask_app(app)
+    configure_database(app)
+    configure_statistics(app)
+    configure_query_instrumentation(app)
+    configure_tenancy(app)
+    configure_session_lifecycle(app)
     configure_jinja_env(app)
 
     # JWT setup
@@ -179,6 +380,9 @@ def create_app():
     # Register error handlers
     register_error_handlers(app)
 
+    # Register command-line commands
+    register_commands(app)
+
     # Configure cache headers for static files
     configure_static_cache(app)
 
@@ -33,6 +33,73 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///librium.sqlite")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # SQLite connection profile (see librium.database.sqlalchemy.profiles)
+    SQLITE_CONNECTION_PROFILE = os.getenv("SQLITE_CONNECTION_PROFILE", "web")
+
+    # Pool of the read-write engine; SQLite serializes writers anyway
+    SQLITE_WRITE_POOL_SIZE = int(os.getenv("SQLITE_WRITE_POOL_SIZE", "2"))
+    SQLITE_WRITE_MAX_OVERFLOW = int(os.getenv("SQLITE_WRITE_MAX_OVERFLOW", "3"))
+
+    # Write transactions that find the database locked by another process are
+    # run again up to this many times, after a jittered backoff starting at
+    # SQLITE_WRITE_BACKOFF_MS (see librium.database.sqlalchemy.writes)
+    SQLITE_WRITE_RETRIES = int(os.getenv("SQLITE_WRITE_RETRIES", "5"))
+    SQLITE_WRITE_BACKOFF_MS = float(os.getenv("SQLITE_WRITE_BACKOFF_MS", "20"))
+
+    # Compiled statements each engine keeps; evictions show in the
+    # queries.compiled_cache.* metrics
+    SQLITE_QUERY_CACHE_SIZE = int(os.getenv("SQLITE_QUERY_CACHE_SIZE", "500"))
+
+    # Pool of the read-only engine used by @read_only service methods
+    SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "20"))
+    SQLITE_READ_MAX_OVERFLOW = int(os.getenv("SQLITE_READ_MAX_OVERFLOW", "20"))
+
+    # Serve the reads of @read_only service methods from an in-memory copy of
+    # the database file (see librium.database.sqlalchemy.replica), checked
+    # for changes made by other processes at most every MAX_LAG seconds
+    SQLITE_MEMORY_REPLICA = (
+        os.getenv("SQLITE_MEMORY_REPLICA", "false").lower() == "true"
+    )
+    SQLITE_MEMORY_REPLICA_MAX_LAG = float(
+        os.getenv("SQLITE_MEMORY_REPLICA_MAX_LAG", "1.0")
+    )
+
+    # Give each tenant a library of its own in TENANT_DATABASE_DIR (see
+    # librium.database.sqlalchemy.tenancy); unset, every request uses
+    # SQLDATABASE. Tenants are resolved by "host" or by JWT "identity"
+    TENANT_DATABASE_DIR = os.getenv("TENANT_DATABASE_DIR")
+    TENANT_RESOLVER = os.getenv("TENANT_RESOLVER", "host")
+    # Create the libraries of unknown tenants instead of answering 404
+    TENANT_AUTO_CREATE = os.getenv("TENANT_AUTO_CREATE", "false").lower() == "true"
+    # Tenant databases kept open, and how long an unused one stays open
+    TENANT_ENGINE_CACHE_SIZE = int(os.getenv("TENANT_ENGINE_CACHE_SIZE", "64"))
+    TENANT_ENGINE_IDLE_SECONDS = float(os.getenv("TENANT_ENGINE_IDLE_SECONDS", "300"))
+
+    # Raise instead of lazy loading relationships a loading profile leaves out
+    STRICT_LOADING = False
+
+    # Statements allowed per request, by default and per endpoint
+    QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "100"))
+    QUERY_BUDGETS: Dict[str, int] = {}
+    # Executions of one statement in a request that are reported as N+1
+    N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
+    # Objects a request may load into the session's identity map before it is
+    # reported; the session is removed after every request either way
+    SESSION_IDENTITY_MAP_LIMIT = int(os.getenv("SESSION_IDENTITY_MAP_LIMIT", "5000"))
+
+    # Statements slower than this are written to logs/slow_queries.log (0 disables)
+    SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+
+    # Total counts of paginated listings kept until the library changes
+    COUNT_CACHE_SIZE = int(os.getenv("COUNT_CACHE_SIZE", "256"))
+
+    # How the statistics page is computed: "numpy" from a columnar snapshot of
+    # the library (see librium.database.sqlalchemy.analytics), or "sql" from
+    # the materialized statistics; "numpy" needs NumPy and falls back to "sql",
+    # with a warning at startup
+    STATISTICS_BACKEND = os.getenv("STATISTICS_BACKEND", "numpy")
+
     # Logging settings
     LOG_LEVEL = "INFO"
     LOG_FILE = "logs/librium.log"
@@ -72,6 +139,7 @@ class DevelopmentConfig(Config):
     DEBUG = True
     LOG_LEVEL = "DEBUG"
     ASSETS_DEBUG = True
+    STRICT_LOADING = True
 
 
 class TestingConfig(Config):
@@ -81,6 +149,7 @@ class TestingConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     LOG_LEVEL = "DEBUG"
+    STRICT_LOADING = True
 
     # Disable caching in tests
     CACHE_TYPE = "NullCache"
@@ -3,6 +3,11 @@ from typing import Dict, Optional, Any
 from datetime import datetime
 from librium.core.logging import get_logger
 
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
 logger = get_logger("core.inflation")
 
 # Using Ninja API for inflation and exchange rates as they are generally free/easy to use for small projects
@@ -72,6 +77,9 @@ class InflationService:
             return {}
 
         current_year = datetime.now().year
+        if np is not None:
+            return cls._cumulative_factors(rates, current_year)
+
         factors = {}
 
         # Sort years descending
@@ -105,3 +113,24 @@ class InflationService:
                 running_factor *= 1 + rate / 100.0
 
         return factors
+
+    @staticmethod
+    def _cumulative_factors(
+        rates: Dict[int, float], current_year: int
+    ) -> Dict[int, float]:
+        """
+        Calculate the inflation factors of get_inflation_factors() with NumPy.
+
+        The factor of a year is the product of the growth of every later year
+        up to the current one, a cumulative product over the years in
+        descending order. The products are taken in the same order as the
+        loop, so both give the same factors.
+        """
+        years = np.array(sorted(rates, reverse=True), dtype=np.int64)
+        years = years[years <= current_year]
+        growth = 1 + np.array([rates[year] for year in years.tolist()]) / 100.0
+        running = np.concatenate(([1.0], np.cumprod(growth)[:-1]))
+
+        factors = {current_year: 1.0}
+        factors.update(zip(years.tolist(), running.tolist()))
+        return factors
@@ -17,9 +17,11 @@ DEFAULT_LOG_DIR = "logs"
 DEFAULT_LOG_FILE = "librium.log"
 DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024  # 10 MB
 DEFAULT_LOG_BACKUP_COUNT = 5
+DEFAULT_SLOW_QUERY_LOG_FILE = "slow_queries.log"
 
 # Create the logger
 logger = logging.getLogger("librium")
+slow_query_logger = logging.getLogger("librium.slow_queries")
 
 
 def configure_logging(
@@ -91,6 +93,51 @@ def configure_logging(
     logger.info("Logging configured")
 
 
+def configure_slow_query_logging(
+    log_dir=None,
+    log_file=None,
+    log_max_bytes=None,
+    log_backup_count=None,
+):
+    """
+    Configure the dedicated slow-query log.
+
+    Slow statements are written to their own rotating file and are not
+    propagated to the application log.
+
+    Args:
+        log_dir: The directory to store log files (default: "logs")
+        log_file: The log file name (default: "slow_queries.log")
+        log_max_bytes: The maximum size of the log file before rotation (default: 10 MB)
+        log_backup_count: The number of backup log files to keep (default: 5)
+    """
+    log_dir = log_dir or DEFAULT_LOG_DIR
+    log_file = log_file or DEFAULT_SLOW_QUERY_LOG_FILE
+    log_max_bytes = log_max_bytes or DEFAULT_LOG_MAX_BYTES
+    log_backup_count = log_backup_count or DEFAULT_LOG_BACKUP_COUNT
+
+    slow_query_logger.setLevel(logging.WARNING)
+    slow_query_logger.propagate = False
+
+    # Remove existing handlers
+    for handler in slow_query_logger.handlers[:]:
+        slow_query_logger.removeHandler(handler)
+        handler.close()
+
+    log_path = Path(log_dir)
+    log_path.mkdir(exist_ok=True)
+
+    file_handler = RotatingFileHandler(
+        log_path / log_file,
+        maxBytes=log_max_bytes,
+        backupCount=log_backup_count,
+    )
+    file_handler.setFormatter(
+        logging.Formatter(DEFAULT_LOG_FORMAT, DEFAULT_LOG_DATE_FORMAT)
+    )
+    slow_query_logger.addHandler(file_handler)
+
+
 def get_logger(name):
     """
     Get a logger for the given name.
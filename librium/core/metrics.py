@@ -0,0 +1,103 @@
+"""
+In-process metrics for the Librium application.
+
+This module provides a small thread-safe registry of counters, gauges and
+timings. It is deliberately dependency-free; the current values can be read
+with ``metrics.snapshot()`` and are exposed through the ``/api/v1/metrics``
+endpoint.
+"""
+
+import threading
+from typing import Any, Dict
+
+
+class MetricsRegistry:
+    """Thread-safe registry of named counters, gauges and timings."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, Dict[str, float]] = {}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """
+        Increment a counter.
+
+        Args:
+            name: The name of the counter
+            value: The amount to add
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """
+        Set a gauge to its current value.
+
+        Args:
+            name: The name of the gauge
+            value: The current value
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """
+        Record an observation, such as a duration in milliseconds.
+
+        Args:
+            name: The name of the timing
+            value: The observed value
+        """
+        with self._lock:
+            timing = self._timings.setdefault(
+                name, {"count": 0, "total": 0.0, "max": 0.0}
+            )
+            timing["count"] += 1
+            timing["total"] += value
+            timing["max"] = max(timing["max"], value)
+
+    def counter(self, name: str) -> int:
+        """
+        Get the current value of a counter.
+
+        Args:
+            name: The name of the counter
+
+        Returns:
+            The value of the counter, or 0 if it was never incremented
+        """
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get a copy of all metrics.
+
+        Returns:
+            A dictionary with ``counters``, ``gauges`` and ``timings``
+        """
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": {
+                    name: {
+                        **timing,
+                        "mean": timing["total"] / timing["count"],
+                    }
+                    for name, timing in self._timings.items()
+                },
+            }
+
+    def reset(self) -> None:
+        """Clear all metrics."""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+
+
+metrics = MetricsRegistry()
@@ -21,6 +21,10 @@ from librium.database.sqlalchemy.db import (
     Session,
     Base,
     engine,
+    read_engine,
+    memory_replica,
+    write_coordinator,
+    tenants,
     create_tables,
     drop_tables,
     init_db,
@@ -57,6 +61,10 @@ __all__ = [
     "Session",
     "Base",
     "engine",
+    "read_engine",
+    "memory_replica",
+    "write_coordinator",
+    "tenants",
     "create_tables",
     "drop_tables",
     "init_db",
@@ -2,6 +2,8 @@
 Database backup and restore functionality.
 
 This module provides functions for backing up the database and restoring it from a backup.
+Each tenant's backups are kept in a directory of their own, see
+librium.database.sqlalchemy.tenancy.
 """
 
 import os
@@ -12,7 +14,10 @@ from datetime import datetime
 from pathlib import Path
 from typing import List, Optional
 
-from librium.database.sqlalchemy.db import engine
+from librium.database.sqlalchemy.analytics import snapshot_cache
+from librium.database.sqlalchemy.counts import count_cache
+from librium.database.sqlalchemy.db import current_engines, memory_replica
+from librium.database.sqlalchemy.tenancy import current_tenant, tenant_file_name
 
 
 def get_backup_directory() -> Path:
@@ -23,7 +28,10 @@ def get_backup_directory() -> Path:
         The backup directory path
     """
     backup_dir = Path.cwd() / "backups"
-    backup_dir.mkdir(exist_ok=True)
+    tenant = current_tenant()
+    if tenant is not None:
+        backup_dir /= Path(tenant_file_name(tenant)).stem
+    backup_dir.mkdir(parents=True, exist_ok=True)
     return backup_dir
 
 
@@ -38,6 +46,7 @@ def create_backup(filename: Optional[str] = None) -> Path:
         The path to the backup file
     """
     # Get the database file path from the engine
+    engine, _ = current_engines()
     db_file = engine.url.database
 
     # Generate a filename if not provided
@@ -80,6 +89,7 @@ def restore_from_backup(backup_file: Path) -> bool:
         True if the restore was successful, False otherwise
     """
     # Get the database file path from the engine
+    engine, read_engine = current_engines()
     db_file = engine.url.database
 
     # Check if the backup file exists
@@ -104,12 +114,20 @@ def restore_from_backup(backup_file: Path) -> bool:
         backup_conn.close()
         temp_conn.close()
 
-        # Dispose of the engine to close all connections
+        # Dispose of the engines to close all connections
         engine.dispose()
+        read_engine.dispose()
 
         # Replace the database file with the temporary file
         shutil.copy2(temp_path, db_file)
 
+        # The restored library may have reached the same version differently
+        count_cache.clear()
+        snapshot_cache.clear()
+
+        if memory_replica is not None and current_tenant() is None:
+            memory_replica.reload()
+
         return True
     except Exception as e:
         print(f"Error restoring from backup: {e}")
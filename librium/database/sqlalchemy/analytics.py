@@ -0,0 +1,285 @@
+"""
+Columnar analytics for the Librium application's statistics page.
+
+This module loads the columns of the non-deleted books the statistics are
+computed from into NumPy arrays, a ``LibrarySnapshot``, and computes the
+whole statistics suite from it with vectorized operations:
+
+- the totals, and the books per genre, year and format;
+- the price per year and in total;
+- price percentiles, books per page-count bucket and the read ratio per
+  decade, which the materialized statistics do not cover.
+
+The snapshot is kept until the library version changes (see
+``librium.database.sqlalchemy.counts``), so it is only reloaded after a
+change; each tenant has its own. NumPy is optional: without it,
+``available()`` is False and the statistics are read from the materialized
+``library_statistic`` table.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
+from typing import Any, Dict, List, Optional
+
+from librium.core.config import get_config
+from librium.core.logging import get_logger
+from librium.core.metrics import metrics
+from librium.database.sqlalchemy.counts import library_counter_value
+from librium.database.sqlalchemy.tenancy import current_tenant
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+# Get logger for this module
+logger = get_logger("database.analytics")
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+# The columns of a snapshot, read as integers without ORM row processing;
+# prices are rounded to cents like in the statistic triggers
+_BOOK_COLUMNS = (
+    "SELECT id, COALESCE(released, 0), "
+    "COALESCE(CAST(ROUND(price * 100) AS INTEGER), -1), "
+    "COALESCE(page_count, 0), read, COALESCE(format_id, 0) "
+    "FROM book WHERE deleted = 0 ORDER BY id"
+)
+_GENRE_LINKS = "SELECT book_id, genre_id FROM book_genres"
+
+# Width of the page-count buckets
+PAGE_BUCKET_SIZE = 100
+
+
+def available() -> bool:
+    """
+    Check whether the statistics are computed from a NumPy snapshot.
+
+    Returns:
+        True if NumPy is installed and the ``numpy`` backend is configured
+    """
+    return np is not None and get_config().STATISTICS_BACKEND == "numpy"
+
+
+class LibrarySnapshot:
+    """
+    The columns of the non-deleted books, as NumPy arrays in id order.
+
+    Missing years, page counts and formats are 0; missing prices are -1, as
+    a book can cost nothing. Prices are in cents, like the materialized
+    statistics. Genre links are two parallel arrays: the position of the
+    book in the other arrays, and the genre id.
+    """
+
+    __slots__ = (
+        "version",
+        "ids",
+        "released",
+        "price",
+        "page_count",
+        "read",
+        "format_id",
+        "genre_books",
+        "genre_ids",
+    )
+
+    def __init__(self, version: Optional[int], books: List, links: List):
+        """
+        Build a snapshot from its rows.
+
+        Args:
+            version: The library version the rows were read at
+            books: Rows of id, released, price, page count, read and format id
+            links: Rows of book id and genre id
+        """
+        self.version = version
+        (
+            self.ids,
+            self.released,
+            self.price,
+            self.page_count,
+            read,
+            self.format_id,
+        ) = _columns(books, 6)
+        self.read = read.astype(bool)
+
+        # Links of deleted books are left out
+        book_ids, genre_ids = _columns(links, 2)
+        positions = np.searchsorted(self.ids, book_ids)
+        found = positions < len(self.ids)
+        found[found] = self.ids[positions[found]] == book_ids[found]
+        self.genre_books = positions[found]
+        self.genre_ids = genre_ids[found]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _columns(rows: List, width: int):
+    """Turn rows of integers into one array per column."""
+    values = np.fromiter(chain.from_iterable(rows), np.int64, len(rows) * width)
+    return values.reshape(-1, width).T
+
+
+def load_snapshot(session, version: Optional[int] = None) -> LibrarySnapshot:
+    """
+    Load the columns of the non-deleted books.
+
+    Args:
+        session: The session to read the books with
+        version: The library version being read
+
+    Returns:
+        The snapshot
+    """
+    connection = session.connection()
+    return LibrarySnapshot(
+        version,
+        connection.exec_driver_sql(_BOOK_COLUMNS).all(),
+        connection.exec_driver_sql(_GENRE_LINKS).all(),
+    )
+
+
+class SnapshotCache:
+    """
+    The snapshot of the current library version, shared between requests.
+
+    Each tenant has a snapshot of its own library; those of the least
+    recently used tenants are dropped first.
+    """
+
+    def __init__(self, maxsize: int = 4):
+        """
+        Initialize an empty cache.
+
+        Args:
+            maxsize: The number of tenants whose snapshot is kept
+        """
+        self.maxsize = maxsize
+        self._snapshots: "OrderedDict[Optional[str], LibrarySnapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session) -> LibrarySnapshot:
+        """
+        Get the snapshot of the library, reloading it if the library changed.
+
+        Args:
+            session: The session to read the library with
+
+        Returns:
+            The snapshot
+        """
+        tenant = current_tenant()
+        version = library_counter_value(session, "version")
+        with self._lock:
+            snapshot = self._snapshots.get(tenant)
+            if snapshot is not None:
+                self._snapshots.move_to_end(tenant)
+        if snapshot is not None and version is not None and snapshot.version == version:
+            metrics.increment("analytics.snapshot.hit")
+            return snapshot
+
+        metrics.increment("analytics.snapshot.miss")
+        started = time.perf_counter()
+        snapshot = load_snapshot(session, version)
+        metrics.observe("analytics.snapshot_ms", (time.perf_counter() - started) * 1000)
+        with self._lock:
+            self._snapshots[tenant] = snapshot
+            self._snapshots.move_to_end(tenant)
+            while len(self._snapshots) > self.maxsize:
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    def clear(self) -> None:
+        """Forget the snapshots, e.g. after restoring another database."""
+        with self._lock:
+            self._snapshots.clear()
+
+
+snapshot_cache = SnapshotCache()
+
+
+def _named(counts, names: Dict[int, str]) -> Dict[str, int]:
+    """Turn counts indexed by id into counts per name, leaving out zeros."""
+    named: Dict[str, int] = {}
+    for id_ in np.flatnonzero(counts).tolist():
+        name = names.get(id_)
+        if name is not None:
+            named[name] = named.get(name, 0) + int(counts[id_])
+    return named
+
+
+def compute_statistics(
+    snapshot: LibrarySnapshot,
+    genre_names: Dict[int, str],
+    format_names: Dict[int, str],
+) -> Dict[str, Any]:
+    """
+    Compute the statistics suite of a snapshot.
+
+    Genres and formats missing from the name mappings, such as deleted ones,
+    are left out, like empty buckets.
+
+    Args:
+        snapshot: The snapshot of the library
+        genre_names: Genre names by id
+        format_names: Format names by id
+
+    Returns:
+        The statistics, with the keys of ``BookService.get_statistics()``
+    """
+    cents = np.maximum(snapshot.price, 0)
+    total = len(snapshot)
+    read = int(np.count_nonzero(snapshot.read))
+
+    # Years and decades are counted as offsets from the earliest one
+    dated = snapshot.released != 0
+    years = snapshot.released[dated]
+    first = int(years.min()) if years.size else 0
+    year_books = np.bincount(years - first)
+    year_cents = np.bincount(years - first, weights=cents[dated])
+    present = np.flatnonzero(year_books)
+    present_years = (present + first).tolist()
+
+    decades = years // 10 - first // 10
+    decade_books = np.bincount(decades)
+    decade_read = np.bincount(decades, weights=snapshot.read[dated])
+    read_decades = np.flatnonzero(decade_books)
+
+    priced = snapshot.price[snapshot.price >= 0]
+    percentiles = np.percentile(priced, PERCENTILES) if priced.size else []
+
+    pages = snapshot.page_count[snapshot.page_count > 0]
+    page_buckets = np.bincount(pages // PAGE_BUCKET_SIZE)
+
+    return {
+        "_total_books": total,
+        "_read_books": read,
+        "_unread_books": total - read,
+        "books_per_genre": _named(np.bincount(snapshot.genre_ids), genre_names),
+        "books_per_year": dict(zip(present_years, year_books[present].tolist())),
+        "books_per_format": _named(np.bincount(snapshot.format_id), format_names),
+        "price_per_year": dict(
+            zip(present_years, (np.rint(year_cents[present]) / 100).tolist())
+        ),
+        "total_price": int(cents.sum()) / 100,
+        "price_percentiles": dict(
+            zip(PERCENTILES, (np.rint(percentiles) / 100).tolist())
+        ),
+        "books_per_page_count": dict(
+            zip(
+                range(0, len(page_buckets) * PAGE_BUCKET_SIZE, PAGE_BUCKET_SIZE),
+                page_buckets.tolist(),
+            )
+        ),
+        "read_ratio_per_decade": dict(
+            zip(
+                ((read_decades + first // 10) * 10).tolist(),
+                (decade_read[read_decades] / decade_books[read_decades])
+                .round(4)
+                .tolist(),
+            )
+        ),
+    }
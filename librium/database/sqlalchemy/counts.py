@@ -0,0 +1,295 @@
+"""
+Cached and maintained row counts for the Librium application.
+
+This module provides the ``library_counter`` table, which SQLite triggers
+keep up to date in the same transaction as every change to the library:
+
+- ``version`` is incremented by every insert, update or delete of a book, an
+  entity or an association between them;
+- ``books`` and ``books_read`` count the non-deleted books, and those read.
+
+Paginated listings use the version to cache their total counts: a cached
+count is reused until the library changes. Each tenant's library has its own
+versions, so counts are cached per tenant. Unfiltered book listings can read
+the counters instead of counting at all.
+"""
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from sqlalchemy import Column, Integer, MetaData, Select, Table, Text, func, select
+
+from librium.core.config import get_config
+from librium.core.logging import get_logger
+from librium.core.metrics import metrics
+from librium.database.sqlalchemy.tenancy import current_tenant
+
+# Get logger for this module
+logger = get_logger("database.counts")
+
+COUNTER_TABLE = "library_counter"
+COUNTERS = ("version", "books", "books_read")
+
+# Filters matched with ilike, whose case does not change the count
+CASE_INSENSITIVE_FILTERS = ("search", "start_with", "ends_with")
+
+# Tables whose changes bump the library version
+VERSIONED_TABLES = (
+    "book",
+    "book_authors",
+    "book_genres",
+    "book_languages",
+    "book_publishers",
+    "series_index",
+    "author",
+    "format",
+    "genre",
+    "language",
+    "publisher",
+    "series",
+)
+
+# Kept outside Base.metadata, like the search index; see create_counters()
+counter_metadata = MetaData()
+library_counter = Table(
+    COUNTER_TABLE,
+    counter_metadata,
+    Column("name", Text, primary_key=True),
+    Column("value", Integer, nullable=False),
+)
+
+# Matches the Book.deleted.is_(False) and Book.read.is_(True) filters;
+# IS never yields NULL, which would wipe out a counter
+_BOOK_DELTA = {
+    "books": "{row}.deleted IS 0",
+    "books_read": "{row}.read IS 1 AND {row}.deleted IS 0",
+}
+
+
+def _counter_update(added: Optional[str], removed: Optional[str]) -> str:
+    """Build the UPDATE bumping the version and adjusting the book counters."""
+    cases = ["WHEN 'version' THEN 1"]
+    for name, delta in _BOOK_DELTA.items():
+        terms = []
+        if added:
+            terms.append(f"({delta.format(row=added)})")
+        if removed:
+            terms.append(f"- ({delta.format(row=removed)})")
+        if terms:
+            cases.append(f"WHEN '{name}' THEN {' '.join(terms)}")
+    return (
+        f"UPDATE {COUNTER_TABLE} SET value = value + CASE name {' '.join(cases)} "
+        f"ELSE 0 END;"
+    )
+
+
+def _triggers() -> Dict[str, str]:
+    """Get the counter triggers, by name."""
+    triggers = {}
+    for table in VERSIONED_TABLES:
+        for event, added, removed in (
+            ("INSERT", "NEW", None),
+            ("UPDATE", "NEW", "OLD"),
+            ("DELETE", None, "OLD"),
+        ):
+            if table == "book":
+                body = _counter_update(added, removed)
+            else:
+                body = (
+                    f"UPDATE {COUNTER_TABLE} SET value = value + 1 "
+                    "WHERE name = 'version';"
+                )
+            triggers[f"{COUNTER_TABLE}_{table}_{event.lower()}"] = (
+                f"AFTER {event} ON {table} BEGIN {body} END"
+            )
+    return triggers
+
+
+def create_counters(connection) -> None:
+    """
+    Create the counter table and the triggers that maintain it.
+
+    Args:
+        connection: The connection to create the counters on
+    """
+    connection.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {COUNTER_TABLE} "
+        "(name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+    )
+    connection.exec_driver_sql(
+        f"INSERT OR IGNORE INTO {COUNTER_TABLE} (name, value) VALUES "
+        + ", ".join(f"('{name}', 0)" for name in COUNTERS)
+    )
+    for name, body in _triggers().items():
+        connection.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+def drop_counters(connection) -> None:
+    """
+    Drop the counter table and its triggers.
+
+    Args:
+        connection: The connection to drop the counters on
+    """
+    for name in _triggers():
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {COUNTER_TABLE}")
+
+
+def rebuild_counters(connection) -> None:
+    """
+    Recount the book counters, for example after a backfill.
+
+    Args:
+        connection: The connection to rebuild the counters on
+    """
+    connection.exec_driver_sql(
+        f"UPDATE {COUNTER_TABLE} SET value = CASE name "
+        "WHEN 'books' THEN (SELECT count(*) FROM book WHERE deleted IS 0) "
+        "WHEN 'books_read' THEN "
+        "(SELECT count(*) FROM book WHERE read IS 1 AND deleted IS 0) "
+        "ELSE value + 1 END"
+    )
+    logger.info("Rebuilt the library counters")
+
+
+@contextmanager
+def suspend_counters(connection):
+    """
+    Suspend the counter triggers for a bulk load, then recount once.
+
+    Args:
+        connection: The connection the bulk load runs on
+    """
+    for name in _triggers():
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    try:
+        yield
+    finally:
+        create_counters(connection)
+        rebuild_counters(connection)
+
+
+def library_counter_value(session, name: str) -> int:
+    """
+    Get the value of a library counter.
+
+    Args:
+        session: The session to read the counter with
+        name: One of COUNTERS
+
+    Returns:
+        The counter value
+    """
+    return session.scalar(
+        select(library_counter.c.value).where(library_counter.c.name == name)
+    )
+
+
+class CountCache:
+    """A bounded cache of counts, valid for one library version each."""
+
+    def __init__(self, maxsize: int = 256):
+        """
+        Initialize an empty cache.
+
+        Args:
+            maxsize: The number of counts kept; the least recently used go first
+        """
+        self.maxsize = maxsize
+        self._counts: "OrderedDict[Hashable, Tuple[int, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, version: int) -> Optional[int]:
+        """
+        Get a cached count.
+
+        Args:
+            key: The normalized filters the count was made for
+            version: The current library version
+
+        Returns:
+            The count, or None if it is missing or from another version
+        """
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached is None or cached[0] != version:
+                return None
+            self._counts.move_to_end(key)
+            return cached[1]
+
+    def set(self, key: Hashable, version: int, count: int) -> None:
+        """
+        Cache a count.
+
+        Args:
+            key: The normalized filters the count was made for
+            version: The library version the count was made at
+            count: The count
+        """
+        with self._lock:
+            self._counts[key] = (version, count)
+            self._counts.move_to_end(key)
+            while len(self._counts) > self.maxsize:
+                self._counts.popitem(last=False)
+
+    def clear(self) -> None:
+        """Forget every cached count, e.g. after restoring another database."""
+        with self._lock:
+            self._counts.clear()
+
+
+count_cache = CountCache(get_config().COUNT_CACHE_SIZE)
+
+
+def normalize_filters(namespace: str, **filters: Any) -> Tuple:
+    """
+    Turn listing filters into a cache key.
+
+    Unset filters are dropped, and ilike filters are lower-cased when that
+    cannot change what they match (SQLite only folds ASCII case). The key
+    starts with the current tenant, whose library versions are its own.
+
+    Args:
+        namespace: The listing the filters belong to, e.g. ``book``
+        **filters: The filter arguments
+
+    Returns:
+        A hashable key
+    """
+    normalized = []
+    for name, value in sorted(filters.items()):
+        if value is None or value == "":
+            continue
+        if name in CASE_INSENSITIVE_FILTERS and isinstance(value, str):
+            value = value.lower() if value.isascii() else value
+        normalized.append((name, value))
+    return (current_tenant(), namespace, tuple(normalized))
+
+
+def cached_count(session, query: Select, namespace: str, **filters: Any) -> int:
+    """
+    Count the rows of a query, reusing the count until the library changes.
+
+    Args:
+        session: The session to count with
+        query: The filtered query
+        namespace: The listing the query belongs to, e.g. ``book``
+        **filters: The filter arguments the query was built from
+
+    Returns:
+        The number of rows
+    """
+    key = normalize_filters(namespace, **filters)
+    version = library_counter_value(session, "version")
+    count = count_cache.get(key, version)
+    if count is not None:
+        metrics.increment("counts.cache.hit")
+        return count
+
+    metrics.increment("counts.cache.miss")
+    count = session.scalar(select(func.count()).select_from(query.subquery()))
+    count_cache.set(key, version, count)
+    return count
@@ -25,18 +25,53 @@ from sqlalchemy import (
     Table,
     create_engine,
     event,
+    false,
 )
 from sqlalchemy.orm import (
     DeclarativeBase,
     Mapped,
+    ORMExecuteState,
     mapped_column,
+    object_session,
     relationship,
     scoped_session,
-    sessionmaker,
+    with_loader_criteria,
 )
-from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm import Session as OrmSession
 from typing_extensions import Annotated
 
+from librium.core.config import get_config
+from librium.database.sqlalchemy.counts import create_counters, drop_counters
+from librium.database.sqlalchemy.pooling import InstrumentedQueuePool
+from librium.database.sqlalchemy.profiles import use_connection_profile
+from librium.database.sqlalchemy.replica import MemoryReplica
+from librium.database.sqlalchemy.routing import (
+    WRITER,
+    RoutingSession,
+    create_read_engine,
+)
+from librium.database.sqlalchemy.search import (
+    create_search_index,
+    create_title_index,
+    drop_search_index,
+    drop_title_index,
+    reverse_title,
+)
+from librium.database.sqlalchemy.statistics import (
+    create_statistics,
+    drop_statistics,
+)
+from librium.database.sqlalchemy.tenancy import (
+    TenantRegistry,
+    TenantSessionmaker,
+    current_tenant,
+    tenant_scope,
+)
+from librium.database.sqlalchemy.writes import (
+    WriteCoordinator,
+    use_immediate_transactions,
+)
+
 # Common constants
 MAX_NAME_LENGTH = 50
 MAX_AFFIX_LENGTH = 20
@@ -46,19 +81,72 @@ DEFAULT_INT_SIZE = 64
 # Load environment and setup database
 load_dotenv(find_dotenv())
 db_file = os.getenv("SQLDATABASE")
+# SQLite allows one writer at a time and every connection holds its own page
+# cache, so the read-write pool is kept small; reads use read_engine's pool
 engine = create_engine(
     f"sqlite:///{db_file}",
-    poolclass=QueuePool,
-    pool_size=10,
-    max_overflow=20,
+    poolclass=InstrumentedQueuePool,
+    pool_size=get_config().SQLITE_WRITE_POOL_SIZE,
+    max_overflow=get_config().SQLITE_WRITE_MAX_OVERFLOW,
     pool_timeout=30,
     pool_recycle=1800,
+    query_cache_size=get_config().SQLITE_QUERY_CACHE_SIZE,
     # echo=True,
 )
+engine.pool.name = WRITER
+use_connection_profile(engine, get_config().SQLITE_CONNECTION_PROFILE)
+
+# Write transactions of the process run one at a time, and take SQLite's write
+# lock when they begin instead of at their first write
+use_immediate_transactions(engine)
+write_coordinator = WriteCoordinator(
+    retries=get_config().SQLITE_WRITE_RETRIES,
+    backoff_ms=get_config().SQLITE_WRITE_BACKOFF_MS,
+)
 
-# Create a session factory
-session_factory = sessionmaker(bind=engine)
-Session = scoped_session(session_factory)
+# Read-only engine for @read_only service methods, reading the file itself or
+# an in-memory copy of it
+memory_replica = None
+if get_config().SQLITE_MEMORY_REPLICA and db_file and db_file != ":memory:":
+    memory_replica = MemoryReplica(
+        engine,
+        pool_size=get_config().SQLITE_READ_POOL_SIZE,
+        max_overflow=get_config().SQLITE_READ_MAX_OVERFLOW,
+        query_cache_size=get_config().SQLITE_QUERY_CACHE_SIZE,
+        max_lag=get_config().SQLITE_MEMORY_REPLICA_MAX_LAG,
+    )
+    read_engine = memory_replica.engine
+else:
+    read_engine = create_read_engine(
+        engine,
+        pool_size=get_config().SQLITE_READ_POOL_SIZE,
+        max_overflow=get_config().SQLITE_READ_MAX_OVERFLOW,
+        query_cache_size=get_config().SQLITE_QUERY_CACHE_SIZE,
+    )
+
+# The databases of the tenants, each in a file of its own; the schema of new
+# ones is created by create_schema() once the models are defined
+tenants = None
+if get_config().TENANT_DATABASE_DIR:
+    tenants = TenantRegistry(
+        get_config().TENANT_DATABASE_DIR,
+        create_schema=lambda tenant_engine: create_schema(tenant_engine),
+        maxsize=get_config().TENANT_ENGINE_CACHE_SIZE,
+        idle_seconds=get_config().TENANT_ENGINE_IDLE_SECONDS,
+        create=get_config().TENANT_AUTO_CREATE,
+        profile=get_config().SQLITE_CONNECTION_PROFILE,
+        write_retries=get_config().SQLITE_WRITE_RETRIES,
+        write_backoff_ms=get_config().SQLITE_WRITE_BACKOFF_MS,
+    )
+
+# Create a session factory that routes reads to the read-only engine, of the
+# current tenant's database if there is one
+session_factory = TenantSessionmaker(
+    tenants, writer=engine, reader=read_engine, replica=memory_replica
+)
+Session = scoped_session(
+    session_factory, scopefunc=tenant_scope if tenants is not None else None
+)
 
 int_pk = Annotated[int, mapped_column(Integer, primary_key=True)]
 str_name = Annotated[str, mapped_column(String)]
@@ -90,6 +178,17 @@ class Base(DeclarativeBase):
     pass
 
 
+class SoftDelete:
+    """
+    Mixin for models whose rows are flagged as deleted instead of removed.
+
+    ORM queries leave out the deleted rows of these models, see
+    exclude_deleted().
+    """
+
+    deleted: Mapped[bool] = mapped_column(default=False)
+
+
 # Association tables for many-to-many relationships
 book_publishers = Table(
     "book_publishers",
@@ -113,13 +212,20 @@ book_genres = Table(
 )
 
 
-class Book(Base):
+class Book(SoftDelete, Base):
     """Book model representing a book in the library."""
 
     __tablename__ = "book"
 
     id: Mapped[int_pk]
     title: Mapped[str_name]
+    # Lower-cased reversed title, so suffix matches can use an index
+    title_reversed: Mapped[Optional[str]] = mapped_column(
+        String,
+        default=lambda context: reverse_title(
+            context.get_current_parameters().get("title")
+        ),
+    )
     created_at: Mapped[DateTime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[Optional[DateTime]] = mapped_column(DateTime)
     isbn: Mapped[Optional[str_max_isbn]]
@@ -129,26 +235,25 @@ class Book(Base):
     read: Mapped[bool] = mapped_column(default=False)
     has_cover: Mapped[bool] = mapped_column(default=False)
     uuid: Mapped[str_uuid]
-    deleted: Mapped[bool] = mapped_column(default=False)
 
     # Relationships
     format_id: Mapped[int] = mapped_column(ForeignKey("format.id"))
     format: Mapped["Format"] = relationship(back_populates="books", lazy="joined")
 
     authors: Mapped[List["AuthorOrdering"]] = relationship(
-        back_populates="book", cascade="all, delete-orphan", lazy="joined"
+        back_populates="book", cascade="all, delete-orphan", lazy="selectin"
     )
     publishers: Mapped[List["Publisher"]] = relationship(
-        secondary=book_publishers, back_populates="books", lazy="joined"
+        secondary=book_publishers, back_populates="books", lazy="selectin"
     )
     languages: Mapped[List["Language"]] = relationship(
-        secondary=book_languages, back_populates="books", lazy="joined"
+        secondary=book_languages, back_populates="books", lazy="selectin"
     )
     genres: Mapped[List["Genre"]] = relationship(
-        secondary=book_genres, back_populates="books", lazy="joined"
+        secondary=book_genres, back_populates="books", lazy="selectin"
     )
     series: Mapped[List["SeriesIndex"]] = relationship(
-        back_populates="book", cascade="all, delete-orphan", lazy="joined"
+        back_populates="book", cascade="all, delete-orphan", lazy="selectin"
     )
 
     def set(self, **kwargs):
@@ -218,8 +323,8 @@ class Book(Base):
             return None
         normalized = isbn.replace("-", "").replace(" ", "")
         q = session.query(cls).filter(cls.isbn.in_([isbn, normalized]))
-        if not include_deleted:
-            q = q.filter(cls.deleted.is_(False))
+        if include_deleted:
+            q = q.execution_options(include_deleted=True)
         return q.first()
 
     @classmethod
@@ -238,8 +343,8 @@ class Book(Base):
         if not query:
             return []
         q = session.query(cls).filter(cls.title.ilike(f"%{query}%"))
-        if not include_deleted:
-            q = q.filter(cls.deleted.is_(False))
+        if include_deleted:
+            q = q.execution_options(include_deleted=True)
         if limit is not None:
             q = q.limit(limit)
         return q.all()
@@ -275,7 +380,7 @@ class Book(Base):
         return f"<Book(id={self.id}, title='{self.title}')>"
 
 
-class Author(Base):
+class Author(SoftDelete, Base):
     """Author model representing a book author."""
 
     __tablename__ = "author"
@@ -290,7 +395,6 @@ class Author(Base):
     uuid: Mapped[str_uuid]
     created_at: Mapped[DateTime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[Optional[DateTime]] = mapped_column(DateTime)
-    deleted: Mapped[bool] = mapped_column(default=False)
 
     # Relationships
     books: Mapped[List["AuthorOrdering"]] = relationship(
@@ -350,8 +454,8 @@ class Author(Base):
         if not name:
             return []
         q = session.query(cls).filter(cls.name.ilike(f"%{name}%"))
-        if not include_deleted:
-            q = q.filter(cls.deleted.is_(False))
+        if include_deleted:
+            q = q.execution_options(include_deleted=True)
         if limit is not None:
             q = q.limit(limit)
         return q.all()
@@ -363,7 +467,7 @@ class Author(Base):
             return f"<Author(id={self.id}, name='{self.first_name} {self.last_name}')>"
 
 
-class Publisher(Base):
+class Publisher(SoftDelete, Base):
     """Publisher model representing a book publisher."""
 
     __tablename__ = "publisher"
@@ -372,7 +476,6 @@ class Publisher(Base):
     name: Mapped[str_max]
     created_at: Mapped[DateTime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[Optional[DateTime]] = mapped_column(DateTime)
-    deleted: Mapped[bool] = mapped_column(default=False)
 
     # Relationships
     books: Mapped[List["Book"]] = relationship(
@@ -400,8 +503,8 @@ class Publisher(Base):
         if not name:
             return []
         q = session.query(cls).filter(cls.name.ilike(f"%{name}%"))
-        if not include_deleted:
-            q = q.filter(cls.deleted.is_(False))
+        if include_deleted:
+            q = q.execution_options(include_deleted=True)
         if limit is not None:
             q = q.limit(limit)
         return q.all()
@@ -410,7 +513,7 @@ class Publisher(Base):
         return f"<Publisher(id={self.id}, name='{self.name}')>"
 
 
-class Format(Base):
+class Format(SoftDelete, Base):
     """Format model representing a book format (e.g., hardcover, paperback)."""
 
     __tablename__ = "format"
@@ -419,7 +522,6 @@ class Format(Base):
     name: Mapped[str_max]
     created_at: Mapped[DateTime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[Optional[DateTime]] = mapped_column(DateTime)
-    deleted: Mapped[bool] = mapped_column(default=False)
 
     # Relationships
     books: Mapped[List["Book"]] = relationship(back_populates="format")
@@ -437,7 +539,7 @@ class Format(Base):
         return f"<Format(id={self.id}, name='{self.name}')>"
 
 
-class Language(Base):
+class Language(SoftDelete, Base):
     """Language model representing a book language."""
 
     __tablename__ = "language"
@@ -446,7 +548,6 @@ class Language(Base):
     name: Mapped[str_max]
     created_at: Mapped[DateTime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[Optional[DateTime]] = mapped_column(DateTime)
-    deleted: Mapped[bool] = mapped_column(default=False)
 
     # Relationships
     books: Mapped[List["Book"]] = relationship(
@@ -466,7 +567,7 @@ class Language(Base):
         return f"<Language(id={self.id}, name='{self.name}')>"
 
 
-class Genre(Base):
+class Genre(SoftDelete, Base):
     """Genre model representing a book genre."""
 
     __tablename__ = "genre"
@@ -475,7 +576,6 @@ class Genre(Base):
     name: Mapped[str_max]
     created_at: Mapped[DateTime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[Optional[DateTime]] = mapped_column(DateTime)
-    deleted: Mapped[bool] = mapped_column(default=False)
 
     # Relationships
     books: Mapped[List["Book"]] = relationship(
@@ -486,7 +586,7 @@ class Genre(Base):
         return f"<Genre(id={self.id}, name='{self.name}')>"
 
 
-class Series(Base):
+class Series(SoftDelete, Base):
     """Series model representing a book series."""
 
     __tablename__ = "series"
@@ -497,7 +597,6 @@ class Series(Base):
     )
     created_at: Mapped[DateTime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[Optional[DateTime]] = mapped_column(DateTime)
-    deleted: Mapped[bool] = mapped_column(default=False)
 
     # Relationships
     books: Mapped[List["SeriesIndex"]] = relationship(
@@ -536,8 +635,8 @@ class Series(Base):
         if not name:
             return []
         q = session.query(cls).filter(cls.name.ilike(f"%{name}%"))
-        if not include_deleted:
-            q = q.filter(cls.deleted.is_(False))
+        if include_deleted:
+            q = q.execution_options(include_deleted=True)
         if limit is not None:
             q = q.limit(limit)
         return q.all()
@@ -561,7 +660,7 @@ class SeriesIndex(Base):
 
     # Relationships
     book: Mapped["Book"] = relationship(back_populates="series")
-    series: Mapped["Series"] = relationship(back_populates="books")
+    series: Mapped["Series"] = relationship(back_populates="books", lazy="joined")
 
     @property
     def index(self) -> Decimal:
@@ -587,13 +686,13 @@ class AuthorOrdering(Base):
 
     # Relationships
     book: Mapped["Book"] = relationship(back_populates="authors")
-    author: Mapped["Author"] = relationship(back_populates="books")
+    author: Mapped["Author"] = relationship(back_populates="books", lazy="joined")
 
     def __repr__(self):
         return f"<AuthorOrdering(book_id={self.book_id}, author_id={self.author_id}, idx={self.idx})>"
 
 
-class Authentication(Base):
+class Authentication(SoftDelete, Base):
     """Authentication model for user authentication."""
 
     __tablename__ = "authentication"
@@ -603,7 +702,6 @@ class Authentication(Base):
     password_hash: Mapped[str_max]
     created_at: Mapped[DateTime] = mapped_column(DateTime, default=datetime.now)
     updated_at: Mapped[Optional[DateTime]] = mapped_column(DateTime)
-    deleted: Mapped[bool] = mapped_column(default=False)
 
     def __repr__(self):
         return f"<Authentication(id={self.id}, username='{self.username}')>"
@@ -621,25 +719,95 @@ class Authentication(Base):
         return check_password_hash(self.password_hash, password)
 
 
-# Create indexes for frequently queried fields
-Index("idx_book_title", Book.title)
-Index("idx_book_read", Book.read)
-Index("idx_book_uuid", Book.uuid)
-Index("idx_author_last_name", Author.last_name)
+# Create indexes for frequently queried fields. The lookups that only ever see
+# rows which are not deleted use partial indexes, which stay compact as soft
+# deleted rows pile up; their condition matches the one of exclude_deleted().
+Index("idx_book_title", Book.title, sqlite_where=Book.deleted == false())
+Index("idx_book_title_reversed", Book.title_reversed)
+Index("idx_book_read", Book.read, sqlite_where=Book.deleted == false())
+Index("idx_book_released", Book.released, sqlite_where=Book.deleted == false())
+Index("idx_book_uuid", Book.uuid, sqlite_where=Book.deleted == false())
+Index("idx_book_isbn", Book.isbn, sqlite_where=Book.deleted == false())
+Index("idx_author_last_name", Author.last_name, sqlite_where=Author.deleted == false())
+Index("idx_author_name", Author.name, sqlite_where=Author.deleted == false())
 Index("idx_series_name", Series.name)
 Index("idx_book_authors_idx", AuthorOrdering.book_id, AuthorOrdering.idx)
 Index("idx_series_index_idx", SeriesIndex.book_id, SeriesIndex.idx)
+# The association tables are keyed by book first; the filters by genre,
+# publisher, language and series look them up from the other side
+Index("idx_series_index_series_id_book_id", SeriesIndex.series_id, SeriesIndex.book_id)
+Index("idx_book_genres_genre_id_book_id", book_genres.c.genre_id, book_genres.c.book_id)
+Index(
+    "idx_book_publishers_publisher_id_book_id",
+    book_publishers.c.publisher_id,
+    book_publishers.c.book_id,
+)
+Index(
+    "idx_book_languages_language_id_book_id",
+    book_languages.c.language_id,
+    book_languages.c.book_id,
+)
+
+
+# Create and drop the full-text search indexes, the library counters and the
+# materialized statistics together with the tables
+@event.listens_for(Base.metadata, "after_create")
+def metadata_after_create(target, connection, **kw):
+    create_search_index(connection)
+    create_title_index(connection)
+    create_counters(connection)
+    create_statistics(connection)
+
+
+@event.listens_for(Base.metadata, "before_drop")
+def metadata_before_drop(target, connection, **kw):
+    drop_search_index(connection)
+    drop_title_index(connection)
+    drop_counters(connection)
+    drop_statistics(connection)
+
+
+@event.listens_for(OrmSession, "do_orm_execute")
+def exclude_deleted(execute_state: ORMExecuteState):
+    """
+    Leave the soft deleted rows out of every ORM query of every session.
+
+    Pass the ``include_deleted=True`` execution option to a query to get
+    them. Refreshing the columns of a loaded row and loading its
+    relationships is not filtered. ``Session.get()`` returns a deleted row
+    that is already in the identity map without a query, so the services
+    pass ``include_deleted`` to it and get the row either way.
+    """
+    if (
+        execute_state.is_select
+        and not execute_state.is_column_load
+        and not execute_state.is_relationship_load
+        and not execute_state.execution_options.get("include_deleted", False)
+    ):
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(
+                SoftDelete,
+                lambda cls: cls.deleted == false(),
+                include_aliases=True,
+                propagate_to_loaders=False,
+            )
+        )
 
 
 # Event listeners for updating timestamps
 @event.listens_for(Book, "before_update")
 def book_before_update(mapper, connection, target):
+    # Flushes also visit books without net changes, which are left untouched
+    if not object_session(target).is_modified(target):
+        return
     target.updated_at = datetime.now()
+    target.title_reversed = reverse_title(target.title)
     validate_book(target)
 
 
 @event.listens_for(Book, "before_insert")
 def book_before_insert(mapper, connection, target):
+    target.title_reversed = reverse_title(target.title)
     validate_book(target)
 
 
@@ -732,25 +900,42 @@ def author_ordering_before_insert(mapper, connection, target):
 # Validation functions
 def validate_book(book):
     """Validate book data before insert or update."""
+    validate_book_values(
+        {
+            "title": book.title,
+            "isbn": book.isbn,
+            "released": book.released,
+            "page_count": book.page_count,
+            "price": book.price,
+        }
+    )
+
+
+def validate_book_values(values):
+    """Validate the given book column values, as stored by insert or update."""
     # Validate title
-    if not book.title or not book.title.strip():
+    if "title" in values and (not values["title"] or not values["title"].strip()):
         raise ValueError("Book title cannot be empty")
 
     # Validate ISBN
-    if book.isbn and not Book.validate_isbn(book.isbn):
-        raise ValueError(f"Invalid ISBN format: {book.isbn}")
+    isbn = values.get("isbn")
+    if isbn and not Book.validate_isbn(isbn):
+        raise ValueError(f"Invalid ISBN format: {isbn}")
 
     # Validate release year
-    if book.released is not None and not Book.validate_released(book.released):
-        raise ValueError(f"Invalid release year: {book.released}")
+    released = values.get("released")
+    if released is not None and not Book.validate_released(released):
+        raise ValueError(f"Invalid release year: {released}")
 
     # Validate page count
-    if book.page_count is not None and book.page_count <= 0:
-        raise ValueError(f"Page count must be positive: {book.page_count}")
+    page_count = values.get("page_count")
+    if page_count is not None and page_count <= 0:
+        raise ValueError(f"Page count must be positive: {page_count}")
 
     # Validate price
-    if book.price is not None and book.price < 0:
-        raise ValueError(f"Price cannot be negative: {book.price}")
+    price = values.get("price")
+    if price is not None and price < 0:
+        raise ValueError(f"Price cannot be negative: {price}")
 
 
 def validate_author(author):
@@ -823,7 +1008,26 @@ def validate_author_ordering(author_ordering):
 # Create all tables
 def create_tables():
     """Create all database tables."""
-    Base.metadata.create_all(engine)
+    create_schema(engine)
+
+
+def create_schema(bind):
+    """Create all database tables on an engine or connection."""
+    Base.metadata.create_all(bind)
+
+
+def current_engines():
+    """
+    Get the engines of the current tenant's database, or the default ones.
+
+    Returns:
+        The read-write engine and the read-only engine
+    """
+    tenant = current_tenant()
+    if tenant is None or tenants is None:
+        return engine, read_engine
+    database = tenants.get(tenant)
+    return database.engine, database.read_engine
 
 
 # Drop all tables
@@ -841,5 +1045,11 @@ def init_db():
 # Close the connection pool when the application exits
 @atexit.register
 def close_connection_pool():
-    """Close the connection pool when the application exits."""
+    """Close the connection pools when the application exits."""
     engine.dispose()
+    if memory_replica is not None:
+        memory_replica.close()
+    else:
+        read_engine.dispose()
+    if tenants is not None:
+        tenants.close()
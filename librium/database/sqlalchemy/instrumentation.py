@@ -0,0 +1,317 @@
+"""
+Statement counting for the Librium application.
+
+This module provides a per-request statement tracker. Every statement the
+session's engines execute while a tracker is active is counted and grouped
+by its normalized SQL text. Repeated identical statements point to N+1 query
+patterns. The Flask integration in ``librium.core.app`` uses the tracker to
+enforce per-route query budgets.
+
+Statements slower than the slow-query threshold are written to the slow-query
+log together with their parameters, the service method and route they came
+from, and their ``EXPLAIN QUERY PLAN`` output.
+
+Every statement also counts as a hit or a miss of the engine's compiled
+statement cache, and statements pruned from a full cache count as evictions.
+"""
+
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from typing import List, Optional, Tuple
+from weakref import WeakSet
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.interfaces import CacheStats
+
+from librium.core.logging import get_logger
+from librium.core.metrics import metrics
+
+# Get loggers for this module
+logger = get_logger("database.instrumentation")
+slow_query_logger = get_logger("slow_queries")
+
+# Statement types EXPLAIN QUERY PLAN is captured for
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+MAX_PARAMETERS_LENGTH = 1000
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:\?, )*\?\)", re.IGNORECASE)
+_VALUES_LIST = re.compile(r"VALUES (?:\((?:\?, )*\?\)(?:, )?)+", re.IGNORECASE)
+
+_tracker: ContextVar[Optional["QueryTracker"]] = ContextVar(
+    "query_tracker", default=None
+)
+_service_method: ContextVar[Optional[str]] = ContextVar("service_method", default=None)
+
+# Statements slower than this are logged; None disables the slow-query log
+_slow_query_threshold: Optional[float] = None
+
+# Engines that already have the cursor listeners installed
+_instrumented: "WeakSet[Engine]" = WeakSet()
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised in tests when a request executes more statements than allowed."""
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    Normalize a SQL statement so that executions differing only in their
+    parameters compare equal.
+
+    Args:
+        statement: The SQL text
+
+    Returns:
+        The statement with literals replaced by ``?``, ``IN`` and ``VALUES``
+        lists collapsed and whitespace squeezed
+    """
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _IN_LIST.sub("IN (?)", statement)
+    statement = _VALUES_LIST.sub("VALUES (?)", statement)
+    return statement
+
+
+class QueryTracker:
+    """Counts the statements executed within one scope, such as a request."""
+
+    def __init__(self, endpoint: Optional[str] = None):
+        """
+        Initialize an empty tracker.
+
+        Args:
+            endpoint: The route the statements are executed for
+        """
+        self.endpoint = endpoint
+        self.statements: Counter = Counter()
+        self.total = 0
+        self.duration = 0.0
+
+    def record(self, statement: str, duration: float) -> None:
+        """
+        Record one executed statement.
+
+        Args:
+            statement: The SQL text as sent to the database
+            duration: The execution time in seconds
+        """
+        self.statements[normalize_sql(statement)] += 1
+        self.total += 1
+        self.duration += duration
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """
+        Get the statements executed at least ``threshold`` times.
+
+        Args:
+            threshold: The minimum number of executions
+
+        Returns:
+            (normalized SQL, count) pairs, most frequent first
+        """
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+def current_tracker() -> Optional[QueryTracker]:
+    """
+    Get the tracker of the current scope.
+
+    Returns:
+        The active tracker, or None if statements are not being tracked
+    """
+    return _tracker.get()
+
+
+def start_tracking(endpoint: Optional[str] = None) -> Tuple[QueryTracker, object]:
+    """
+    Start tracking statements in the current context.
+
+    Args:
+        endpoint: The route the statements are executed for
+
+    Returns:
+        The tracker and a token for ``stop_tracking``
+    """
+    tracker = QueryTracker(endpoint)
+    return tracker, _tracker.set(tracker)
+
+
+def stop_tracking(token) -> None:
+    """
+    Stop tracking statements.
+
+    Args:
+        token: The token returned by ``start_tracking``
+    """
+    _tracker.reset(token)
+
+
+@contextmanager
+def track_queries():
+    """
+    Track the statements executed inside the block.
+
+    Yields:
+        The QueryTracker, updated as statements run
+    """
+    tracker, token = start_tracking()
+    try:
+        yield tracker
+    finally:
+        stop_tracking(token)
+
+
+@contextmanager
+def service_method(name: str):
+    """
+    Attribute the statements executed inside the block to a service method.
+
+    Args:
+        name: The qualified name of the method, e.g. ``BookService.get_paginated``
+    """
+    token = _service_method.set(name)
+    try:
+        yield
+    finally:
+        _service_method.reset(token)
+
+
+def current_service_method() -> Optional[str]:
+    """
+    Get the service method statements are currently executed for.
+
+    Returns:
+        The qualified name of the method, or None outside a service call
+    """
+    return _service_method.get()
+
+
+def set_slow_query_threshold(threshold_ms: Optional[float]) -> None:
+    """
+    Set the duration above which statements are written to the slow-query log.
+
+    Args:
+        threshold_ms: The threshold in milliseconds, or None to disable
+    """
+    global _slow_query_threshold
+    _slow_query_threshold = threshold_ms / 1000 if threshold_ms else None
+
+
+def explain_query_plan(dbapi_connection, statement: str, parameters) -> str:
+    """
+    Get the query plan of a statement as an indented tree.
+
+    Args:
+        dbapi_connection: The sqlite3 connection to explain the statement on
+        statement: The SQL text
+        parameters: The bound parameters
+
+    Returns:
+        The plan, one step per line, or an empty string for statements that
+        cannot be explained
+    """
+    if not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return ""
+
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ())
+        rows = cursor.fetchall()
+    except Exception as e:
+        logger.debug(f"Could not explain statement: {e}")
+        return ""
+    finally:
+        cursor.close()
+
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append(f"{'  ' * depth[node]}{detail}")
+    return "\n".join(lines)
+
+
+def _log_slow_query(cursor, statement, parameters, duration, executemany):
+    metrics.increment("queries.slow")
+    tracker = _tracker.get()
+    plan = (
+        ""
+        if executemany
+        else explain_query_plan(cursor.connection, statement, parameters)
+    )
+    parameters = repr(parameters)
+    if len(parameters) > MAX_PARAMETERS_LENGTH:
+        parameters = f"{parameters[:MAX_PARAMETERS_LENGTH]}..."
+
+    slow_query_logger.warning(
+        f"{duration * 1000:.1f} ms"
+        f" | route={tracker.endpoint if tracker else None}"
+        f" | service={_service_method.get()}\n"
+        f"{statement}\n"
+        f"parameters: {parameters}\n"
+        f"plan:\n{plan or '(none)'}"
+    )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Driver-level SQL, such as PRAGMAs, is never cached
+    if context.cache_hit is CacheStats.CACHE_HIT:
+        metrics.increment("queries.compiled_cache.hit")
+    elif context.cache_hit is CacheStats.CACHE_MISS:
+        metrics.increment("queries.compiled_cache.miss")
+    if _tracker.get() is not None or _slow_query_threshold is not None:
+        # Kept on the statement's own context, so a statement that fails
+        # leaves nothing behind on the pooled connection
+        context._query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_start_time", None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+
+    tracker = _tracker.get()
+    if tracker is not None:
+        tracker.record(statement, duration)
+
+    if _slow_query_threshold is not None and duration >= _slow_query_threshold:
+        _log_slow_query(cursor, statement, parameters, duration, executemany)
+
+
+def _count_evictions(size_alert, cache) -> None:
+    # Called once before the cache prunes itself back to its capacity
+    metrics.increment("queries.compiled_cache.evictions", len(cache) - cache.capacity)
+    size_alert(cache)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Install the statement tracking listeners on an engine.
+
+    Calling this more than once for the same engine has no effect.
+
+    Args:
+        engine: The engine to instrument
+    """
+    if engine in _instrumented:
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    cache = engine._compiled_cache
+    if cache is not None:
+        cache.size_alert = partial(_count_evictions, cache.size_alert)
+    _instrumented.add(engine)
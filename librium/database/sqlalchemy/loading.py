@@ -0,0 +1,167 @@
+"""
+Named relationship loading profiles for the Librium application.
+
+This module provides loader options for each kind of call site that loads
+books, so that every query loads exactly the relationships it renders instead
+of joining every collection. It also provides ``count_rows``, which counts the
+rows ORM queries fetch and is used to compare loading strategies, and
+``stream``, which loads the results of bulk jobs in batches.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import Select, event
+from sqlalchemy.orm import (
+    Session,
+    joinedload,
+    lazyload,
+    raiseload,
+    selectinload,
+)
+from sqlalchemy.orm.interfaces import LoaderOption
+
+from librium.core.config import get_config
+from librium.database.sqlalchemy.db import AuthorOrdering, Book, SeriesIndex
+
+# Instances loaded per batch by stream()
+STREAM_BATCH_SIZE = 1000
+
+BOOK_RELATIONSHIPS = (
+    "format",
+    "authors",
+    "series",
+    "publishers",
+    "languages",
+    "genres",
+)
+
+# Relationships each profile loads; every other Book relationship is either
+# raised on (strict loading) or left to lazy loading.
+LOADING_PROFILES: Dict[str, List[str]] = {
+    # main/index.html: title, released, authors and series with their index
+    "list": ["authors", "series"],
+    # book/index.html edit form
+    "detail": list(BOOK_RELATIONSHIPS),
+    # utils/export.py
+    "export": list(BOOK_RELATIONSHIPS),
+    # ORM books shaped like /api/v1/books, which renders read models
+    "api": list(BOOK_RELATIONSHIPS),
+}
+
+_row_counts: ContextVar[Optional[Dict[str, int]]] = ContextVar(
+    "row_counts", default=None
+)
+
+
+def _load(relationship: str) -> LoaderOption:
+    attribute = getattr(Book, relationship)
+    if relationship == "format":
+        return joinedload(attribute)
+    if relationship == "authors":
+        return selectinload(attribute).joinedload(AuthorOrdering.author)
+    if relationship == "series":
+        return selectinload(attribute).joinedload(SeriesIndex.series)
+    return selectinload(attribute)
+
+
+def loading_options(name: str, strict: Optional[bool] = None) -> List[LoaderOption]:
+    """
+    Get the loader options of a named loading profile.
+
+    Args:
+        name: The name of the profile
+        strict: Whether relationships outside the profile raise when accessed
+            instead of being lazy loaded (defaults to ``STRICT_LOADING``)
+
+    Returns:
+        A list of options for ``select(Book).options(...)``
+
+    Raises:
+        ValueError: If no profile with the given name exists
+    """
+    try:
+        relationships = LOADING_PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown loading profile '{name}'. "
+            f"Available profiles: {', '.join(sorted(LOADING_PROFILES))}"
+        ) from None
+
+    if strict is None:
+        strict = get_config().STRICT_LOADING
+    skip = raiseload if strict else lazyload
+
+    return [
+        (
+            _load(relationship)
+            if relationship in relationships
+            else skip(getattr(Book, relationship))
+        )
+        for relationship in BOOK_RELATIONSHIPS
+    ]
+
+
+def stream(
+    session: Session, statement: Select, batch_size: int = STREAM_BATCH_SIZE
+) -> Iterator[Any]:
+    """
+    Yield the instances of a query in batches, expunging each batch when done.
+
+    Bulk jobs that visit every book would otherwise keep all of them, with
+    their relationships, in the session's identity map. The session is
+    emptied after each batch, so it must not hold anything the caller still
+    needs, and the instances of a batch are detached once the next batch is
+    loaded. Eager loading must not join collections; the loading profiles
+    only join many-to-one relationships.
+
+    Args:
+        session: The session to load with
+        statement: The query, such as ``select(Book)``
+        batch_size: The number of instances loaded and kept at once
+
+    Yields:
+        The instances, in the order of the query
+    """
+    result = session.scalars(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield from partition
+        # expunge_all() would replace the identity map the result loads into
+        for instance in list(session.identity_map.values()):
+            # Expunging a book cascades to its author orderings and series
+            # indexes, which may come later in the list
+            if instance in session:
+                session.expunge(instance)
+
+
+@contextmanager
+def count_rows():
+    """
+    Count the statements and rows of ORM queries executed inside the block.
+
+    Relationship loads (``selectinload``) are included. Rows are counted
+    before ``.unique()``, so joined eager loading shows its full cartesian
+    product.
+
+    Yields:
+        A dictionary with ``statements`` and ``rows``, updated as queries run
+    """
+    counts = {"statements": 0, "rows": 0}
+    token = _row_counts.set(counts)
+    try:
+        yield counts
+    finally:
+        _row_counts.reset(token)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _count_fetched_rows(orm_execute_state):
+    counts = _row_counts.get()
+    if counts is None or not orm_execute_state.is_select:
+        return None
+
+    frozen = orm_execute_state.invoke_statement().freeze()
+    counts["statements"] += 1
+    counts["rows"] += len(frozen.data)
+    return frozen()
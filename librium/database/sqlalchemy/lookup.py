@@ -0,0 +1,45 @@
+"""
+Batched lookups for the Librium application.
+
+This module provides the resolution of a list of ids to model instances in
+a single ``IN`` query, instead of one ``Session.get()`` per id, reporting
+the ids that are not found.
+"""
+
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import select
+
+# Ids per IN list, below SQLite's default limit of bound parameters
+CHUNK_SIZE = 500
+
+
+def get_many_by_ids(
+    session, model, ids: Iterable[int], include_deleted: bool = True
+) -> Tuple[List, List[int]]:
+    """
+    Get the instances of a model with the given ids.
+
+    Args:
+        session: The session to query with
+        model: The model class, with an ``id`` primary key
+        ids: The ids to get; repeated ids are repeated in the result
+        include_deleted: Whether soft deleted instances are found
+
+    Returns:
+        A tuple containing:
+            - The instances found, in the order of the ids
+            - The ids that were not found, in order
+    """
+    ids = list(ids)
+    wanted = list(dict.fromkeys(ids))
+    found = {}
+    for start in range(0, len(wanted), CHUNK_SIZE):
+        query = select(model).where(model.id.in_(wanted[start : start + CHUNK_SIZE]))
+        if include_deleted:
+            query = query.execution_options(include_deleted=True)
+        found.update((item.id, item) for item in session.scalars(query))
+    return (
+        [found[i] for i in ids if i in found],
+        [i for i in wanted if i not in found],
+    )
@@ -0,0 +1,212 @@
+"""
+Keyset pagination for the Librium application.
+
+This module provides cursor-based pagination keyed on (sort column, id).
+A page after a cursor is read with a range condition on the sort column's
+index, so deep pages cost the same as the first one, unlike ``OFFSET``,
+which reads and discards every row before the page.
+
+Cursors are opaque, URL-safe strings. They record the direction, the sort
+field and the key of the row the page continues from.
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Select, and_, or_, tuple_
+
+NEXT = "next"
+PREV = "prev"
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor cannot be decoded or belongs to another sort order."""
+
+
+class Page(list):
+    """
+    The items of one page, with the cursors of the neighbouring pages.
+
+    Attributes:
+        next_cursor: The cursor of the following page, or None on the last page
+        prev_cursor: The cursor of the preceding page, or None on the first page
+    """
+
+    def __init__(
+        self,
+        items: Iterable = (),
+        next_cursor: Optional[str] = None,
+        prev_cursor: Optional[str] = None,
+    ):
+        super().__init__(items)
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def encode_cursor(direction: str, sort_by: str, key: Tuple[Any, int]) -> str:
+    """
+    Encode a cursor.
+
+    Args:
+        direction: NEXT for the rows after the key, PREV for the rows before it
+        sort_by: The sort field the key belongs to
+        key: The (sort value, id) of the row the page continues from
+
+    Returns:
+        The opaque cursor
+    """
+    # Numeric values are stored as REAL by SQLite, so floats compare exactly
+    payload = json.dumps([direction, sort_by, list(key)], default=float)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str) -> Tuple[str, Tuple[Any, int]]:
+    """
+    Decode a cursor.
+
+    Args:
+        cursor: The opaque cursor
+        sort_by: The sort field of the current request
+
+    Returns:
+        The direction and the (sort value, id) key
+
+    Raises:
+        InvalidCursorError: If the cursor is malformed or was issued for a
+            different sort field
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        direction, cursor_sort_by, (value, id) = json.loads(
+            base64.urlsafe_b64decode(padded.encode())
+        )
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+    if direction not in (NEXT, PREV) or not isinstance(id, int):
+        raise InvalidCursorError(f"Invalid cursor: {cursor}")
+    if cursor_sort_by != sort_by:
+        raise InvalidCursorError(
+            f"Cursor was issued for sorting by {cursor_sort_by}, not {sort_by}"
+        )
+    return direction, (value, id)
+
+
+def _after(sort_column, id_column, key: Tuple[Any, int], descending: bool):
+    """
+    Get the condition selecting the rows that come after ``key`` in the order
+    ``sort_column, id_column``, both ascending or both descending.
+
+    SQLite sorts NULL before every value, so NULL sort values come first in
+    ascending and last in descending order.
+    """
+    value, id = key
+    if not descending:
+        if value is None:
+            return or_(
+                and_(sort_column.is_(None), id_column > id), sort_column.is_not(None)
+            )
+        # A row-value comparison is answered as a range on the column's index
+        return tuple_(sort_column, id_column) > tuple_(value, id)
+
+    if value is None:
+        return and_(sort_column.is_(None), id_column < id)
+    return or_(
+        tuple_(sort_column, id_column) < tuple_(value, id), sort_column.is_(None)
+    )
+
+
+def _order(sort_column, id_column, descending: bool) -> list:
+    if descending:
+        return [sort_column.desc(), id_column.desc()]
+    return [sort_column.asc(), id_column.asc()]
+
+
+def _fetch(session, query: Select) -> List:
+    # A query of one entity gives its instances, a column projection its rows
+    entities = query.column_descriptions
+    if len(entities) == 1 and entities[0]["expr"] is entities[0]["entity"]:
+        return session.scalars(query).unique().all()
+    return session.execute(query).all()
+
+
+def paginate(
+    session,
+    query: Select,
+    sort_column,
+    id_column,
+    sort_by: str,
+    descending: bool = False,
+    page: int = 1,
+    page_size: int = 30,
+    cursor: Optional[str] = None,
+) -> Page:
+    """
+    Get one page of a query's results, by cursor or by page number.
+
+    With a cursor, the page is read with a keyset condition. Without one,
+    the page number is used with ``OFFSET`` for backward compatibility; the
+    returned page still carries cursors so clients can switch to them.
+
+    Args:
+        session: The session to execute the query with
+        query: The filtered query, without ordering or limits, of an entity
+            or of columns including the sort and id columns
+        sort_column: The column to sort by
+        id_column: The unique column that breaks ties, normally the primary key
+        sort_by: The name of the sort field, recorded in the cursors
+        descending: Whether to sort in descending order
+        page: The page number (1-indexed), used without a cursor
+        page_size: The number of items per page
+        cursor: The cursor of the page to get
+
+    Returns:
+        The page
+
+    Raises:
+        InvalidCursorError: If the cursor is invalid for this sort field
+    """
+
+    def key(item) -> Tuple[Any, int]:
+        return getattr(item, sort_column.key), getattr(item, id_column.key)
+
+    if cursor is None:
+        offset = (page - 1) * page_size
+        items = _fetch(
+            session,
+            query.order_by(*_order(sort_column, id_column, descending))
+            .offset(offset)
+            .limit(page_size + 1),
+        )
+        more = len(items) > page_size
+        items = items[:page_size]
+        return Page(
+            items,
+            encode_cursor(NEXT, sort_by, key(items[-1])) if items and more else None,
+            encode_cursor(PREV, sort_by, key(items[0])) if items and page > 1 else None,
+        )
+
+    direction, cursor_key = decode_cursor(cursor, sort_by)
+    # Rows before the cursor are read in reverse order, then flipped back
+    reverse = direction == PREV
+    items = _fetch(
+        session,
+        query.where(_after(sort_column, id_column, cursor_key, descending != reverse))
+        .order_by(*_order(sort_column, id_column, descending != reverse))
+        .limit(page_size + 1),
+    )
+    more = len(items) > page_size
+    items = items[:page_size]
+    if reverse:
+        items.reverse()
+
+    if not items:
+        return Page()
+    first, last = key(items[0]), key(items[-1])
+    return Page(
+        items,
+        encode_cursor(NEXT, sort_by, last) if more or reverse else None,
+        encode_cursor(PREV, sort_by, first) if more or not reverse else None,
+    )
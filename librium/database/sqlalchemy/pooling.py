@@ -0,0 +1,66 @@
+"""
+Connection pool telemetry for the Librium application.
+
+This module provides ``InstrumentedQueuePool``, the pool of both the
+read-write and the read-only engine. It records how long each checkout
+waited for a connection, how many connections were in use, and when the pool
+had to open connections above its size, so the pools and the number of
+workers can be sized from the ``pool.<name>.*`` metrics.
+"""
+
+import time
+
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+from librium.core.metrics import metrics
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records checkout metrics under its name.
+
+    The name is set on ``engine.pool`` after the engine is created, and is
+    kept by the pool that replaces this one when the engine is disposed.
+    """
+
+    name = "default"
+
+    # Keep the pool's own log messages under "sqlalchemy" rather than
+    # "librium", whose handlers log at INFO
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.InstrumentedQueuePool"
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        """Create a new pool with the same configuration and name."""
+        pool = super().recreate()
+        pool.name = self.name
+        return pool
+
+    def connect(self):
+        """
+        Check out a connection, recording the wait and the pool's usage.
+
+        Records the ``pool.<name>.checkout_wait_ms`` and ``pool.<name>.in_use``
+        timings, and counts ``pool.<name>.overflow`` when the checkout opened
+        a connection above the pool size and ``pool.<name>.timeouts`` when no
+        connection became available in time.
+
+        Raises:
+            TimeoutError: If the pool stayed exhausted for its timeout
+        """
+        name = f"pool.{self.name}"
+        overflow = self.overflow()
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except TimeoutError:
+            metrics.increment(f"{name}.timeouts")
+            raise
+        metrics.observe(
+            f"{name}.checkout_wait_ms", (time.perf_counter() - start) * 1000
+        )
+        metrics.observe(f"{name}.in_use", self.checkedout())
+        # The overflow counter starts below zero while the pool fills up
+        if self.overflow() > max(overflow, 0):
+            metrics.increment(f"{name}.overflow")
+        return connection
@@ -0,0 +1,162 @@
+"""
+SQLite connection profiles for the Librium application.
+
+This module defines named sets of PRAGMA settings and applies them to every
+new DBAPI connection through a ``connect`` event listener on the engine.
+Profiles are selected with the ``SQLITE_CONNECTION_PROFILE`` configuration
+setting.
+"""
+
+from typing import Any, Dict
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from librium.core.logging import get_logger
+
+# Get logger for this module
+logger = get_logger("database.profiles")
+
+DEFAULT_PROFILE = "web"
+
+# PRAGMA settings per profile. Negative cache sizes are in KiB, as per SQLite.
+CONNECTION_PROFILES: Dict[str, Dict[str, Any]] = {
+    "web": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64000,  # 64 MB
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    "bulk-import": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -256000,  # 256 MB
+        "mmap_size": 1024 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000,
+    },
+    "read-only-replica": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -32000,  # 32 MB
+        "mmap_size": 512 * 1024 * 1024,
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+        "query_only": "ON",
+    },
+    # Connections to a MemoryReplica, whose pages are already in memory
+    "in-memory-replica": {
+        "temp_store": "MEMORY",
+        "query_only": "ON",
+    },
+}
+
+# The listener installed on each engine, so the profile can be switched later
+_listeners: "WeakKeyDictionary[Engine, ConnectionProfileListener]" = WeakKeyDictionary()
+
+
+def get_connection_profile(name: str) -> Dict[str, Any]:
+    """
+    Get the PRAGMA settings of a named connection profile.
+
+    Args:
+        name: The name of the profile
+
+    Returns:
+        A mapping of PRAGMA names to values
+
+    Raises:
+        ValueError: If no profile with the given name exists
+    """
+    try:
+        return CONNECTION_PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown connection profile '{name}'. "
+            f"Available profiles: {', '.join(sorted(CONNECTION_PROFILES))}"
+        ) from None
+
+
+def apply_pragmas(dbapi_connection, pragmas: Dict[str, Any]) -> None:
+    """
+    Apply PRAGMA settings to a raw DBAPI connection.
+
+    A PRAGMA that cannot be applied (for example ``journal_mode`` on a
+    read-only file) is logged and skipped instead of failing the connection.
+
+    Args:
+        dbapi_connection: The sqlite3 connection
+        pragmas: A mapping of PRAGMA names to values
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        for key, value in pragmas.items():
+            try:
+                cursor.execute(f"PRAGMA {key}={value}")
+            except Exception as e:
+                logger.warning(f"Could not apply PRAGMA {key}={value}: {e}")
+    finally:
+        cursor.close()
+
+
+class ConnectionProfileListener:
+    """Engine ``connect`` listener that applies the active connection profile."""
+
+    def __init__(self, name: str):
+        """
+        Initialize the listener.
+
+        Args:
+            name: The name of the profile to apply
+        """
+        self.name = name
+
+    def __call__(self, dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, get_connection_profile(self.name))
+
+
+def use_connection_profile(engine: Engine, name: str) -> None:
+    """
+    Apply a connection profile to every new connection of an engine.
+
+    Calling this again with a different profile disposes the engine's pool so
+    that subsequent connections are opened with the new settings.
+
+    Args:
+        engine: The engine to configure
+        name: The name of the profile to apply
+
+    Raises:
+        ValueError: If no profile with the given name exists
+    """
+    get_connection_profile(name)
+
+    listener = _listeners.get(engine)
+    if listener is None:
+        listener = ConnectionProfileListener(name)
+        event.listen(engine, "connect", listener)
+        _listeners[engine] = listener
+    elif listener.name != name:
+        listener.name = name
+        engine.dispose()
+    else:
+        return
+
+    logger.debug(f"Using connection profile '{name}' for {engine.url}")
+
+
+def get_active_profile(engine: Engine) -> str | None:
+    """
+    Get the name of the connection profile applied to an engine.
+
+    Args:
+        engine: The engine to inspect
+
+    Returns:
+        The name of the profile, or None if no profile has been applied
+    """
+    listener = _listeners.get(engine)
+    return listener.name if listener else None
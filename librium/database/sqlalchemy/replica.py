@@ -0,0 +1,247 @@
+"""
+In-memory read replica of the Librium database file.
+
+A library fits in memory, so ``MemoryReplica`` can serve the reads of
+``@read_only`` service methods from a copy of the database file held in a
+shared-cache in-memory SQLite database instead of from the file. The copy is
+made with the sqlite3 backup API, like ``librium.database.backup``.
+
+Writes still go to the file through the read-write engine. After every commit
+of a ``RoutingSession`` the replica checks ``PRAGMA data_version`` of the file
+and copies it again if it changed, so a request reads its own writes. Changes
+made by other processes are picked up by the next read at most ``max_lag``
+seconds later.
+
+A copy that is being read cannot be written over (shared-cache readers hold
+table locks), so each sync copies the file into a new generation of the
+replica and switches new connections to it. Sessions that are already
+reading finish on the generation they started with, and a generation is
+freed once its last connection is closed, so a sync needs the memory of two
+copies for a moment.
+"""
+
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from itertools import count
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+
+from librium.core.logging import get_logger
+from librium.core.metrics import metrics
+from librium.database.sqlalchemy.pooling import InstrumentedQueuePool
+from librium.database.sqlalchemy.profiles import use_connection_profile
+from librium.database.sqlalchemy.routing import READER, RoutingSession
+
+# Get logger for this module
+logger = get_logger("database.replica")
+
+# Distinguishes the replicas of one process, such as those of tests
+_replicas = count(1)
+
+
+class MemoryReplica:
+    """
+    An in-memory copy of a database file, re-synced when the file changes.
+
+    Attributes:
+        engine: The read-only engine of the replica
+        generation: The number of the copy new connections open
+        synced_at: When the file was last copied
+        syncs: The number of copies made
+    """
+
+    def __init__(
+        self,
+        writer: Engine,
+        pool_size: int = 20,
+        max_overflow: int = 20,
+        query_cache_size: int = 500,
+        max_lag: float = 1.0,
+    ):
+        """
+        Copy the database file of a read-write engine into memory.
+
+        Args:
+            writer: The read-write engine
+            pool_size: The number of pooled read connections
+            max_overflow: The number of read connections allowed above the pool size
+            query_cache_size: The number of compiled statements the engine caches
+            max_lag: Seconds between checks for changes made by other processes
+
+        Raises:
+            ValueError: If the engine's database is in memory
+        """
+        database = writer.url.database
+        if not database or database == ":memory:":
+            raise ValueError("An in-memory database cannot be replicated")
+
+        self.path = database
+        self.max_lag = max_lag
+        self.generation = 0
+        self.synced_at: Optional[datetime] = None
+        self.syncs = 0
+
+        self._name = f"librium_replica_{next(_replicas)}"
+        self._lock = threading.Lock()
+        self._source: Optional[sqlite3.Connection] = None
+        # Keeps the current generation alive while no reader is connected
+        self._anchor: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._checked_at = 0.0
+        self._behind_since: Optional[float] = None
+
+        self.engine = create_engine(
+            "sqlite://",
+            creator=self._connect,
+            poolclass=InstrumentedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=30,
+            query_cache_size=query_cache_size,
+        )
+        self.engine.pool.name = READER
+        use_connection_profile(self.engine, "in-memory-replica")
+
+        @event.listens_for(self.engine, "connect")
+        def tag_generation(dbapi_connection, connection_record):
+            connection_record.info["generation"] = self.generation
+
+        @event.listens_for(self.engine, "checkin")
+        def close_old_generation(dbapi_connection, connection_record):
+            # Let the generation this connection read be freed
+            if connection_record.info.get("generation") != self.generation:
+                connection_record.invalidate()
+
+        self.sync(force=True)
+
+    def _uri(self, generation: int) -> str:
+        return f"file:{self._name}_{generation}?mode=memory&cache=shared"
+
+    def _connect(self) -> sqlite3.Connection:
+        # Each generation is only read once it is complete, so the reads of
+        # a connection see one snapshot without an explicit transaction
+        return sqlite3.connect(
+            self._uri(self.generation), uri=True, check_same_thread=False
+        )
+
+    def _file_version(self) -> int:
+        if self._source is None:
+            self._source = sqlite3.connect(self.path, check_same_thread=False)
+        return self._source.execute("PRAGMA data_version").fetchone()[0]
+
+    def sync(self, force: bool = False) -> bool:
+        """
+        Copy the database file into a new generation if it changed.
+
+        Waits for a sync running in another thread to finish first.
+
+        Args:
+            force: Whether to copy the file even if it did not change
+
+        Returns:
+            True if the file was copied
+        """
+        with self._lock:
+            return self._sync(force)
+
+    def _sync(self, force: bool) -> bool:
+        self._checked_at = time.monotonic()
+        version = self._file_version()
+        if not force and version == self._data_version:
+            return False
+
+        started = time.perf_counter()
+        generation = self.generation + 1
+        anchor = sqlite3.connect(
+            self._uri(generation), uri=True, check_same_thread=False
+        )
+        self._source.backup(anchor)
+
+        previous, self._anchor = self._anchor, anchor
+        self.generation = generation
+        self._data_version = version
+        self._behind_since = None
+        self.synced_at = datetime.now()
+        self.syncs += 1
+        if previous is not None:
+            previous.close()
+        # Close the idle connections to the previous generation; those in use
+        # are closed when they are checked in
+        self.engine.dispose()
+
+        elapsed = (time.perf_counter() - started) * 1000
+        metrics.increment("replica.syncs")
+        metrics.observe("replica.sync_ms", elapsed)
+        logger.debug(
+            f"Copied {self.path} into generation {generation} in {elapsed:.1f} ms"
+        )
+        return True
+
+    def refresh(self) -> None:
+        """
+        Sync the replica before a read if it may have fallen behind.
+
+        The file is checked at most once every ``max_lag`` seconds. A read
+        that arrives while another thread is syncing uses the current
+        generation instead of waiting.
+        """
+        if time.monotonic() - self._checked_at < self.max_lag:
+            return
+        if not self._lock.acquire(blocking=False):
+            metrics.increment("replica.reads_during_sync")
+            return
+        try:
+            self._sync(force=False)
+        finally:
+            self._lock.release()
+
+    def reload(self) -> None:
+        """Reopen the database file and copy it, such as after it was replaced."""
+        with self._lock:
+            if self._source is not None:
+                self._source.close()
+                self._source = None
+            self._sync(force=True)
+
+    def staleness(self) -> Dict[str, Any]:
+        """
+        Report how far the replica is behind the database file.
+
+        Returns:
+            A mapping with the generation, when it was synced, whether the file
+            has changed since, and for how many seconds it has been seen behind
+        """
+        with self._lock:
+            stale = self._file_version() != self._data_version
+        now = time.monotonic()
+        if not stale:
+            self._behind_since = None
+        elif self._behind_since is None:
+            self._behind_since = now
+        return {
+            "generation": self.generation,
+            "synced_at": self.synced_at.isoformat() if self.synced_at else None,
+            "stale": stale,
+            "lag_seconds": now - self._behind_since if stale else 0.0,
+            "syncs": self.syncs,
+        }
+
+    def close(self) -> None:
+        """Close the replica's connections and free its memory."""
+        with self._lock:
+            self.engine.dispose()
+            for connection in (self._anchor, self._source):
+                if connection is not None:
+                    connection.close()
+            self._anchor = self._source = None
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def sync_after_commit(session):
+    """Copy the committed changes into the replica, so later reads see them."""
+    if session.replica is not None:
+        session.replica.sync()
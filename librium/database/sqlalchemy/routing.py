@@ -0,0 +1,178 @@
+"""
+Session routing between the read-write and read-only engines.
+
+The ``read_only`` and ``transactional`` decorators mark the scope of a call
+with a route. ``RoutingSession`` resolves its bind from that route, so
+services keep using the global ``Session`` while their reads are served by
+the read-only engine.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Session as OrmSession
+
+from librium.core.logging import get_logger
+from librium.core.metrics import metrics
+from librium.database.sqlalchemy.pooling import InstrumentedQueuePool
+from librium.database.sqlalchemy.profiles import use_connection_profile
+
+# Get logger for this module
+logger = get_logger("database.routing")
+
+READER = "reader"
+WRITER = "writer"
+
+_route: ContextVar[Optional[str]] = ContextVar("session_route", default=None)
+
+
+class ReadOnlySessionError(InvalidRequestError):
+    """Raised when changes are flushed inside a read-only scope."""
+
+
+def current_route() -> Optional[str]:
+    """
+    Get the route of the current scope.
+
+    Returns:
+        READER, WRITER, or None outside any decorated call
+    """
+    return _route.get()
+
+
+@contextmanager
+def route(name: str):
+    """
+    Route the session to an engine for the duration of the block.
+
+    An enclosing write scope always wins, so reads made while a transaction
+    is open see its uncommitted changes.
+
+    Args:
+        name: READER or WRITER
+    """
+    if _route.get() == WRITER:
+        yield
+        return
+
+    token = _route.set(name)
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+def create_read_engine(
+    writer: Engine,
+    pool_size: int = 20,
+    max_overflow: int = 20,
+    query_cache_size: int = 500,
+) -> Engine:
+    """
+    Create a read-only engine for the database file of a read-write engine.
+
+    Connections are opened with ``mode=ro`` and the ``read-only-replica``
+    profile, so any write through them fails. In-memory databases cannot be
+    shared between engines, in which case the writer itself is returned.
+
+    Each transaction on the engine is an explicit ``BEGIN``, so every read of
+    a session sees one snapshot of the database until the session ends,
+    instead of each statement seeing the latest commit.
+
+    Args:
+        writer: The read-write engine
+        pool_size: The number of pooled read connections
+        max_overflow: The number of read connections allowed above the pool size
+        query_cache_size: The number of compiled statements the engine caches
+
+    Returns:
+        The read-only engine
+    """
+    database = writer.url.database
+    if not database or database == ":memory:":
+        logger.debug("In-memory database, reads share the read-write engine")
+        return writer
+
+    path = Path(database).absolute()
+    reader = create_engine(
+        f"sqlite:///{path.as_uri()}?mode=ro&uri=true",
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=30,
+        pool_recycle=1800,
+        query_cache_size=query_cache_size,
+    )
+    reader.pool.name = READER
+    use_connection_profile(reader, "read-only-replica")
+
+    # pysqlite only begins transactions before writes, so reads would each
+    # run in their own implicit transaction without these
+    @event.listens_for(reader, "connect")
+    def disable_implicit_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(reader, "begin")
+    def begin_snapshot(connection):
+        connection.exec_driver_sql("BEGIN")
+
+    @event.listens_for(reader, "do_connect")
+    def create_missing_database(dialect, conn_rec, cargs, cparams):
+        # mode=ro cannot create the file, so let the writer create it first
+        if not path.exists():
+            writer.connect().close()
+
+    return reader
+
+
+class RoutingSession(OrmSession):
+    """Session that sends reads in a read-only scope to the read engine."""
+
+    def __init__(
+        self, writer=None, reader=None, replica=None, write_coordinator=None, **kwargs
+    ):
+        """
+        Initialize a new routing session.
+
+        Args:
+            writer: The read-write engine
+            reader: The read-only engine (defaults to the writer)
+            replica: The MemoryReplica whose engine is the reader, if any
+            write_coordinator: The WriteCoordinator of the writer's database,
+                if not the process-wide one
+            **kwargs: Additional arguments for the Session
+        """
+        super().__init__(**kwargs)
+        self.writer = writer
+        self.reader = reader if reader is not None else writer
+        self.replica = replica
+        self.write_coordinator = write_coordinator
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.writer is None:
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+        if current_route() == READER:
+            metrics.increment("session.route.reader")
+            if self.replica is not None:
+                self.replica.refresh()
+            return self.reader
+
+        metrics.increment("session.route.writer")
+        return self.writer
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def reject_flush_in_read_scope(session, flush_context, instances):
+    """Fail loudly instead of writing through a read-only scope."""
+    if current_route() == READER:
+        metrics.increment("session.route.rejected_writes")
+        raise ReadOnlySessionError(
+            "Attempted to flush changes inside a read-only scope; "
+            "use @transactional for service methods that write"
+        )
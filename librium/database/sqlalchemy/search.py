@@ -0,0 +1,377 @@
+"""
+Full-text search index for the Librium application.
+
+This module provides the ``book_search`` FTS5 table, which indexes the title,
+author names, series names, publisher names and ISBN of every non-deleted
+book. The index is kept in sync by SQLite triggers, so Core bulk inserts and
+migrations keep it up to date as well as the ORM.
+
+It also provides ``book_title_trigram``, an FTS5 trigram index over book
+titles that answers ``LIKE '%text%'`` substring matches, and the reversed
+title key used to answer suffix matches from a regular index.
+"""
+
+import re
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    MetaData,
+    Table,
+    Text,
+    func,
+    literal_column,
+    select,
+)
+
+from librium.core.logging import get_logger
+
+# Get logger for this module
+logger = get_logger("database.search")
+
+SEARCH_TABLE = "book_search"
+TITLE_TRIGRAM_TABLE = "book_title_trigram"
+
+# Tables managed by this module rather than by Base.metadata
+SEARCH_TABLES = (SEARCH_TABLE, TITLE_TRIGRAM_TABLE)
+
+# Substring patterns shorter than a trigram cannot use the trigram index
+MIN_TRIGRAM_LENGTH = 3
+
+# Relative weight of each column when ranking matches with bm25()
+SEARCH_WEIGHTS = {
+    "title": 10.0,
+    "authors": 5.0,
+    "series": 3.0,
+    "publishers": 1.0,
+    "isbn": 1.0,
+}
+
+# The FTS5 table lives outside Base.metadata so create_all() does not
+# create it as a regular table; it is created by create_search_index().
+search_metadata = MetaData()
+book_search = Table(
+    SEARCH_TABLE,
+    search_metadata,
+    Column("rowid", Integer, primary_key=True),
+    *(Column(name, Text) for name in SEARCH_WEIGHTS),
+)
+book_title_trigram = Table(
+    TITLE_TRIGRAM_TABLE,
+    search_metadata,
+    Column("rowid", Integer, primary_key=True),
+    Column("title", Text),
+)
+
+_INDEX = """
+INSERT INTO book_search (rowid, title, authors, series, publishers, isbn)
+SELECT
+    book.id,
+    book.title,
+    (SELECT group_concat(author.name, ' ')
+     FROM book_authors JOIN author ON author.id = book_authors.author_id
+     WHERE book_authors.book_id = book.id),
+    (SELECT group_concat(series.name, ' ')
+     FROM series_index JOIN series ON series.id = series_index.series_id
+     WHERE series_index.book_id = book.id),
+    (SELECT group_concat(publisher.name, ' ')
+     FROM book_publishers JOIN publisher ON publisher.id = book_publishers.publisher_id
+     WHERE book_publishers.book_id = book.id),
+    book.isbn
+FROM book
+WHERE book.id IN ({books}) AND NOT book.deleted
+"""
+_REINDEX = "DELETE FROM book_search WHERE rowid IN ({books}); " + _INDEX + ";"
+
+# Trigger name -> (event, expression selecting the affected book ids)
+_TRIGGER_EVENTS: Dict[str, tuple] = {
+    "book_search_book_insert": ("AFTER INSERT ON book", "NEW.id"),
+    "book_search_book_update": (
+        "AFTER UPDATE OF title, isbn, deleted ON book",
+        "NEW.id",
+    ),
+    "book_search_book_delete": ("AFTER DELETE ON book", "OLD.id"),
+    "book_search_authors_insert": ("AFTER INSERT ON book_authors", "NEW.book_id"),
+    "book_search_authors_delete": ("AFTER DELETE ON book_authors", "OLD.book_id"),
+    "book_search_authors_update": (
+        "AFTER UPDATE ON book_authors",
+        "OLD.book_id, NEW.book_id",
+    ),
+    "book_search_series_index_insert": (
+        "AFTER INSERT ON series_index",
+        "NEW.book_id",
+    ),
+    "book_search_series_index_delete": (
+        "AFTER DELETE ON series_index",
+        "OLD.book_id",
+    ),
+    "book_search_series_index_update": (
+        "AFTER UPDATE ON series_index",
+        "OLD.book_id, NEW.book_id",
+    ),
+    "book_search_publishers_insert": (
+        "AFTER INSERT ON book_publishers",
+        "NEW.book_id",
+    ),
+    "book_search_publishers_delete": (
+        "AFTER DELETE ON book_publishers",
+        "OLD.book_id",
+    ),
+    "book_search_author_rename": (
+        "AFTER UPDATE OF name ON author",
+        "SELECT book_id FROM book_authors WHERE author_id = NEW.id",
+    ),
+    "book_search_series_rename": (
+        "AFTER UPDATE OF name ON series",
+        "SELECT book_id FROM series_index WHERE series_id = NEW.id",
+    ),
+    "book_search_publisher_rename": (
+        "AFTER UPDATE OF name ON publisher",
+        "SELECT book_id FROM book_publishers WHERE publisher_id = NEW.id",
+    ),
+}
+
+# The trigram index is an external-content table over book.title, so the
+# triggers pass the old title back to FTS5 when a row is removed.
+_TITLE_INSERT = (
+    f"INSERT INTO {TITLE_TRIGRAM_TABLE} (rowid, title) VALUES (NEW.id, NEW.title);"
+)
+_TITLE_DELETE = (
+    f"INSERT INTO {TITLE_TRIGRAM_TABLE} ({TITLE_TRIGRAM_TABLE}, rowid, title) "
+    "VALUES ('delete', OLD.id, OLD.title);"
+)
+_TITLE_TRIGGERS: Dict[str, tuple] = {
+    "book_title_trigram_insert": ("AFTER INSERT ON book", _TITLE_INSERT),
+    "book_title_trigram_delete": ("AFTER DELETE ON book", _TITLE_DELETE),
+    "book_title_trigram_update": (
+        "AFTER UPDATE OF title ON book",
+        _TITLE_DELETE + " " + _TITLE_INSERT,
+    ),
+}
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_LIKE_WILDCARDS = re.compile(r"[%_]")
+
+
+def _create_triggers(connection) -> None:
+    for name, (trigger_event, books) in _TRIGGER_EVENTS.items():
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {name} {trigger_event} BEGIN "
+            f"{_REINDEX.format(books=books)} END"
+        )
+
+
+def _drop_triggers(connection) -> None:
+    for name in _TRIGGER_EVENTS:
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def _create_title_triggers(connection) -> None:
+    for name, (trigger_event, body) in _TITLE_TRIGGERS.items():
+        connection.exec_driver_sql(
+            f"CREATE TRIGGER IF NOT EXISTS {name} {trigger_event} BEGIN {body} END"
+        )
+
+
+def _drop_title_triggers(connection) -> None:
+    for name in _TITLE_TRIGGERS:
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def create_search_index(connection) -> None:
+    """
+    Create the FTS5 table and the triggers that keep it in sync.
+
+    Args:
+        connection: The connection to create the index on
+    """
+    connection.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        f"{', '.join(SEARCH_WEIGHTS)}, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    _create_triggers(connection)
+
+
+def drop_search_index(connection) -> None:
+    """
+    Drop the FTS5 table and its triggers.
+
+    Args:
+        connection: The connection to drop the index on
+    """
+    _drop_triggers(connection)
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def rebuild_search_index(connection) -> None:
+    """
+    Re-index every book, for example after a backfill or bulk import.
+
+    Args:
+        connection: The connection to rebuild the index on
+    """
+    connection.exec_driver_sql(f"DELETE FROM {SEARCH_TABLE}")
+    connection.exec_driver_sql(_INDEX.format(books="SELECT id FROM book"))
+    logger.info("Rebuilt the full-text search index")
+
+
+def create_title_index(connection) -> None:
+    """
+    Create the trigram title index and the triggers that keep it in sync.
+
+    Args:
+        connection: The connection to create the index on
+    """
+    connection.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TITLE_TRIGRAM_TABLE} USING fts5("
+        "title, content = 'book', content_rowid = 'id', "
+        "tokenize = 'trigram case_sensitive 0')"
+    )
+    _create_title_triggers(connection)
+
+
+def drop_title_index(connection) -> None:
+    """
+    Drop the trigram title index and its triggers.
+
+    Args:
+        connection: The connection to drop the index on
+    """
+    _drop_title_triggers(connection)
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {TITLE_TRIGRAM_TABLE}")
+
+
+def rebuild_title_index(connection) -> None:
+    """
+    Re-index every book title from the ``book`` table.
+
+    Args:
+        connection: The connection to rebuild the index on
+    """
+    connection.exec_driver_sql(
+        f"INSERT INTO {TITLE_TRIGRAM_TABLE} ({TITLE_TRIGRAM_TABLE}) VALUES ('rebuild')"
+    )
+    logger.info("Rebuilt the trigram title index")
+
+
+@contextmanager
+def suspend_search_index(connection):
+    """
+    Suspend the sync triggers for a bulk load, then rebuild the indexes once.
+
+    Indexing every row as it is inserted is much slower than indexing the
+    whole library at the end.
+
+    Args:
+        connection: The connection the bulk load runs on
+    """
+    _drop_triggers(connection)
+    _drop_title_triggers(connection)
+    try:
+        yield
+    finally:
+        _create_triggers(connection)
+        _create_title_triggers(connection)
+        rebuild_search_index(connection)
+        rebuild_title_index(connection)
+
+
+def to_match_query(query: str) -> str:
+    """
+    Turn user input into an FTS5 query that matches every word as a prefix.
+
+    FTS5 operators and punctuation in the input are not interpreted.
+
+    Args:
+        query: The search text
+
+    Returns:
+        The MATCH expression, or an empty string if the input has no words
+    """
+    return " ".join(f'"{token}"*' for token in _TOKEN.findall(query))
+
+
+def reverse_title(title: Optional[str]) -> Optional[str]:
+    """
+    Get the key suffix matches are answered from: the lower-cased title, reversed.
+
+    A title ends with ``text`` exactly when its key starts with the key of
+    ``text``, which a regular index can answer as a range.
+
+    Args:
+        title: The title or suffix
+
+    Returns:
+        The key, or None for a missing title
+    """
+    return title.lower()[::-1] if title is not None else None
+
+
+def title_trigram_match(pattern: str):
+    """
+    Get a subquery of the ids of books whose title matches a LIKE pattern.
+
+    FTS5 answers the pattern from the trigram index, folding case like
+    ``ilike``. Patterns need a run of at least ``MIN_TRIGRAM_LENGTH``
+    characters between wildcards to avoid a scan of the whole index.
+
+    Args:
+        pattern: The LIKE pattern, e.g. ``%dune%``
+
+    Returns:
+        A select of matching book ids, for ``Book.id.in_(...)``
+    """
+    return select(book_title_trigram.c.rowid).where(
+        book_title_trigram.c.title.like(pattern)
+    )
+
+
+def can_use_trigrams(text: str) -> bool:
+    """
+    Check whether a substring can be matched through the trigram index.
+
+    Args:
+        text: The substring to search for
+
+    Returns:
+        True if some run of the text between wildcards is a trigram or longer
+    """
+    return any(len(part) >= MIN_TRIGRAM_LENGTH for part in _LIKE_WILDCARDS.split(text))
+
+
+def has_like_wildcards(text: str) -> bool:
+    """
+    Check whether text contains ``%`` or ``_``, which LIKE treats as wildcards.
+
+    Args:
+        text: The text to check
+
+    Returns:
+        True if the text contains a LIKE wildcard
+    """
+    return _LIKE_WILDCARDS.search(text) is not None
+
+
+def search_match(query: str):
+    """
+    Get the WHERE clause matching the search index against a MATCH expression.
+
+    Args:
+        query: The MATCH expression, see ``to_match_query``
+
+    Returns:
+        A SQL expression for ``select(...).where(...)``
+    """
+    return literal_column(SEARCH_TABLE).match(query)
+
+
+def search_rank():
+    """
+    Get the bm25() ranking of a match, best matches first when sorted ascending.
+
+    Returns:
+        A SQL expression for ``order_by(...)``
+    """
+    return func.bm25(literal_column(SEARCH_TABLE), *SEARCH_WEIGHTS.values())
@@ -0,0 +1,53 @@
+"""
+Prebuilt statements for the Librium application's hot read paths.
+
+SQLAlchemy caches the compiled form of every statement, but a service method
+that calls ``select()`` still builds the statement and generates its cache
+key on each call. ``cached_statement`` builds a statement once per explicit
+key, with ``bindparam()`` placeholders for the values that change between
+calls, and returns the same object afterwards. The values are passed as
+parameters when the statement is executed::
+
+    Session.scalar(
+        cached_statement(
+            "author.by_name",
+            lambda: select(Author).where(Author.name == bindparam("name")),
+        ),
+        {"name": name},
+    )
+
+``lambda_stmt()`` was measured as well (``python -m utils.benchmark
+statements``), and was slower than building the statement on each call.
+"""
+
+from typing import Callable, Dict, Hashable
+
+from sqlalchemy import Executable
+
+_statements: Dict[Hashable, Executable] = {}
+
+
+def cached_statement(key: Hashable, build: Callable[[], Executable]) -> Executable:
+    """
+    Get the statement of a key, building it on first use.
+
+    The key must identify everything the statement depends on apart from its
+    bound parameters, such as the loading profile and strictness of its
+    loader options.
+
+    Args:
+        key: The key of the statement
+        build: Builds the statement
+
+    Returns:
+        The statement
+    """
+    statement = _statements.get(key)
+    if statement is None:
+        statement = _statements[key] = build()
+    return statement
+
+
+def clear_statement_cache() -> None:
+    """Forget every prebuilt statement, such as after the mappers change."""
+    _statements.clear()
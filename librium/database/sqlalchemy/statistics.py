@@ -0,0 +1,242 @@
+"""
+Materialized library statistics for the Librium application.
+
+This module provides the ``library_statistic`` table, which holds the
+aggregates shown on the statistics page, one row per bucket:
+
+- ``total`` and ``read`` (bucket 0): the non-deleted books, and those read;
+- ``year``: the books released in a year (the bucket), with their price;
+- ``format`` and ``genre``: the books of a format or genre id.
+
+SQLite triggers on ``book`` and ``book_genres`` keep the rows up to date in
+the same transaction as every change, so reading the statistics costs one
+row per bucket instead of a scan of the whole library. Prices are stored in
+cents, so adding and removing books never accumulates rounding errors.
+"""
+
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text
+
+from librium.core.logging import get_logger
+
+# Get logger for this module
+logger = get_logger("database.statistics")
+
+STATISTIC_TABLE = "library_statistic"
+STATISTIC_KINDS = ("total", "read", "year", "format", "genre")
+
+# Kept outside Base.metadata, like the counters; see create_statistics()
+statistic_metadata = MetaData()
+library_statistic = Table(
+    STATISTIC_TABLE,
+    statistic_metadata,
+    Column("kind", Text, primary_key=True),
+    Column("bucket", Integer, primary_key=True),
+    Column("books", Integer, nullable=False),
+    Column("price", Integer, nullable=False),
+)
+
+# The price of a book row, in cents
+_CENTS = "CAST(ROUND(COALESCE({row}.price, 0) * 100) AS INTEGER)"
+
+# The buckets a book row counts towards: kind, bucket, condition, whether
+# its price is added
+_BOOK_BUCKETS = (
+    ("total", "0", "1", True),
+    ("read", "0", "{row}.read IS 1", False),
+    ("year", "{row}.released", "{row}.released IS NOT NULL", True),
+    ("format", "{row}.format_id", "{row}.format_id IS NOT NULL", False),
+)
+
+
+def _add_book(row: str, sign: str) -> str:
+    """Build the upserts adding (sign "+") or removing (sign "-") a book row."""
+    statements = []
+    for kind, bucket, condition, priced in _BOOK_BUCKETS:
+        price = f"{sign}{_CENTS.format(row=row)}" if priced else "0"
+        # The WHERE clause keeps SQLite from reading ON CONFLICT as a join
+        statements.append(
+            f"INSERT INTO {STATISTIC_TABLE} (kind, bucket, books, price) "
+            f"SELECT '{kind}', {bucket.format(row=row)}, {sign}1, {price} "
+            f"WHERE {row}.deleted IS 0 AND {condition.format(row=row)} "
+            "ON CONFLICT (kind, bucket) DO UPDATE SET "
+            "books = books + excluded.books, price = price + excluded.price;"
+        )
+    return " ".join(statements)
+
+
+def _add_genre_link(row: str, sign: str) -> str:
+    """Build the upsert adding or removing a book-genre link row."""
+    return (
+        f"INSERT INTO {STATISTIC_TABLE} (kind, bucket, books, price) "
+        f"SELECT 'genre', {row}.genre_id, {sign}count(*), 0 FROM book "
+        f"WHERE book.id = {row}.book_id AND book.deleted IS 0 "
+        "ON CONFLICT (kind, bucket) DO UPDATE SET books = books + excluded.books;"
+    )
+
+
+def _shift_genres(book_id: str, delta: str) -> str:
+    """Build the update shifting the genre buckets of a book's links."""
+    return (
+        f"UPDATE {STATISTIC_TABLE} SET books = books + ({delta}) "
+        "WHERE kind = 'genre' AND bucket IN "
+        f"(SELECT genre_id FROM book_genres WHERE book_id = {book_id});"
+    )
+
+
+def _triggers() -> Dict[str, str]:
+    """Get the statistic triggers, by name."""
+    return {
+        f"{STATISTIC_TABLE}_book_insert": (
+            f"AFTER INSERT ON book BEGIN {_add_book('NEW', '+')} END"
+        ),
+        f"{STATISTIC_TABLE}_book_update": (
+            "AFTER UPDATE OF deleted, read, released, price, format_id ON book "
+            f"BEGIN {_add_book('OLD', '-')} {_add_book('NEW', '+')} "
+            f"{_shift_genres('NEW.id', '(NEW.deleted IS 0) - (OLD.deleted IS 0)')} "
+            "END"
+        ),
+        # Links still present are removed here; links removed after the book
+        # find no book row and change nothing
+        f"{STATISTIC_TABLE}_book_delete": (
+            f"AFTER DELETE ON book BEGIN {_add_book('OLD', '-')} "
+            f"{_shift_genres('OLD.id', '-(OLD.deleted IS 0)')} END"
+        ),
+        f"{STATISTIC_TABLE}_book_genres_insert": (
+            f"AFTER INSERT ON book_genres BEGIN {_add_genre_link('NEW', '+')} END"
+        ),
+        f"{STATISTIC_TABLE}_book_genres_update": (
+            f"AFTER UPDATE ON book_genres BEGIN {_add_genre_link('OLD', '-')} "
+            f"{_add_genre_link('NEW', '+')} END"
+        ),
+        f"{STATISTIC_TABLE}_book_genres_delete": (
+            f"AFTER DELETE ON book_genres BEGIN {_add_genre_link('OLD', '-')} END"
+        ),
+    }
+
+
+def create_statistics(connection) -> None:
+    """
+    Create the statistic table and the triggers that maintain it.
+
+    Args:
+        connection: The connection to create the statistics on
+    """
+    connection.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {STATISTIC_TABLE} (kind TEXT NOT NULL, "
+        "bucket INTEGER NOT NULL, books INTEGER NOT NULL, price INTEGER NOT NULL, "
+        "PRIMARY KEY (kind, bucket))"
+    )
+    for name, body in _triggers().items():
+        connection.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+
+def drop_statistics(connection) -> None:
+    """
+    Drop the statistic table and its triggers.
+
+    Args:
+        connection: The connection to drop the statistics on
+    """
+    for name in _triggers():
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {STATISTIC_TABLE}")
+
+
+@contextmanager
+def suspend_statistics(connection):
+    """
+    Suspend the statistic triggers for a bulk load, then recompute once.
+
+    Args:
+        connection: The connection the bulk load runs on
+    """
+    for name in _triggers():
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    try:
+        yield
+    finally:
+        create_statistics(connection)
+        _recompute_statistics(connection)
+        logger.info("Recomputed the library statistics")
+
+
+# Full recomputation of every bucket from the library tables
+_RECOMPUTE = f"""
+SELECT 'total', 0, count(*), COALESCE(sum({_CENTS.format(row="book")}), 0)
+FROM book WHERE deleted IS 0
+UNION ALL
+SELECT 'read', 0, count(*), 0 FROM book WHERE deleted IS 0 AND read IS 1
+UNION ALL
+SELECT 'year', released, count(*), sum({_CENTS.format(row="book")})
+FROM book WHERE deleted IS 0 AND released IS NOT NULL GROUP BY released
+UNION ALL
+SELECT 'format', format_id, count(*), 0
+FROM book WHERE deleted IS 0 AND format_id IS NOT NULL GROUP BY format_id
+UNION ALL
+SELECT 'genre', book_genres.genre_id, count(*), 0
+FROM book_genres JOIN book ON book.id = book_genres.book_id
+WHERE book.deleted IS 0 GROUP BY book_genres.genre_id
+"""
+
+
+def _statistics(rows) -> Dict[Tuple[str, int], Tuple[int, int]]:
+    """Key statistic rows by (kind, bucket), leaving out empty buckets."""
+    return {
+        (kind, bucket): (books, price)
+        for kind, bucket, books, price in rows
+        if books or price
+    }
+
+
+def verify_statistics(connection) -> List[Tuple[str, int, tuple, tuple]]:
+    """
+    Compare the materialized statistics with a full recomputation.
+
+    Args:
+        connection: The connection to read the statistics with
+
+    Returns:
+        The differing buckets, as (kind, bucket, stored, expected) where the
+        values are (books, price in cents) or None for a missing bucket
+    """
+    stored = _statistics(
+        connection.exec_driver_sql(
+            f"SELECT kind, bucket, books, price FROM {STATISTIC_TABLE}"
+        )
+    )
+    expected = _statistics(connection.exec_driver_sql(_RECOMPUTE))
+    return [
+        (kind, bucket, stored.get((kind, bucket)), expected.get((kind, bucket)))
+        for kind, bucket in sorted(stored.keys() | expected.keys())
+        if stored.get((kind, bucket)) != expected.get((kind, bucket))
+    ]
+
+
+def _recompute_statistics(connection) -> None:
+    connection.exec_driver_sql(f"DELETE FROM {STATISTIC_TABLE}")
+    connection.exec_driver_sql(
+        f"INSERT INTO {STATISTIC_TABLE} (kind, bucket, books, price) {_RECOMPUTE}"
+    )
+
+
+def rebuild_statistics(connection) -> List[Tuple[str, int, tuple, tuple]]:
+    """
+    Replace the materialized statistics with a full recomputation.
+
+    Args:
+        connection: The connection to rebuild the statistics on
+
+    Returns:
+        The buckets that differed before the rebuild, see verify_statistics()
+    """
+    differences = verify_statistics(connection)
+    for kind, bucket, stored, expected in differences:
+        logger.warning(
+            f"Statistic {kind}/{bucket} was {stored}, recomputed as {expected}"
+        )
+    _recompute_statistics(connection)
+    logger.info(f"Rebuilt the library statistics ({len(differences)} differences)")
+    return differences
@@ -0,0 +1,275 @@
+"""
+Read models for the Librium application's list views.
+
+List pages and ``/api/v1/books`` only render a handful of book columns and
+the names of related rows. This module provides compact ``__slots__`` read
+models for them, built from column-projected queries instead of ORM
+instances, so they skip identity-map tracking, attribute instrumentation and
+relationship collections. ``book_summaries`` loads each related list with one
+query for the whole page, or one per ``CHUNK_SIZE`` books for longer lists
+such as a genre's books.
+"""
+
+from decimal import Decimal
+from itertools import chain
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from librium.database.sqlalchemy.db import (
+    Author,
+    AuthorOrdering,
+    Book,
+    Format,
+    Genre,
+    Language,
+    Publisher,
+    Series,
+    SeriesIndex,
+    book_genres,
+    book_languages,
+    book_publishers,
+)
+from librium.database.sqlalchemy.lookup import CHUNK_SIZE
+
+
+class EntitySummary:
+    """The id and name of a row related to a book."""
+
+    __slots__ = ("id", "name")
+
+    def __init__(self, id: int, name: str):
+        self.id = id
+        self.name = name
+
+    def __repr__(self):
+        return f"<{type(self).__name__}(id={self.id}, name='{self.name}')>"
+
+
+class AuthorSummary(EntitySummary):
+    """An author of a book, with their position among the book's authors."""
+
+    __slots__ = ("idx",)
+
+    def __init__(self, id: int, name: str, idx: int):
+        super().__init__(id, name)
+        self.idx = idx
+
+
+class SeriesSummary(EntitySummary):
+    """A series of a book, with the book's index in the series."""
+
+    __slots__ = ("idx",)
+
+    def __init__(self, id: int, name: str, idx: Decimal):
+        super().__init__(id, name)
+        self.idx = idx
+
+    @property
+    def index(self) -> Decimal:
+        """Return the index as an integer if it's a whole number, otherwise as a decimal."""
+        return int(self.idx) if not self.idx * 10 % 10 else self.idx
+
+
+class BookSummary:
+    """
+    The columns and related names of a book that list views render.
+
+    Attributes a profile does not load are None for columns and empty lists
+    for related rows.
+    """
+
+    __slots__ = (
+        "id",
+        "title",
+        "uuid",
+        "released",
+        "read",
+        "isbn",
+        "price",
+        "page_count",
+        "has_cover",
+        "created_at",
+        "updated_at",
+        "format_id",
+        "format",
+        "authors",
+        "series",
+        "genres",
+        "publishers",
+        "languages",
+    )
+
+    def __init__(self, row):
+        mapping = row._mapping
+        for name in self.__slots__:
+            setattr(self, name, mapping.get(name))
+        self.format = None
+        self.authors: List[AuthorSummary] = []
+        self.series: List[SeriesSummary] = []
+        self.genres: List[EntitySummary] = []
+        self.publishers: List[EntitySummary] = []
+        self.languages: List[EntitySummary] = []
+
+    def __repr__(self):
+        return f"<BookSummary(id={self.id}, title='{self.title}')>"
+
+
+# Columns and related lists each profile loads, named like the loading
+# profiles of the ORM queries they replace
+SUMMARY_PROFILES: Dict[str, Tuple[Tuple, Tuple[str, ...]]] = {
+    # main/index.html and the genre page
+    "list": (
+        (Book.id, Book.title, Book.uuid, Book.released, Book.read),
+        ("authors", "series"),
+    ),
+    # /api/v1/books
+    "api": (
+        (
+            Book.id,
+            Book.title,
+            Book.uuid,
+            Book.isbn,
+            Book.released,
+            Book.price,
+            Book.page_count,
+            Book.read,
+            Book.has_cover,
+            Book.created_at,
+            Book.updated_at,
+            Book.format_id,
+        ),
+        ("format", "authors", "series", "genres", "publishers", "languages"),
+    ),
+}
+
+
+def summary_columns(name: str) -> Tuple:
+    """
+    Get the book columns a summary profile selects.
+
+    Args:
+        name: The name of the profile
+
+    Returns:
+        The columns, for ``select(*summary_columns(name))``
+
+    Raises:
+        ValueError: If no profile with the given name exists
+    """
+    try:
+        return SUMMARY_PROFILES[name][0]
+    except KeyError:
+        raise ValueError(
+            f"Unknown summary profile '{name}'. "
+            f"Available profiles: {', '.join(sorted(SUMMARY_PROFILES))}"
+        ) from None
+
+
+def _chunks(ids: Sequence[int]) -> Iterable[Sequence[int]]:
+    return (ids[start : start + CHUNK_SIZE] for start in range(0, len(ids), CHUNK_SIZE))
+
+
+def _related(session: Session, statement, book_ids: Sequence[int]) -> Iterable:
+    # The book id is the first column of every related list. Like relationship
+    # loads, the lists keep related rows that are soft deleted. A book's rows
+    # all come from the same chunk, so they keep the statement's order.
+    return chain.from_iterable(
+        session.execute(
+            statement.where(statement.selected_columns[0].in_(chunk)).execution_options(
+                include_deleted=True
+            )
+        )
+        for chunk in _chunks(book_ids)
+    )
+
+
+def _load_format(session: Session, books: Dict[int, BookSummary]) -> None:
+    format_ids = list({book.format_id for book in books.values() if book.format_id})
+    formats = {
+        format_id: EntitySummary(format_id, name)
+        for chunk in _chunks(format_ids)
+        for format_id, name in session.execute(
+            select(Format.id, Format.name)
+            .where(Format.id.in_(chunk))
+            .execution_options(include_deleted=True)
+        )
+    }
+    for book in books.values():
+        book.format = formats.get(book.format_id)
+
+
+def _load_authors(session: Session, books: Dict[int, BookSummary]) -> None:
+    statement = (
+        select(AuthorOrdering.book_id, Author.id, Author.name, AuthorOrdering.idx)
+        .join(Author, Author.id == AuthorOrdering.author_id)
+        .order_by(AuthorOrdering.book_id, AuthorOrdering.idx)
+    )
+    for book_id, *author in _related(session, statement, list(books)):
+        books[book_id].authors.append(AuthorSummary(*author))
+
+
+def _load_series(session: Session, books: Dict[int, BookSummary]) -> None:
+    statement = (
+        select(SeriesIndex.book_id, Series.id, Series.name, SeriesIndex.idx)
+        .join(Series, Series.id == SeriesIndex.series_id)
+        .order_by(SeriesIndex.book_id, Series.name)
+    )
+    for book_id, *series in _related(session, statement, list(books)):
+        books[book_id].series.append(SeriesSummary(*series))
+
+
+def _named_loader(attribute: str, table, model, column: str):
+    def load(session: Session, books: Dict[int, BookSummary]) -> None:
+        statement = (
+            select(table.c.book_id, model.id, model.name)
+            .join(model, model.id == table.c[column])
+            .order_by(table.c.book_id, model.name)
+        )
+        for book_id, *entity in _related(session, statement, list(books)):
+            getattr(books[book_id], attribute).append(EntitySummary(*entity))
+
+    return load
+
+
+_LOADERS = {
+    "format": _load_format,
+    "authors": _load_authors,
+    "series": _load_series,
+    "genres": _named_loader("genres", book_genres, Genre, "genre_id"),
+    "publishers": _named_loader(
+        "publishers", book_publishers, Publisher, "publisher_id"
+    ),
+    "languages": _named_loader("languages", book_languages, Language, "language_id"),
+}
+
+
+def book_summaries(
+    session: Session, rows: Iterable, name: str = "list"
+) -> List[BookSummary]:
+    """
+    Build the summaries of books from rows of their projected columns.
+
+    The related lists of the profile are loaded with one query each for all
+    the books, so a page costs the same number of statements however many
+    books it has. Lists of more than ``CHUNK_SIZE`` books are loaded in chunks,
+    to stay below SQLite's limit of bound parameters.
+
+    Args:
+        session: The session to load the related lists with
+        rows: Rows selected with ``summary_columns(name)``
+        name: The name of the summary profile
+
+    Returns:
+        The summaries, in the order of the rows
+    """
+    summary_columns(name)
+    summaries = [BookSummary(row) for row in rows]
+    if not summaries:
+        return summaries
+
+    books = {summary.id: summary for summary in summaries}
+    for relationship in SUMMARY_PROFILES[name][1]:
+        _LOADERS[relationship](session, books)
+    return summaries
@@ -0,0 +1,400 @@
+"""
+Databases per tenant for the Librium application.
+
+When ``TENANT_DATABASE_DIR`` is set, every tenant has a library of its own in
+``<TENANT_DATABASE_DIR>/<tenant>.sqlite``. The web application resolves the
+tenant of each request from its JWT identity or its host (see
+``librium.core.app.configure_tenancy``) and sets it with ``use_tenant()``.
+
+The global ``Session`` then resolves to a session of the current tenant's
+database, so services keep using it unchanged. ``TenantSessionmaker`` creates
+those sessions from the tenant's ``TenantDatabase``: a read-write engine, a
+read-only engine and a write lock of its own, so tenants never wait for each
+other's writes. ``TenantRegistry`` keeps the databases of the most recently
+used tenants open, closes those that were idle for too long, and creates the
+files of new tenants from a copy of an empty library.
+
+Requests without a tenant use the configured ``SQLDATABASE``, which also
+keeps the in-memory replica if one is configured.
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from librium.core.logging import get_logger
+from librium.core.metrics import metrics
+from librium.database.sqlalchemy.instrumentation import instrument_engine
+from librium.database.sqlalchemy.pooling import InstrumentedQueuePool
+from librium.database.sqlalchemy.profiles import use_connection_profile
+from librium.database.sqlalchemy.routing import (
+    WRITER,
+    RoutingSession,
+    create_read_engine,
+)
+from librium.database.sqlalchemy.writes import (
+    WriteCoordinator,
+    use_immediate_transactions,
+)
+
+# Get logger for this module
+logger = get_logger("database.tenancy")
+
+# Tenant names that are used as file names as they are
+_FILE_NAME = re.compile(r"[a-z0-9][a-z0-9_.-]{0,63}")
+_UNSAFE = re.compile(r"[^a-z0-9_.-]+")
+
+_tenant: ContextVar[Optional[str]] = ContextVar("tenant", default=None)
+
+
+class UnknownTenantError(LookupError):
+    """Raised when a tenant has no database and new ones are not created."""
+
+
+def current_tenant() -> Optional[str]:
+    """
+    Get the tenant of the current scope.
+
+    Returns:
+        The tenant's name, or None outside any tenant
+    """
+    return _tenant.get()
+
+
+@contextmanager
+def use_tenant(name: Optional[str]):
+    """
+    Use the database of a tenant for the duration of the block.
+
+    Args:
+        name: The tenant's name, or None for the default database
+    """
+    token = _tenant.set(name)
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+def tenant_scope():
+    """Scope the global session to the current thread and tenant."""
+    return threading.current_thread(), _tenant.get()
+
+
+def tenant_file_name(name: str) -> str:
+    """
+    Get the database file name of a tenant.
+
+    Lower-case names of letters, digits, dots, dashes and underscores are
+    used as they are. Other names, such as e-mail addresses, get a hash of
+    the name appended so no two tenants share a file.
+
+    Args:
+        name: The tenant's name
+
+    Returns:
+        The file name, without a directory
+    """
+    normalized = name.strip().lower()
+    if normalized == name and _FILE_NAME.fullmatch(name):
+        return f"{name}.sqlite"
+    digest = hashlib.sha256(name.encode()).hexdigest()[:16]
+    slug = _UNSAFE.sub("_", normalized).strip("._-")[:40] or "tenant"
+    return f"{slug}-{digest}.sqlite"
+
+
+class TenantDatabase:
+    """
+    The engines and write lock of one tenant's database file.
+
+    Attributes:
+        name: The tenant's name
+        path: The database file
+        engine: The read-write engine
+        read_engine: The read-only engine
+        write_coordinator: Serializes the tenant's write transactions
+        last_used: When the database was last handed out, in monotonic seconds
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: Path,
+        profile: str = "web",
+        write_pool_size: int = 1,
+        write_max_overflow: int = 2,
+        read_pool_size: int = 2,
+        read_max_overflow: int = 8,
+        write_retries: int = 5,
+        write_backoff_ms: float = 20,
+    ):
+        """
+        Open the engines of a tenant's database file.
+
+        Args:
+            name: The tenant's name
+            path: The database file
+            profile: The connection profile of the read-write engine
+            write_pool_size: The number of pooled read-write connections
+            write_max_overflow: The read-write connections allowed above the pool size
+            read_pool_size: The number of pooled read connections
+            read_max_overflow: The read connections allowed above the pool size
+            write_retries: How many times a busy write transaction is run again
+            write_backoff_ms: The delay before the first retry
+        """
+        self.name = name
+        self.path = path
+        self.engine = create_engine(
+            f"sqlite:///{path}",
+            poolclass=InstrumentedQueuePool,
+            pool_size=write_pool_size,
+            max_overflow=write_max_overflow,
+            pool_timeout=30,
+            pool_recycle=1800,
+        )
+        # Tenants share the pool metrics, which would otherwise grow with them
+        self.engine.pool.name = WRITER
+        use_connection_profile(self.engine, profile)
+        use_immediate_transactions(self.engine)
+        self.read_engine = create_read_engine(
+            self.engine, pool_size=read_pool_size, max_overflow=read_max_overflow
+        )
+        for engine in (self.engine, self.read_engine):
+            instrument_engine(engine)
+        self.write_coordinator = WriteCoordinator(
+            retries=write_retries, backoff_ms=write_backoff_ms
+        )
+        self.last_used = time.monotonic()
+
+    def dispose(self) -> None:
+        """
+        Close the pooled connections of both engines.
+
+        Connections that are checked out are closed when they are returned,
+        so a request still using the database can finish.
+        """
+        self.engine.dispose()
+        self.read_engine.dispose()
+
+
+class TenantRegistry:
+    """
+    The open databases of the most recently used tenants.
+
+    Attributes:
+        directory: The directory of the tenants' database files
+        maxsize: The number of tenant databases kept open
+        idle_seconds: How long an unused tenant database is kept open
+        create: Whether the files of unknown tenants are created
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        create_schema: Callable[[Engine], None],
+        maxsize: int = 64,
+        idle_seconds: float = 300,
+        create: bool = False,
+        **database_options,
+    ):
+        """
+        Initialize an empty registry.
+
+        Args:
+            directory: The directory of the tenants' database files
+            create_schema: Creates the tables of an empty library on an engine
+            maxsize: The number of tenant databases kept open
+            idle_seconds: How long an unused tenant database is kept open, or
+                0 to keep it until the registry is full
+            create: Whether the files of unknown tenants are created
+            **database_options: Options of each TenantDatabase
+        """
+        self.directory = Path(directory)
+        self.maxsize = maxsize
+        self.idle_seconds = idle_seconds
+        self.create = create
+        self._create_schema = create_schema
+        self._database_options = database_options
+        self._databases: "OrderedDict[str, TenantDatabase]" = OrderedDict()
+        self._lock = threading.Lock()
+        # An in-memory empty library that new tenants' files are copied from
+        self._template: Optional[Engine] = None
+
+    def __len__(self) -> int:
+        return len(self._databases)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._databases
+
+    def path(self, name: str) -> Path:
+        """
+        Get the database file of a tenant.
+
+        Args:
+            name: The tenant's name
+
+        Returns:
+            The path of the file, which may not exist yet
+        """
+        return self.directory / tenant_file_name(name)
+
+    def get(self, name: str) -> TenantDatabase:
+        """
+        Get the database of a tenant, opening it if it is not open.
+
+        Opening a database closes the least recently used one if the registry
+        is full, and those that were idle for longer than ``idle_seconds``.
+
+        Args:
+            name: The tenant's name
+
+        Returns:
+            The tenant's database
+
+        Raises:
+            UnknownTenantError: If the tenant has no database file and new
+                ones are not created
+        """
+        with self._lock:
+            now = time.monotonic()
+            database = self._databases.get(name)
+            if database is not None:
+                self._databases.move_to_end(name)
+                database.last_used = now
+                metrics.increment("tenants.engines.hit")
+            else:
+                metrics.increment("tenants.engines.miss")
+                database = self._open(name)
+                self._databases[name] = database
+            self._evict(now)
+            return database
+
+    def create_tenant(self, name: str) -> Path:
+        """
+        Create the database file of a tenant with an empty library.
+
+        Args:
+            name: The tenant's name
+
+        Returns:
+            The path of the file, which is left as it is if it exists
+        """
+        with self._lock:
+            return self._create(name)
+
+    def _create(self, name: str) -> Path:
+        path = self.path(name)
+        if path.exists():
+            return path
+        # Creating the schema with its triggers takes tens of milliseconds,
+        # so it is created once and copied into the file of each new tenant
+        if self._template is None:
+            self._template = create_engine(
+                "sqlite://",
+                poolclass=StaticPool,
+                connect_args={"check_same_thread": False},
+            )
+            self._create_schema(self._template)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        source = self._template.raw_connection()
+        target = sqlite3.connect(path)
+        try:
+            source.driver_connection.backup(target)
+        finally:
+            target.close()
+            source.close()
+        metrics.increment("tenants.created")
+        logger.info(f"Created the database of tenant '{name}' at {path}")
+        return path
+
+    def _open(self, name: str) -> TenantDatabase:
+        path = self.path(name)
+        if not path.exists():
+            if not self.create:
+                raise UnknownTenantError(f"Unknown tenant '{name}'")
+            self._create(name)
+        return TenantDatabase(name, path, **self._database_options)
+
+    def evict_idle(self) -> int:
+        """
+        Close the databases of the tenants that were idle for too long.
+
+        Returns:
+            The number of databases closed
+        """
+        with self._lock:
+            return self._evict(time.monotonic())
+
+    def _evict(self, now: float) -> int:
+        # The least recently used databases come first
+        evicted = []
+        while len(self._databases) > self.maxsize:
+            evicted.append(self._databases.popitem(last=False)[1])
+        while self.idle_seconds and self._databases:
+            database = next(iter(self._databases.values()))
+            if now - database.last_used < self.idle_seconds:
+                break
+            evicted.append(self._databases.popitem(last=False)[1])
+
+        for database in evicted:
+            database.dispose()
+            metrics.increment("tenants.engines.evicted")
+        metrics.set_gauge("tenants.engines.open", len(self._databases))
+        return len(evicted)
+
+    def close(self) -> None:
+        """Close the databases of every tenant."""
+        with self._lock:
+            for database in self._databases.values():
+                database.dispose()
+            self._databases.clear()
+            metrics.set_gauge("tenants.engines.open", 0)
+            if self._template is not None:
+                self._template.dispose()
+                self._template = None
+
+
+class TenantSessionmaker(sessionmaker):
+    """
+    Session factory that binds each new session to the current tenant.
+
+    Outside any tenant, sessions use the engines the factory was configured
+    with.
+    """
+
+    def __init__(self, tenants: Optional[TenantRegistry] = None, **kwargs):
+        """
+        Initialize the factory.
+
+        Args:
+            tenants: The registry of the tenants' databases, if tenancy is on
+            **kwargs: Arguments of the sessionmaker, such as the default engines
+        """
+        kwargs.setdefault("class_", RoutingSession)
+        super().__init__(**kwargs)
+        self.tenants = tenants
+
+    def __call__(self, **local_kw) -> RoutingSession:
+        name = _tenant.get()
+        if name is not None and self.tenants is not None:
+            database = self.tenants.get(name)
+            local_kw = {
+                "writer": database.engine,
+                "reader": database.read_engine,
+                "replica": None,
+                "write_coordinator": database.write_coordinator,
+                **local_kw,
+            }
+        return super().__call__(**local_kw)
@@ -4,12 +4,26 @@ Transaction management for SQLAlchemy.
 This module provides decorators and context managers for managing transactions
 in the application. It ensures that database operations are properly wrapped
 in transactions to maintain data consistency.
+
+Read-only scopes are routed to the read-only engine and everything else to
+the read-write engine (see ``librium.database.sqlalchemy.routing``). Write
+scopes hold the write lock of the session's database and begin with
+``BEGIN IMMEDIATE`` (see ``librium.database.sqlalchemy.writes``).
 """
 
-from contextlib import contextmanager
+from contextlib import contextmanager, nullcontext
 from functools import wraps
 
-from librium.database.sqlalchemy.db import Session
+from librium.database.sqlalchemy.db import Session, write_coordinator
+from librium.database.sqlalchemy.instrumentation import service_method
+from librium.database.sqlalchemy.routing import READER, WRITER, RoutingSession, route
+
+
+def _write_coordinator(session):
+    # Tenants' sessions carry the lock of their database
+    if isinstance(session, RoutingSession) and session.write_coordinator is not None:
+        return session.write_coordinator
+    return write_coordinator
 
 
 def transactional(func):
@@ -19,6 +33,11 @@ def transactional(func):
     This decorator ensures that the function is executed within a database
     session and that changes are committed or rolled back appropriately.
 
+    The function runs while holding the write lock of its database. If the
+    database is locked by another process, the transaction is rolled back and
+    the function is called again with the same arguments, so it must not
+    change them or have side effects outside the session.
+
     Args:
         func: The function to wrap
 
@@ -29,13 +48,12 @@ def transactional(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
         session = Session()
-        try:
-            result = func(*args, **kwargs)
-            session.commit()
-            return result
-        except Exception as e:
-            session.rollback()
-            raise e
+
+        def run():
+            with route(WRITER), service_method(func.__qualname__):
+                return func(*args, **kwargs)
+
+        return _write_coordinator(session).run(session, run)
 
     return wrapper
 
@@ -48,6 +66,10 @@ def read_only(func):
     session but does not commit any changes. This is useful for functions
     that only read from the database.
 
+    Queries are sent to the read-only engine unless the function is called
+    from within a transaction, and flushing changes raises
+    ``ReadOnlySessionError``.
+
     Args:
         func: The function to wrap
 
@@ -59,7 +81,8 @@ def read_only(func):
     def wrapper(*args, **kwargs):
         session = Session()
         try:
-            result = func(*args, **kwargs)
+            with route(READER), service_method(func.__qualname__):
+                result = func(*args, **kwargs)
             return result
         except Exception as e:
             raise e
@@ -83,9 +106,12 @@ def transaction_context(read_only=False):
     """
     session = Session()
     try:
-        yield session
-        if not read_only:
-            session.commit()
+        with route(READER if read_only else WRITER), (
+            nullcontext() if read_only else _write_coordinator(session).hold()
+        ):
+            yield session
+            if not read_only:
+                session.commit()
     except Exception as e:
         session.rollback()
         raise e
@@ -108,6 +134,8 @@ class TransactionContext:
         """
         self.read_only = read_only
         self.session = None
+        self._route = route(READER if read_only else WRITER)
+        self._lock = None
 
     def __enter__(self):
         """
@@ -117,6 +145,11 @@ class TransactionContext:
             The database session
         """
         self.session = Session()
+        self._lock = (
+            nullcontext() if self.read_only else _write_coordinator(self.session).hold()
+        )
+        self._lock.__enter__()
+        self._route.__enter__()
         return self.session
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -134,11 +167,15 @@ class TransactionContext:
         Returns:
             True if the exception was handled, False otherwise
         """
-        if exc_type is not None:
-            self.session.rollback()
-            return False
-
-        if not self.read_only:
-            self.session.commit()
+        self._route.__exit__(exc_type, exc_val, exc_tb)
+        try:
+            if exc_type is not None:
+                self.session.rollback()
+                return False
+
+            if not self.read_only:
+                self.session.commit()
+        finally:
+            self._lock.__exit__(exc_type, exc_val, exc_tb)
 
         return True
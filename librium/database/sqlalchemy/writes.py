@@ -0,0 +1,211 @@
+"""
+Write coordination for the Librium application's SQLite database.
+
+SQLite allows one writer at a time. A transaction that starts by reading and
+only later writes (pysqlite's default deferred ``BEGIN``) can fail with
+"database is locked" when it tries to take the write lock, without waiting
+for ``busy_timeout``, if another connection wrote in the meantime. Concurrent
+form saves, API additions and cover uploads surfaced as errors that way.
+
+``WriteCoordinator`` sits in front of the ``@transactional`` decorator:
+
+- a per-process lock lets one write transaction run at a time, so the
+  threads of a worker queue for it instead of contending inside SQLite;
+- write transactions start with ``BEGIN IMMEDIATE``, which takes SQLite's
+  write lock up front and waits ``busy_timeout`` for other processes;
+- a transaction that still fails with SQLITE_BUSY or SQLITE_LOCKED is rolled
+  back and run again, a bounded number of times with jittered backoff.
+
+The wait for the lock and the retries are recorded as the ``writes.*``
+metrics.
+"""
+
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from librium.core.logging import get_logger
+from librium.core.metrics import metrics
+
+# Get logger for this module
+logger = get_logger("database.writes")
+
+# SQLite's primary result codes for a database another connection has locked;
+# extended codes such as SQLITE_BUSY_SNAPSHOT keep them in their low byte
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+# Whether transactions begun in the current scope take the write lock up front
+_immediate: ContextVar[bool] = ContextVar("immediate_transactions", default=False)
+
+
+def is_busy_error(error: BaseException) -> bool:
+    """
+    Check whether an error means the database was locked by another connection.
+
+    Args:
+        error: The error raised by a statement or commit
+
+    Returns:
+        True for SQLITE_BUSY and SQLITE_LOCKED errors
+    """
+    if isinstance(error, OperationalError):
+        error = error.orig
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED)
+    message = str(error)
+    return "database is locked" in message or "database table is locked" in message
+
+
+def use_immediate_transactions(engine: Engine) -> None:
+    """
+    Begin the transactions of write scopes on an engine with ``BEGIN IMMEDIATE``.
+
+    Other transactions keep pysqlite's behaviour of beginning before the first
+    write, which does not emit a second ``BEGIN`` once one is open.
+
+    Args:
+        engine: The read-write engine
+    """
+
+    @event.listens_for(engine, "begin")
+    def begin_immediate(connection):
+        if _immediate.get():
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+class WriteCoordinator:
+    """
+    Serializes the write transactions of a process and retries busy ones.
+
+    The lock is reentrant, so a transactional service method may call another
+    one; only the outermost call waits for the lock, commits and retries.
+
+    Attributes:
+        retries: How many times a busy transaction is run again
+        backoff_ms: The delay before the first retry, doubled for each one
+        max_backoff_ms: The longest delay between two attempts
+    """
+
+    def __init__(
+        self, retries: int = 5, backoff_ms: float = 20, max_backoff_ms: float = 500
+    ):
+        """
+        Initialize the coordinator.
+
+        Args:
+            retries: How many times a busy transaction is run again
+            backoff_ms: The delay before the first retry, doubled for each one
+            max_backoff_ms: The longest delay between two attempts
+        """
+        self.retries = retries
+        self.backoff_ms = backoff_ms
+        self.max_backoff_ms = max_backoff_ms
+        self._lock = threading.RLock()
+        self._local = threading.local()
+
+    @property
+    def depth(self) -> int:
+        """The number of write scopes the current thread is in."""
+        return getattr(self._local, "depth", 0)
+
+    @contextmanager
+    def hold(self):
+        """
+        Hold the write lock for the duration of the block.
+
+        Transactions begun in the block take SQLite's write lock up front.
+        Records the ``writes.lock_wait_ms`` and ``writes.lock_held_ms`` timings
+        of the outermost block.
+        """
+        outermost = self.depth == 0
+        started = time.perf_counter()
+        with self._lock:
+            acquired = time.perf_counter()
+            if outermost:
+                metrics.observe("writes.lock_wait_ms", (acquired - started) * 1000)
+            self._local.depth = self.depth + 1
+            token = _immediate.set(True)
+            try:
+                yield
+            finally:
+                _immediate.reset(token)
+                self._local.depth -= 1
+                if outermost:
+                    metrics.observe(
+                        "writes.lock_held_ms", (time.perf_counter() - acquired) * 1000
+                    )
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Get the delay before a retry, with full jitter.
+
+        Args:
+            attempt: The number of the retry, starting at 1
+
+        Returns:
+            The delay in seconds
+        """
+        ceiling = min(self.backoff_ms * 2 ** (attempt - 1), self.max_backoff_ms)
+        return random.uniform(0, ceiling) / 1000
+
+    def run(self, session, func: Callable[[], Any]) -> Any:
+        """
+        Run a write transaction, committing it, and retry it while it is busy.
+
+        A nested call runs in the transaction of the outermost one, which
+        alone commits, rolls back and retries, so a retry never repeats work
+        that was already committed. The lock is released while waiting to
+        retry, so other writers of the process can go first.
+
+        Args:
+            session: The session the transaction runs in
+            func: Runs the transaction's statements
+
+        Returns:
+            The result of the function
+
+        Raises:
+            OperationalError: If the database stayed locked for every attempt
+        """
+        if self.depth:
+            return func()
+
+        attempt = 0
+        while True:
+            try:
+                return self._attempt(session, func)
+            except Exception as e:
+                if not is_busy_error(e):
+                    raise
+                metrics.increment("writes.busy")
+                if attempt == self.retries:
+                    metrics.increment("writes.gave_up")
+                    logger.warning(
+                        f"Database still locked after {attempt + 1} attempts: {e}"
+                    )
+                    raise
+                attempt += 1
+                metrics.increment("writes.retries")
+                time.sleep(self.backoff(attempt))
+
+    def _attempt(self, session, func: Callable[[], Any]) -> Any:
+        with self.hold():
+            try:
+                result = func()
+                session.commit()
+                return result
+            except Exception:
+                session.rollback()
+                raise
@@ -8,6 +8,7 @@ API for the views to use.
 
 from librium.services.authentication import AuthenticationService
 from librium.services.book import BookService
+from librium.services.bulk import BulkService
 from librium.services.author import AuthorService
 from librium.services.publisher import PublisherService
 from librium.services.format import FormatService
@@ -19,6 +20,7 @@ from librium.services.year import YearService
 # Define __all__ to control what gets imported with "from librium.services import *"
 __all__ = [
     "BookService",
+    "BulkService",
     "AuthorService",
     "PublisherService",
     "FormatService",
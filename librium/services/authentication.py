@@ -6,9 +6,10 @@ This module provides a service for interacting with the Authentication model.
 
 from typing import List, Optional
 
-from sqlalchemy import select
+from sqlalchemy import bindparam, select
 
 from librium.database import Authentication, Session, read_only, transactional
+from librium.database.sqlalchemy.statements import cached_statement
 
 
 class AuthenticationService:
@@ -26,7 +27,9 @@ class AuthenticationService:
         Returns:
             Optional[Authentication]: The authentication record if found, otherwise None.
         """
-        return Session.get(Authentication, auth_id)
+        return Session.get(
+            Authentication, auth_id, execution_options={"include_deleted": True}
+        )
 
     @staticmethod
     @read_only
@@ -41,7 +44,13 @@ class AuthenticationService:
             Optional[Authentication]: The authentication record if found, otherwise None.
         """
         return Session.scalar(
-            select(Authentication).where(Authentication.username == name)
+            cached_statement(
+                "authentication.by_name",
+                lambda: select(Authentication).where(
+                    Authentication.username == bindparam("name")
+                ),
+            ),
+            {"name": name},
         )
 
     @staticmethod
@@ -53,9 +62,7 @@ class AuthenticationService:
         Returns:
             List[Authentication]: A list of all authentication records.
         """
-        return Session.scalar(
-            select(Authentication).where(Authentication.deleted.is_(False))
-        )
+        return Session.scalar(select(Authentication))
 
     @staticmethod
     @transactional
@@ -91,7 +98,9 @@ class AuthenticationService:
         Returns:
             Optional[Authentication]: The updated authentication record if found, otherwise None.
         """
-        authentication = Session.get(Authentication, auth_id)
+        authentication = Session.get(
+            Authentication, auth_id, execution_options={"include_deleted": True}
+        )
         if not authentication:
             return None
 
@@ -115,7 +124,9 @@ class AuthenticationService:
         Returns:
             bool: True if the record was found and marked as deleted, False otherwise.
         """
-        authentication = Session.get(Authentication, auth_id)
+        authentication = Session.get(
+            Authentication, auth_id, execution_options={"include_deleted": True}
+        )
         if not authentication:
             return False
         authentication.deleted = True
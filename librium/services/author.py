@@ -4,11 +4,15 @@ Author service for the Librium application.
 This module provides a service for interacting with the Author model.
 """
 
-from typing import List, Optional, Any
+from typing import Any, Iterable, List, Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import bindparam, select
 
 from librium.database import Author, Session, read_only, transactional
+from librium.database.sqlalchemy.counts import cached_count
+from librium.database.sqlalchemy.lookup import get_many_by_ids
+from librium.database.sqlalchemy.pagination import paginate
+from librium.database.sqlalchemy.statements import cached_statement
 from librium.services.series import SeriesService
 
 
@@ -27,11 +31,29 @@ class AuthorService:
         Returns:
             The author if found and not deleted, None otherwise
         """
-        author = Session.get(Author, author_id)
+        author = Session.get(
+            Author, author_id, execution_options={"include_deleted": True}
+        )
         if author and not author.deleted:
             return author
         return None
 
+    @staticmethod
+    @read_only
+    def get_many_by_ids(author_ids: Iterable[int]) -> Tuple[List[Author], List[int]]:
+        """
+        Get authors by their IDs, in a single query.
+
+        Args:
+            author_ids: The IDs of the authors
+
+        Returns:
+            A tuple containing:
+                - The authors found and not deleted, in the order of the IDs
+                - The IDs that were not found
+        """
+        return get_many_by_ids(Session, Author, author_ids, include_deleted=False)
+
     @staticmethod
     @read_only
     def get_by_name(name: str) -> Optional[Author]:
@@ -44,10 +66,13 @@ class AuthorService:
         Returns:
             The author if found and not deleted, None otherwise
         """
-        author = Session.scalar(
-            select(Author).where(Author.name == name, Author.deleted == False)
+        return Session.scalar(
+            cached_statement(
+                "author.by_name",
+                lambda: select(Author).where(Author.name == bindparam("name")),
+            ),
+            {"name": name},
         )
-        return author
 
     @staticmethod
     @read_only
@@ -58,7 +83,7 @@ class AuthorService:
         Returns:
             A list of all authors that are not deleted
         """
-        return list(Session.query(Author).filter(Author.deleted == False))
+        return list(Session.query(Author))
 
     @staticmethod
     @read_only
@@ -97,7 +122,6 @@ class AuthorService:
             .where(Author.middle_name == middle_name)
             .where(Author.prefix == prefix)
             .where(Author.suffix == suffix)
-            .where(Author.deleted == False)
         )
 
         return Session.scalars(selector).unique().one_or_none()
@@ -118,7 +142,6 @@ class AuthorService:
             select(Author)
             .where(Author.last_name is not None)
             .where(Author.last_name.istartswith(prefix))
-            .where(Author.deleted == False)
         )
         return Session.scalars(selector).unique().all()
 
@@ -201,7 +224,9 @@ class AuthorService:
         Returns:
             The updated author if found, None otherwise
         """
-        author = Session.get(Author, author_id)
+        author = Session.get(
+            Author, author_id, execution_options={"include_deleted": True}
+        )
         if not author:
             return None
 
@@ -223,7 +248,9 @@ class AuthorService:
         Returns:
             True if the author was soft deleted, False otherwise
         """
-        author = Session.get(Author, author_id)
+        author = Session.get(
+            Author, author_id, execution_options={"include_deleted": True}
+        )
         if not author:
             return False
 
@@ -351,7 +378,7 @@ class AuthorService:
         """
         return list(
             Session.query(Author)
-            .where(Author.books.is_empty() == False, Author.deleted == False)
+            .where(Author.books.is_empty() == False)
             .order_by(Author.last_name)
         )
 
@@ -371,7 +398,6 @@ class AuthorService:
             Session.query(Author).where(
                 Author.books.is_empty() == False,
                 Author.books.any(lambda b: b.book.read is is_read),
-                Author.deleted == False,
             )
         )
 
@@ -387,12 +413,13 @@ class AuthorService:
         exact_name: Optional[str] = None,
         sort_by: str = "last_name",
         sort_order: str = "asc",
+        cursor: Optional[str] = None,
         **kwargs,
     ) -> tuple[List[Author], int]:
         """
         Get a paginated list of non-deleted authors with optional filtering and sorting.
         """
-        query = select(Author).where(Author.deleted == False)
+        query = select(Author)
         # name/last_name filters
         if search:
             # search in last_name or name
@@ -413,16 +440,26 @@ class AuthorService:
             query = (
                 query.join(Author.books).join(Book).where(Book.read.is_(filter_read))
             )
-        from sqlalchemy import func
-
-        total_count = Session.scalar(select(func.count()).select_from(query.subquery()))
-        # sorting
-        order_attr = Author.last_name
-        if sort_order.lower() == "desc":
-            query = query.order_by(order_attr.desc())
-        else:
-            query = query.order_by(order_attr.asc())
-        offset = (page - 1) * page_size
-        query = query.offset(offset).limit(page_size)
-        authors = Session.scalars(query).unique().all()
+        total_count = cached_count(
+            Session,
+            query,
+            "author",
+            filter_read=filter_read,
+            search=search,
+            start_with=start_with,
+            ends_with=ends_with,
+            exact_name=exact_name,
+        )
+        # sorting, ties broken by id
+        authors = paginate(
+            Session,
+            query,
+            Author.last_name,
+            Author.id,
+            "last_name",
+            descending=sort_order.lower() == "desc",
+            page=page,
+            page_size=page_size,
+            cursor=cursor,
+        )
         return authors, total_count
@@ -4,11 +4,14 @@ Book service for the Librium application.
 This module provides a service for interacting with the Book model.
 """
 
+import operator
+from datetime import datetime
 from decimal import Decimal
-from typing import Any, Dict, List, Optional
+from functools import reduce
+from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import select
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import bindparam, case, exists, func, or_, select
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
 
 from librium.database import (
     AuthorOrdering,
@@ -19,19 +22,195 @@ from librium.database import (
     read_only,
     transactional,
 )
+from librium.database.sqlalchemy import analytics
 from librium.database.sqlalchemy.db import book_genres, book_languages, book_publishers
+from librium.database.sqlalchemy.counts import cached_count, library_counter_value
+from librium.database.sqlalchemy.loading import loading_options
+from librium.database.sqlalchemy.pagination import Page, paginate
+from librium.database.sqlalchemy.statements import cached_statement
+from librium.database.sqlalchemy.summaries import (
+    BookSummary,
+    book_summaries,
+    summary_columns,
+)
+from librium.database.sqlalchemy.search import (
+    book_search,
+    can_use_trigrams,
+    has_like_wildcards,
+    reverse_title,
+    search_match,
+    search_rank,
+    title_trigram_match,
+    to_match_query,
+)
 from librium.services.author import AuthorService
 from librium.services.format import FormatService
 from librium.services.genre import GenreService
 from librium.services.language import LanguageService
 from librium.services.publisher import PublisherService
 from librium.services.series import SeriesService
+from librium.core.config import get_config
 from librium.core.logging import get_logger
 
 # Get logger for this module
 logger = get_logger("services.book")
 
 
+# Problems a book can have, with the bit each sets in a book's problem mask
+PROBLEMS = {
+    "missing_cover": 1,
+    "missing_isbn": 2,
+    "missing_author": 4,
+    "missing_publisher": 8,
+    "missing_language": 16,
+    "missing_genre": 32,
+}
+
+
+def _problem_conditions() -> Dict[str, Any]:
+    """Get the condition matching the books with each problem."""
+    return {
+        "missing_cover": Book.has_cover.is_(False),
+        "missing_isbn": Book.isbn.is_(None) | (Book.isbn == ""),
+        "missing_author": ~exists().where(AuthorOrdering.book_id == Book.id),
+        "missing_publisher": ~exists().where(book_publishers.c.book_id == Book.id),
+        "missing_language": ~exists().where(book_languages.c.book_id == Book.id),
+        "missing_genre": ~exists().where(book_genres.c.book_id == Book.id),
+    }
+
+
+def _problem_mask():
+    """Get the problem mask of a book: the sum of the bits of its problems."""
+    conditions = _problem_conditions()
+    return reduce(
+        operator.add,
+        [case((conditions[name], bit), else_=0) for name, bit in PROBLEMS.items()],
+    )
+
+
+def _title_like(pattern: str, text: str):
+    """
+    Match titles against an ilike pattern, using the trigram index if it can.
+
+    The ilike condition is kept so the result is exactly that of the plain
+    ilike; the index only narrows down the rows it is checked against.
+    """
+    condition = Book.title.ilike(pattern)
+    if can_use_trigrams(text):
+        condition = Book.id.in_(title_trigram_match(pattern)) & condition
+    return condition
+
+
+def _title_ends_with(text: str):
+    """Match titles ending with text, as a range over the reversed title key."""
+    if has_like_wildcards(text):
+        return Book.title.ilike(f"%{text}")
+    key = reverse_title(text)
+    return (
+        (Book.title_reversed >= key)
+        & (Book.title_reversed < key + "\U0010ffff")
+        & Book.title.ilike(f"%{text}")
+    )
+
+
+def book_filters(
+    filter_read: Optional[bool] = None,
+    search: Optional[str] = None,
+    start_with: Optional[str] = None,
+    ends_with: Optional[str] = None,
+    exact_name: Optional[str] = None,
+) -> List[Any]:
+    """
+    Get the conditions of the book listing filters.
+
+    Args:
+        filter_read: If provided, filter books by read status
+        search: If provided, filter books by title containing this string
+        start_with: If provided, filter books by title starting with this string
+        ends_with: If provided, filter books by title ending with this string
+        exact_name: If provided, filter books by exact title match
+
+    Returns:
+        The conditions of the given filters, which all books match
+    """
+    conditions = []
+    if filter_read is not None:
+        conditions.append(Book.read.is_(filter_read))
+    if search:
+        conditions.append(_title_like(f"%{search}%", search))
+    if start_with:
+        conditions.append(_title_like(f"{start_with}%", start_with))
+    if exact_name:
+        conditions.append(Book.title == exact_name)
+    if ends_with:
+        conditions.append(_title_ends_with(ends_with))
+    return conditions
+
+
+def _author_orderings(book: Book, authors: List[Any]) -> List[AuthorOrdering]:
+    """
+    Get the author orderings of a book for a list of authors, in order.
+
+    The book's current orderings are reused, and only those whose position
+    changed get a new idx, so saving unchanged authors writes nothing.
+    Authors listed twice are kept at their first position.
+    """
+    current = {ordering.author_id: ordering for ordering in book.authors}
+    orderings = []
+    for author in authors:
+        if any(ordering.author_id == author.id for ordering in orderings):
+            continue
+        idx = len(orderings) + 1
+        ordering = current.get(author.id)
+        if ordering is None:
+            ordering = AuthorOrdering(book=book, author=author, idx=idx)
+            Session.add(ordering)
+        elif ordering.idx != idx:
+            ordering.idx = idx
+        orderings.append(ordering)
+    return orderings
+
+
+def _series_indexes(book: Book, entries: List[Tuple[Any, Any]]) -> List[SeriesIndex]:
+    """
+    Get the series indexes of a book for a list of (series, idx) entries.
+
+    Indexes already in the book are reused, and an entry whose series the
+    book is in at another index moves that index instead of replacing it,
+    so only the changed rows are written.
+    """
+    # Indexes come from the form as floats, and repeated entries are dropped
+    entries = dict.fromkeys((series, Decimal(str(idx))) for series, idx in entries)
+    remaining = list(book.series)
+    indexes = []
+    moved = []
+    for series, idx in entries:
+        match = next(
+            (
+                index
+                for index in remaining
+                if index.series_id == series.id and index.idx == idx
+            ),
+            None,
+        )
+        if match is None:
+            moved.append((len(indexes), series, idx))
+            indexes.append(None)
+        else:
+            remaining.remove(match)
+            indexes.append(match)
+    for position, series, idx in moved:
+        index = next((i for i in remaining if i.series_id == series.id), None)
+        if index is None:
+            index = SeriesIndex(book=book, series=series, idx=idx)
+            Session.add(index)
+        else:
+            remaining.remove(index)
+            index.idx = idx
+        indexes[position] = index
+    return indexes
+
+
 class BookService:
     """Service for interacting with the Book model."""
 
@@ -49,7 +228,9 @@ class BookService:
         """
         try:
             logger.debug(f"Getting book with ID: {book_id}")
-            book = Session.get(Book, book_id)
+            book = Session.get(
+                Book, book_id, execution_options={"include_deleted": True}
+            )
             if book and not book.deleted:
                 logger.debug(f"Found book: {book.title} (ID: {book.id})")
                 return book
@@ -77,9 +258,16 @@ class BookService:
         """
         try:
             logger.debug(f"Getting book with UUID: {uuid}")
+            strict = get_config().STRICT_LOADING
             book = (
                 Session.scalars(
-                    select(Book).where(Book.uuid == uuid, Book.deleted.is_(False))
+                    cached_statement(
+                        ("book.by_uuid", strict),
+                        lambda: select(Book)
+                        .where(Book.uuid == bindparam("uuid"))
+                        .options(*loading_options("detail", strict)),
+                    ),
+                    {"uuid": uuid},
                 )
                 .unique()
                 .one_or_none()
@@ -108,17 +296,60 @@ class BookService:
         """
         try:
             logger.debug("Getting all non-deleted books")
-            books = (
-                Session.scalars(select(Book).where(Book.deleted.is_(False)))
-                .unique()
-                .all()
-            )
+            books = Session.scalars(select(Book)).unique().all()
             logger.debug(f"Found {len(books)} non-deleted books")
             return books
         except SQLAlchemyError as e:
             logger.error(f"Error getting all books: {e}")
             raise
 
+    @staticmethod
+    @read_only
+    def get_summaries(book_ids: List[int], loading: str = "list") -> List[BookSummary]:
+        """
+        Get the summaries of non-deleted books.
+
+        Args:
+            book_ids: The IDs of the books
+            loading: The summary profile, "list" or "api"
+
+        Returns:
+            The summaries of the books found, ordered by title
+        """
+        logger.debug(f"Getting summaries of {len(book_ids)} books")
+        rows = Session.execute(
+            select(*summary_columns(loading))
+            .where(Book.id.in_(book_ids))
+            .order_by(Book.title, Book.id)
+        ).all()
+        return book_summaries(Session, rows, loading)
+
+    @staticmethod
+    def _summarize(query, order_attr, loading: str):
+        """Project a query of books onto the columns of a summary profile."""
+        columns = summary_columns(loading)
+        if order_attr.key not in {column.key for column in columns}:
+            columns += (order_attr,)
+        return query.with_only_columns(*columns)
+
+    @staticmethod
+    def _count_from_counters(filter_read: Optional[bool]) -> int:
+        """
+        Get the number of non-deleted books from the maintained counters.
+
+        Args:
+            filter_read: If provided, count only books with this read status
+
+        Returns:
+            The number of books
+        """
+        if filter_read is None:
+            return library_counter_value(Session, "books")
+        read = library_counter_value(Session, "books_read")
+        if filter_read:
+            return read
+        return library_counter_value(Session, "books") - read
+
     @staticmethod
     @read_only
     def get_paginated(
@@ -131,10 +362,18 @@ class BookService:
         exact_name: Optional[str] = None,
         sort_by: str = "title",
         sort_order: str = "asc",
-    ) -> tuple[List[Book], int]:
+        loading: str = "list",
+        cursor: Optional[str] = None,
+        approximate_count: bool = False,
+        summaries: bool = False,
+    ) -> tuple[List[Book] | List[BookSummary], int]:
         """
         Get a paginated list of non-deleted books with optional filtering and sorting.
 
+        Pages are read by cursor when one is given, otherwise by page number.
+        The returned list is a ``Page`` that carries the cursors of the
+        previous and next pages either way.
+
         Args:
             page: The page number (1-indexed)
             page_size: The number of items per page
@@ -145,6 +384,14 @@ class BookService:
             exact_name: If provided, filter books by exact title match
             sort_by: Field to sort by (title, released, price, page_count, read)
             sort_order: Sort order (asc or desc)
+            loading: The loading profile for the books' relationships
+            cursor: If provided, the cursor of the page to get instead of
+                the page number
+            approximate_count: Take the total of listings filtered by read
+                status only from the maintained library counters instead of
+                counting the books
+            summaries: Return ``BookSummary`` read models of the ``loading``
+                summary profile instead of ORM books
 
         Returns:
             A tuple containing:
@@ -152,6 +399,7 @@ class BookService:
                 - The total number of books matching the criteria
 
         Raises:
+            InvalidCursorError: If the cursor is invalid for this sort field
             SQLAlchemyError: If there's an error during database operations
         """
         try:
@@ -161,35 +409,27 @@ class BookService:
                 f"ends_with={ends_with}, exact_name={exact_name})"
             )
 
-            # Build the base query
-            query = select(Book).where(Book.deleted.is_(False))
-
-            # Apply read filter if provided
-            if filter_read is not None:
-                query = query.where(Book.read.is_(filter_read))
-
-            # Apply search filter if provided
-            if search:
-                query = query.where(Book.title.ilike(f"%{search}%"))
-
-            # Apply start_with filter if provided
-            if start_with:
-                query = query.where(Book.title.ilike(f"{start_with}%"))
-
-            # Apply exact_name filter if provided
-            if exact_name:
-                query = query.where(Book.title == exact_name)
-
-            # Apply ends_with filter if provided
-            if ends_with:
-                query = query.where(Book.title.ilike(f"%{ends_with}"))
-
-            from sqlalchemy import func
-
-            total_count = Session.scalar(
-                select(func.count()).select_from(query.subquery())
+            # Build the base query, with the filters that are provided
+            query = select(Book).where(
+                *book_filters(filter_read, search, start_with, ends_with, exact_name),
             )
 
+            if approximate_count and not (
+                search or start_with or ends_with or exact_name
+            ):
+                total_count = BookService._count_from_counters(filter_read)
+            else:
+                total_count = cached_count(
+                    Session,
+                    query,
+                    "book",
+                    filter_read=filter_read,
+                    search=search,
+                    start_with=start_with,
+                    ends_with=ends_with,
+                    exact_name=exact_name,
+                )
+
             # Apply sorting
             if sort_by == "title":
                 order_attr = Book.title
@@ -203,22 +443,33 @@ class BookService:
                 order_attr = Book.read
             else:
                 # Default to title if sort_by is not recognised
-                order_attr = Book.title
+                sort_by, order_attr = "title", Book.title
 
             logger.debug(f"Sorting by {sort_by} in {sort_order} order")
 
-            # Apply sort order
-            if sort_order.lower() == "desc":
-                query = query.order_by(order_attr.desc())
+            if summaries:
+                query = BookService._summarize(query, order_attr, loading)
             else:
-                query = query.order_by(order_attr.asc())
-
-            # Apply pagination
-            offset = (page - 1) * page_size
-            query = query.offset(offset).limit(page_size)
-
-            # Execute query
-            books = Session.scalars(query).unique().all()
+                query = query.options(*loading_options(loading))
+
+            # Apply sort order and pagination, ties broken by id
+            books = paginate(
+                Session,
+                query,
+                order_attr,
+                Book.id,
+                sort_by,
+                descending=sort_order.lower() == "desc",
+                page=page,
+                page_size=page_size,
+                cursor=cursor,
+            )
+            if summaries:
+                books = Page(
+                    book_summaries(Session, books, loading),
+                    books.next_cursor,
+                    books.prev_cursor,
+                )
 
             logger.debug(
                 f"Found {len(books)} books for page {page} (total: {total_count})"
@@ -228,6 +479,121 @@ class BookService:
             logger.error(f"Error getting paginated books: {e}")
             raise
 
+    @staticmethod
+    @read_only
+    def search(
+        query: str,
+        page: int = 1,
+        page_size: int = 30,
+        filter_read: Optional[bool] = None,
+        sort_by: str = "relevance",
+        sort_order: str = "asc",
+        loading: str = "list",
+        summaries: bool = False,
+    ) -> tuple[List[Book] | List[BookSummary], int]:
+        """
+        Search non-deleted books by title, author, series, publisher and ISBN.
+
+        Every word of the query must match the beginning of a word in one of
+        those fields. The search uses the full-text index and falls back to a
+        title substring match if the index is not available.
+
+        Args:
+            query: The search text
+            page: The page number (1-indexed)
+            page_size: The number of items per page
+            filter_read: If provided, filter books by read status
+            sort_by: "relevance", or a field accepted by get_paginated
+            sort_order: Sort order (asc or desc)
+            loading: The loading profile for the books' relationships
+            summaries: Return ``BookSummary`` read models of the ``loading``
+                summary profile instead of ORM books
+
+        Returns:
+            A tuple containing:
+                - A list of books for the requested page
+                - The total number of books matching the query
+
+        Raises:
+            SQLAlchemyError: If there's an error during database operations
+        """
+        match = to_match_query(query or "")
+        if not match:
+            return BookService.get_paginated(
+                page=page,
+                page_size=page_size,
+                filter_read=filter_read,
+                search=query,
+                sort_by=sort_by,
+                sort_order=sort_order,
+                loading=loading,
+                summaries=summaries,
+            )
+
+        try:
+            logger.debug(f"Searching books for {match!r} (page={page})")
+            statement = (
+                select(Book)
+                .join(book_search, book_search.c.rowid == Book.id)
+                .where(search_match(match))
+            )
+            if filter_read is not None:
+                statement = statement.where(Book.read.is_(filter_read))
+
+            total_count = cached_count(
+                Session,
+                statement,
+                "book_search",
+                match=match,
+                filter_read=filter_read,
+            )
+
+            if sort_by == "relevance":
+                order = [search_rank(), Book.title]
+            else:
+                order_attr = {
+                    "released": Book.released,
+                    "price": Book.price,
+                    "page_count": Book.page_count,
+                    "read": Book.read,
+                }.get(sort_by, Book.title)
+                order = [
+                    order_attr.desc() if sort_order.lower() == "desc" else order_attr
+                ]
+
+            statement = (
+                statement.order_by(*order)
+                .offset((page - 1) * page_size)
+                .limit(page_size)
+            )
+            if summaries:
+                rows = Session.execute(
+                    statement.with_only_columns(*summary_columns(loading))
+                ).all()
+                books = book_summaries(Session, rows, loading)
+            else:
+                books = (
+                    Session.scalars(statement.options(*loading_options(loading)))
+                    .unique()
+                    .all()
+                )
+            logger.debug(
+                f"Found {len(books)} books for page {page} (total: {total_count})"
+            )
+            return books, total_count
+        except OperationalError as e:
+            logger.warning(f"Full-text search unavailable, using title match: {e}")
+            return BookService.get_paginated(
+                page=page,
+                page_size=page_size,
+                filter_read=filter_read,
+                search=query,
+                sort_by=sort_by,
+                sort_order=sort_order,
+                loading=loading,
+                summaries=summaries,
+            )
+
     @staticmethod
     @read_only
     def get_read() -> List[Book]:
@@ -242,7 +608,7 @@ class BookService:
         """
         try:
             logger.debug("Getting all read books that are not deleted")
-            books = list(Session.query(Book).where(Book.read, Book.deleted.is_(False)))
+            books = list(Session.query(Book).where(Book.read))
             logger.debug(f"Found {len(books)} read books that are not deleted")
             return books
         except SQLAlchemyError as e:
@@ -263,9 +629,7 @@ class BookService:
         """
         try:
             logger.debug("Getting all unread books that are not deleted")
-            books = list(
-                Session.query(Book).where(Book.read.is_(False), Book.deleted.is_(False))
-            )
+            books = list(Session.query(Book).where(Book.read.is_(False)))
             logger.debug(f"Found {len(books)} unread books that are not deleted")
             return books
         except SQLAlchemyError as e:
@@ -286,9 +650,7 @@ class BookService:
         """
         try:
             logger.debug("Getting number of read books")
-            count = (
-                Session.query(Book).where(Book.read, Book.deleted.is_(False)).count()
-            )
+            count = Session.query(Book).where(Book.read).count()
             logger.debug(f"Found {count} read books")
             return count
         except SQLAlchemyError as e:
@@ -309,11 +671,7 @@ class BookService:
         """
         try:
             logger.debug("Getting number of unread books")
-            count = (
-                Session.query(Book)
-                .where(Book.read.is_(False), Book.deleted.is_(False))
-                .count()
-            )
+            count = Session.query(Book).where(Book.read.is_(False)).count()
             logger.debug(f"Found {count} unread books")
             return count
         except SQLAlchemyError as e:
@@ -341,17 +699,9 @@ class BookService:
                 f"Getting books by title: {title} (partial_match={partial_match})"
             )
             if partial_match:
-                books = (
-                    Session.query(Book)
-                    .where(Book.title.ilike(f"%{title}%"), Book.deleted.is_(False))
-                    .all()
-                )
+                books = Session.query(Book).where(Book.title.ilike(f"%{title}%")).all()
             else:
-                books = (
-                    Session.query(Book)
-                    .where(Book.title == title, Book.deleted.is_(False))
-                    .all()
-                )
+                books = Session.query(Book).where(Book.title == title).all()
             logger.debug(f"Found {len(books)} books matching title: {title}")
             return books
         except SQLAlchemyError as e:
@@ -378,7 +728,7 @@ class BookService:
             books = (
                 Session.query(Book)
                 .join(AuthorOrdering, Book.id == AuthorOrdering.book_id)
-                .where(AuthorOrdering.author_id == author_id, Book.deleted.is_(False))
+                .where(AuthorOrdering.author_id == author_id)
                 .all()
             )
             logger.debug(f"Found {len(books)} books by author ID: {author_id}")
@@ -407,7 +757,7 @@ class BookService:
             books = (
                 Session.query(Book)
                 .join(book_genres, Book.id == book_genres.c.book_id)
-                .where(book_genres.c.genre_id == genre_id, Book.deleted.is_(False))
+                .where(book_genres.c.genre_id == genre_id)
                 .all()
             )
             logger.debug(f"Found {len(books)} books by genre ID: {genre_id}")
@@ -438,7 +788,6 @@ class BookService:
                 .join(book_publishers, Book.id == book_publishers.c.book_id)
                 .where(
                     book_publishers.c.publisher_id == publisher_id,
-                    Book.deleted.is_(False),
                 )
                 .all()
             )
@@ -513,15 +862,11 @@ class BookService:
 
             if year is not None:
                 logger.debug(f"Getting books by release year: {year}")
-                books = list(
-                    Session.query(Book).where(
-                        Book.released == year, Book.deleted.is_(False)
-                    )
-                )
+                books = list(Session.query(Book).where(Book.released == year))
                 logger.debug(f"Found {len(books)} books released in {year}")
             else:
                 # Handle year range
-                query = Session.query(Book).where(Book.deleted.is_(False))
+                query = Session.query(Book)
 
                 if start_year is not None:
                     query = query.where(Book.released >= start_year)
@@ -577,7 +922,7 @@ class BookService:
                 raise ValueError("min_price cannot be greater than max_price")
 
             # Build query
-            query = Session.query(Book).where(Book.deleted.is_(False))
+            query = Session.query(Book)
 
             if min_price is not None:
                 query = query.where(Book.price >= min_price)
@@ -618,7 +963,9 @@ class BookService:
             logger.info(f"Creating new book: {title}")
 
             # Get the format
-            format_obj = Session.get(Format, format_id)
+            format_obj = Session.get(
+                Format, format_id, execution_options={"include_deleted": True}
+            )
             if not format_obj:
                 logger.error(f"Format with ID {format_id} not found")
                 raise ValueError(f"Format with ID {format_id} not found")
@@ -665,7 +1012,9 @@ class BookService:
             logger.info(f"Updating book with ID: {book_id}")
 
             # Get the book
-            book = Session.get(Book, book_id)
+            book = Session.get(
+                Book, book_id, execution_options={"include_deleted": True}
+            )
             if not book:
                 logger.warning(f"Book with ID {book_id} not found for update")
                 return None
@@ -673,7 +1022,9 @@ class BookService:
             # Handle special cases for relationships
             if "format_id" in kwargs:
                 format_id = kwargs.pop("format_id")
-                format_obj = Session.get(Format, format_id)
+                format_obj = Session.get(
+                    Format, format_id, execution_options={"include_deleted": True}
+                )
                 if not format_obj:
                     logger.error(f"Format with ID {format_id} not found")
                     raise ValueError(f"Format with ID {format_id} not found")
@@ -709,7 +1060,9 @@ class BookService:
             logger.info(f"Soft deleting book with ID: {book_id}")
 
             # Get the book
-            book = Session.get(Book, book_id)
+            book = Session.get(
+                Book, book_id, execution_options={"include_deleted": True}
+            )
             if not book:
                 logger.warning(f"Book with ID {book_id} not found for deletion")
                 return False
@@ -726,106 +1079,104 @@ class BookService:
             logger.error(f"Error soft deleting book with ID {book_id}: {e}")
             raise
 
+    @staticmethod
+    def _problem_row(row) -> Dict[str, Any]:
+        """Turn a (id, title, uuid, mask) row into a problem book."""
+        return {
+            "id": row.id,
+            "title": row.title,
+            "uuid": row.uuid,
+            "problems": [name for name, bit in PROBLEMS.items() if row.problems & bit],
+        }
+
     @staticmethod
     @read_only
-    def get_problems() -> Dict[str, List[Book]]:
+    def get_problems() -> Dict[str, List[Dict[str, Any]]]:
         """
-        Get books with missing attributes.
+        Get books with missing attributes, in a single pass over the library.
 
         Returns:
-            A dictionary containing lists of books with problems:
-                - missing_cover
-                - missing_isbn
-                - missing_author
-                - missing_publisher
-                - missing_language
-                - missing_genre
+            A dictionary mapping every name of PROBLEMS (missing_cover,
+            missing_isbn, missing_author, missing_publisher, missing_language
+            and missing_genre) to the books with that problem, each a
+            dictionary with the id, title, uuid and names of its problems
         """
         try:
             logger.debug("Getting books with problems")
-
-            # Books missing a cover image
-            missing_cover = (
-                Session.scalars(
-                    select(Book).where(
-                        Book.deleted.is_(False), Book.has_cover.is_(False)
-                    )
+            rows = Session.execute(
+                select(
+                    Book.id, Book.title, Book.uuid, _problem_mask().label("problems")
                 )
-                .unique()
-                .all()
-            )
+                .where(or_(*_problem_conditions().values()))
+                .order_by(Book.title, Book.id)
+            ).all()
+
+            problems = {name: [] for name in PROBLEMS}
+            for row in rows:
+                book = BookService._problem_row(row)
+                for name in book["problems"]:
+                    problems[name].append(book)
+            return problems
+        except SQLAlchemyError as e:
+            logger.error(f"Error getting books with problems: {e}")
+            raise
 
-            # Books missing an ISBN
-            missing_isbn = (
-                Session.scalars(
-                    select(Book).where(
-                        Book.deleted.is_(False),
-                        (Book.isbn.is_(None)) | (Book.isbn == ""),
-                    )
-                )
-                .unique()
-                .all()
-            )
+    @staticmethod
+    @read_only
+    def get_problem_counts() -> Dict[str, int]:
+        """
+        Count the books with each problem, in a single pass over the library.
 
-            # Books missing an author
-            missing_author = (
-                Session.scalars(
-                    select(Book)
-                    .where(Book.deleted.is_(False))
-                    .outerjoin(AuthorOrdering)
-                    .where(AuthorOrdering.author_id.is_(None))
-                )
-                .unique()
-                .all()
-            )
+        Returns:
+            A dictionary mapping every name of PROBLEMS to its number of books
+        """
+        # Grouping by mask evaluates each book's conditions once; the books
+        # of each combination of problems are then added up per problem
+        mask = _problem_mask()
+        counts = dict.fromkeys(PROBLEMS, 0)
+        for problems, count in Session.execute(
+            select(mask, func.count()).group_by(mask)
+        ):
+            for name, bit in PROBLEMS.items():
+                if problems & bit:
+                    counts[name] += count
+        return counts
 
-            # Books missing a publisher
-            missing_publisher = (
-                Session.scalars(
-                    select(Book)
-                    .where(Book.deleted.is_(False))
-                    .outerjoin(book_publishers, Book.id == book_publishers.c.book_id)
-                    .where(book_publishers.c.publisher_id.is_(None))
-                )
-                .unique()
-                .all()
-            )
+    @staticmethod
+    @read_only
+    def get_problem_books(
+        problem: str, page: int = 1, page_size: int = 30
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Get one page of the books with a problem, ordered by title.
 
-            # Books missing a language
-            missing_language = (
-                Session.scalars(
-                    select(Book)
-                    .where(Book.deleted.is_(False))
-                    .outerjoin(book_languages, Book.id == book_languages.c.book_id)
-                    .where(book_languages.c.language_id.is_(None))
-                )
-                .unique()
-                .all()
-            )
+        Only the id, title and uuid of the books are loaded.
 
-            # Books missing a genre
-            missing_genre = (
-                Session.scalars(
-                    select(Book)
-                    .where(Book.deleted.is_(False))
-                    .outerjoin(book_genres, Book.id == book_genres.c.book_id)
-                    .where(book_genres.c.genre_id.is_(None))
-                )
-                .unique()
-                .all()
-            )
+        Args:
+            problem: One of the names of PROBLEMS
+            page: The page number (1-indexed)
+            page_size: The number of books per page
 
-            return {
-                "missing_cover": missing_cover,
-                "missing_isbn": missing_isbn,
-                "missing_author": missing_author,
-                "missing_publisher": missing_publisher,
-                "missing_language": missing_language,
-                "missing_genre": missing_genre,
-            }
-        except SQLAlchemyError as e:
-            logger.error(f"Error getting books with problems: {e}")
-            raise
+        Returns:
+            A tuple of (books, total_count), each book a dictionary with the
+            id, title, uuid and names of all its problems
+
+        Raises:
+            ValueError: If the problem is unknown
+        """
+        if problem not in PROBLEMS:
+            raise ValueError(f"Unknown problem: {problem}")
+
+        query = select(
+            Book.id, Book.title, Book.uuid, _problem_mask().label("problems")
+        ).where(_problem_conditions()[problem])
+        total = cached_count(Session, query, "problems", problem=problem)
+        rows = Session.execute(
+            query.order_by(Book.title, Book.id)
+            .offset((page - 1) * page_size)
+            .limit(page_size)
+        ).all()
+        return [BookService._problem_row(row) for row in rows], total
 
     @staticmethod
     @read_only
@@ -833,6 +1184,10 @@ class BookService:
         """
         Get various statistics about the book collection.
 
+        The statistics are computed from a NumPy snapshot of the library if
+        NumPy is installed, and read from the materialized statistics
+        otherwise (see ``librium.database.sqlalchemy.analytics``).
+
         Returns:
             A dictionary containing:
                 - total_books: Total number of books
@@ -841,78 +1196,90 @@ class BookService:
                 - books_per_genre: Dictionary mapping genre names to book counts
                 - books_per_year: Dictionary mapping years to book counts
                 - books_per_format: Dictionary mapping format names to book counts
+                - price_percentiles, books_per_page_count and
+                  read_ratio_per_decade: Only computed from the snapshot
         """
+        from librium.core.inflation import InflationService
+
+        if analytics.available():
+            stats = BookService._snapshot_statistics()
+        else:
+            stats = BookService._materialized_statistics()
+
+        # Inflation Data
+        from flask import current_app
+
+        currency = current_app.config.get("DEFAULT_CURRENCY", "USD")
+        stats["inflation_factors"] = {
+            currency: InflationService.get_inflation_factors(currency)
+        }
+        stats["currency"] = currency
+        return stats
+
+    @staticmethod
+    def _snapshot_statistics() -> Dict[str, Any]:
+        """Compute the statistics from the snapshot of the library."""
+        from librium.database.sqlalchemy.db import Format, Genre
+
+        return analytics.compute_statistics(
+            analytics.snapshot_cache.get(Session),
+            dict(Session.execute(select(Genre.id, Genre.name)).all()),
+            dict(Session.execute(select(Format.id, Format.name)).all()),
+        )
+
+    @staticmethod
+    def _materialized_statistics() -> Dict[str, Any]:
+        """Read the statistics from the materialized buckets."""
         from sqlalchemy import func
 
-        from librium.database.sqlalchemy.db import Format, Genre, book_genres
-        from librium.core.inflation import InflationService
+        from librium.database.sqlalchemy.db import Format, Genre
+        from librium.database.sqlalchemy.statistics import library_statistic
+
+        # The statistics are materialized by triggers, one row per bucket;
+        # empty buckets are kept and left out here
+        stat = library_statistic.c
+        buckets = {
+            (kind, bucket): (books, price)
+            for kind, bucket, books, price in Session.execute(
+                select(stat.kind, stat.bucket, stat.books, stat.price).where(
+                    stat.kind.in_(("total", "read", "year")), stat.books > 0
+                )
+            )
+        }
 
         # Total, Read, Unread
-        total = (
-            Session.query(func.count(Book.id)).filter(Book.deleted.is_(False)).scalar()
-            or 0
-        )
-        read = (
-            Session.query(func.count(Book.id))
-            .filter(Book.deleted.is_(False), Book.read.is_(True))
-            .scalar()
-            or 0
-        )
+        total, total_price = buckets.get(("total", 0), (0, 0))
+        read = buckets.get(("read", 0), (0, 0))[0]
         unread = total - read
 
         # Books per Genre
-        genre_stats = (
-            Session.query(Genre.name, func.count(Book.id))
-            .join(book_genres, Genre.id == book_genres.c.genre_id)
-            .join(Book, Book.id == book_genres.c.book_id)
-            .filter(Book.deleted.is_(False))
+        genre_stats = Session.execute(
+            select(Genre.name, func.sum(stat.books))
+            .join(Genre, Genre.id == stat.bucket)
+            .where(stat.kind == "genre", stat.books > 0)
             .group_by(Genre.name)
-            .all()
-        )
+        ).all()
         books_per_genre = {name: count for name, count in genre_stats}
 
         # Books per Year
-        year_stats = (
-            Session.query(Book.released, func.count(Book.id))
-            .filter(Book.deleted.is_(False), Book.released.isnot(None))
-            .group_by(Book.released)
-            .order_by(Book.released)
-            .all()
+        years = sorted(
+            (bucket, value)
+            for (kind, bucket), value in buckets.items()
+            if kind == "year"
         )
-        books_per_year = {year: count for year, count in year_stats}
+        books_per_year = {year: books for year, (books, _) in years}
 
         # Books per Format
-        format_stats = (
-            Session.query(Format.name, func.count(Book.id))
-            .join(Book, Format.id == Book.format_id)
-            .filter(Book.deleted.is_(False))
+        format_stats = Session.execute(
+            select(Format.name, func.sum(stat.books))
+            .join(Format, Format.id == stat.bucket)
+            .where(stat.kind == "format", stat.books > 0)
             .group_by(Format.name)
-            .all()
-        )
+        ).all()
         books_per_format = {name: count for name, count in format_stats}
 
-        # Price per Year
-        price_year_stats = (
-            # Aggregates total price per release year
-            Session.query(Book.released, func.sum(Book.price))
-            .filter(Book.deleted.is_(False), Book.released.isnot(None))
-            .group_by(Book.released)
-            .order_by(Book.released)
-            .all()
-        )
-        price_per_year = {year: float(total or 0) for year, total in price_year_stats}
-
-        # Total price
-        total_price = (
-            Session.query(func.sum(Book.price)).filter(Book.deleted.is_(False)).scalar()
-            or 0
-        )
-
-        # Inflation Data
-        from flask import current_app
-
-        currency = current_app.config.get("DEFAULT_CURRENCY", "USD")
-        inflation_factors = {currency: InflationService.get_inflation_factors(currency)}
+        # Price per Year, stored in cents
+        price_per_year = {year: price / 100 for year, (_, price) in years}
 
         return {
             "_total_books": total,
@@ -922,9 +1289,7 @@ class BookService:
             "books_per_year": books_per_year,
             "books_per_format": books_per_format,
             "price_per_year": price_per_year,
-            "total_price": float(total_price),
-            "inflation_factors": inflation_factors,
-            "currency": currency,
+            "total_price": total_price / 100,
         }
 
     @staticmethod
@@ -950,24 +1315,23 @@ class BookService:
         try:
             logger.info(f"Adding or updating book: {book.title} (ID: {book.id})")
 
-            lookup = ["genres", "publishers", "languages"]
+            lookup = {
+                "genres": GenreService,
+                "publishers": PublisherService,
+                "languages": LanguageService,
+            }
 
-            # Clear existing relationships
-            logger.debug("Clearing existing relationships")
-            book.authors = []
-            book.series = []
+            # The resolved values go into a dict of their own, so a retry of a
+            # busy transaction starts again from the ids of the caller's data
+            values = dict(data)
 
-            # Process related entities
-            for key in lookup:
+            # Process related entities, each list in one query
+            for key, service in lookup.items():
                 if table := data.get(key):
                     logger.debug(f"Processing {key}: {table}")
-                    match key:
-                        case "genres":
-                            data[key] = [GenreService.get_by_id(g) for g in table]
-                        case "publishers":
-                            data[key] = [PublisherService.get_by_id(g) for g in table]
-                        case "languages":
-                            data[key] = [LanguageService.get_by_id(g) for g in table]
+                    values[key], missing = service.get_many_by_ids(table)
+                    if missing:
+                        logger.warning(f"{key} with IDs {missing} not found, skipping")
 
             # Get format
             if "format" not in data:
@@ -975,61 +1339,61 @@ class BookService:
                 raise ValueError("Format is required")
 
             logger.debug(f"Getting format: {data['format']}")
-            data["format"] = FormatService.get_by_id(data["format"])
-            if not data["format"]:
+            values["format"] = FormatService.get_by_id(data["format"])
+            if not values["format"]:
                 logger.error(f"Format with ID {data['format']} not found")
                 raise ValueError(f"Format with ID {data['format']} not found")
 
             # Process series
             logger.debug("Processing series")
-            for series in book.series:
-                Session.delete(series)
-
             _series = []
             if "series" in data:
+                found, _ = SeriesService.get_many_by_ids(
+                    s["series"] for s in data["series"]
+                )
+                series_by_id = {series.id: series for series in found}
+                entries = []
                 for s in data["series"]:
-                    series = SeriesService.get_by_id(s["series"])
+                    series = series_by_id.get(s["series"])
                     if not series:
                         logger.warning(
                             f"Series with ID {s['series']} not found, skipping"
                         )
                         continue
-
-                    si = SeriesIndex(book=book, series=series, idx=s["idx"])
-                    Session.add(si)
-                    _series.append(si)
+                    entries.append((series, s["idx"]))
+                _series = _series_indexes(book, entries)
 
             # Process authors
             logger.debug("Processing authors")
             _authors = []
-
-            for author_order in book.authors:
-                Session.delete(author_order)
-
-            i = 1
             try:
                 if "authors" in data:
-                    for a in data.get("authors"):
-                        author = AuthorService.get_by_id(a)
-                        if not author:
-                            logger.warning(f"Author with ID {a} not found, skipping")
-                            continue
-
-                        ax = AuthorOrdering(book=book, author=author, idx=i)
-                        Session.add(ax)
-                        i += 1
-                        _authors.append(ax)
+                    authors, missing = AuthorService.get_many_by_ids(data["authors"])
+                    if missing:
+                        logger.warning(
+                            f"Authors with IDs {missing} not found, skipping"
+                        )
+                    _authors = _author_orderings(book, authors)
             except TypeError as e:
                 logger.error(f"Error processing authors: {e}")
                 # Don't re-raise, as this is handled gracefully in the original code
 
+            # The form sends prices as floats, which never equal the stored
+            # Decimal and would make every save rewrite the price
+            if isinstance(data.get("price"), float):
+                values["price"] = Decimal(str(data["price"]))
+
             # Update data with processed relationships
-            data["series"] = _series
-            data["authors"] = _authors
+            values["series"] = _series
+            values["authors"] = _authors
+
+            # Moved authors and series change no column of the book itself
+            if any(Session.is_modified(row) for row in [*_authors, *_series]):
+                book.updated_at = datetime.now()
 
             # Update the book
-            logger.debug(f"Updating book attributes: {data.keys()}")
-            book.set(**data)
+            logger.debug(f"Updating book attributes: {values.keys()}")
+            book.set(**values)
 
             logger.info(f"Book updated: {book.title} (ID: {book.id})")
             return book
@@ -0,0 +1,231 @@
+"""
+Bulk book service for the Librium application.
+
+This module provides a service for changing every book of a filtered set at
+once. Each operation runs as a single set-based statement: an UPDATE of the
+matching books, or an INSERT or DELETE of their association rows, instead of
+one transaction per book.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, false, func, literal, or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from librium.core.logging import get_logger
+from librium.database import (
+    AuthorOrdering,
+    Book,
+    Format,
+    Genre,
+    Language,
+    Publisher,
+    SeriesIndex,
+    Session,
+    transactional,
+)
+from librium.database.sqlalchemy.db import (
+    book_genres,
+    book_languages,
+    book_publishers,
+    validate_book_values,
+)
+from librium.services.book import book_filters
+
+# Get logger for this module
+logger = get_logger("services.bulk")
+
+# The book columns a bulk update can set
+UPDATABLE_COLUMNS = ("read", "format_id", "released", "price", "page_count")
+
+# The associations books can be added to or removed from in bulk: the
+# association table, its column and the associated model
+LINKS = {
+    "genre": (book_genres, "genre_id", Genre),
+    "language": (book_languages, "language_id", Language),
+    "publisher": (book_publishers, "publisher_id", Publisher),
+}
+
+BULK_OPERATIONS = (
+    "update",
+    "delete",
+    *(f"{action}_{kind}" for kind in LINKS for action in ("add", "remove")),
+)
+
+
+class BulkService:
+    """Service for changing filtered sets of books at once."""
+
+    @staticmethod
+    def _book_ids(
+        filter_read: Optional[bool] = None,
+        search: Optional[str] = None,
+        start_with: Optional[str] = None,
+        ends_with: Optional[str] = None,
+        exact_name: Optional[str] = None,
+        series_ids: Optional[List[int]] = None,
+        author_ids: Optional[List[int]] = None,
+        genre_ids: Optional[List[int]] = None,
+        publisher_ids: Optional[List[int]] = None,
+    ):
+        """
+        Get the ids of the non-deleted books matching the filters.
+
+        The filters are those of BookService.get_paginated(), plus the ids of
+        series, authors, genres and publishers: a book matches when it is in
+        any of the given series, by any of the given authors, of any of the
+        genres and from any of the publishers.
+
+        Raises:
+            ValueError: If no filter is given
+        """
+        conditions = book_filters(
+            filter_read, search, start_with, ends_with, exact_name
+        )
+        if series_ids:
+            conditions.append(
+                Book.id.in_(
+                    select(SeriesIndex.book_id).where(
+                        SeriesIndex.series_id.in_(series_ids)
+                    )
+                )
+            )
+        if author_ids:
+            conditions.append(
+                Book.id.in_(
+                    select(AuthorOrdering.book_id).where(
+                        AuthorOrdering.author_id.in_(author_ids)
+                    )
+                )
+            )
+        if genre_ids:
+            conditions.append(
+                Book.id.in_(
+                    select(book_genres.c.book_id).where(
+                        book_genres.c.genre_id.in_(genre_ids)
+                    )
+                )
+            )
+        if publisher_ids:
+            conditions.append(
+                Book.id.in_(
+                    select(book_publishers.c.book_id).where(
+                        book_publishers.c.publisher_id.in_(publisher_ids)
+                    )
+                )
+            )
+        # Changing the whole library is never what a forgotten filter meant
+        if not conditions:
+            raise ValueError("A bulk operation needs at least one filter")
+        # Written as "deleted = 0", the condition of the partial indexes
+        return select(Book.id).where(Book.deleted == false(), *conditions)
+
+    @staticmethod
+    @transactional
+    def apply(
+        operation: str,
+        filters: Dict[str, Any],
+        values: Optional[Dict[str, Any]] = None,
+        entity_id: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """
+        Apply an operation to every book matching the filters.
+
+        Args:
+            operation: One of BULK_OPERATIONS: "update" sets the values,
+                "delete" soft deletes the books, and "add_<kind>" and
+                "remove_<kind>" add the books to or remove them from the
+                genre, language or publisher with the entity ID
+            filters: The filters of the books, see _book_ids()
+            values: The column values set by "update", see UPDATABLE_COLUMNS
+            entity_id: The ID of the entity added or removed
+
+        Returns:
+            The number of books matching the filters ("books") and the number
+            of books or associations the operation changed ("changed")
+
+        Raises:
+            ValueError: If the operation, a filter or a value is invalid, or
+                the format or entity with the given ID is not found
+            SQLAlchemyError: If there's an error during database operations
+        """
+        if operation not in BULK_OPERATIONS:
+            raise ValueError(f"Unknown bulk operation: {operation}")
+        book_ids = BulkService._book_ids(**filters)
+        try:
+            logger.info(f"Applying bulk {operation} to books matching {filters}")
+            books = Session.scalar(
+                select(func.count()).select_from(book_ids.subquery())
+            )
+            if operation == "update":
+                changed = BulkService._update(book_ids, values or {})
+            elif operation == "delete":
+                changed = BulkService._update(book_ids, {"deleted": True})
+            else:
+                action, kind = operation.split("_", 1)
+                changed = BulkService._link(book_ids, kind, entity_id, action == "add")
+            logger.info(f"Bulk {operation} matched {books} books, changed {changed}")
+            return {"books": books, "changed": changed}
+        except SQLAlchemyError as e:
+            logger.error(f"Error applying bulk {operation}: {e}")
+            raise
+
+    @staticmethod
+    def _update(book_ids, values: Dict[str, Any]) -> int:
+        """
+        Set the values on the books, validated as for a single book.
+
+        Only books with a different value are updated, so unchanged books
+        keep their updated_at and fire no triggers.
+        """
+        unknown = set(values) - {*UPDATABLE_COLUMNS, "deleted"}
+        if unknown:
+            raise ValueError(
+                f"Cannot update book columns: {', '.join(sorted(unknown))}"
+            )
+        if not values:
+            raise ValueError("A bulk update needs at least one value")
+        validate_book_values(values)
+        if "format_id" in values and not Session.get(
+            Format, values["format_id"], execution_options={"include_deleted": True}
+        ):
+            raise ValueError(f"Format with ID {values['format_id']} not found")
+
+        statement = (
+            update(Book)
+            .where(
+                Book.id.in_(book_ids),
+                or_(
+                    *(getattr(Book, key).is_not(value) for key, value in values.items())
+                ),
+            )
+            .values(**values, updated_at=datetime.now())
+            # Books already loaded into the session get the new values
+            .execution_options(synchronize_session="fetch")
+        )
+        return Session.execute(statement).rowcount
+
+    @staticmethod
+    def _link(book_ids, kind: str, entity_id: Optional[int], add: bool) -> int:
+        """Add the books to or remove them from an entity, skipping no-ops."""
+        table, column, model = LINKS[kind]
+        entity = Session.get(model, entity_id) if entity_id else None
+        if not entity or entity.deleted:
+            raise ValueError(f"{model.__name__} with ID {entity_id} not found")
+
+        if add:
+            statement = (
+                insert(table)
+                .from_select(
+                    ["book_id", column],
+                    book_ids.add_columns(literal(entity.id)),
+                )
+                .on_conflict_do_nothing()
+            )
+        else:
+            statement = delete(table).where(
+                table.c[column] == entity.id, table.c.book_id.in_(book_ids)
+            )
+        return Session.execute(statement).rowcount
@@ -4,9 +4,10 @@ Format service for the Librium application.
 This module provides a service for interacting with the Format model.
 """
 
-from typing import List, Optional
+from typing import Iterable, List, Optional, Tuple
 
 from librium.database import Format, Session, transactional, read_only
+from librium.database.sqlalchemy.lookup import get_many_by_ids
 
 
 class FormatService:
@@ -24,7 +25,25 @@ class FormatService:
         Returns:
             The format if found, None otherwise
         """
-        return Session.get(Format, format_id)
+        return Session.get(
+            Format, format_id, execution_options={"include_deleted": True}
+        )
+
+    @staticmethod
+    @read_only
+    def get_many_by_ids(format_ids: Iterable[int]) -> Tuple[List[Format], List[int]]:
+        """
+        Get formats by their IDs, in a single query.
+
+        Args:
+            format_ids: The IDs of the formats
+
+        Returns:
+            A tuple containing:
+                - The formats found, in the order of the IDs
+                - The IDs that were not found
+        """
+        return get_many_by_ids(Session, Format, format_ids)
 
     @staticmethod
     @read_only
@@ -38,7 +57,9 @@ class FormatService:
         Returns:
             The format if found, None otherwise
         """
-        return Session.get(Format, {"name": name})
+        return Session.get(
+            Format, {"name": name}, execution_options={"include_deleted": True}
+        )
 
     @staticmethod
     @read_only
@@ -86,7 +107,9 @@ class FormatService:
         Returns:
             The updated format if found, None otherwise
         """
-        format_obj = Session.get(Format, format_id)
+        format_obj = Session.get(
+            Format, format_id, execution_options={"include_deleted": True}
+        )
         if not format_obj:
             return None
 
@@ -111,7 +134,9 @@ class FormatService:
         Returns:
             True if the format was deleted, False otherwise
         """
-        format_obj = Session.get(Format, format_id)
+        format_obj = Session.get(
+            Format, format_id, execution_options={"include_deleted": True}
+        )
         if not format_obj:
             return False
 
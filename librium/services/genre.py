@@ -4,13 +4,19 @@ Genre service for the Librium application.
 This module provides a service for interacting with the Genre model.
 """
 
-from typing import Any, List, Optional
+from typing import Any, Iterable, List, Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import bindparam, select
 from sqlalchemy.exc import SQLAlchemyError
 
 from librium.core.logging import get_logger
 from librium.database import Book, Genre, Session, transactional, read_only
+from librium.database.sqlalchemy.counts import cached_count
+from librium.database.sqlalchemy.db import book_genres
+from librium.database.sqlalchemy.lookup import get_many_by_ids
+from librium.database.sqlalchemy.pagination import paginate
+from librium.database.sqlalchemy.statements import cached_statement
+from librium.database.sqlalchemy.summaries import book_summaries, summary_columns
 
 # Get logger for this module
 logger = get_logger("services.genre")
@@ -31,11 +37,29 @@ class GenreService:
         Returns:
             The genre if found and not deleted, None otherwise
         """
-        genre = Session.get(Genre, genre_id)
+        genre = Session.get(
+            Genre, genre_id, execution_options={"include_deleted": True}
+        )
         if genre and not genre.deleted:
             return genre
         return None
 
+    @staticmethod
+    @read_only
+    def get_many_by_ids(genre_ids: Iterable[int]) -> Tuple[List[Genre], List[int]]:
+        """
+        Get genres by their IDs, in a single query.
+
+        Args:
+            genre_ids: The IDs of the genres
+
+        Returns:
+            A tuple containing:
+                - The genres found and not deleted, in the order of the IDs
+                - The IDs that were not found
+        """
+        return get_many_by_ids(Session, Genre, genre_ids, include_deleted=False)
+
     @staticmethod
     @read_only
     def get_by_name(name: str) -> Optional[Genre]:
@@ -48,11 +72,13 @@ class GenreService:
         Returns:
             The genre if found and not deleted, None otherwise
         """
-        return (
-            Session.query(Genre)
-            .where(Genre.name == name, Genre.deleted == False)
-            .one_or_none()
-        )
+        return Session.scalars(
+            cached_statement(
+                "genre.by_name",
+                lambda: select(Genre).where(Genre.name == bindparam("name")),
+            ),
+            {"name": name},
+        ).one_or_none()
 
     @staticmethod
     @read_only
@@ -63,12 +89,7 @@ class GenreService:
         Returns:
             A list of all genres that are not deleted
         """
-        return (
-            Session.query(Genre)
-            .filter(Genre.deleted == False)
-            .order_by(Genre.name)
-            .all()
-        )
+        return Session.query(Genre).order_by(Genre.name).all()
 
     @staticmethod
     @transactional
@@ -105,7 +126,9 @@ class GenreService:
         Returns:
             The updated genre if found, None otherwise
         """
-        genre_obj = Session.get(Genre, genre_id)
+        genre_obj = Session.get(
+            Genre, genre_id, execution_options={"include_deleted": True}
+        )
         if not genre_obj:
             return None
 
@@ -130,7 +153,9 @@ class GenreService:
         Returns:
             True if the genre was soft deleted, False otherwise
         """
-        genre_obj = Session.get(Genre, genre_id)
+        genre_obj = Session.get(
+            Genre, genre_id, execution_options={"include_deleted": True}
+        )
         if not genre_obj:
             return False
 
@@ -149,6 +174,7 @@ class GenreService:
         exact_name: Optional[str] = None,
         sort_by: str = "name",
         sort_order: str = "asc",
+        cursor: Optional[str] = None,
         **kwargs,
     ) -> tuple[List[Genre], int]:
         """
@@ -160,7 +186,7 @@ class GenreService:
                 f"Getting paginated genres (page={page}, page_size={page_size}, "
                 f"search={search}, start_with={start_with}, ends_with={ends_with}, exact_name={exact_name})"
             )
-            query = select(Genre).where(Genre.deleted.is_(False))
+            query = select(Genre)
 
             # Apply filters as in get_genres()
             if search:
@@ -174,23 +200,30 @@ class GenreService:
             if filter_read is not None:
                 query = query.join(Genre.books).where(Book.read.is_(filter_read))
 
-            from sqlalchemy import func
-
-            total_count = Session.scalar(
-                select(func.count()).select_from(query.subquery())
+            total_count = cached_count(
+                Session,
+                query,
+                "genre",
+                filter_read=filter_read,
+                search=search,
+                start_with=start_with,
+                ends_with=ends_with,
+                exact_name=exact_name,
             )
 
-            # Only 'name' is supported for sorting
-            order_attr = Genre.name
+            # Only 'name' is supported for sorting, ties broken by id
             logger.debug(f"Sorting by {sort_by} in {sort_order} order")
-            if sort_order.lower() == "desc":
-                query = query.order_by(order_attr.desc())
-            else:
-                query = query.order_by(order_attr.asc())
-
-            offset = (page - 1) * page_size
-            query = query.offset(offset).limit(page_size)
-            genres = Session.scalars(query).unique().all()
+            genres = paginate(
+                Session,
+                query,
+                Genre.name,
+                Genre.id,
+                "name",
+                descending=sort_order.lower() == "desc",
+                page=page,
+                page_size=page_size,
+                cursor=cursor,
+            )
             logger.debug(
                 f"Found {len(genres)} genres for page {page} (total: {total_count})"
             )
@@ -213,17 +246,15 @@ class GenreService:
             A list of books associated with the genre
         """
         logger.debug(f"Getting books for genre ID: {genre_id}")
-        genre = Session.get(Genre, genre_id)
+        genre = Session.get(
+            Genre, genre_id, execution_options={"include_deleted": True}
+        )
         if not genre or genre.deleted:
             logger.debug(f"Genre with ID {genre_id} not found or is deleted")
             return []
 
         # Build base selector for books in this genre, excluding deleted
-        selector = (
-            select(Book)
-            .where(Book.genres.contains(genre))
-            .where(Book.deleted.is_(False))
-        )
+        selector = select(Book).where(Book.genres.contains(genre))
         # Apply read filter only if explicitly provided
         if read is not None:
             selector = selector.where(Book.read.is_(read))
@@ -248,26 +279,36 @@ class GenreService:
         Returns:
             A list of books associated with the genre
         """
-        books = []
-        for book in GenreService.get_books_in_genre(genre_id, read):
-            book_info = {
+        genre = Session.get(
+            Genre, genre_id, execution_options={"include_deleted": True}
+        )
+        if not genre or genre.deleted:
+            logger.debug(f"Genre with ID {genre_id} not found or is deleted")
+            return []
+
+        selector = (
+            select(*summary_columns("list"))
+            .join(book_genres, book_genres.c.book_id == Book.id)
+            .where(book_genres.c.genre_id == genre_id)
+        )
+        if read is not None:
+            selector = selector.where(Book.read.is_(read))
+
+        books = [
+            {
                 "name": book.title,
                 "id": book.id,
                 "uuid": book.uuid,
-                "authors": [],
-                "series": [],
+                "authors": [
+                    {"name": a.name, "id": a.id, "idx": a.idx} for a in book.authors
+                ],
+                "series": [
+                    {"name": s.name, "id": s.id, "idx": s.idx} for s in book.series
+                ],
                 "released": book.released,
             }
-            for s in book.series:
-                book_info["series"].append(
-                    {"name": s.series.name, "id": s.series.id, "idx": s.idx}
-                )
-            for a in book.authors:
-                book_info["authors"].append(
-                    {"name": a.author.name, "id": a.author.id, "idx": a.idx}
-                )
-            book_info["authors"].sort(key=lambda x: x["idx"])
-            books.append(book_info)
+            for book in book_summaries(Session, Session.execute(selector).all())
+        ]
         try:
             books.sort(
                 key=lambda x: (
@@ -4,9 +4,10 @@ Language service for the Librium application.
 This module provides a service for interacting with the Language model.
 """
 
-from typing import List, Optional
+from typing import Iterable, List, Optional, Tuple
 
 from librium.database import Language, Session, transactional, read_only
+from librium.database.sqlalchemy.lookup import get_many_by_ids
 
 
 class LanguageService:
@@ -24,7 +25,27 @@ class LanguageService:
         Returns:
             The language if found, None otherwise
         """
-        return Session.get(Language, language_id)
+        return Session.get(
+            Language, language_id, execution_options={"include_deleted": True}
+        )
+
+    @staticmethod
+    @read_only
+    def get_many_by_ids(
+        language_ids: Iterable[int],
+    ) -> Tuple[List[Language], List[int]]:
+        """
+        Get languages by their IDs, in a single query.
+
+        Args:
+            language_ids: The IDs of the languages
+
+        Returns:
+            A tuple containing:
+                - The languages found, in the order of the IDs
+                - The IDs that were not found
+        """
+        return get_many_by_ids(Session, Language, language_ids)
 
     @staticmethod
     @read_only
@@ -38,7 +59,9 @@ class LanguageService:
         Returns:
             The language if found, None otherwise
         """
-        return Session.get(Language, {"name": name})
+        return Session.get(
+            Language, {"name": name}, execution_options={"include_deleted": True}
+        )
 
     @staticmethod
     @read_only
@@ -86,7 +109,9 @@ class LanguageService:
         Returns:
             The updated language if found, None otherwise
         """
-        language_obj = Session.get(Language, language_id)
+        language_obj = Session.get(
+            Language, language_id, execution_options={"include_deleted": True}
+        )
         if not language_obj:
             return None
 
@@ -111,7 +136,9 @@ class LanguageService:
         Returns:
             True if the language was deleted, False otherwise
         """
-        language_obj = Session.get(Language, language_id)
+        language_obj = Session.get(
+            Language, language_id, execution_options={"include_deleted": True}
+        )
         if not language_obj:
             return False
 
@@ -4,9 +4,13 @@ Publisher service for the Librium application.
 This module provides a service for interacting with the Publisher model.
 """
 
-from typing import List, Optional
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select
 
 from librium.database import Publisher, Session, transactional, read_only
+from librium.database.sqlalchemy.lookup import get_many_by_ids
+from librium.database.sqlalchemy.statements import cached_statement
 
 
 class PublisherService:
@@ -24,7 +28,27 @@ class PublisherService:
         Returns:
             The publisher if found, None otherwise
         """
-        return Session.get(Publisher, publisher_id)
+        return Session.get(
+            Publisher, publisher_id, execution_options={"include_deleted": True}
+        )
+
+    @staticmethod
+    @read_only
+    def get_many_by_ids(
+        publisher_ids: Iterable[int],
+    ) -> Tuple[List[Publisher], List[int]]:
+        """
+        Get publishers by their IDs, in a single query.
+
+        Args:
+            publisher_ids: The IDs of the publishers
+
+        Returns:
+            A tuple containing:
+                - The publishers found, in the order of the IDs
+                - The IDs that were not found
+        """
+        return get_many_by_ids(Session, Publisher, publisher_ids)
 
     @staticmethod
     @read_only
@@ -38,7 +62,13 @@ class PublisherService:
         Returns:
             The publisher if found, None otherwise
         """
-        return Session.query(Publisher).where(Publisher.name == name).one_or_none()
+        return Session.scalars(
+            cached_statement(
+                "publisher.by_name",
+                lambda: select(Publisher).where(Publisher.name == bindparam("name")),
+            ),
+            {"name": name},
+        ).one_or_none()
 
     @staticmethod
     @read_only
@@ -86,7 +116,9 @@ class PublisherService:
         Returns:
             The updated publisher if found, None otherwise
         """
-        publisher = Session.get(Publisher, publisher_id)
+        publisher = Session.get(
+            Publisher, publisher_id, execution_options={"include_deleted": True}
+        )
         if not publisher:
             return None
 
@@ -111,7 +143,9 @@ class PublisherService:
         Returns:
             True if the publisher was deleted, False otherwise
         """
-        publisher = Session.get(Publisher, publisher_id)
+        publisher = Session.get(
+            Publisher, publisher_id, execution_options={"include_deleted": True}
+        )
         if not publisher:
             return False
 
@@ -4,7 +4,7 @@ Series service for the Librium application.
 This module provides a service for interacting with the Series model.
 """
 
-from typing import Any, List, Optional
+from typing import Any, Iterable, List, Optional, Tuple
 
 from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
@@ -18,6 +18,9 @@ from librium.database import (
     read_only,
     transactional,
 )
+from librium.database.sqlalchemy.counts import cached_count
+from librium.database.sqlalchemy.lookup import get_many_by_ids
+from librium.database.sqlalchemy.pagination import paginate
 
 
 class SeriesService:
@@ -35,7 +38,25 @@ class SeriesService:
         Returns:
             The series if found, None otherwise
         """
-        return Session.get(Series, series_id)
+        return Session.get(
+            Series, series_id, execution_options={"include_deleted": True}
+        )
+
+    @staticmethod
+    @read_only
+    def get_many_by_ids(series_ids: Iterable[int]) -> Tuple[List[Series], List[int]]:
+        """
+        Get series by their IDs, in a single query.
+
+        Args:
+            series_ids: The IDs of the series
+
+        Returns:
+            A tuple containing:
+                - The series found, in the order of the IDs
+                - The IDs that were not found
+        """
+        return get_many_by_ids(Session, Series, series_ids)
 
     @staticmethod
     @read_only
@@ -78,7 +99,9 @@ class SeriesService:
         Returns:
             The updated series if found, None otherwise
         """
-        series = Session.get(Series, series_id)
+        series = Session.get(
+            Series, series_id, execution_options={"include_deleted": True}
+        )
         if not series:
             return None
 
@@ -100,7 +123,9 @@ class SeriesService:
         Returns:
             True if the series was deleted, False otherwise
         """
-        series = Session.get(Series, series_id)
+        series = Session.get(
+            Series, series_id, execution_options={"include_deleted": True}
+        )
         if not series:
             return False
 
@@ -123,8 +148,10 @@ class SeriesService:
         Returns:
             The created SeriesIndex if successful, None otherwise
         """
-        book = Session.get(Book, book_id)
-        series = Session.get(Series, series_id)
+        book = Session.get(Book, book_id, execution_options={"include_deleted": True})
+        series = Session.get(
+            Series, series_id, execution_options={"include_deleted": True}
+        )
 
         if not book or not series:
             return None
@@ -154,8 +181,10 @@ class SeriesService:
         Returns:
             True if the book was removed, False otherwise
         """
-        book = Session.get(Book, book_id)
-        series = Session.get(Series, series_id)
+        book = Session.get(Book, book_id, execution_options={"include_deleted": True})
+        series = Session.get(
+            Series, series_id, execution_options={"include_deleted": True}
+        )
 
         if not book or not series:
             return False
@@ -179,6 +208,7 @@ class SeriesService:
         exact_name: Optional[str] = None,
         sort_by: str = "name",
         sort_order: str = "asc",
+        cursor: Optional[str] = None,
         **kwargs,
     ) -> tuple[List[Series], int]:
         """
@@ -190,7 +220,7 @@ class SeriesService:
                 f"Getting paginated genres (page={page}, page_size={page_size}, "
                 f"search={search}, start_with={start_with}, ends_with={ends_with}, exact_name={exact_name})"
             )
-            query = select(Series).where(Series.deleted.is_(False))
+            query = select(Series)
 
             # Apply filters as in get_genres()
             if search:
@@ -205,23 +235,30 @@ class SeriesService:
             if filter_read is not None:
                 query = query.join(Series.books).where(Book.read.is_(filter_read))
 
-            from sqlalchemy import func
-
-            total_count = Session.scalar(
-                select(func.count()).select_from(query.subquery())
+            total_count = cached_count(
+                Session,
+                query,
+                "series",
+                filter_read=filter_read,
+                search=search,
+                start_with=start_with,
+                ends_with=ends_with,
+                exact_name=exact_name,
             )
 
-            # Only 'name' is supported for sorting
-            order_attr = Series.name
+            # Only 'name' is supported for sorting, ties broken by id
             logger.debug(f"Sorting by {sort_by} in {sort_order} order")
-            if sort_order.lower() == "desc":
-                query = query.order_by(order_attr.desc())
-            else:
-                query = query.order_by(order_attr.asc())
-
-            offset = (page - 1) * page_size
-            query = query.offset(offset).limit(page_size)
-            genres = Session.scalars(query).unique().all()
+            genres = paginate(
+                Session,
+                query,
+                Series.name,
+                Series.id,
+                "name",
+                descending=sort_order.lower() == "desc",
+                page=page,
+                page_size=page_size,
+                cursor=cursor,
+            )
             logger.debug(
                 f"Found {len(genres)} genres for page {page} (total: {total_count})"
             )
@@ -243,14 +280,14 @@ class SeriesService:
         Returns:
             A list of books in the series
         """
-        series = Session.get(Series, series_id)
+        series = Session.get(
+            Series, series_id, execution_options={"include_deleted": True}
+        )
         if not series:
             return []
 
-        query = (
-            Session.query(Book)
-            .filter(Book.id.in_([b.book.id for b in series.books]))
-            .filter(Book.deleted.is_(False))
+        query = Session.query(Book).filter(
+            Book.id.in_([b.book.id for b in series.books])
         )
         if read is not None:
             query = query.filter(Book.read.is_(read))
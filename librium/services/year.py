@@ -11,6 +11,7 @@ from sqlalchemy.exc import SQLAlchemyError
 
 from librium.core.logging import get_logger
 from librium.database import Book, Session, read_only
+from librium.database.sqlalchemy.counts import cached_count
 
 # Get logger for this module
 logger = get_logger("services.year")
@@ -31,10 +32,13 @@ class YearService:
         exact_name: Optional[str] = None,
         sort_by: str = "released",
         sort_order: str = "asc",
+        **kwargs,
     ) -> tuple[List[Book], int]:
         """
         Get a paginated list of non-deleted books with optional filtering and sorting.
 
+        Years are few, so they are paged by number; cursors are ignored.
+
         Args:
             page: The page number (1-indexed)
             page_size: The number of items per page
@@ -73,13 +77,11 @@ class YearService:
             ]
 
             # Build the base query
-            query = (
-                select(Book)
-                .where(Book.deleted.is_(False))
-                .where(Book.released.in_(years))
-            )
+            query = select(Book).where(Book.released.in_(years))
 
-            total_count = len(Session.scalars(query).unique().all())
+            total_count = cached_count(
+                Session, query, "year", page=page, page_size=page_size
+            )
 
             # Apply sorting
             order_attr = Book.title
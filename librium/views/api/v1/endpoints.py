@@ -15,16 +15,20 @@ from webargs.flaskparser import use_args, use_kwargs
 
 from librium.core.limit import limiter
 from librium.core.logging import get_logger
+from librium.core.metrics import metrics
+from librium.database import engine, memory_replica, read_engine
 from librium.database.backup import (
     create_backup,
     delete_backup,
     list_backups,
     restore_from_backup,
 )
+from librium.database.sqlalchemy.pagination import InvalidCursorError
 from librium.services import (
     AuthenticationService,
     AuthorService,
     BookService,
+    BulkService,
     GenreService,
     LanguageService,
     PublisherService,
@@ -45,6 +49,7 @@ from librium.views.api.v1.schemas import (
     BackupDeleteSchema,
     BackupRestoreSchema,
     BookIdSchema,
+    BooksBulkSchema,
     BooksQuerySchema,
     CoverFileSchema,
     CoverSchema,
@@ -535,23 +540,44 @@ def books(args):
     logger.info(f"GET /api/v1/books called with args: {args}")
 
     try:
-        # Get books using the BookService
-        books, total_count = BookService.get_paginated(
-            page=args.get("page", 1),
-            page_size=args.get("page_size", 30),
-            filter_read=args.get("read"),
-            search=args.get("search"),
-            start_with=args.get("start_with"),
-            sort_by=args.get("sort_by", "title"),
-            sort_order=args.get("sort_order", "asc"),
+        sort_by = args.get("sort_by") or (
+            "relevance" if args.get("search") else "title"
         )
 
+        # Get books using the BookService
+        if args.get("search") and not args.get("start_with"):
+            if args.get("cursor"):
+                return bad_request("Search results are paged by page number only")
+            books, total_count = BookService.search(
+                args["search"],
+                page=args.get("page", 1),
+                page_size=args.get("page_size", 30),
+                filter_read=args.get("read"),
+                sort_by=sort_by,
+                sort_order=args.get("sort_order", "asc"),
+                loading="api",
+                summaries=True,
+            )
+        else:
+            books, total_count = BookService.get_paginated(
+                page=args.get("page", 1),
+                page_size=args.get("page_size", 30),
+                filter_read=args.get("read"),
+                search=args.get("search"),
+                start_with=args.get("start_with"),
+                sort_by=sort_by,
+                sort_order=args.get("sort_order", "asc"),
+                loading="api",
+                cursor=args.get("cursor"),
+                summaries=True,
+            )
+
         # Calculate pagination information
         total_pages = (total_count + args.get("page_size", 30) - 1) // args.get(
             "page_size", 30
         )
 
-        # Convert books to dictionaries
+        # Convert the books' read models to dictionaries
         book_dicts = []
         for book in books:
             book_dict = {
@@ -569,15 +595,12 @@ def books(args):
                     if book.format
                     else None
                 ),
-                "authors": [
-                    {"id": a.author.id, "name": a.author.name} for a in book.authors
-                ],
+                "authors": [{"id": a.id, "name": a.name} for a in book.authors],
                 "genres": [{"id": g.id, "name": g.name} for g in book.genres],
                 "publishers": [{"id": p.id, "name": p.name} for p in book.publishers],
                 "languages": [{"id": l.id, "name": l.name} for l in book.languages],
                 "series": [
-                    {"id": s.series.id, "name": s.series.name, "index": s.index}
-                    for s in book.series
+                    {"id": s.id, "name": s.name, "index": s.index} for s in book.series
                 ],
                 "created_at": book.created_at.isoformat() if book.created_at else None,
                 "updated_at": book.updated_at.isoformat() if book.updated_at else None,
@@ -593,6 +616,8 @@ def books(args):
                     "page_size": args.get("page_size", 30),
                     "total_items": total_count,
                     "total_pages": total_pages,
+                    "next_cursor": getattr(books, "next_cursor", None),
+                    "prev_cursor": getattr(books, "prev_cursor", None),
                 },
                 "filters": {
                     "read": args.get("read"),
@@ -600,16 +625,54 @@ def books(args):
                     "start_with": args.get("start_with"),
                 },
                 "sorting": {
-                    "sort_by": args.get("sort_by", "title"),
+                    "sort_by": sort_by,
                     "sort_order": args.get("sort_order", "asc"),
                 },
             }
         )
+    except InvalidCursorError as e:
+        logger.warning(f"Invalid cursor for GET /api/v1/books: {e}")
+        return bad_request(str(e))
     except Exception as e:
         logger.exception(f"Error getting books: {e}")
         return internal_server_error(f"Error getting books: {str(e)}")
 
 
+@bp.route("/books/bulk", methods=["POST"])
+@jwt_required()
+@use_args(BooksBulkSchema, location="json")
+def books_bulk(args):
+    """
+    Apply an operation to every book matching a filter at once.
+
+    Args:
+        args: The validated request arguments containing the operation, the
+            filter of the books, and the values or entity ID of the operation
+
+    Returns:
+        JSON response with the number of matching and changed books
+    """
+    logger.info(f"POST /api/v1/books/bulk called with args: {args}")
+
+    filters = dict(args["filter"])
+    if "read" in filters:
+        filters["filter_read"] = filters.pop("read")
+    try:
+        counts = BulkService.apply(
+            args["operation"],
+            filters,
+            values=args.get("values"),
+            entity_id=args.get("id"),
+        )
+        return jsonify({"operation": args["operation"], **counts})
+    except ValueError as e:
+        logger.warning(f"Invalid bulk operation: {e}")
+        return bad_request(str(e))
+    except Exception as e:
+        logger.exception(f"Error applying bulk operation: {e}")
+        return internal_server_error(f"Error applying bulk operation: {str(e)}")
+
+
 # Authentication endpoints
 @bp.route("/auth/token", methods=["POST"])
 @limiter.limit(
@@ -644,6 +707,33 @@ def protected():
     return jsonify(msg="You are authenticated!"), 200
 
 
+@bp.route("/metrics")
+@limiter.exempt
+@jwt_required()
+def get_metrics():
+    """
+    Get the in-process metrics, including session routing, pool usage and the
+    staleness of the in-memory replica.
+
+    Returns:
+        JSON response with counters, gauges and timings
+    """
+    for name, pool_engine in (("writer", engine), ("reader", read_engine)):
+        metrics.set_gauge(f"pool.{name}.size", pool_engine.pool.size())
+        metrics.set_gauge(f"pool.{name}.checked_out", pool_engine.pool.checkedout())
+        metrics.set_gauge(f"pool.{name}.overflow", max(pool_engine.pool.overflow(), 0))
+        metrics.set_gauge(
+            f"queries.compiled_cache.{name}.size",
+            len(pool_engine._compiled_cache or ()),
+        )
+    if memory_replica is not None:
+        staleness = memory_replica.staleness()
+        metrics.set_gauge("replica.generation", staleness["generation"])
+        metrics.set_gauge("replica.stale", int(staleness["stale"]))
+        metrics.set_gauge("replica.lag_seconds", staleness["lag_seconds"])
+    return jsonify(metrics.snapshot())
+
+
 # Error handlers for API
 @bp.app_errorhandler(404)
 def api_not_found(error):
@@ -5,7 +5,9 @@ This module provides validation schemas for the API endpoints.
 """
 
 from marshmallow import Schema, validate, EXCLUDE
-from marshmallow.fields import Boolean, Integer, Raw, String
+from marshmallow.fields import Boolean, Decimal, Integer, List, Nested, Raw, String
+
+from librium.services.bulk import BULK_OPERATIONS
 
 
 class EntitySchema(Schema):
@@ -120,13 +122,13 @@ class BooksQuerySchema(Schema):
     read = Boolean(required=False)
     search = String(required=False)
     start_with = String(required=False)
+    # Defaults to "relevance" when searching and to "title" otherwise
     sort_by = String(
         required=False,
         validate=validate.OneOf(
-            ["title", "released", "price", "page_count", "read"],
-            error="Sort field must be one of: title, released, price, page_count, read",
+            ["relevance", "title", "released", "price", "page_count", "read"],
+            error="Sort field must be one of: relevance, title, released, price, page_count, read",
         ),
-        load_default="title",
     )
     sort_order = String(
         required=False,
@@ -135,3 +137,46 @@ class BooksQuerySchema(Schema):
         ),
         load_default="asc",
     )
+    # Opaque cursor from a previous response; takes precedence over page
+    cursor = String(required=False)
+
+
+class BookFilterSchema(Schema):
+    """Schema for validating the filter of a bulk book operation."""
+
+    read = Boolean(required=False)
+    search = String(required=False)
+    start_with = String(required=False)
+    ends_with = String(required=False)
+    exact_name = String(required=False)
+    series_ids = List(Integer(validate=validate.Range(min=1)), required=False)
+    author_ids = List(Integer(validate=validate.Range(min=1)), required=False)
+    genre_ids = List(Integer(validate=validate.Range(min=1)), required=False)
+    publisher_ids = List(Integer(validate=validate.Range(min=1)), required=False)
+
+
+class BookValuesSchema(Schema):
+    """Schema for validating the values set by a bulk book update."""
+
+    read = Boolean(required=False)
+    format_id = Integer(required=False, validate=validate.Range(min=1))
+    released = Integer(required=False, allow_none=True)
+    price = Decimal(required=False, allow_none=True, places=2)
+    page_count = Integer(required=False, allow_none=True)
+
+
+class BooksBulkSchema(Schema):
+    """Schema for validating bulk book operation requests."""
+
+    operation = String(
+        required=True,
+        validate=validate.OneOf(
+            BULK_OPERATIONS,
+            error=f"Operation must be one of: {', '.join(BULK_OPERATIONS)}",
+        ),
+    )
+    filter = Nested(BookFilterSchema, required=True)
+    # The values of an update
+    values = Nested(BookValuesSchema, required=False)
+    # The genre, language or publisher books are added to or removed from
+    id = Integer(required=False, validate=validate.Range(min=1))
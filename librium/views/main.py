@@ -1,7 +1,8 @@
 from flask import Blueprint, redirect, render_template, request, url_for
-from marshmallow import Schema, fields
+from marshmallow import Schema, fields, validate
 from webargs.flaskparser import use_args
 
+from librium.services.book import PROBLEMS
 from librium.views.views import (
     get_authors,
     get_books,
@@ -9,6 +10,7 @@ from librium.views.views import (
     get_series,
     get_years,
 )
+from librium.views.views.utils import paginate, pagesize
 
 bp = Blueprint("main", __name__)
 
@@ -20,8 +22,10 @@ class UserArgs(Schema):
     id = fields.Integer()
     name = fields.String()
     search = fields.String()
+    ranked = fields.Boolean()
     sort_by = fields.String()
     sort_order = fields.String(load_default="asc")
+    cursor = fields.String()
 
 
 @bp.route("/")
@@ -77,13 +81,29 @@ def statistics():
 
 
 @bp.route("/problems")
-def problems():
-    from librium.core.app import cache
+@use_args(
+    {
+        "problem": fields.String(validate=validate.OneOf(PROBLEMS)),
+        "page": fields.Integer(load_default=1, validate=validate.Range(min=1)),
+    },
+    location="query",
+)
+def problems(args):
     from librium.services import BookService
 
-    @cache.cached(timeout=600)
-    def get_cached_problems():
-        return BookService.get_problems()
-
-    problems = get_cached_problems()
-    return render_template("main/problems.html", **problems)
+    # The summary is counted in one pass; only the chosen problem's books
+    # are loaded, one page at a time
+    counts = BookService.get_problem_counts()
+    books, pagination = [], 0
+    if args.get("problem"):
+        books, total = BookService.get_problem_books(
+            args["problem"], page=args["page"], page_size=pagesize
+        )
+        pagination = paginate(total)
+    return render_template(
+        "main/problems.html",
+        counts=counts,
+        problem=args.get("problem"),
+        books=books,
+        pagination=pagination,
+    )
@@ -1,6 +1,8 @@
+from functools import partial
 from math import ceil
 from typing import Any, Iterable, TypeVar
 
+from librium.database.sqlalchemy.pagination import InvalidCursorError
 from librium.services import (
     BookService,
     GenreService,
@@ -20,6 +22,21 @@ T = TypeVar("T")
 pagesize = 30
 
 
+class Pagination(int):
+    """
+    The number of pages, with the cursors of the pages around the current one.
+
+    Templates use it as the page count; ``next_cursor`` and ``prev_cursor``
+    are None where there is no such page or the items are not cursor-paged.
+    """
+
+    def __new__(cls, pages: int, next_cursor=None, prev_cursor=None):
+        pagination = super().__new__(cls, pages)
+        pagination.next_cursor = next_cursor
+        pagination.prev_cursor = prev_cursor
+        return pagination
+
+
 def paginate(length: int) -> int:
     return ceil(length / pagesize)
 
@@ -58,8 +75,12 @@ def get_raw(
 ) -> tuple[list | dict[str, list] | None, int]:
     # Handle direct ID lookup first
     if arguments.get("id"):
-        item = service.get_by_id(arguments["id"])
-        paginated_items = [item] if item else []
+        if service == BookService:
+            # Book lists render the read models, see below
+            paginated_items = BookService.get_summaries([arguments["id"]])
+        else:
+            item = service.get_by_id(arguments["id"])
+            paginated_items = [item] if item else []
         length = len(paginated_items)
         return paginated_items, paginate(length)
 
@@ -74,7 +95,9 @@ def get_raw(
     # Determine search filter
     search = arguments.get("search")
 
-    # Determine match position for search: any (default), start, end
+    # Determine match position for search: any (default), start, end. "any"
+    # matches the search anywhere in the title, unless a ranked search of
+    # whole words is asked for with "ranked"
     position = (arguments.get("position") or "any").lower()
     start_with = None
     ends_with = None
@@ -94,6 +117,9 @@ def get_raw(
     sort_by = arguments.get("sort_by", "title")
     sort_order = arguments.get("sort_order", "asc")
 
+    # A cursor from a previous page takes precedence over the page number
+    cursor = arguments.get("cursor")
+
     pagesize = get_pagesize(service)
 
     if (
@@ -103,19 +129,53 @@ def get_raw(
         or service == YearService
         or service.__name__ == "AuthorService"
     ):
-        # Get paginated items via service
-        paginated_items, total_count = service.get_paginated(
-            page=page,
-            page_size=pagesize,
-            filter_read=read_filter,
-            search=search,
-            start_with=start_with,
-            ends_with=ends_with,
-            exact_name=exact_name,
-            sort_by=sort_by,
-            sort_order=sort_order,
+        if (
+            service == BookService
+            and search
+            and arguments.get("ranked")
+            and position == "any"
+            and not (start_with or exact_name)
+        ):
+            # Ranked full-text search over titles, authors, series and more
+            paginated_items, total_count = BookService.search(
+                search,
+                page=page,
+                page_size=pagesize,
+                filter_read=read_filter,
+                sort_by=arguments.get("sort_by", "relevance"),
+                sort_order=sort_order,
+                summaries=True,
+            )
+        else:
+            # Get paginated items via service
+            get_page = partial(
+                service.get_paginated,
+                page=page,
+                page_size=pagesize,
+                filter_read=read_filter,
+                search=search,
+                start_with=start_with,
+                ends_with=ends_with,
+                exact_name=exact_name,
+                sort_by=sort_by,
+                sort_order=sort_order,
+                # Unfiltered book listings take their total from the counters
+                approximate_count=True,
+            )
+            if service == BookService:
+                # Book lists render BookSummary read models, not ORM books
+                get_page = partial(get_page, summaries=True)
+            try:
+                paginated_items, total_count = get_page(cursor=cursor)
+            except InvalidCursorError:
+                # A stale cursor, e.g. kept in the URL after changing the
+                # sort order, falls back to the page number
+                paginated_items, total_count = get_page()
+        paginated_length = Pagination(
+            ceil(total_count / pagesize),
+            getattr(paginated_items, "next_cursor", None),
+            getattr(paginated_items, "prev_cursor", None),
         )
-        paginated_length = ceil(total_count / pagesize)
         if service == GenreService:
             paginated_items = {
                 key.name: GenreService.get_books_in_genre_formatted(key.id, read_filter)
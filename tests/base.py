@@ -0,0 +1,60 @@
+"""
+Base classes for tests that run against a SQLite database file.
+"""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from librium.database import Base
+
+
+class FileDatabaseTestCase(unittest.TestCase):
+    """Base class for tests that need a SQLite file rather than :memory:."""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.directory = Path(self.tempdir.name)
+        self.path = self.directory / "librium.sqlite"
+
+
+class DatabaseTestCase(FileDatabaseTestCase):
+    """
+    Base class for tests on a database file with the full schema.
+
+    Each test gets ``self.engine`` and a ``self.Session`` registry bound to it,
+    which :meth:`patch_sessions` puts in place of the global ``Session``.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.engine = self.create_engine()
+        Base.metadata.create_all(self.engine)
+        self.Session = scoped_session(sessionmaker(bind=self.engine))
+        self.addCleanup(self._close_database)
+
+    def _close_database(self):
+        # Tests may have swapped in an engine of their own
+        self.Session.remove()
+        self.engine.dispose()
+
+    def create_engine(self) -> Engine:
+        return create_engine(f"sqlite:///{self.path}")
+
+    def patch_sessions(self, *modules: str) -> None:
+        """
+        Replace the global ``Session`` of each module for the rest of the test.
+
+        Args:
+            modules: The dotted names of the modules
+        """
+        for module in modules:
+            patcher = patch(f"{module}.Session", self.Session)
+            patcher.start()
+            self.addCleanup(patcher.stop)
@@ -0,0 +1,129 @@
+"""
+Tests for the NumPy statistics of the library.
+"""
+
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+
+from flask import Flask
+
+from librium.core import inflation
+from librium.core.app import configure_statistics
+from librium.core.inflation import InflationService
+from librium.core.metrics import metrics
+from librium.database import Book, Format, Genre
+from librium.database.sqlalchemy import analytics
+from librium.services import BookService
+from tests.base import DatabaseTestCase
+
+
+@unittest.skipIf(analytics.np is None, "NumPy is not installed")
+class TestAnalytics(DatabaseTestCase):
+    """Tests for computing the statistics from a snapshot of the library."""
+
+    def setUp(self):
+        super().setUp()
+        session = self.Session()
+
+        paperback = Format(name="Paperback")
+        hardcover = Format(name="Hardcover")
+        fantasy = Genre(name="Fantasy")
+        horror = Genre(name="Horror")
+        for i in range(8):
+            session.add(
+                Book(
+                    title=f"Book {i}",
+                    format=paperback if i % 2 else hardcover,
+                    read=i < 3,
+                    released=1995 + i * 3 if i < 6 else None,
+                    price=Decimal(i * 5) if i != 1 else None,
+                    page_count=120 * i or None,
+                    genres=[fantasy] if i < 5 else [fantasy, horror],
+                )
+            )
+        session.add(
+            Book(title="Deleted", format=paperback, genres=[horror], deleted=True)
+        )
+        session.commit()
+        self.Session.remove()
+
+        analytics.snapshot_cache.clear()
+        metrics.reset()
+        self.patch_sessions("librium.services.book")
+
+    def statistics(self, available=True):
+        with Flask(__name__).app_context(), patch(
+            "librium.core.inflation.InflationService.get_inflation_factors",
+            return_value={},
+        ), patch.object(analytics, "available", return_value=available):
+            return BookService.get_statistics()
+
+    def test_matches_materialized(self):
+        """Test that the snapshot gives the materialized statistics."""
+        snapshot = self.statistics()
+        materialized = self.statistics(available=False)
+        for key, value in materialized.items():
+            with self.subTest(key=key):
+                self.assertEqual(snapshot[key], value)
+        self.assertEqual(snapshot["books_per_genre"], {"Fantasy": 8, "Horror": 3})
+
+    def test_analytics(self):
+        """Test the statistics the materialized buckets do not cover."""
+        stats = self.statistics()
+        self.assertEqual(
+            stats["price_percentiles"],
+            {10: 6.0, 25: 12.5, 50: 20.0, 75: 27.5, 90: 32.0},
+        )
+        self.assertEqual(
+            stats["books_per_page_count"],
+            {0: 0, 100: 1, 200: 1, 300: 1, 400: 1, 500: 0, 600: 1, 700: 1, 800: 1},
+        )
+        # 1995, 1998 | 2001, 2004, 2007 | 2010
+        self.assertEqual(
+            stats["read_ratio_per_decade"], {1990: 1.0, 2000: 0.3333, 2010: 0.0}
+        )
+        self.assertNotIn("price_percentiles", self.statistics(available=False))
+
+    def test_snapshot_reloaded_on_change(self):
+        """Test that the snapshot is kept until the library changes."""
+        self.statistics()
+        self.statistics()
+        self.assertEqual(metrics.counter("analytics.snapshot.miss"), 1)
+        self.assertEqual(metrics.counter("analytics.snapshot.hit"), 1)
+
+        session = self.Session()
+        session.get(Book, 1).read = False
+        session.commit()
+        self.assertEqual(self.statistics()["_read_books"], 2)
+        self.assertEqual(metrics.counter("analytics.snapshot.miss"), 2)
+
+    def test_empty_library(self):
+        """Test that an empty library has empty statistics."""
+        snapshot = analytics.LibrarySnapshot(1, [], [])
+        stats = analytics.compute_statistics(snapshot, {}, {})
+        self.assertEqual(stats["_total_books"], 0)
+        self.assertEqual(stats["books_per_year"], {})
+        self.assertEqual(stats["price_percentiles"], {})
+        self.assertEqual(stats["read_ratio_per_decade"], {})
+
+    def test_numpy_missing(self):
+        """Test that a numpy backend without NumPy warns and falls back."""
+        app = Flask(__name__)
+        app.config["STATISTICS_BACKEND"] = "numpy"
+        with patch.object(analytics, "np", None):
+            with self.assertLogs("librium.core.app", level="WARNING"):
+                configure_statistics(app)
+            self.assertFalse(analytics.available())
+
+    def test_inflation_factors(self):
+        """Test that the cumulative product gives the factors of the loop."""
+        rates = {year: (year % 7) * 1.3 - 2 for year in range(1960, 2031)}
+        with patch.object(InflationService, "get_inflation_data", return_value=rates):
+            factors = InflationService.get_inflation_factors("USD")
+            with patch.object(inflation, "np", None):
+                self.assertEqual(InflationService.get_inflation_factors("USD"), factors)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -13,7 +13,15 @@ from flask_jwt_extended import JWTManager, create_access_token
 from werkzeug.datastructures import FileStorage
 
 from librium.database import Language
-from librium.database.sqlalchemy.db import Author, Base, Genre, Publisher, Series
+from librium.database.sqlalchemy.db import (
+    Author,
+    Base,
+    Book,
+    Genre,
+    Publisher,
+    Series,
+)
+from librium.database.sqlalchemy.pagination import InvalidCursorError, Page
 from librium.views.api.v1 import bp as api_bp
 
 
@@ -166,6 +174,73 @@ class TestAPIEndpoints(TestAPIBase):
         self.assertEqual(response.status_code, 200)
         mock_service.delete.assert_called_once_with(1)
 
+    @patch("librium.views.api.v1.endpoints.BulkService")
+    def test_books_bulk(self, mock_service):
+        """Test applying an operation to a filtered set of books."""
+        mock_service.apply.return_value = {"books": 3, "changed": 2}
+
+        response = self.client.post(
+            "/api/v1/books/bulk",
+            json={
+                "operation": "update",
+                "filter": {"series_ids": [4], "publisher_ids": [2], "read": False},
+                "values": {"read": True},
+            },
+            headers=self.auth_headers,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data, {"operation": "update", "books": 3, "changed": 2})
+        mock_service.apply.assert_called_once_with(
+            "update",
+            {"series_ids": [4], "publisher_ids": [2], "filter_read": False},
+            values={"read": True},
+            entity_id=None,
+        )
+
+    @patch("librium.views.api.v1.endpoints.BulkService")
+    def test_books_bulk_invalid(self, mock_service):
+        """Test that invalid bulk operations are bad requests."""
+        mock_service.apply.side_effect = ValueError("Invalid release year: 1")
+
+        response = self.client.post(
+            "/api/v1/books/bulk",
+            json={"operation": "update", "filter": {}, "values": {"released": 1}},
+            headers=self.auth_headers,
+        )
+        self.assertEqual(response.status_code, 400)
+
+    @patch("librium.views.api.v1.endpoints.BookService")
+    def test_books_cursor(self, mock_service):
+        """Test that book listings are paged by cursor."""
+        mock_service.get_paginated.return_value = (
+            Page([Book(id=3, title="Dune")], next_cursor="next", prev_cursor="prev"),
+            40,
+        )
+
+        response = self.client.get(
+            "/api/v1/books?cursor=abc&page_size=1", headers=self.auth_headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data["books"][0]["title"], "Dune")
+        self.assertEqual(data["pagination"]["next_cursor"], "next")
+        self.assertEqual(data["pagination"]["prev_cursor"], "prev")
+        self.assertEqual(mock_service.get_paginated.call_args.kwargs["cursor"], "abc")
+
+    @patch("librium.views.api.v1.endpoints.BookService")
+    def test_books_invalid_cursor(self, mock_service):
+        """Test that an invalid cursor is a bad request."""
+        mock_service.get_paginated.side_effect = InvalidCursorError("Invalid cursor")
+
+        response = self.client.get(
+            "/api/v1/books?cursor=abc", headers=self.auth_headers
+        )
+
+        self.assertEqual(response.status_code, 400)
+
     @patch("librium.views.api.v1.endpoints.add_cover")
     def test_add_cover(self, mock_add_cover):
         """Test adding a cover."""
@@ -0,0 +1,114 @@
+"""
+Tests for saving only the changed relationships of a book.
+"""
+
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from librium.database import Author, Book, Format, Genre, Series
+from librium.services import BookService
+from tests.base import DatabaseTestCase
+
+SERVICES = ("author", "book", "format", "genre", "language", "publisher", "series")
+
+
+class TestBookSaves(DatabaseTestCase):
+    """Tests for diffing a book's relationships against the saved ones."""
+
+    def setUp(self):
+        super().setUp()
+        self.session = self.Session()
+
+        self.writes = []
+
+        @event.listens_for(self.engine, "before_cursor_execute")
+        def count_writes(conn, cursor, statement, parameters, context, executemany):
+            if statement.split(None, 1)[0] in ("INSERT", "UPDATE", "DELETE"):
+                self.writes.append(statement.split(None, 3)[:3])
+
+        authors = [Author(name=f"Author {i}") for i in range(3)]
+        series = [Series(name=f"Series {i}") for i in range(2)]
+        paperback = Format(name="Paperback")
+        genre = Genre(name="Fantasy")
+        self.session.add_all([*authors, *series, paperback, genre])
+        self.session.flush()
+        self.data = {
+            "title": "Dune",
+            "price": 9.99,
+            "format": paperback.id,
+            "authors": [authors[0].id, authors[1].id],
+            "genres": [genre.id],
+            "series": [{"series": series[0].id, "idx": 1.0}],
+        }
+        self.authors = [a.id for a in authors]
+        self.series = [s.id for s in series]
+        self.book = Book(title="Dune", format=paperback)
+        self.session.add(self.book)
+        self.session.commit()
+
+        self.patch_sessions(
+            *(f"librium.services.{module}" for module in SERVICES),
+            "librium.database.sqlalchemy.transactions",
+        )
+        self.save()
+
+    def save(self, **changes):
+        self.session.expire_all()
+        book = self.session.get(Book, self.book.id)
+        self.writes.clear()
+        BookService.add_or_update(book, {**self.data, **changes})
+        self.session.expire_all()
+        return self.session.get(Book, self.book.id)
+
+    def test_unchanged_save_writes_nothing(self):
+        """Test that saving a book as it is issues no writes."""
+        updated_at = self.session.get(Book, self.book.id).updated_at
+        book = self.save()
+        self.assertEqual(self.writes, [])
+        self.assertEqual(book.updated_at, updated_at)
+        self.assertEqual(book.price, Decimal("9.99"))
+
+    def test_reordered_authors(self):
+        """Test that reordering authors only updates their idx."""
+        book = self.save(authors=[self.authors[1], self.authors[0]])
+        self.assertEqual(
+            [(a.author_id, a.idx) for a in sorted(book.authors, key=lambda a: a.idx)],
+            [(self.authors[1], 1), (self.authors[0], 2)],
+        )
+        self.assertEqual(
+            [w[:2] for w in self.writes],
+            [["UPDATE", "book"], ["UPDATE", "book_authors"]],
+        )
+
+    def test_replaced_author(self):
+        """Test that replacing an author deletes and inserts only that row."""
+        book = self.save(authors=[self.authors[0], self.authors[2]])
+        self.assertEqual(
+            sorted((a.author_id, a.idx) for a in book.authors),
+            [(self.authors[0], 1), (self.authors[2], 2)],
+        )
+        self.assertEqual(
+            sorted(w[0] for w in self.writes if "book_authors" in w),
+            ["DELETE", "INSERT"],
+        )
+
+    def test_series(self):
+        """Test that series indexes are moved, added and removed."""
+        book = self.save(
+            series=[
+                {"series": self.series[0], "idx": 2.5},
+                {"series": self.series[1], "idx": 1.0},
+            ]
+        )
+        self.assertEqual(
+            sorted((s.series_id, s.idx) for s in book.series),
+            [(self.series[0], Decimal("2.5")), (self.series[1], Decimal("1"))],
+        )
+        book = self.save(series=[])
+        self.assertEqual(book.series, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
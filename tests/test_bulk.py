@@ -0,0 +1,188 @@
+"""
+Tests for the set-based bulk book operations.
+"""
+
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import event, select
+
+from librium.database import (
+    Author,
+    AuthorOrdering,
+    Book,
+    Format,
+    Genre,
+    Publisher,
+    Series,
+    SeriesIndex,
+)
+from librium.database.sqlalchemy.instrumentation import explain_query_plan
+from librium.database.sqlalchemy.loading import count_rows
+from librium.database.sqlalchemy.statistics import verify_statistics
+from librium.services import BulkService
+from tests.base import DatabaseTestCase
+
+
+class TestBulkService(DatabaseTestCase):
+    """Tests for applying operations to filtered sets of books."""
+
+    def setUp(self):
+        super().setUp()
+        self.session = self.Session()
+
+        self.paperback = Format(name="Paperback")
+        self.hardcover = Format(name="Hardcover")
+        self.fantasy = Genre(name="Fantasy")
+        self.horror = Genre(name="Horror")
+        herbert = Author(name="Frank Herbert")
+        dune = Series(name="Dune")
+        for i in range(4):
+            self.session.add(
+                Book(
+                    title=f"Dune {i}",
+                    format=self.paperback,
+                    read=i == 0,
+                    genres=[self.fantasy] if i < 2 else [],
+                    authors=[AuthorOrdering(author=herbert, idx=0)],
+                    series=[SeriesIndex(series=dune, idx=i + 1)],
+                )
+            )
+        self.session.add(Book(title="Carrie", format=self.paperback))
+        self.session.add_all([self.hardcover, self.horror])
+        self.session.add(Book(title="Dune 5", format=self.paperback, deleted=True))
+        self.session.commit()
+        self.dune = dune.id
+
+        self.patch_sessions(
+            "librium.services.bulk",
+            "librium.services.book",
+            "librium.database.sqlalchemy.transactions",
+        )
+
+    def books(self, **criteria):
+        self.session.expire_all()
+        return [
+            book.title
+            for book in self.session.scalars(
+                select(Book)
+                .filter_by(**criteria)
+                .order_by(Book.id)
+                .execution_options(include_deleted=True)
+            )
+        ]
+
+    def test_update_series(self):
+        """Test that a whole series is marked read in one statement."""
+        with count_rows() as counter:
+            counts = BulkService.apply(
+                "update", {"series_ids": [self.dune]}, values={"read": True}
+            )
+        self.assertEqual(counts, {"books": 4, "changed": 3})
+        self.assertEqual(
+            self.books(read=True, deleted=False),
+            ["Dune 0", "Dune 1", "Dune 2", "Dune 3"],
+        )
+        # The count, the update and the commit's bookkeeping, not one per book
+        self.assertLess(counter["statements"], 4)
+        with self.engine.connect() as connection:
+            self.assertEqual(verify_statistics(connection), [])
+
+    def test_loaded_books_updated(self):
+        """Test that books already in the session see the bulk update."""
+        # Without expiring them on commit, which would hide stale values
+        self.session.expire_on_commit = False
+        book = self.session.scalar(select(Book).where(Book.title == "Dune 1"))
+        self.assertFalse(book.read)
+        BulkService.apply("update", {"series_ids": [self.dune]}, values={"read": True})
+        self.assertTrue(book.read)
+        BulkService.apply("delete", {"exact_name": "Dune 1"})
+        self.assertTrue(book.deleted)
+
+    def test_update_is_validated(self):
+        """Test that bulk values are validated as for a single book."""
+        for values, message in [
+            ({"released": 1}, "Invalid release year"),
+            ({"price": Decimal("-1")}, "Price cannot be negative"),
+            ({"page_count": 0}, "Page count must be positive"),
+            ({"format_id": 99}, "Format with ID 99 not found"),
+            ({"title": "Dune"}, "Cannot update book columns"),
+        ]:
+            with self.subTest(values=values):
+                with self.assertRaisesRegex(ValueError, message):
+                    BulkService.apply("update", {"search": "Dune"}, values=values)
+        with self.assertRaisesRegex(ValueError, "at least one filter"):
+            BulkService.apply("update", {}, values={"read": True})
+        self.assertEqual(self.books(read=True), ["Dune 0"])
+
+    def test_update_format(self):
+        """Test that the format of filtered books is changed."""
+        counts = BulkService.apply(
+            "update",
+            {"start_with": "dune", "filter_read": False},
+            values={"format_id": self.hardcover.id},
+        )
+        self.assertEqual(counts, {"books": 3, "changed": 3})
+        self.assertEqual(
+            self.books(format_id=self.hardcover.id), ["Dune 1", "Dune 2", "Dune 3"]
+        )
+
+    def test_update_publisher(self):
+        """Test that the format of every book from a publisher is changed."""
+        ace = Publisher(name="Ace Books")
+        for book in self.session.scalars(select(Book).where(Book.title < "Dune 2")):
+            book.publishers.append(ace)
+        self.session.commit()
+
+        counts = BulkService.apply(
+            "update",
+            {"publisher_ids": [ace.id]},
+            values={"format_id": self.hardcover.id},
+        )
+        self.assertEqual(counts, {"books": 3, "changed": 3})
+        self.assertEqual(
+            self.books(format_id=self.hardcover.id), ["Dune 0", "Dune 1", "Carrie"]
+        )
+
+    def test_add_and_remove_genre(self):
+        """Test that books are added to and removed from a genre."""
+        counts = BulkService.apply(
+            "add_genre", {"series_ids": [self.dune]}, entity_id=self.horror.id
+        )
+        self.assertEqual(counts, {"books": 4, "changed": 4})
+        counts = BulkService.apply(
+            "remove_genre", {"genre_ids": [self.horror.id]}, entity_id=self.fantasy.id
+        )
+        self.assertEqual(counts, {"books": 4, "changed": 2})
+        self.session.expire_all()
+        self.assertEqual(self.fantasy.books, [])
+        self.assertEqual(len(self.horror.books), 4)
+        with self.engine.connect() as connection:
+            self.assertEqual(verify_statistics(connection), [])
+
+        with self.assertRaisesRegex(ValueError, "Genre with ID 99 not found"):
+            BulkService.apply("add_genre", {"search": "Dune"}, entity_id=99)
+
+    def test_delete(self):
+        """Test that filtered books are soft deleted."""
+        counts = BulkService.apply("delete", {"ends_with": "1"})
+        self.assertEqual(counts, {"books": 1, "changed": 1})
+        self.assertEqual(self.books(deleted=True), ["Dune 1", "Dune 5"])
+
+    def test_partial_index_used(self):
+        """Test that the filtered books are found with the partial indexes."""
+        plans = []
+
+        @event.listens_for(self.engine, "before_cursor_execute")
+        def explain(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("UPDATE"):
+                plans.append(
+                    explain_query_plan(cursor.connection, statement, parameters)
+                )
+
+        BulkService.apply("update", {"exact_name": "Carrie"}, values={"read": True})
+        self.assertIn("USING INDEX idx_book_title", plans[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
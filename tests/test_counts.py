@@ -0,0 +1,158 @@
+"""
+Tests for the library counters and the count cache.
+"""
+
+import unittest
+
+from sqlalchemy import update
+
+from librium.core.metrics import metrics
+from librium.database import Book, Format, Genre
+from librium.database.sqlalchemy.counts import (
+    CountCache,
+    count_cache,
+    library_counter_value,
+    normalize_filters,
+    rebuild_counters,
+)
+from librium.services import BookService, GenreService, YearService
+from tests.base import DatabaseTestCase
+
+
+class TestCountCache(unittest.TestCase):
+    """Tests for the version-keyed count cache."""
+
+    def test_version_invalidates(self):
+        """Test that a count is only reused at the version it was made at."""
+        cache = CountCache()
+        cache.set("key", 1, 42)
+        self.assertEqual(cache.get("key", 1), 42)
+        self.assertIsNone(cache.get("key", 2))
+
+    def test_bounded(self):
+        """Test that the least recently used counts are dropped."""
+        cache = CountCache(maxsize=2)
+        cache.set("a", 1, 1)
+        cache.set("b", 1, 2)
+        cache.get("a", 1)
+        cache.set("c", 1, 3)
+        self.assertIsNone(cache.get("b", 1))
+        self.assertEqual(cache.get("a", 1), 1)
+
+    def test_normalize_filters(self):
+        """Test that equivalent filters share a key."""
+        self.assertEqual(
+            normalize_filters("book", search="Dune", start_with=None, read=None),
+            normalize_filters("book", search="dune"),
+        )
+        self.assertNotEqual(
+            normalize_filters("book", exact_name="Dune"),
+            normalize_filters("book", exact_name="dune"),
+        )
+        # SQLite only folds ASCII case, so other text keeps its case
+        self.assertNotEqual(
+            normalize_filters("book", search="Écho"),
+            normalize_filters("book", search="écho"),
+        )
+
+
+class TestLibraryCounters(DatabaseTestCase):
+    """Tests for the trigger-maintained counters and cached totals."""
+
+    def setUp(self):
+        super().setUp()
+        self.session = self.Session()
+
+        self.paperback = Format(name="Paperback")
+        for i in range(6):
+            self.session.add(
+                Book(
+                    title=f"Book {i}",
+                    format=self.paperback,
+                    read=i % 2 == 0,
+                    released=2000 + i % 3,
+                )
+            )
+        self.session.add(Genre(name="Fantasy"))
+        self.session.commit()
+
+        count_cache.clear()
+        metrics.reset()
+        self.patch_sessions(
+            "librium.services.book", "librium.services.genre", "librium.services.year"
+        )
+
+    def tearDown(self):
+        count_cache.clear()
+
+    def counter(self, name):
+        return library_counter_value(self.session, name)
+
+    def test_counters_follow_changes(self):
+        """Test that the counters follow inserts, updates and deletes."""
+        self.assertEqual((self.counter("books"), self.counter("books_read")), (6, 3))
+        version = self.counter("version")
+
+        book = self.session.get(Book, 2)
+        book.read = True
+        self.session.commit()
+        self.assertEqual(self.counter("books_read"), 4)
+
+        book.deleted = True
+        self.session.commit()
+        self.assertEqual((self.counter("books"), self.counter("books_read")), (5, 3))
+
+        # Book 1 has been read
+        self.session.delete(self.session.get(Book, 1))
+        self.session.commit()
+        self.assertEqual((self.counter("books"), self.counter("books_read")), (4, 2))
+
+        # Entity changes bump the version without touching the book counters
+        self.session.add(Genre(name="Horror"))
+        self.session.commit()
+        self.assertEqual(self.counter("version"), version + 4)
+        self.assertEqual(self.counter("books"), 4)
+
+    def test_rebuild(self):
+        """Test that rebuilding recounts books changed behind the triggers."""
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DROP TRIGGER library_counter_book_update")
+            connection.execute(update(Book).values(read=True))
+            rebuild_counters(connection)
+        self.assertEqual(self.counter("books_read"), 6)
+
+    def test_cached_total(self):
+        """Test that totals are cached until the library changes."""
+        self.assertEqual(BookService.get_paginated(search="book")[1], 6)
+        self.assertEqual(BookService.get_paginated(search="BOOK", page=2)[1], 6)
+        self.assertEqual(metrics.snapshot()["counters"]["counts.cache.hit"], 1)
+
+        self.session.add(Book(title="Book 7", format=self.paperback))
+        self.session.commit()
+        self.assertEqual(BookService.get_paginated(search="book")[1], 7)
+        self.assertEqual(metrics.snapshot()["counters"]["counts.cache.miss"], 2)
+
+    def test_approximate_count(self):
+        """Test that unfiltered totals are read from the counters."""
+        for filter_read, expected in [(None, 6), (True, 3), (False, 3)]:
+            with self.subTest(filter_read=filter_read):
+                _, total = BookService.get_paginated(
+                    filter_read=filter_read, approximate_count=True
+                )
+                self.assertEqual(total, expected)
+        self.assertNotIn("counts.cache.miss", metrics.snapshot()["counters"])
+
+        # Filtered listings are still counted
+        _, total = BookService.get_paginated(search="4", approximate_count=True)
+        self.assertEqual(total, 1)
+
+    def test_other_services(self):
+        """Test that genre and year totals are counted and cached."""
+        self.assertEqual(GenreService.get_paginated()[1], 1)
+        self.assertEqual(YearService.get_paginated(page_size=2)[1], 4)
+        self.assertEqual(YearService.get_paginated(page_size=2)[1], 4)
+        self.assertEqual(metrics.snapshot()["counters"]["counts.cache.hit"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,342 @@
+"""
+Tests for the database engine and connection configuration.
+"""
+
+import unittest
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.exc import InvalidRequestError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import joinedload, sessionmaker
+
+from librium.core.metrics import metrics
+from librium.database import (
+    Author,
+    AuthorOrdering,
+    Base,
+    Book,
+    Format,
+    Genre,
+    Language,
+    Publisher,
+    Series,
+    SeriesIndex,
+    read_only,
+    transactional,
+)
+from librium.database.sqlalchemy.loading import count_rows, loading_options
+from librium.database.sqlalchemy.pooling import InstrumentedQueuePool
+from librium.database.sqlalchemy.profiles import (
+    CONNECTION_PROFILES,
+    get_active_profile,
+    get_connection_profile,
+    use_connection_profile,
+)
+from librium.database.sqlalchemy.routing import (
+    READER,
+    WRITER,
+    ReadOnlySessionError,
+    RoutingSession,
+    create_read_engine,
+    current_route,
+    route,
+)
+from tests.base import DatabaseTestCase, FileDatabaseTestCase
+
+
+class TestConnectionProfiles(FileDatabaseTestCase):
+    """Tests for the SQLite connection profiles."""
+
+    def pragma(self, engine, name):
+        with engine.connect() as connection:
+            return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+    def test_presets_exist(self):
+        """Test that the documented presets are available."""
+        for name in ("web", "bulk-import", "read-only-replica"):
+            with self.subTest(profile=name):
+                profile = get_connection_profile(name)
+                for key in (
+                    "journal_mode",
+                    "synchronous",
+                    "cache_size",
+                    "mmap_size",
+                    "temp_store",
+                    "busy_timeout",
+                ):
+                    self.assertIn(key, profile)
+
+    def test_unknown_profile(self):
+        """Test that an unknown profile name is rejected."""
+        with self.assertRaises(ValueError):
+            get_connection_profile("does-not-exist")
+
+    def test_profile_applied_on_connect(self):
+        """Test that every new connection gets the profile's PRAGMAs."""
+        engine = create_engine(f"sqlite:///{self.path}")
+        use_connection_profile(engine, "web")
+
+        self.assertEqual(get_active_profile(engine), "web")
+        self.assertEqual(self.pragma(engine, "journal_mode"), "wal")
+        self.assertEqual(
+            self.pragma(engine, "busy_timeout"),
+            CONNECTION_PROFILES["web"]["busy_timeout"],
+        )
+        self.assertEqual(
+            self.pragma(engine, "cache_size"),
+            CONNECTION_PROFILES["web"]["cache_size"],
+        )
+        engine.dispose()
+
+    def test_switching_profile(self):
+        """Test that switching profiles reconfigures pooled connections."""
+        engine = create_engine(f"sqlite:///{self.path}")
+        use_connection_profile(engine, "web")
+        self.assertEqual(self.pragma(engine, "synchronous"), 1)  # NORMAL
+
+        use_connection_profile(engine, "bulk-import")
+        self.assertEqual(get_active_profile(engine), "bulk-import")
+        self.assertEqual(self.pragma(engine, "synchronous"), 0)  # OFF
+        engine.dispose()
+
+    def test_read_only_replica_rejects_writes(self):
+        """Test that the read-only profile refuses to write."""
+        engine = create_engine(f"sqlite:///{self.path}")
+        use_connection_profile(engine, "read-only-replica")
+        with self.assertRaises(Exception):
+            with engine.begin() as connection:
+                connection.exec_driver_sql("CREATE TABLE t (id INTEGER)")
+        engine.dispose()
+
+
+class TestSessionRouting(FileDatabaseTestCase):
+    """Tests for routing sessions between the read and write engines."""
+
+    def setUp(self):
+        super().setUp()
+        self.writer = create_engine(f"sqlite:///{self.path}")
+        use_connection_profile(self.writer, "web")
+        Base.metadata.create_all(self.writer)
+        self.reader = create_read_engine(self.writer, pool_size=2, max_overflow=0)
+        self.session = sessionmaker(
+            class_=RoutingSession, writer=self.writer, reader=self.reader
+        )()
+
+    def tearDown(self):
+        self.session.close()
+        self.reader.dispose()
+        self.writer.dispose()
+        super().tearDown()
+
+    def test_read_engine_is_separate(self):
+        """Test that a file database gets its own read-only engine."""
+        self.assertIsNot(self.reader, self.writer)
+        self.assertEqual(get_active_profile(self.reader), "read-only-replica")
+
+    def test_in_memory_database_shares_engine(self):
+        """Test that an in-memory database reuses the writer."""
+        writer = create_engine("sqlite:///:memory:")
+        self.assertIs(create_read_engine(writer), writer)
+
+    def test_routes(self):
+        """Test that each scope resolves to the expected engine."""
+        self.assertIs(self.session.get_bind(), self.writer)
+        with route(READER):
+            self.assertIs(self.session.get_bind(), self.reader)
+            with route(WRITER):
+                self.assertIs(self.session.get_bind(), self.writer)
+        with route(WRITER):
+            with route(READER):
+                self.assertIs(self.session.get_bind(), self.writer)
+
+    def test_routing_metrics(self):
+        """Test that routed statements are counted."""
+        before = metrics.counter("session.route.reader")
+        with route(READER):
+            self.session.execute(text("SELECT 1"))
+        self.assertEqual(metrics.counter("session.route.reader"), before + 1)
+
+    def test_reads_see_committed_writes(self):
+        """Test that the reader sees data committed by the writer."""
+        with route(WRITER):
+            self.session.add(Format(name="Paperback"))
+            self.session.commit()
+        with route(READER):
+            self.assertEqual(self.session.query(Format).count(), 1)
+
+    def test_flush_in_read_scope_fails(self):
+        """Test that changes cannot be flushed in a read-only scope."""
+        with route(READER):
+            self.session.add(Format(name="Paperback"))
+            with self.assertRaises(ReadOnlySessionError):
+                self.session.flush()
+        self.session.rollback()
+
+    def test_read_engine_rejects_writes(self):
+        """Test that the read engine refuses writes even without the ORM."""
+        with self.assertRaises(OperationalError):
+            with self.reader.begin() as connection:
+                connection.execute(text("INSERT INTO format (name) VALUES ('x')"))
+
+    def test_decorators_set_route(self):
+        """Test that the decorators mark their scope, outermost first."""
+
+        @read_only
+        def read():
+            return current_route()
+
+        @transactional
+        def write():
+            return current_route(), read()
+
+        self.assertEqual(read(), READER)
+        self.assertEqual(write(), (WRITER, WRITER))
+        self.assertIsNone(current_route())
+
+
+class TestPoolTelemetry(FileDatabaseTestCase):
+    """Tests for the checkout metrics of the instrumented pool."""
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.engine = create_engine(
+            f"sqlite:///{self.path}",
+            poolclass=InstrumentedQueuePool,
+            pool_size=1,
+            max_overflow=1,
+            pool_timeout=0.1,
+        )
+        self.engine.pool.name = "test"
+
+    def tearDown(self):
+        self.engine.dispose()
+        super().tearDown()
+
+    def test_checkout_metrics(self):
+        """Test that usage, overflow and timeouts are recorded."""
+        first = self.engine.connect()
+        second = self.engine.connect()
+        with self.assertRaises(PoolTimeoutError):
+            self.engine.connect()
+        first.close()
+        second.close()
+
+        timings = metrics.snapshot()["timings"]
+        self.assertEqual(timings["pool.test.checkout_wait_ms"]["count"], 2)
+        self.assertEqual(timings["pool.test.in_use"]["max"], 2)
+        self.assertEqual(metrics.counter("pool.test.overflow"), 1)
+        self.assertEqual(metrics.counter("pool.test.timeouts"), 1)
+
+    def test_name_survives_dispose(self):
+        """Test that a recreated pool keeps recording under its name."""
+        self.engine.dispose()
+        self.engine.connect().close()
+        self.assertEqual(metrics.snapshot()["timings"]["pool.test.in_use"]["count"], 1)
+
+
+class TestLoadingProfiles(DatabaseTestCase):
+    """Tests for the named relationship loading profiles."""
+
+    def setUp(self):
+        super().setUp()
+        self.session = self.Session()
+
+        paperback = Format(name="Paperback")
+        genres = [Genre(name=f"Genre {i}") for i in range(3)]
+        publishers = [Publisher(name=f"Publisher {i}") for i in range(2)]
+        languages = [Language(name=f"Language {i}") for i in range(2)]
+        series = Series(name="Series")
+        for i in range(5):
+            book = Book(
+                title=f"Book {i}",
+                format=paperback,
+                genres=genres,
+                publishers=publishers,
+                languages=languages,
+            )
+            book.authors = [
+                AuthorOrdering(author=Author(name=f"Author {i}.{j}"), idx=j)
+                for j in range(2)
+            ]
+            book.series = [SeriesIndex(series=series, idx=i + 1)]
+            self.session.add(book)
+        self.session.commit()
+        self.session.expunge_all()
+
+    def load(self, *options):
+        with count_rows() as counts:
+            books = (
+                self.session.scalars(select(Book).order_by(Book.id).options(*options))
+                .unique()
+                .all()
+            )
+        self.session.expunge_all()
+        return books, counts
+
+    def test_unknown_profile(self):
+        """Test that an unknown profile name is rejected."""
+        with self.assertRaises(ValueError):
+            loading_options("does-not-exist")
+
+    def test_list_profile_fetches_fewer_rows(self):
+        """Test that the list profile avoids the joined cartesian product."""
+        _, joined = self.load(
+            joinedload(Book.format),
+            joinedload(Book.authors),
+            joinedload(Book.publishers),
+            joinedload(Book.languages),
+            joinedload(Book.genres),
+            joinedload(Book.series),
+        )
+        _, listed = self.load(*loading_options("list"))
+
+        # 5 books x 2 authors x 2 publishers x 2 languages x 3 genres x 1 series
+        self.assertEqual(joined["rows"], 120)
+        # 5 books, 10 author orderings, 5 series indexes
+        self.assertEqual(listed["rows"], 20)
+        self.assertEqual(listed["statements"], 3)
+
+    def test_list_profile_loads_rendered_relationships(self):
+        """Test that the list page's attributes need no further queries."""
+        with count_rows() as counts:
+            books = (
+                self.session.scalars(
+                    select(Book).options(*loading_options("list", strict=True))
+                )
+                .unique()
+                .all()
+            )
+            statements = counts["statements"]
+            for book in books:
+                [ordering.author.name for ordering in book.authors]
+                [(si.series.name, si.index) for si in book.series]
+            self.assertEqual(counts["statements"], statements)
+
+    def test_strict_loading_raises(self):
+        """Test that strict loading raises on relationships outside the profile."""
+        book = self.session.scalars(
+            select(Book).options(*loading_options("list", strict=True))
+        ).first()
+        with self.assertRaises(InvalidRequestError):
+            book.genres
+
+    def test_lenient_loading_falls_back_to_lazy_loading(self):
+        """Test that relationships outside the profile still load on access."""
+        book = self.session.scalars(
+            select(Book).options(*loading_options("list", strict=False))
+        ).first()
+        self.assertEqual(len(book.genres), 3)
+
+    def test_detail_profile_loads_everything(self):
+        """Test that the detail profile loads every relationship up front."""
+        books, _ = self.load(*loading_options("detail", strict=True))
+        book = books[0]
+        self.assertEqual(book.format.name, "Paperback")
+        self.assertEqual(len(book.genres), 3)
+        self.assertEqual(len(book.publishers), 2)
+        self.assertEqual(len(book.languages), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+"""
+Tests for the bulk import of exported books.
+"""
+
+import csv
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+
+import simplejson as json
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from librium.database import (
+    Author,
+    AuthorOrdering,
+    Base,
+    Book,
+    Format,
+    Genre,
+    Language,
+    Publisher,
+    Series,
+    SeriesIndex,
+)
+from librium.database.sqlalchemy.search import book_search, search_match
+from librium.database.sqlalchemy.statistics import verify_statistics
+from tests.base import DatabaseTestCase
+from utils.export import HEADERS, process_book_info
+from utils.importer import read_rows, run
+
+
+class TestImporter(DatabaseTestCase):
+    """Tests for importing the export format into another library."""
+
+    def setUp(self):
+        super().setUp()
+
+        # The library the rows are exported from
+        source = create_engine(f"sqlite:///{self.directory / 'source.sqlite'}")
+        Base.metadata.create_all(source)
+        with Session(source) as session:
+            herbert = Author(
+                first_name="Frank", last_name="Herbert", name="Frank Herbert"
+            )
+            paperback = Format(name="Paperback")
+            dune = Series(name="Dune")
+            for i in range(7):
+                book = Book(
+                    title=f"Dune {i}",
+                    isbn="9780441172719" if i == 0 else None,
+                    released=1965 + i,
+                    price=Decimal("9.99"),
+                    read=i % 2 == 0,
+                    format=paperback,
+                    genres=[Genre(name=f"Genre {i % 3}")] if i else [],
+                    languages=[Language(name="English")] if i == 1 else [],
+                    publishers=[Publisher(name="Ace")] if i == 2 else [],
+                )
+                book.authors = [AuthorOrdering(author=herbert, idx=1)]
+                book.series = [SeriesIndex(series=dune, idx=i + 1)]
+                session.add(book)
+            session.commit()
+            self.rows = [
+                process_book_info(book)
+                for book in session.scalars(select(Book).order_by(Book.id))
+            ]
+        source.dispose()
+
+        with Session(self.engine) as session:
+            # An existing genre is reused, whatever its case
+            session.add(Genre(name="genre 1"))
+            session.commit()
+
+    def write(self, file_format, rows=None):
+        rows = self.rows if rows is None else rows
+        path = self.directory / f"export.{file_format}"
+        with open(path, "w", newline="") as fp:
+            if file_format == "csv":
+                writer = csv.DictWriter(fp, HEADERS)
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                json.dump(rows, fp, indent=2)
+        return path
+
+    def count(self, model):
+        with Session(self.engine) as session:
+            return session.scalar(select(func.count()).select_from(model))
+
+    def test_round_trip(self):
+        """Test that both export formats import back the same books."""
+        for file_format in ["csv", "json"]:
+            with self.subTest(file_format=file_format):
+                self.tearDown()
+                self.setUp()
+                report = run(self.write(file_format), batch_size=3, engine=self.engine)
+                self.assertEqual((report.books, report.errors), (7, []))
+                self.assertEqual(
+                    report.created,
+                    {
+                        "author": 1,
+                        "publisher": 1,
+                        "genre": 2,
+                        "language": 1,
+                        "series": 1,
+                        "format": 1,
+                    },
+                )
+                expected = [
+                    dict(row, genre=row["genre"].replace("Genre 1", "genre 1"))
+                    for row in self.rows
+                ]
+                with Session(self.engine) as session:
+                    books = session.scalars(select(Book).order_by(Book.id)).all()
+                    self.assertEqual(
+                        [process_book_info(book) for book in books], expected
+                    )
+                self.assertEqual(self.count(Genre), 3)
+
+    def test_search_index_is_rebuilt(self):
+        """Test that imported books are searchable and counted."""
+        run(self.write("csv"), engine=self.engine)
+        with self.engine.connect() as connection:
+            self.assertEqual(
+                len(
+                    connection.execute(
+                        select(book_search.c.rowid).where(search_match("herbert"))
+                    ).all()
+                ),
+                7,
+            )
+            self.assertEqual(verify_statistics(connection), [])
+
+    def test_reimport_skips_books(self):
+        """Test that books already imported are skipped."""
+        path = self.write("csv")
+        run(path, engine=self.engine)
+        report = run(path, engine=self.engine)
+        self.assertEqual((report.books, report.skipped), (0, 7))
+        self.assertEqual(self.count(Book), 7)
+        self.assertEqual(self.count(Author), 1)
+
+    def test_dry_run(self):
+        """Test that a dry run reports without writing."""
+        rows = [*self.rows, dict(self.rows[1], book_uuid="", isbn="123")]
+        report = run(self.write("csv", rows), dry_run=True, engine=self.engine)
+        self.assertEqual((report.rows, report.books), (8, 7))
+        self.assertEqual(report.errors, [(8, "Invalid ISBN: 123")])
+        self.assertEqual(report.created["series"], 1)
+        self.assertEqual(self.count(Book), 0)
+
+    def test_progress(self):
+        """Test that progress is reported after every batch."""
+        reports = []
+        run(
+            self.write("csv"),
+            batch_size=3,
+            progress=lambda report: reports.append(report.books),
+            engine=self.engine,
+        )
+        self.assertEqual(reports, [3, 6, 7])
+
+    def test_json_is_streamed(self):
+        """Test that JSON objects are read across chunk boundaries."""
+        path = self.write("json")
+        with patch("utils.importer.JSON_CHUNK_SIZE", 16), open(path) as fp:
+            rows = list(read_rows(fp, "json"))
+        self.assertEqual(
+            [row["title"] for row in rows], [r["title"] for r in self.rows]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Tests for the workload-driven index advisor.
+"""
+
+import os
+import sqlite3
+import unittest
+
+os.environ.setdefault("FLASK_ENV", "testing")
+os.environ.setdefault("SQLDATABASE", ":memory:")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from librium.database import Base, Book, Format, Genre
+from tests.base import FileDatabaseTestCase
+from utils.index_advisor import Workload, analyze, drift, write_migration
+
+GENRE_FILTER = (
+    "SELECT book.id FROM book WHERE book.deleted = 0 AND book.id IN "
+    "(SELECT book_genres.book_id FROM book_genres WHERE book_genres.genre_id = ?)"
+)
+
+
+class TestIndexAdvisor(FileDatabaseTestCase):
+    """Tests for recording workloads and proposing indexes."""
+
+    def setUp(self):
+        super().setUp()
+        engine = create_engine(f"sqlite:///{self.path}")
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        paperback = Format(name="Paperback")
+        genres = [Genre(name=f"Genre {i}") for i in range(5)]
+        session.add_all(
+            Book(title=f"Book {i}", format=paperback, genres=[genres[i % 5]])
+            for i in range(50)
+        )
+        session.commit()
+        session.close()
+        engine.dispose()
+
+        connection = sqlite3.connect(self.path)
+        connection.execute("DROP INDEX idx_book_genres_genre_id_book_id")
+        connection.close()
+
+    def test_workload(self):
+        """Test that statements are counted by shape and saved and loaded."""
+        workload = Workload()
+        workload.record("SELECT book.id FROM book WHERE book.title = 'Dune'")
+        workload.record("SELECT book.id FROM book WHERE book.title = 'Emma'")
+        workload.record("PRAGMA foreign_keys = ON")
+        workload.record("BEGIN")
+        self.assertEqual(list(workload.counts.values()), [2])
+
+        path = self.directory / "workload.jsonl"
+        workload.save(path)
+        self.assertEqual(Workload.load(path).counts, workload.counts)
+
+    def test_slow_query_log(self):
+        """Test that a slow-query log is read as a workload."""
+        path = self.directory / "slow_queries.log"
+        path.write_text(
+            "2026-10-17 10:00:00 - 120.5 ms | route=books | service=BookService\n"
+            "SELECT book.id\nFROM book\nWHERE book.title = ?\n"
+            "parameters: ('Dune',)\n"
+            "plan:\nSEARCH book USING INDEX idx_book_title (title=?)\n",
+            encoding="utf-8",
+        )
+        workload = Workload.load(path)
+        self.assertEqual(
+            list(workload.statements.values()),
+            ["SELECT book.id\nFROM book\nWHERE book.title = ?"],
+        )
+
+    def test_reverse_index_proposed(self):
+        """Test that a lookup by genre gets the reverse association index."""
+        workload = Workload()
+        workload.record(GENRE_FILTER, 3)
+        report = analyze(workload, self.path, min_rows=10)
+
+        statement, count, problems = report["problems"][0]
+        self.assertEqual(count, 3)
+        self.assertEqual(problems, ["full scan of book_genres"])
+        proposal = report["proposals"][0]
+        self.assertEqual(proposal["table"], "book_genres")
+        self.assertEqual(proposal["columns"], ["genre_id", "book_id"])
+        self.assertEqual(proposal["executions"], 3)
+
+        # The same table, too small to be worth an index
+        self.assertEqual(analyze(workload, self.path)["problems"], [])
+
+    def test_drift(self):
+        """Test that an index missing from the database is reported."""
+        report = drift(self.path)
+        self.assertEqual(report["missing"], ["idx_book_genres_genre_id_book_id"])
+        self.assertEqual(report["unexpected"], [])
+        self.assertEqual(report["different"], [])
+
+    def test_write_migration(self):
+        """Test that the proposals are written as an Alembic migration."""
+        versions = self.directory / "alembic" / "versions"
+        versions.mkdir(parents=True)
+        (versions / "1234_initial.py").write_text(
+            'revision = "1234"\ndown_revision = None\n', encoding="utf-8"
+        )
+        path = write_migration(
+            [
+                {
+                    "name": "idx_book_price",
+                    "table": "book",
+                    "columns": ["price"],
+                    "where": "deleted = 0",
+                }
+            ],
+            versions,
+        )
+        source = path.read_text(encoding="utf-8")
+        self.assertIn('down_revision = "1234"', source)
+        self.assertIn(
+            'op.create_index("idx_book_price", "book", ["price"], '
+            'sqlite_where=sa.text("deleted = 0"))',
+            source,
+        )
+        self.assertIn('op.drop_index("idx_book_price", table_name="book")', source)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,246 @@
+"""
+Tests for per-request statement counting and query budgets.
+"""
+
+import os
+import unittest
+
+os.environ.setdefault("FLASK_ENV", "testing")
+os.environ.setdefault("SQLDATABASE", ":memory:")
+
+from sqlalchemy import bindparam, column, create_engine, select, table, text
+from sqlalchemy.exc import OperationalError
+
+from librium import create_app
+from librium.core.metrics import metrics
+from librium.database import engine
+from librium.database.sqlalchemy.instrumentation import (
+    QueryBudgetExceeded,
+    QueryTracker,
+    explain_query_plan,
+    instrument_engine,
+    normalize_sql,
+    service_method,
+    set_slow_query_threshold,
+    start_tracking,
+    stop_tracking,
+    track_queries,
+)
+from librium.database.sqlalchemy.statements import cached_statement
+
+
+def run_statements(count):
+    with engine.connect() as connection:
+        for i in range(count):
+            connection.execute(text("SELECT :value"), {"value": i})
+
+
+class TestNormalizeSql(unittest.TestCase):
+    """Tests for SQL normalization."""
+
+    def test_literals_and_whitespace(self):
+        """Test that literals and whitespace do not distinguish statements."""
+        self.assertEqual(
+            normalize_sql("SELECT *\n  FROM book WHERE id = 42 AND title = 'It''s'"),
+            "SELECT * FROM book WHERE id = ? AND title = ?",
+        )
+
+    def test_in_lists_collapse(self):
+        """Test that IN lists of any length compare equal."""
+        self.assertEqual(
+            normalize_sql("SELECT * FROM book WHERE id IN (?, ?, ?)"),
+            normalize_sql("SELECT * FROM book WHERE id IN (?)"),
+        )
+
+    def test_identifiers_with_digits_kept(self):
+        """Test that digits inside identifiers are not replaced."""
+        self.assertIn("book_1", normalize_sql("SELECT book_1.id FROM book AS book_1"))
+
+
+class TestQueryTracker(unittest.TestCase):
+    """Tests for the statement tracker."""
+
+    def test_repeated(self):
+        """Test that repeated statements are grouped and reported."""
+        tracker = QueryTracker()
+        for i in range(12):
+            tracker.record(f"SELECT * FROM series_index WHERE book_id = {i}", 0.0)
+        tracker.record("SELECT count(*) FROM book", 0.0)
+
+        self.assertEqual(tracker.total, 13)
+        self.assertEqual(
+            tracker.repeated(10),
+            [("SELECT * FROM series_index WHERE book_id = ?", 12)],
+        )
+
+    def test_track_queries(self):
+        """Test that statements are only counted while tracking."""
+        run_statements(2)
+        with track_queries() as tracker:
+            run_statements(3)
+        run_statements(2)
+        self.assertEqual(tracker.total, 3)
+
+
+class TestQueryBudget(unittest.TestCase):
+    """Tests for the per-request query budget."""
+
+    def setUp(self):
+        self.app = create_app()
+        self.app.config["QUERY_BUDGET"] = 5
+        self.app.config["QUERY_BUDGETS"] = {"heavy": 50}
+        self.app.add_url_rule("/few", "few", lambda: run_statements(3) or "ok")
+        self.app.add_url_rule("/many", "many", lambda: run_statements(20) or "ok")
+        self.app.add_url_rule("/heavy", "heavy", lambda: run_statements(20) or "ok")
+        self.client = self.app.test_client()
+
+    def test_within_budget(self):
+        """Test that the statement count is reported in debug mode."""
+        response = self.client.get("/few")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Query-Count"], "3")
+        self.assertIn("X-Query-Time-Ms", response.headers)
+
+    def test_over_budget_raises_in_tests(self):
+        """Test that exceeding the budget fails the request when testing."""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/many")
+
+    def test_over_budget_logs_in_production(self):
+        """Test that exceeding the budget only logs outside of tests."""
+        self.app.config["TESTING"] = False
+        self.app.debug = False
+        with self.assertLogs("librium.core.app", level="WARNING") as logs:
+            response = self.client.get("/many")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Query-Count", response.headers)
+        self.assertTrue(any("budget: 5" in line for line in logs.output))
+        self.assertTrue(any("Possible N+1" in line for line in logs.output))
+
+    def test_endpoint_budget(self):
+        """Test that a per-endpoint budget overrides the default."""
+        response = self.client.get("/heavy")
+        self.assertEqual(response.headers["X-Query-Count"], "20")
+
+
+class TestSlowQueryLog(unittest.TestCase):
+    """Tests for the slow-query log."""
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        instrument_engine(self.engine)
+        with self.engine.begin() as connection:
+            connection.execute(text("CREATE TABLE t (id INTEGER, name TEXT)"))
+            connection.execute(text("CREATE INDEX idx_t_id ON t (id)"))
+
+    def tearDown(self):
+        set_slow_query_threshold(None)
+        self.engine.dispose()
+
+    def explain(self, statement, parameters=()):
+        with self.engine.connect() as connection:
+            return explain_query_plan(
+                connection.connection.dbapi_connection, statement, parameters
+            )
+
+    def test_explain_query_plan(self):
+        """Test that the plan shows scans and index searches."""
+        self.assertIn(
+            "SCAN t", self.explain("SELECT * FROM t WHERE name LIKE ?", ("%x%",))
+        )
+        self.assertIn("idx_t_id", self.explain("SELECT * FROM t WHERE id = ?", (1,)))
+        self.assertEqual(self.explain("PRAGMA user_version"), "")
+
+    def test_slow_statement_logged(self):
+        """Test that a slow statement is logged with its context and plan."""
+        set_slow_query_threshold(1e-6)
+        tracker, token = start_tracking("main.books")
+        try:
+            with self.assertLogs("librium.slow_queries", level="WARNING") as logs:
+                with service_method("BookService.get_paginated"):
+                    with self.engine.connect() as connection:
+                        connection.execute(
+                            text("SELECT * FROM t WHERE name LIKE :name"),
+                            {"name": "%Dune%"},
+                        )
+        finally:
+            stop_tracking(token)
+
+        entry = logs.output[0]
+        self.assertIn("route=main.books", entry)
+        self.assertIn("service=BookService.get_paginated", entry)
+        self.assertIn("'%Dune%'", entry)
+        self.assertIn("SCAN t", entry)
+
+    def test_fast_statement_not_logged(self):
+        """Test that statements under the threshold are not logged."""
+        set_slow_query_threshold(60_000)
+        with self.assertNoLogs("librium.slow_queries", level="WARNING"):
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT * FROM t"))
+
+    def test_failing_statement(self):
+        """Test that a failing statement leaves no timing on the connection."""
+        set_slow_query_threshold(60_000)
+        with track_queries() as tracker:
+            with self.engine.connect() as connection:
+                with self.assertRaises(OperationalError):
+                    connection.execute(text("SELECT * FROM missing"))
+                connection.execute(text("SELECT * FROM t"))
+                self.assertEqual(connection.info.get("query_started", []), [])
+        self.assertEqual(tracker.total, 1)
+
+
+class TestCompiledCache(unittest.TestCase):
+    """Tests for the compiled statement cache metrics and prebuilt statements."""
+
+    def setUp(self):
+        metrics.reset()
+        self.engine = create_engine("sqlite://", query_cache_size=4)
+        instrument_engine(self.engine)
+        self.t = table("t", column("id"), column("name"))
+        with self.engine.begin() as connection:
+            connection.execute(text("CREATE TABLE t (id INTEGER, name TEXT)"))
+        metrics.reset()
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def test_hits_and_misses(self):
+        """Test that repeated statements count as hits of the compiled cache."""
+        with self.engine.connect() as connection:
+            for name in ["Dune", "Emma", "Dune"]:
+                connection.execute(select(self.t).where(self.t.c.name == name))
+        self.assertEqual(metrics.counter("queries.compiled_cache.miss"), 1)
+        self.assertEqual(metrics.counter("queries.compiled_cache.hit"), 2)
+
+    def test_evictions(self):
+        """Test that statements pruned from a full cache count as evictions."""
+        with self.engine.connect() as connection:
+            # Statements differing in their text, not only in parameters
+            for value in range(12):
+                connection.execute(text(f"SELECT {value}"))
+        self.assertGreater(metrics.counter("queries.compiled_cache.evictions"), 0)
+
+    def test_cached_statement(self):
+        """Test that a statement is built once per key and bound per call."""
+        built = []
+
+        def build():
+            built.append(True)
+            return select(self.t.c.id).where(self.t.c.name == bindparam("name"))
+
+        with self.engine.begin() as connection:
+            connection.execute(text("INSERT INTO t VALUES (1, 'Dune'), (2, 'Emma')"))
+            ids = [
+                connection.scalar(
+                    cached_statement(("test", "t.by_name"), build), {"name": name}
+                )
+                for name in ["Dune", "Emma"]
+            ]
+        self.assertEqual(ids, [1, 2])
+        self.assertEqual(len(built), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
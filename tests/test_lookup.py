@@ -0,0 +1,117 @@
+"""
+Tests for the batched id lookups of the entity services.
+"""
+
+import unittest
+
+from librium.database import Author, Book, Format, Genre, Language, Series
+from librium.database.sqlalchemy.loading import count_rows
+from librium.services import AuthorService, BookService, GenreService
+from tests.base import DatabaseTestCase
+
+SERVICES = ("author", "book", "format", "genre", "language", "publisher", "series")
+
+
+class TestGetManyByIds(DatabaseTestCase):
+    """Tests for resolving lists of ids in one query."""
+
+    def setUp(self):
+        super().setUp()
+        self.session = self.Session()
+
+        self.authors = [Author(name=f"Author {i}") for i in range(6)]
+        self.genres = [Genre(name=f"Genre {i}") for i in range(5)]
+        self.series = [Series(name=f"Series {i}") for i in range(4)]
+        self.paperback = Format(name="Paperback")
+        self.english = Language(name="English")
+        self.book = Book(title="Dune", format=self.paperback)
+        self.session.add_all(
+            [
+                *self.authors,
+                *self.genres,
+                *self.series,
+                self.english,
+                self.book,
+            ]
+        )
+        self.authors[5].deleted = True
+        self.session.commit()
+
+        self.patch_sessions(
+            *(f"librium.services.{module}" for module in SERVICES),
+            "librium.database.sqlalchemy.transactions",
+        )
+
+    def test_order_and_missing(self):
+        """Test that the ids keep their order and missing ids are reported."""
+        ids = [self.genres[2].id, 99, self.genres[0].id, self.genres[2].id]
+        with count_rows() as counter:
+            genres, missing = GenreService.get_many_by_ids(ids)
+        self.assertEqual(counter["statements"], 1)
+        self.assertEqual(genres, [self.genres[2], self.genres[0], self.genres[2]])
+        self.assertEqual(missing, [99])
+
+    def test_deleted_are_missing(self):
+        """Test that deleted authors are reported as missing."""
+        authors, missing = AuthorService.get_many_by_ids(
+            [self.authors[0].id, self.authors[5].id]
+        )
+        self.assertEqual(authors, [self.authors[0]])
+        self.assertEqual(missing, [self.authors[5].id])
+
+    def save(self, authors, genres, series):
+        data = {
+            "title": "Dune",
+            "format": self.paperback.id,
+            "authors": [a.id for a in self.authors[:authors]],
+            "genres": [g.id for g in self.genres[:genres]],
+            "languages": [self.english.id],
+            "series": [
+                {"series": s.id, "idx": i + 1}
+                for i, s in enumerate(self.series[:series])
+            ],
+        }
+        self.session.expire_all()
+        book = self.session.get(Book, self.book.id)
+        with count_rows() as counter:
+            BookService.add_or_update(book, data)
+        return counter["statements"]
+
+    def test_add_or_update_queries(self):
+        """Test that resolving a book's relationships costs constant queries."""
+        self.save(1, 1, 1)
+        few = self.save(1, 1, 1)
+        many = self.save(5, 4, 3)
+        self.assertEqual(many, few)
+        self.session.expire_all()
+        book = self.session.get(Book, self.book.id)
+        self.assertEqual(
+            [a.author.name for a in sorted(book.authors, key=lambda a: a.idx)],
+            [f"Author {i}" for i in range(5)],
+        )
+        self.assertEqual(len(book.genres), 4)
+        self.assertEqual(len(book.series), 3)
+
+    def test_add_or_update_skips_missing(self):
+        """Test that missing ids are skipped when saving a book."""
+        self.session.expire_all()
+        book = self.session.get(Book, self.book.id)
+        BookService.add_or_update(
+            book,
+            {
+                "title": "Dune",
+                "format": self.paperback.id,
+                "authors": [self.authors[5].id, self.authors[1].id],
+                "genres": [99, self.genres[3].id],
+                "series": [{"series": 99, "idx": 1}],
+            },
+        )
+        self.session.expire_all()
+        book = self.session.get(Book, self.book.id)
+        self.assertEqual([a.author.name for a in book.authors], ["Author 1"])
+        self.assertEqual([g.name for g in book.genres], ["Genre 3"])
+        self.assertEqual(book.series, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+"""
+Tests for keyset (cursor) pagination.
+"""
+
+import unittest
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from librium.database import Book, Format, Genre
+from librium.database.sqlalchemy.pagination import (
+    InvalidCursorError,
+    decode_cursor,
+    encode_cursor,
+)
+from librium.services import BookService, GenreService
+from tests.base import DatabaseTestCase
+
+
+class TestCursors(unittest.TestCase):
+    """Tests for encoding and decoding cursors."""
+
+    def test_round_trip(self):
+        """Test that a cursor decodes to the key it was made from."""
+        cursor = encode_cursor("next", "price", (Decimal("12.50"), 7))
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decode_cursor(cursor, "price"), ("next", (12.5, 7)))
+
+    def test_invalid(self):
+        """Test that malformed cursors are rejected."""
+        for cursor in [
+            "",
+            "not a cursor",
+            encode_cursor("sideways", "title", ("a", 1)),
+        ]:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursorError):
+                    decode_cursor(cursor, "title")
+
+    def test_other_sort_field(self):
+        """Test that a cursor cannot be used with another sort field."""
+        with self.assertRaises(InvalidCursorError):
+            decode_cursor(encode_cursor("next", "title", ("Dune", 1)), "released")
+
+
+class TestKeysetPagination(DatabaseTestCase):
+    """Tests for paging through services by cursor."""
+
+    def setUp(self):
+        super().setUp()
+        self.session = self.Session()
+
+        paperback = Format(name="Paperback")
+        # Repeated titles and missing prices exercise the id tie-break and NULLs
+        for i in range(23):
+            self.session.add(
+                Book(
+                    title=f"Book {i % 7}",
+                    format=paperback,
+                    price=Decimal(i % 5) if i % 4 else None,
+                )
+            )
+        for name in ["Fantasy", "Horror", "Mystery", "Romance", "Science Fiction"]:
+            self.session.add(Genre(name=name))
+        self.session.commit()
+
+        self.patch_sessions("librium.services.book", "librium.services.genre")
+
+    def expected(self, sort_by, sort_order):
+        column = getattr(Book, sort_by)
+        order = [column, Book.id]
+        if sort_order == "desc":
+            order = [column.desc(), Book.id.desc()]
+        return self.session.scalars(select(Book.id).order_by(*order)).all()
+
+    def walk(self, **kwargs):
+        """Follow the next cursors from the first page to the last."""
+        pages = []
+        books, total = BookService.get_paginated(page_size=5, **kwargs)
+        pages.append(books)
+        while books.next_cursor:
+            books, total = BookService.get_paginated(
+                page_size=5, cursor=books.next_cursor, **kwargs
+            )
+            pages.append(books)
+        return pages, total
+
+    def test_cursor_pages_match_offset_order(self):
+        """Test that following cursors visits every book once, in order."""
+        for sort_by in ["title", "price", "read"]:
+            for sort_order in ["asc", "desc"]:
+                with self.subTest(sort_by=sort_by, sort_order=sort_order):
+                    pages, total = self.walk(sort_by=sort_by, sort_order=sort_order)
+                    self.assertEqual(total, 23)
+                    self.assertEqual(len(pages), 5)
+                    self.assertEqual(
+                        [book.id for page in pages for book in page],
+                        self.expected(sort_by, sort_order),
+                    )
+
+    def test_prev_cursor(self):
+        """Test that the previous cursor returns the page before."""
+        pages, _ = self.walk(sort_by="price")
+        books = pages[-1]
+        for expected in reversed(pages[:-1]):
+            books, _ = BookService.get_paginated(
+                page_size=5, sort_by="price", cursor=books.prev_cursor
+            )
+            self.assertEqual([b.id for b in books], [b.id for b in expected])
+        self.assertIsNone(books.prev_cursor)
+
+    def test_page_numbers_still_work(self):
+        """Test that page numbers return the same pages, with cursors."""
+        pages, _ = self.walk()
+        for number, expected in enumerate(pages, 1):
+            books, _ = BookService.get_paginated(page=number, page_size=5)
+            self.assertEqual([b.id for b in books], [b.id for b in expected])
+            self.assertEqual(books.prev_cursor is None, number == 1)
+            self.assertEqual(books.next_cursor is None, number == len(pages))
+
+        # A page number cursor continues where the page ended
+        books, _ = BookService.get_paginated(page=2, page_size=5)
+        books, _ = BookService.get_paginated(page_size=5, cursor=books.next_cursor)
+        self.assertEqual([b.id for b in books], [b.id for b in pages[2]])
+
+    def test_cursor_with_other_sort_field(self):
+        """Test that a cursor for another sort field is rejected."""
+        books, _ = BookService.get_paginated(page_size=5, sort_by="title")
+        with self.assertRaises(InvalidCursorError):
+            BookService.get_paginated(
+                page_size=5, sort_by="price", cursor=books.next_cursor
+            )
+
+    def test_genre_cursor(self):
+        """Test cursor pagination of another service."""
+        genres, total = GenreService.get_paginated(page_size=2, sort_order="desc")
+        names = [genre.name for genre in genres]
+        while genres.next_cursor:
+            genres, total = GenreService.get_paginated(
+                page_size=2, sort_order="desc", cursor=genres.next_cursor
+            )
+            names += [genre.name for genre in genres]
+        self.assertEqual(total, 5)
+        self.assertEqual(
+            names, ["Science Fiction", "Romance", "Mystery", "Horror", "Fantasy"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Tests for the single-pass problems report.
+"""
+
+import unittest
+
+from librium.database import (
+    Author,
+    AuthorOrdering,
+    Book,
+    Format,
+    Genre,
+    Language,
+    Publisher,
+)
+from librium.database.sqlalchemy.loading import count_rows
+from librium.services import BookService
+from tests.base import DatabaseTestCase
+
+
+class TestProblems(DatabaseTestCase):
+    """Tests for counting and paging books with problems."""
+
+    def setUp(self):
+        super().setUp()
+        self.session = self.Session()
+
+        paperback = Format(name="Paperback")
+        author = Author(name="Frank Herbert")
+        genre = Genre(name="Science Fiction")
+        language = Language(name="English")
+        publisher = Publisher(name="Ace")
+
+        # A complete book
+        self.session.add(
+            Book(
+                title="Dune",
+                isbn="9780441172719",
+                has_cover=True,
+                format=paperback,
+                authors=[AuthorOrdering(author=author, idx=0)],
+                genres=[genre],
+                languages=[language],
+                publishers=[publisher],
+            )
+        )
+        # Books missing a cover and everything else
+        for i in range(5):
+            self.session.add(Book(title=f"Book {i}", format=paperback))
+        # A book missing only a genre
+        self.session.add(
+            Book(
+                title="Children of Dune",
+                isbn="",
+                has_cover=True,
+                format=paperback,
+                authors=[AuthorOrdering(author=author, idx=0)],
+                languages=[language],
+                publishers=[publisher],
+            )
+        )
+        # Deleted books are not reported
+        self.session.add(Book(title="Deleted", format=paperback, deleted=True))
+        self.session.commit()
+
+        self.patch_sessions("librium.services.book")
+
+    def test_counts(self):
+        """Test that every problem is counted in one statement."""
+        with count_rows() as counter:
+            counts = BookService.get_problem_counts()
+        self.assertEqual(counter["statements"], 1)
+        self.assertEqual(
+            counts,
+            {
+                "missing_cover": 5,
+                "missing_isbn": 6,
+                "missing_author": 5,
+                "missing_publisher": 5,
+                "missing_language": 5,
+                "missing_genre": 6,
+            },
+        )
+
+    def test_problem_books(self):
+        """Test that a problem's books are paged with all their problems."""
+        books, total = BookService.get_problem_books("missing_genre", page_size=4)
+        self.assertEqual(total, 6)
+        self.assertEqual(
+            [book["title"] for book in books],
+            ["Book 0", "Book 1", "Book 2", "Book 3"],
+        )
+        self.assertEqual(set(books[0]), {"id", "title", "uuid", "problems"})
+
+        books, _ = BookService.get_problem_books("missing_genre", page=2, page_size=4)
+        self.assertEqual(
+            [(book["title"], book["problems"]) for book in books],
+            [
+                ("Book 4", list(BookService.get_problem_counts())),
+                ("Children of Dune", ["missing_isbn", "missing_genre"]),
+            ],
+        )
+
+    def test_unknown_problem(self):
+        """Test that unknown problems are rejected."""
+        with self.assertRaises(ValueError):
+            BookService.get_problem_books("missing_dragons")
+
+    def test_get_problems(self):
+        """Test that the full report groups the same books."""
+        problems = BookService.get_problems()
+        counts = BookService.get_problem_counts()
+        self.assertEqual({name: len(books) for name, books in problems.items()}, counts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+"""
+Tests for the in-memory read replica.
+"""
+
+import os
+import sqlite3
+import unittest
+
+os.environ.setdefault("FLASK_ENV", "testing")
+os.environ.setdefault("SQLDATABASE", ":memory:")
+
+from sqlalchemy import create_engine, select, text, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from librium.core.metrics import metrics
+from librium.database import Base, Book, Format
+from librium.database.sqlalchemy.profiles import use_connection_profile
+from librium.database.sqlalchemy.replica import MemoryReplica
+from librium.database.sqlalchemy.routing import READER, WRITER, RoutingSession, route
+from tests.base import FileDatabaseTestCase
+
+
+class TestMemoryReplica(FileDatabaseTestCase):
+    """Tests for serving reads from an in-memory copy of the database file."""
+
+    def setUp(self):
+        super().setUp()
+        self.engine = create_engine(f"sqlite:///{self.path}")
+        use_connection_profile(self.engine, "web")
+        Base.metadata.create_all(self.engine)
+        session = sessionmaker(bind=self.engine)()
+        paperback = Format(name="Paperback")
+        session.add_all([Book(title=f"Book {i}", format=paperback) for i in range(3)])
+        session.commit()
+        session.close()
+
+        metrics.reset()
+        self.replica = MemoryReplica(self.engine, pool_size=2, max_overflow=2)
+        self.Session = sessionmaker(
+            class_=RoutingSession,
+            writer=self.engine,
+            reader=self.replica.engine,
+            replica=self.replica,
+        )
+
+    def tearDown(self):
+        self.replica.close()
+        self.engine.dispose()
+
+    def titles(self, session):
+        with route(READER):
+            return session.scalars(select(Book.title).order_by(Book.id)).all()
+
+    def test_reads_from_memory(self):
+        """Test that reads use the copy, which rejects writes."""
+        with self.Session() as session:
+            self.assertEqual(self.titles(session), ["Book 0", "Book 1", "Book 2"])
+            with route(READER):
+                self.assertIs(session.get_bind(), self.replica.engine)
+
+        with self.assertRaises(OperationalError):
+            with self.replica.engine.begin() as connection:
+                connection.execute(text("DELETE FROM book"))
+
+    def test_sync_after_commit(self):
+        """Test that a committed write is read back from the replica."""
+        with self.Session() as session:
+            with route(WRITER):
+                session.execute(update(Book).where(Book.id == 1).values(title="Dune"))
+            session.commit()
+            self.assertEqual(self.titles(session), ["Dune", "Book 1", "Book 2"])
+
+        self.assertEqual(self.replica.generation, 2)
+        self.assertEqual(metrics.counter("replica.syncs"), 2)
+        # Nothing changed since, so nothing is copied
+        self.assertFalse(self.replica.sync())
+
+    def test_generations(self):
+        """Test that a session keeps its snapshot and old copies are freed."""
+        reading = self.Session()
+        self.assertEqual(len(self.titles(reading)), 3)
+
+        with self.engine.begin() as connection:
+            connection.execute(text("DELETE FROM book WHERE id = 3"))
+        self.assertTrue(self.replica.sync())
+
+        with self.Session() as session:
+            self.assertEqual(len(self.titles(session)), 2)
+        self.assertEqual(len(self.titles(reading)), 3)
+        reading.close()
+
+        # The first generation is gone with its last connection
+        connection = sqlite3.connect(
+            f"file:{self.replica._name}_1?mode=memory&cache=shared", uri=True
+        )
+        self.assertEqual(
+            connection.execute("SELECT count(*) FROM sqlite_master").fetchone(), (0,)
+        )
+        connection.close()
+
+    def test_staleness(self):
+        """Test that changes by other connections are reported and picked up."""
+        self.assertFalse(self.replica.staleness()["stale"])
+
+        with self.engine.begin() as connection:
+            connection.execute(text("UPDATE book SET read = 1"))
+        staleness = self.replica.staleness()
+        self.assertTrue(staleness["stale"])
+        self.assertEqual(staleness["generation"], 1)
+
+        # Checked again once max_lag has passed
+        self.replica.max_lag = 0
+        with self.Session() as session, route(READER):
+            self.assertEqual(session.scalar(select(Book.read).limit(1)), True)
+        self.assertFalse(self.replica.staleness()["stale"])
+        self.assertEqual(self.replica.staleness()["lag_seconds"], 0.0)
+
+    def test_reload(self):
+        """Test that a replaced database file is copied again."""
+        other = self.directory / "other.sqlite"
+        engine = create_engine(f"sqlite:///{other}")
+        Base.metadata.create_all(engine)
+        engine.dispose()
+
+        self.engine.dispose()
+        source = sqlite3.connect(other)
+        target = sqlite3.connect(self.path)
+        source.backup(target)
+        source.close()
+        target.close()
+
+        self.replica.reload()
+        with self.Session() as session:
+            self.assertEqual(self.titles(session), [])
+
+    def test_in_memory_database(self):
+        """Test that an in-memory database cannot be replicated."""
+        with self.assertRaises(ValueError):
+            MemoryReplica(create_engine("sqlite://"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,263 @@
+"""
+Tests for the full-text search index and BookService.search.
+"""
+
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import select
+
+from librium.database import (
+    Author,
+    AuthorOrdering,
+    Book,
+    Format,
+    Publisher,
+    Series,
+    SeriesIndex,
+)
+from librium.database.sqlalchemy.search import (
+    book_search,
+    rebuild_search_index,
+    search_match,
+    suspend_search_index,
+    title_trigram_match,
+    to_match_query,
+)
+from librium.services import BookService
+from librium.views.views.utils import get_raw
+from tests.base import DatabaseTestCase
+
+
+class SearchTestCase(DatabaseTestCase):
+    """A small library in a temporary database file."""
+
+    def setUp(self):
+        super().setUp()
+        self.session = self.Session()
+
+        paperback = Format(name="Paperback")
+        self.herbert = Author(name="Frank Herbert")
+        self.dune = Series(name="Dune Chronicles")
+        self.ace = Publisher(name="Ace Books")
+        self.books = {}
+        for i, title in enumerate(
+            ["Dune", "Dune Messiah", "Children of Dune", "The Dosadi Experiment"], 1
+        ):
+            book = Book(title=title, format=paperback)
+            book.authors = [AuthorOrdering(author=self.herbert, idx=0)]
+            book.publishers = [self.ace]
+            if "Dune" in title:
+                book.series = [SeriesIndex(series=self.dune, idx=i)]
+            self.session.add(book)
+            self.books[title] = book
+        self.books["Dune"].isbn = "9780441172719"
+        self.session.commit()
+
+    def matches(self, query):
+        return set(
+            self.session.scalars(
+                select(book_search.c.rowid).where(search_match(to_match_query(query)))
+            )
+        )
+
+    def ids(self, *titles):
+        return {self.books[title].id for title in titles}
+
+
+class TestSearchIndex(SearchTestCase):
+    """Tests for keeping the search index in sync."""
+
+    def test_to_match_query(self):
+        """Test that user input becomes quoted prefix terms."""
+        self.assertEqual(to_match_query("dune  mess"), '"dune"* "mess"*')
+        self.assertEqual(to_match_query('Dune" OR title:*'), '"Dune"* "OR"* "title"*')
+        self.assertEqual(to_match_query("--"), "")
+
+    def test_indexed_on_insert(self):
+        """Test that new books are searchable by every indexed field."""
+        self.assertEqual(self.matches("messiah"), self.ids("Dune Messiah"))
+        self.assertEqual(
+            self.matches("herbert dosadi"), self.ids("The Dosadi Experiment")
+        )
+        self.assertEqual(
+            self.matches("chronicles"),
+            self.ids("Dune", "Dune Messiah", "Children of Dune"),
+        )
+        self.assertEqual(len(self.matches("ace")), 4)
+        self.assertEqual(self.matches("9780441172719"), self.ids("Dune"))
+
+    def test_prefix_and_diacritics(self):
+        """Test prefix matching and diacritic folding."""
+        self.assertEqual(self.matches("dos"), self.ids("The Dosadi Experiment"))
+        self.herbert.name = "Frank Hérbert"
+        self.session.commit()
+        self.assertEqual(len(self.matches("herbert")), 4)
+
+    def test_updates_follow_renames(self):
+        """Test that renaming a related entity re-indexes its books."""
+        self.dune.name = "Arrakis Saga"
+        self.session.commit()
+        self.assertEqual(len(self.matches("arrakis")), 3)
+        self.assertEqual(self.matches("chronicles"), set())
+
+    def test_soft_deleted_books_removed(self):
+        """Test that soft-deleted books drop out of the index."""
+        self.books["Dune"].deleted = True
+        self.session.commit()
+        self.assertNotIn(self.books["Dune"].id, self.matches("dune"))
+
+        self.books["Dune"].deleted = False
+        self.session.commit()
+        self.assertIn(self.books["Dune"].id, self.matches("dune"))
+
+    def test_association_changes(self):
+        """Test that adding and removing authors re-indexes the book."""
+        book = self.books["The Dosadi Experiment"]
+        book.authors.append(AuthorOrdering(author=Author(name="Bill Ransom"), idx=1))
+        self.session.commit()
+        self.assertEqual(self.matches("ransom"), {book.id})
+
+        book.authors = [ordering for ordering in book.authors if ordering.idx == 0]
+        self.session.commit()
+        self.assertEqual(self.matches("ransom"), set())
+
+    def test_suspend_and_rebuild(self):
+        """Test that a bulk load with suspended triggers is indexed afterwards."""
+        with self.engine.begin() as connection:
+            with suspend_search_index(connection):
+                connection.execute(
+                    Book.__table__.insert(),
+                    [{"title": "Whipping Star", "format_id": 1, "uuid": "whipping"}],
+                )
+                self.assertEqual(
+                    connection.scalar(
+                        select(book_search.c.rowid).where(search_match('"whipping"'))
+                    ),
+                    None,
+                )
+        self.assertEqual(len(self.matches("whipping")), 1)
+
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DELETE FROM book_search")
+            rebuild_search_index(connection)
+        self.assertEqual(len(self.matches("dune")), 3)
+
+    def test_book_service_search(self):
+        """Test ranked search, filtering and pagination through the service."""
+        with patch("librium.services.book.Session", self.Session):
+            books, total = BookService.search("dune")
+            self.assertEqual(total, 3)
+            # Title matches outrank series-only matches
+            self.assertEqual(books[0].title, "Dune")
+
+            books, total = BookService.search("herbert", page=2, page_size=3)
+            self.assertEqual(total, 4)
+            self.assertEqual(len(books), 1)
+
+            books, total = BookService.search("herbert", sort_by="title")
+            self.assertEqual(
+                [book.title for book in books],
+                ["Children of Dune", "Dune", "Dune Messiah", "The Dosadi Experiment"],
+            )
+
+            self.books["Dune"].read = True
+            self.session.commit()
+            books, total = BookService.search("dune", filter_read=True)
+            self.assertEqual([book.title for book in books], ["Dune"])
+
+    def test_book_service_search_without_index(self):
+        """Test that search falls back to a title match without the index."""
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql("DROP TABLE book_search")
+        with patch("librium.services.book.Session", self.Session):
+            books, total = BookService.search("messiah")
+        self.assertEqual([book.title for book in books], ["Dune Messiah"])
+
+    def test_list_search(self):
+        """Test that the book list matches substrings unless ranked is asked for."""
+
+        def titles(**arguments):
+            books, _ = get_raw(BookService, arguments, {})
+            return {book.title for book in books}
+
+        with patch("librium.services.book.Session", self.Session):
+            self.assertEqual(titles(search="essia"), {"Dune Messiah"})
+            self.assertEqual(
+                titles(search="une"), {"Dune", "Dune Messiah", "Children of Dune"}
+            )
+            self.assertEqual(titles(search="herbert"), set())
+            self.assertEqual(titles(search="herbert", ranked=True), set(self.books))
+            self.assertEqual(titles(search="essia", ranked=True), set())
+
+
+class TestTitleIndexes(SearchTestCase):
+    """Tests for substring, prefix and suffix title matching through indexes."""
+
+    def trigram_matches(self, pattern):
+        return set(self.session.scalars(title_trigram_match(pattern)))
+
+    def test_title_reversed_key(self):
+        """Test that the reversed title key follows ORM and Core writes."""
+        book = self.books["Dune Messiah"]
+        self.assertEqual(book.title_reversed, "haissem enud")
+
+        book.title = "God Emperor of Dune"
+        self.session.commit()
+        self.assertEqual(book.title_reversed, "enud fo rorepme dog")
+
+        with self.engine.begin() as connection:
+            connection.execute(
+                Book.__table__.insert(),
+                [{"title": "Whipping Star", "format_id": 1, "uuid": "whipping"}],
+            )
+            key = connection.scalar(
+                select(Book.title_reversed).where(Book.uuid == "whipping")
+            )
+        self.assertEqual(key, "rats gnippihw")
+
+    def test_trigram_index_follows_updates(self):
+        """Test that the trigram index follows renamed and deleted books."""
+        book = self.books["Dune Messiah"]
+        self.assertEqual(self.trigram_matches("%messi%"), {book.id})
+
+        book.title = "God Emperor of Dune"
+        self.session.commit()
+        self.assertEqual(self.trigram_matches("%messi%"), set())
+        self.assertEqual(self.trigram_matches("%EMPEROR%"), {book.id})
+
+        self.session.delete(book)
+        self.session.commit()
+        self.assertEqual(self.trigram_matches("%emperor%"), set())
+
+    def test_matches_equal_ilike(self):
+        """Test that indexed title matches return exactly what ilike returns."""
+        cases = {
+            "search": ["dune", "DUNE", "of", "une m", "ren%dune", "d_ne", "x"],
+            "start_with": ["dune", "du", "children", "the d", "d%e", "zzz"],
+            "ends_with": ["dune", "ent", "une", "siah", "D_ne", "e%t", "dun"],
+        }
+        patterns = {
+            "search": "%{}%",
+            "start_with": "{}%",
+            "ends_with": "%{}",
+        }
+        with patch("librium.services.book.Session", self.Session):
+            for argument, texts in cases.items():
+                for text in texts:
+                    with self.subTest(argument=argument, text=text):
+                        books, total = BookService.get_paginated(**{argument: text})
+                        expected = self.session.scalars(
+                            select(Book.title)
+                            .where(
+                                Book.deleted.is_(False),
+                                Book.title.ilike(patterns[argument].format(text)),
+                            )
+                            .order_by(Book.title)
+                        ).all()
+                        self.assertEqual([book.title for book in books], expected)
+                        self.assertEqual(total, len(expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
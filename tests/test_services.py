@@ -71,7 +71,9 @@ class TestBookService(TestServiceBase):
         book = BookService.get_by_id(1)
 
         # Assert that the correct methods were called
-        mock_session.get.assert_called_once_with(Book, 1)
+        mock_session.get.assert_called_once_with(
+            Book, 1, execution_options={"include_deleted": True}
+        )
         self.assertEqual(book.id, 1)
         self.assertEqual(book.title, "Test Book")
 
@@ -91,7 +93,9 @@ class TestBookService(TestServiceBase):
         book = BookService.get_by_id(1)
 
         # Assert that the correct methods were called
-        mock_session.get.assert_called_once_with(Book, 1)
+        mock_session.get.assert_called_once_with(
+            Book, 1, execution_options={"include_deleted": True}
+        )
         self.assertIsNone(book)  # Should return None for deleted books
 
     @patch("librium.services.book.Session")
@@ -227,7 +231,9 @@ class TestBookService(TestServiceBase):
         )
 
         # Assert that the correct methods were called
-        mock_session.get.assert_called_once_with(Book, 1)
+        mock_session.get.assert_called_once_with(
+            Book, 1, execution_options={"include_deleted": True}
+        )
         self.assertEqual(mock_book.title, "Updated Book")
         self.assertEqual(mock_book.released, 2024)
         # transactional decorator commits on Session() instance from transactions module
@@ -250,7 +256,9 @@ class TestBookService(TestServiceBase):
         result = BookService.delete(1)
 
         # Assert that the correct methods were called
-        mock_session.get.assert_called_once_with(Book, 1)
+        mock_session.get.assert_called_once_with(
+            Book, 1, execution_options={"include_deleted": True}
+        )
         self.assertTrue(mock_book.deleted)  # Check that deleted flag was set to True
         self.assertTrue(result)  # Check that the method returned True
         # transactional decorator commits on Session() instance from transactions module
@@ -325,47 +333,46 @@ class TestBookService(TestServiceBase):
     @patch("librium.services.book.Session")
     def test_get_problems(self, mock_session):
         """Test get_problems method."""
-        # Mock books for different problems
-        book_no_cover = MagicMock(
-            spec=Book, title="No Cover", has_cover=False, deleted=False
-        )
-        book_no_isbn = MagicMock(spec=Book, title="No ISBN", isbn=None, deleted=False)
-        book_no_author = MagicMock(spec=Book, title="No Author", deleted=False)
-        book_no_publisher = MagicMock(spec=Book, title="No Publisher", deleted=False)
-        book_no_language = MagicMock(spec=Book, title="No Language", deleted=False)
-        book_no_genre = MagicMock(spec=Book, title="No Genre", deleted=False)
-
-        # We need to mock Session.scalars(...).unique().all() for each call in get_problems
-        # There are 6 calls in get_problems
-        mock_scalars = MagicMock()
-        mock_session.scalars.return_value = mock_scalars
-        mock_unique = MagicMock()
-        mock_scalars.unique.return_value = mock_unique
-
-        mock_unique.all.side_effect = [
-            [book_no_cover],  # missing_cover
-            [book_no_isbn],  # missing_isbn
-            [book_no_author],  # missing_author
-            [book_no_publisher],  # missing_publisher
-            [book_no_language],  # missing_language
-            [book_no_genre],  # missing_genre
+        # Rows of (id, title, uuid, problem mask) from the single query
+        no_cover = MagicMock(id=1, title="No Cover", uuid="a", problems=1)
+        no_isbn_or_genre = MagicMock(id=2, title="No ISBN", uuid="b", problems=2 | 32)
+        no_author = MagicMock(id=3, title="No Author", uuid="c", problems=4)
+        mock_session.execute.return_value.all.return_value = [
+            no_cover,
+            no_isbn_or_genre,
+            no_author,
         ]
 
         problems = BookService.get_problems()
 
-        self.assertIn("missing_cover", problems)
-        self.assertIn("missing_isbn", problems)
-        self.assertIn("missing_author", problems)
-        self.assertIn("missing_publisher", problems)
-        self.assertIn("missing_language", problems)
-        self.assertIn("missing_genre", problems)
-
-        self.assertEqual(problems["missing_cover"], [book_no_cover])
-        self.assertEqual(problems["missing_isbn"], [book_no_isbn])
-        self.assertEqual(problems["missing_author"], [book_no_author])
-        self.assertEqual(problems["missing_publisher"], [book_no_publisher])
-        self.assertEqual(problems["missing_language"], [book_no_language])
-        self.assertEqual(problems["missing_genre"], [book_no_genre])
+        mock_session.execute.assert_called_once()
+        self.assertEqual(
+            list(problems),
+            [
+                "missing_cover",
+                "missing_isbn",
+                "missing_author",
+                "missing_publisher",
+                "missing_language",
+                "missing_genre",
+            ],
+        )
+        self.assertEqual([b["id"] for b in problems["missing_cover"]], [1])
+        self.assertEqual([b["id"] for b in problems["missing_isbn"]], [2])
+        self.assertEqual([b["id"] for b in problems["missing_author"]], [3])
+        self.assertEqual(problems["missing_publisher"], [])
+        self.assertEqual(problems["missing_language"], [])
+        self.assertEqual(
+            problems["missing_genre"],
+            [
+                {
+                    "id": 2,
+                    "title": "No ISBN",
+                    "uuid": "b",
+                    "problems": ["missing_isbn", "missing_genre"],
+                }
+            ],
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,131 @@
+"""
+Tests for request-scoped sessions, read snapshots and streaming.
+"""
+
+import os
+import unittest
+
+os.environ.setdefault("FLASK_ENV", "testing")
+os.environ.setdefault("SQLDATABASE", ":memory:")
+
+from flask import Flask
+from sqlalchemy import func, select
+from sqlalchemy.orm import sessionmaker
+
+from librium.core.app import configure_session_lifecycle
+from librium.core.metrics import metrics
+from librium.database import Author, AuthorOrdering, Book, Format
+from librium.database.sqlalchemy.loading import loading_options, stream
+from librium.database.sqlalchemy.profiles import use_connection_profile
+from librium.database.sqlalchemy.routing import create_read_engine
+from tests.base import DatabaseTestCase
+
+
+class TestSessionDatabase(DatabaseTestCase):
+    """Base class for tests on a file database with a few books."""
+
+    def setUp(self):
+        super().setUp()
+        paperback = Format(name="Paperback")
+        self.Session.add_all(
+            [Book(title=f"Book {i}", format=paperback) for i in range(10)]
+        )
+        self.Session.commit()
+        self.Session.remove()
+
+    def create_engine(self):
+        engine = super().create_engine()
+        use_connection_profile(engine, "web")
+        return engine
+
+
+class TestSessionLifecycle(TestSessionDatabase):
+    """Tests for removing the session after each request."""
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.app = Flask(__name__)
+        self.app.config["SESSION_IDENTITY_MAP_LIMIT"] = 5
+        self.app.add_url_rule(
+            "/books",
+            "books",
+            lambda: str(len(self.Session.scalars(select(Book)).all())),
+        )
+        self.app.add_url_rule("/static", "static_page", lambda: "ok")
+        self.patch_sessions("librium.core.app")
+        configure_session_lifecycle(self.app)
+
+    def test_session_removed(self):
+        """Test that the session is removed and its size reported."""
+        with self.assertLogs("librium.core.app", level="WARNING") as logs:
+            response = self.app.test_client().get("/books")
+        self.assertEqual(response.data, b"10")
+        self.assertFalse(self.Session.registry.has())
+        self.assertEqual(metrics.counter("requests.identity_map.over_limit"), 1)
+        self.assertIn("books loaded 11 objects into the session", logs.output[0])
+        self.assertEqual(
+            metrics.snapshot()["timings"]["requests.identity_map"]["count"], 1
+        )
+
+    def test_unused_session(self):
+        """Test that requests without a session do not create one."""
+        self.app.test_client().get("/static")
+        self.assertFalse(self.Session.registry.has())
+        self.assertNotIn("requests.identity_map", metrics.snapshot()["timings"])
+
+
+class TestReadSnapshot(TestSessionDatabase):
+    """Tests for the consistent snapshot of read sessions."""
+
+    def test_snapshot_until_closed(self):
+        """Test that a read session does not see commits made after it began."""
+        reader = create_read_engine(self.engine)
+        session = sessionmaker(bind=reader)()
+        count = select(func.count(Book.id))
+        try:
+            self.assertEqual(session.scalar(count), 10)
+            self.Session.add(Book(title="Book 10", format_id=1))
+            self.Session.commit()
+            self.assertEqual(session.scalar(count), 10)
+            session.close()
+            self.assertEqual(session.scalar(count), 11)
+        finally:
+            session.close()
+            reader.dispose()
+
+
+class TestStream(TestSessionDatabase):
+    """Tests for loading the results of bulk jobs in batches."""
+
+    def test_stream(self):
+        """Test that every book is yielded while the session stays bounded."""
+        session = self.Session()
+        sizes = []
+        titles = []
+        for book in stream(session, select(Book).order_by(Book.id), batch_size=3):
+            titles.append(book.title)
+            sizes.append(len(session.identity_map))
+        self.assertEqual(titles, [f"Book {i}" for i in range(10)])
+        # Three books and their format
+        self.assertLessEqual(max(sizes), 4)
+
+    def test_stream_with_relationships(self):
+        """Test that books are streamed with the relationships of a profile."""
+        herbert = Author(name="Frank Herbert")
+        for book in self.Session.scalars(select(Book)):
+            book.authors = [AuthorOrdering(author=herbert, idx=0)]
+        self.Session.commit()
+        self.Session.remove()
+
+        session = self.Session()
+        statement = select(Book).options(*loading_options("export"))
+        authors = [
+            [ordering.author.name for ordering in book.authors]
+            for book in stream(session, statement, batch_size=3)
+        ]
+        self.assertEqual(authors, [["Frank Herbert"]] * 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+Tests for the global soft-delete criteria and the partial indexes.
+"""
+
+import json
+import os
+import unittest
+
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from librium.database import Author, AuthorOrdering, Book, Format
+from librium.database.sqlalchemy.instrumentation import explain_query_plan
+from librium.services import BookService, FormatService
+from tests.base import DatabaseTestCase
+from utils import export
+
+
+class TestSoftDelete(DatabaseTestCase):
+    """Tests for leaving soft deleted rows out of ORM queries."""
+
+    def setUp(self):
+        super().setUp()
+        # Separate from the services' sessions, which tests may patch in
+        self.session = sessionmaker(bind=self.engine)()
+        self.addCleanup(self.session.close)
+
+        paperback = Format(name="Paperback")
+        herbert = Author(name="Frank Herbert", last_name="Herbert")
+        self.dune = Book(
+            title="Dune",
+            isbn="9780441172719",
+            format=paperback,
+            authors=[AuthorOrdering(author=herbert, idx=0)],
+        )
+        self.messiah = Book(title="Dune Messiah", format=paperback, deleted=True)
+        self.session.add_all([self.dune, self.messiah])
+        self.session.add(Author(name="Brian Herbert", deleted=True))
+        self.session.commit()
+
+    def test_queries_exclude_deleted(self):
+        """Test that selects, counts and joins leave out deleted rows."""
+        self.assertEqual(self.session.scalars(select(Book.title)).all(), ["Dune"])
+        self.assertEqual(self.session.scalar(select(func.count(Book.id))), 1)
+        self.assertEqual(self.session.query(Author).count(), 1)
+        self.assertEqual(Book.search_by_title(self.session, "dune"), [self.dune])
+
+    def test_include_deleted(self):
+        """Test that the execution option includes deleted rows."""
+        titles = self.session.scalars(
+            select(Book.title).order_by(Book.id).execution_options(include_deleted=True)
+        ).all()
+        self.assertEqual(titles, ["Dune", "Dune Messiah"])
+        self.assertEqual(
+            len(Book.search_by_title(self.session, "dune", include_deleted=True)), 2
+        )
+
+    def test_loaded_rows_are_refreshed(self):
+        """Test that a deleted row already loaded can still be refreshed."""
+        self.session.expire(self.messiah)
+        self.assertEqual(self.messiah.title, "Dune Messiah")
+        self.session.expire_all()
+        self.assertTrue(self.messiah.deleted)
+        self.assertEqual(self.dune.authors[0].author.name, "Frank Herbert")
+
+    def test_lookups_by_id_include_deleted(self):
+        """Test that lookups by id and the export still find deleted rows."""
+        self.session.add(Format(name="Hardcover", deleted=True))
+        self.session.commit()
+        self.patch_sessions(
+            "librium.services.book",
+            "librium.services.format",
+            "librium.database.sqlalchemy.transactions",
+            "utils.export",
+        )
+
+        self.assertEqual(FormatService.get_by_id(2).name, "Hardcover")
+        # Restoring a deleted book
+        BookService.update(self.messiah.id, deleted=False)
+        self.session.expire_all()
+        self.assertFalse(self.messiah.deleted)
+        BookService.update(self.messiah.id, deleted=True)
+
+        path = export.run("json")
+        self.addCleanup(os.remove, path)
+        with open(path, encoding="utf-8") as fp:
+            titles = [book["title"] for book in json.load(fp)]
+        self.assertEqual(titles, ["Dune", "Dune Messiah"])
+
+    def test_partial_indexes_are_used(self):
+        """Test that the lookups are planned with the partial indexes."""
+        plans = []
+
+        @event.listens_for(self.engine, "before_cursor_execute")
+        def explain(conn, cursor, statement, parameters, context, executemany):
+            plans.append(explain_query_plan(cursor.connection, statement, parameters))
+
+        for statement, index in [
+            (select(Book).where(Book.title == "Dune"), "idx_book_title"),
+            (select(Book).where(Book.isbn == "9780441172719"), "idx_book_isbn"),
+            (select(Book).where(Book.released == 1965), "idx_book_released"),
+            (
+                select(Author).where(Author.last_name == "Herbert"),
+                "idx_author_last_name",
+            ),
+        ]:
+            with self.subTest(index=index):
+                plans.clear()
+                self.session.scalars(statement).all()
+                self.assertIn(f"USING INDEX {index}", plans[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
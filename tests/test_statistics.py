@@ -0,0 +1,126 @@
+"""
+Tests for the materialized library statistics.
+"""
+
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+
+from flask import Flask
+from sqlalchemy import insert
+
+from librium.database import Book, Format, Genre
+from librium.database.sqlalchemy.statistics import (
+    rebuild_statistics,
+    verify_statistics,
+)
+from librium.services import BookService
+from tests.base import DatabaseTestCase
+
+
+class TestLibraryStatistics(DatabaseTestCase):
+    """Tests for the trigger-maintained statistics."""
+
+    def setUp(self):
+        super().setUp()
+        self.session = self.Session()
+
+        self.paperback = Format(name="Paperback")
+        self.hardcover = Format(name="Hardcover")
+        self.fantasy = Genre(name="Fantasy")
+        self.horror = Genre(name="Horror")
+        for i in range(6):
+            self.session.add(
+                Book(
+                    title=f"Book {i}",
+                    format=self.paperback if i % 2 else self.hardcover,
+                    read=i < 2,
+                    released=2000 + i % 3,
+                    price=Decimal("9.99") if i % 3 else None,
+                    genres=[self.fantasy] if i < 4 else [self.fantasy, self.horror],
+                )
+            )
+        self.session.commit()
+
+        self.patch_sessions("librium.services.book")
+
+    def assertConsistent(self):
+        with self.engine.connect() as connection:
+            self.assertEqual(verify_statistics(connection), [])
+
+    def statistics(self):
+        with Flask(__name__).app_context(), patch(
+            "librium.core.inflation.InflationService.get_inflation_factors",
+            return_value={},
+        ):
+            return BookService.get_statistics()
+
+    def test_statistics(self):
+        """Test that the statistics are read from the materialized buckets."""
+        stats = self.statistics()
+        self.assertEqual(
+            (stats["_total_books"], stats["_read_books"], stats["_unread_books"]),
+            (6, 2, 4),
+        )
+        self.assertEqual(stats["books_per_genre"], {"Fantasy": 6, "Horror": 2})
+        self.assertEqual(stats["books_per_year"], {2000: 2, 2001: 2, 2002: 2})
+        self.assertEqual(stats["books_per_format"], {"Hardcover": 3, "Paperback": 3})
+        self.assertEqual(stats["price_per_year"], {2000: 0.0, 2001: 19.98, 2002: 19.98})
+        self.assertEqual(stats["total_price"], 39.96)
+
+    def test_changes_keep_statistics_consistent(self):
+        """Test that inserts, updates and deletes maintain every bucket."""
+        book = self.session.get(Book, 1)
+        changes = [
+            lambda: setattr(book, "price", Decimal("0.10")),
+            lambda: setattr(book, "released", 1999),
+            lambda: setattr(book, "format", self.paperback),
+            lambda: setattr(book, "read", False),
+            lambda: book.genres.append(self.horror),
+            lambda: book.genres.remove(self.fantasy),
+            lambda: setattr(book, "deleted", True),
+            lambda: book.genres.append(self.fantasy),
+            lambda: setattr(book, "deleted", False),
+            lambda: self.session.delete(self.session.get(Book, 5)),
+            lambda: self.session.delete(book),
+        ]
+        for number, change in enumerate(changes):
+            with self.subTest(change=number):
+                change()
+                self.session.commit()
+                self.assertConsistent()
+
+        stats = self.statistics()
+        self.assertEqual(stats["_total_books"], 4)
+        self.assertEqual(stats["books_per_genre"], {"Fantasy": 4, "Horror": 1})
+        self.assertNotIn(1999, stats["books_per_year"])
+
+    def test_core_inserts(self):
+        """Test that Core bulk inserts are counted too."""
+        with self.engine.begin() as connection:
+            connection.execute(
+                insert(Book),
+                [
+                    {"title": "Bulk", "format_id": 1, "released": 2020, "price": 5}
+                    for _ in range(3)
+                ],
+            )
+        self.assertConsistent()
+        self.assertEqual(self.statistics()["price_per_year"][2020], 15.0)
+
+    def test_rebuild(self):
+        """Test that a rebuild reports and repairs drifted buckets."""
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(
+                "UPDATE library_statistic SET books = books + 1 WHERE kind = 'year'"
+            )
+            differences = rebuild_statistics(connection)
+        self.assertEqual(
+            [(kind, bucket) for kind, bucket, _, _ in differences],
+            [("year", 2000), ("year", 2001), ("year", 2002)],
+        )
+        self.assertConsistent()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+"""
+Tests for the read models of list views.
+"""
+
+import sqlite3
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+
+from sqlalchemy import event, select
+
+from librium.database import (
+    Author,
+    AuthorOrdering,
+    Book,
+    Format,
+    Genre,
+    Publisher,
+    Series,
+    SeriesIndex,
+)
+from librium.database.sqlalchemy import summaries
+from librium.database.sqlalchemy.summaries import (
+    BookSummary,
+    book_summaries,
+    summary_columns,
+)
+from librium.services import BookService, GenreService
+from tests.base import DatabaseTestCase
+
+
+class TestBookSummaries(DatabaseTestCase):
+    """Tests for building BookSummary read models."""
+
+    def setUp(self):
+        super().setUp()
+        session = self.Session()
+
+        paperback = Format(name="Paperback")
+        herbert = Author(name="Frank Herbert")
+        anderson = Author(name="Kevin J. Anderson")
+        dune = Series(name="Dune")
+        science_fiction = Genre(name="Science Fiction")
+        for i in range(12):
+            book = Book(
+                title=f"Book {i:02}",
+                format=paperback,
+                price=Decimal(i),
+                released=1965 + i,
+                genres=[science_fiction] if i % 2 else [],
+                publishers=[Publisher(name=f"Publisher {i}")],
+                authors=[AuthorOrdering(author=herbert, idx=0)],
+            )
+            if i % 3 == 0:
+                book.authors.append(AuthorOrdering(author=anderson, idx=1))
+                book.series.append(SeriesIndex(series=dune, idx=Decimal(i) / 2))
+            session.add(book)
+        session.add(Book(title="Book 99", format=paperback, deleted=True))
+        session.commit()
+        self.genre_id = science_fiction.id
+        self.Session.remove()
+
+        self.patch_sessions(
+            "librium.services.book",
+            "librium.services.genre",
+            "librium.database.sqlalchemy.transactions",
+        )
+
+    def test_related_lists(self):
+        """Test that a summary has the columns and related lists of its profile."""
+        session = self.Session()
+        rows = session.execute(
+            select(*summary_columns("api")).where(Book.title == "Book 03")
+        ).all()
+        (book,) = book_summaries(session, rows, "api")
+
+        self.assertIsInstance(book, BookSummary)
+        self.assertFalse(hasattr(book, "__dict__"))
+        self.assertEqual((book.title, book.released, book.price), ("Book 03", 1968, 3))
+        self.assertEqual(book.format.name, "Paperback")
+        self.assertEqual(
+            [(a.name, a.idx) for a in book.authors],
+            [("Frank Herbert", 0), ("Kevin J. Anderson", 1)],
+        )
+        self.assertEqual([(s.name, s.index) for s in book.series], [("Dune", 1.5)])
+        self.assertEqual([g.name for g in book.genres], ["Science Fiction"])
+        self.assertEqual([p.name for p in book.publishers], ["Publisher 3"])
+        self.assertEqual(book.languages, [])
+
+    def test_statements_per_page(self):
+        """Test that a page costs one statement per related list."""
+        statements = []
+
+        @event.listens_for(self.engine, "before_cursor_execute")
+        def count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        session = self.Session()
+        rows = session.execute(select(*summary_columns("list"))).all()
+        statements.clear()
+        books = book_summaries(session, rows)
+        self.assertEqual(len(books), 12)
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(len(session.identity_map), 0)
+
+    def test_paginated(self):
+        """Test that summary pages match the ORM pages, cursors included."""
+        for sort_by in ["title", "price"]:
+            with self.subTest(sort_by=sort_by):
+                books, total = BookService.get_paginated(
+                    page_size=5, sort_by=sort_by, sort_order="desc"
+                )
+                summaries, summary_total = BookService.get_paginated(
+                    page_size=5, sort_by=sort_by, sort_order="desc", summaries=True
+                )
+                self.assertEqual(summary_total, total)
+                self.assertEqual([b.id for b in summaries], [b.id for b in books])
+                self.assertEqual(summaries.next_cursor, books.next_cursor)
+
+                following, _ = BookService.get_paginated(
+                    page_size=5,
+                    sort_by=sort_by,
+                    sort_order="desc",
+                    cursor=summaries.next_cursor,
+                    summaries=True,
+                )
+                self.assertIsInstance(following[0], BookSummary)
+                self.assertEqual(len(following), 5)
+
+    def test_search(self):
+        """Test that search results can be summaries."""
+        books, total = BookService.search("book 0", page_size=20, summaries=True)
+        self.assertEqual(total, 10)
+        self.assertTrue(all(isinstance(book, BookSummary) for book in books))
+
+    def test_genre_formatted(self):
+        """Test that the genre page lists the summaries of the genre's books."""
+        books = GenreService.get_books_in_genre_formatted(self.genre_id, None)
+        self.assertEqual(len(books), 6)
+        # Books outside a series first, then by series and index
+        self.assertEqual(
+            [book["name"] for book in books],
+            ["Book 01", "Book 05", "Book 07", "Book 11", "Book 03", "Book 09"],
+        )
+        self.assertEqual(books[4]["series"], [{"name": "Dune", "id": 1, "idx": 1.5}])
+        self.assertEqual(
+            [a["name"] for a in books[4]["authors"]],
+            ["Frank Herbert", "Kevin J. Anderson"],
+        )
+        self.assertEqual(GenreService.get_books_in_genre_formatted(999, None), [])
+
+    def test_more_books_than_parameters(self):
+        """Test that long lists are loaded in chunks of bound parameters."""
+
+        @event.listens_for(self.engine, "connect")
+        def limit_parameters(dbapi_connection, record):
+            dbapi_connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 5)
+
+        self.engine.dispose()
+        with patch.object(summaries, "CHUNK_SIZE", 4):
+            books = GenreService.get_books_in_genre_formatted(self.genre_id, None)
+        self.assertEqual(len(books), 6)
+        self.assertEqual(
+            [a["name"] for a in books[4]["authors"]],
+            ["Frank Herbert", "Kevin J. Anderson"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
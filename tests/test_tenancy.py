@@ -0,0 +1,276 @@
+"""
+Tests for the databases per tenant.
+"""
+
+import threading
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import scoped_session
+
+from librium.core.app import configure_session_lifecycle, configure_tenancy
+from librium.core.metrics import metrics
+from librium.database import Base, Book, Genre
+from librium.database.sqlalchemy.routing import WRITER, route
+from librium.database.sqlalchemy.tenancy import (
+    TenantRegistry,
+    TenantSessionmaker,
+    UnknownTenantError,
+    current_tenant,
+    tenant_file_name,
+    tenant_scope,
+    use_tenant,
+)
+from librium.services import GenreService
+from tests.base import FileDatabaseTestCase
+
+
+class TestTenantDatabase(FileDatabaseTestCase):
+    """Base class for tests with a directory of tenant databases."""
+
+    def setUp(self):
+        super().setUp()
+        self.tenants = TenantRegistry(
+            self.directory / "tenants",
+            create_schema=Base.metadata.create_all,
+            maxsize=16,
+            create=True,
+        )
+        metrics.reset()
+
+    def tearDown(self):
+        self.tenants.close()
+
+
+class TestTenantRegistry(TestTenantDatabase):
+    """Tests for opening, creating and closing the databases of tenants."""
+
+    def test_hundreds_of_tenants(self):
+        """Test that only the most recently used tenants stay open."""
+        names = [f"tenant-{i}" for i in range(300)]
+        for name in names:
+            with self.tenants.get(name).engine.connect() as connection:
+                self.assertEqual(
+                    connection.scalar(select(func.count()).select_from(Book)), 0
+                )
+
+        self.assertEqual(len(list((self.directory / "tenants").glob("*.sqlite"))), 300)
+        self.assertEqual(len(self.tenants), 16)
+        self.assertEqual(metrics.counter("tenants.created"), 300)
+        self.assertEqual(metrics.counter("tenants.engines.evicted"), 284)
+        self.assertEqual(metrics.snapshot()["gauges"]["tenants.engines.open"], 16)
+
+        for name in names[-16:]:
+            self.tenants.get(name)
+        self.assertEqual(metrics.counter("tenants.engines.hit"), 16)
+        self.assertNotIn(names[0], self.tenants)
+
+    def test_idle_tenants_closed(self):
+        """Test that tenants unused for idle_seconds are closed."""
+        self.tenants.idle_seconds = 60
+        with patch("librium.database.sqlalchemy.tenancy.time.monotonic") as clock:
+            clock.return_value = 1000
+            self.tenants.get("alice")
+            clock.return_value = 1030
+            self.tenants.get("bob")
+
+            clock.return_value = 1070
+            self.assertEqual(self.tenants.evict_idle(), 1)
+            self.assertNotIn("alice", self.tenants)
+            self.assertIn("bob", self.tenants)
+
+            # Opening another tenant closes the idle ones as well
+            clock.return_value = 1100
+            self.tenants.get("carol")
+            self.assertEqual(len(self.tenants), 1)
+
+    def test_unknown_tenant(self):
+        """Test that tenants are only created when asked to."""
+        self.tenants.create = False
+        with self.assertRaises(UnknownTenantError):
+            self.tenants.get("alice")
+
+        path = self.tenants.create_tenant("alice")
+        self.assertEqual(self.tenants.get("alice").path, path)
+        self.assertEqual(self.tenants.create_tenant("alice"), path)
+
+    def test_file_names(self):
+        """Test that every tenant gets a file of its own in the directory."""
+        self.assertEqual(tenant_file_name("alice"), "alice.sqlite")
+        self.assertEqual(
+            tenant_file_name("books.example.com"), "books.example.com.sqlite"
+        )
+        names = ["Alice", "alice@example.com", "alice_example.com", "../alice", ".."]
+        files = {tenant_file_name(name) for name in names}
+        self.assertEqual(len(files), len(names))
+        for name in files:
+            self.assertNotIn("/", name)
+            self.assertFalse(name.startswith("."))
+
+
+class TestTenantSessions(TestTenantDatabase):
+    """Tests for services using the database of the current tenant."""
+
+    def setUp(self):
+        super().setUp()
+        self.engine = create_engine(f"sqlite:///{self.directory / 'default.sqlite'}")
+        Base.metadata.create_all(self.engine)
+        self.Session = scoped_session(
+            TenantSessionmaker(self.tenants, writer=self.engine, reader=self.engine),
+            scopefunc=tenant_scope,
+        )
+        self.patchers = [
+            patch(f"librium.{module}.Session", self.Session)
+            for module in ("services.genre", "database.sqlalchemy.transactions")
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        for tenant in (None, "alice", "bob"):
+            with use_tenant(tenant):
+                self.Session.remove()
+        self.engine.dispose()
+        super().tearDown()
+
+    def test_isolated_libraries(self):
+        """Test that tenants only see their own library and counts."""
+        for tenant, genre in [("alice", "Fantasy"), ("bob", "Horror")]:
+            with use_tenant(tenant):
+                GenreService.create(genre)
+
+        # Both libraries are at the same version, so the counts must be
+        # cached per tenant
+        with use_tenant("alice"):
+            self.assertEqual(GenreService.get_paginated(search="fantasy")[1], 1)
+        with use_tenant("bob"):
+            genres, total = GenreService.get_paginated(search="fantasy")
+            self.assertEqual((genres, total), ([], 0))
+            self.assertEqual(GenreService.get_paginated()[1], 1)
+
+        with self.engine.connect() as connection:
+            self.assertEqual(
+                connection.scalar(select(func.count()).select_from(Genre)), 0
+            )
+
+    def test_sessions_bound_to_tenant(self):
+        """Test that each tenant's sessions use its engines and write lock."""
+        with use_tenant("alice"), route(WRITER):
+            alice = self.Session()
+            self.assertIs(alice.get_bind(), self.tenants.get("alice").engine)
+        with use_tenant("bob"):
+            bob = self.Session()
+        self.assertIsNot(alice, bob)
+        self.assertIsNot(alice.write_coordinator, bob.write_coordinator)
+
+        with route(WRITER):
+            self.assertIs(self.Session().get_bind(), self.engine)
+            self.assertIsNone(self.Session().write_coordinator)
+
+    def test_concurrent_tenants(self):
+        """Test that tenants write at the same time without waiting for each other."""
+        errors = []
+
+        def writer(tenant):
+            try:
+                with use_tenant(tenant):
+                    for i in range(20):
+                        GenreService.create(f"Genre {i}")
+                    self.Session.remove()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [
+            threading.Thread(target=writer, args=(f"tenant-{i}",)) for i in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        for i in range(8):
+            with self.tenants.get(f"tenant-{i}").engine.connect() as connection:
+                self.assertEqual(
+                    connection.scalar(select(func.count()).select_from(Genre)), 20
+                )
+
+
+class TestTenantRequests(TestTenantDatabase):
+    """Tests for resolving the tenant of each request."""
+
+    def setUp(self):
+        super().setUp()
+        self.tenants.create = False
+        self.tenants.create_tenant("alice.example")
+        self.tenants.create_tenant("bob")
+
+        self.app = Flask(__name__)
+        self.app.config.update(
+            TENANT_RESOLVER="host",
+            SESSION_IDENTITY_MAP_LIMIT=100,
+            JWT_SECRET_KEY="secret-key-for-the-tenancy-tests",
+        )
+        JWTManager(self.app)
+        self.app.add_url_rule("/tenant", "tenant", lambda: str(current_tenant()))
+        self.Session = scoped_session(
+            TenantSessionmaker(self.tenants), scopefunc=tenant_scope
+        )
+        self.patchers = [
+            patch("librium.core.app.tenants", self.tenants),
+            patch("librium.core.app.Session", self.Session),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        configure_tenancy(self.app)
+        configure_session_lifecycle(self.app)
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        super().tearDown()
+
+    def test_host(self):
+        """Test that the host of a request selects its tenant."""
+        response = self.client.get("/tenant", base_url="http://alice.example:5000")
+        self.assertEqual(response.data, b"alice.example")
+        self.assertIsNone(current_tenant())
+
+        response = self.client.get("/tenant", base_url="http://mallory.example")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(metrics.counter("tenants.unknown"), 1)
+
+    def test_identity(self):
+        """Test that the JWT identity of a request selects its tenant."""
+        self.app.config["TENANT_RESOLVER"] = "identity"
+        with self.app.app_context():
+            token = create_access_token(identity="bob")
+
+        response = self.client.get(
+            "/tenant", headers={"Authorization": f"Bearer {token}"}
+        )
+        self.assertEqual(response.data, b"bob")
+        # Requests without a token use the default database
+        self.assertEqual(self.client.get("/tenant").data, b"None")
+
+    def test_session_removed(self):
+        """Test that the session of the request's tenant is removed."""
+
+        def count_genres():
+            return str(self.Session.scalar(select(func.count()).select_from(Genre)))
+
+        self.app.add_url_rule("/genres", "genres", count_genres)
+        response = self.client.get("/genres", base_url="http://bob")
+        self.assertEqual(response.data, b"0")
+        with use_tenant("bob"):
+            self.assertFalse(self.Session.registry.has())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,284 @@
+"""
+Tests for coordinating the write transactions of the database.
+"""
+
+import sqlite3
+import threading
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from librium.core.metrics import metrics
+from librium.database import Book, Format, Genre, transactional
+from librium.database.sqlalchemy.profiles import use_connection_profile
+from librium.database.sqlalchemy.writes import (
+    WriteCoordinator,
+    is_busy_error,
+    use_immediate_transactions,
+)
+from librium.services import BookService
+from tests.base import DatabaseTestCase
+
+SERVICES = ("author", "book", "format", "genre", "language", "publisher", "series")
+
+
+class TestWriteCoordinator(DatabaseTestCase):
+    """Tests for serializing write transactions and retrying busy ones."""
+
+    def setUp(self):
+        super().setUp()
+        self.Session.add(
+            Book(title="Dune", page_count=100, format=Format(name="Paperback"))
+        )
+        self.Session.commit()
+        self.Session.remove()
+
+        metrics.reset()
+        self.coordinator = WriteCoordinator(retries=3, backoff_ms=5)
+        self.patch_sessions("librium.database.sqlalchemy.transactions")
+        patcher = patch(
+            "librium.database.sqlalchemy.transactions.write_coordinator",
+            self.coordinator,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_engine(self, timeout: float = 5.0):
+        engine = create_engine(
+            f"sqlite:///{self.path}", connect_args={"timeout": timeout}
+        )
+        use_connection_profile(engine, "web")
+        # The profile's busy_timeout would override the connection's timeout
+        event.listen(
+            engine,
+            "connect",
+            lambda dbapi_connection, record: dbapi_connection.execute(
+                f"PRAGMA busy_timeout={int(timeout * 1000)}"
+            ),
+        )
+        use_immediate_transactions(engine)
+        return engine
+
+    def add_page(self, Session):
+        book = Session.get(Book, 1)
+        book.page_count += 1
+
+    def pages_added(self):
+        self.Session.remove()
+        return self.Session.get(Book, 1).page_count - 100
+
+    def lock_database(self):
+        """Take the write lock like another process would."""
+        connection = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False
+        )
+        connection.execute("BEGIN IMMEDIATE")
+        return connection
+
+    def test_concurrent_writes(self):
+        """Test that concurrent writes of two processes neither fail nor get lost."""
+
+        @transactional
+        def add_page():
+            self.add_page(self.Session)
+
+        # A second process, with its own engine, sessions and lock
+        other_engine = self.create_engine()
+        OtherSession = scoped_session(sessionmaker(bind=other_engine))
+        other_coordinator = WriteCoordinator(retries=3, backoff_ms=5)
+
+        def other_add_page():
+            other_coordinator.run(OtherSession(), lambda: self.add_page(OtherSession))
+
+        writes = 25
+        errors = []
+
+        def writer(write, Session):
+            try:
+                for _ in range(writes):
+                    write()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                Session.remove()
+
+        threads = [
+            threading.Thread(target=writer, args=(add_page, self.Session))
+            for _ in range(8)
+        ] + [
+            threading.Thread(target=writer, args=(other_add_page, OtherSession))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        other_engine.dispose()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.pages_added(), 16 * writes)
+        self.assertEqual(metrics.counter("writes.gave_up"), 0)
+        self.assertEqual(
+            metrics.snapshot()["timings"]["writes.lock_wait_ms"]["count"], 16 * writes
+        )
+
+    def test_begin_immediate(self):
+        """Test that only write transactions take the write lock up front."""
+        statements = []
+        event.listen(
+            self.engine,
+            "before_cursor_execute",
+            lambda conn, cursor, statement, *args: statements.append(statement),
+        )
+
+        @transactional
+        def add_page():
+            self.add_page(self.Session)
+
+        self.Session.get(Book, 1)
+        self.Session.commit()
+        self.assertNotIn("BEGIN IMMEDIATE", statements)
+
+        add_page()
+        self.assertEqual(statements.count("BEGIN IMMEDIATE"), 1)
+
+    def test_retry_while_locked(self):
+        """Test that a transaction is run again once another process commits."""
+        self.engine.dispose()
+        self.engine = self.create_engine(timeout=0.05)
+        self.Session.configure(bind=self.engine)
+        calls = []
+
+        @transactional
+        def add_page():
+            calls.append(1)
+            self.add_page(self.Session)
+
+        connection = self.lock_database()
+        threading.Timer(0.1, connection.commit).start()
+        add_page()
+        connection.close()
+
+        self.assertEqual(self.pages_added(), 1)
+        self.assertGreater(len(calls), 1)
+        self.assertEqual(metrics.counter("writes.retries"), len(calls) - 1)
+        self.assertEqual(metrics.counter("writes.busy"), len(calls) - 1)
+
+    def test_give_up(self):
+        """Test that a transaction fails once it was locked for every attempt."""
+        self.engine.dispose()
+        self.engine = self.create_engine(timeout=0.01)
+        self.Session.configure(bind=self.engine)
+        calls = []
+
+        @transactional
+        def add_page():
+            calls.append(1)
+            self.add_page(self.Session)
+
+        connection = self.lock_database()
+        with self.assertRaises(OperationalError) as raised, self.assertLogs(
+            "librium.database.writes", level="WARNING"
+        ):
+            add_page()
+        connection.close()
+
+        self.assertTrue(is_busy_error(raised.exception))
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(metrics.counter("writes.retries"), 3)
+        self.assertEqual(metrics.counter("writes.gave_up"), 1)
+        self.assertEqual(self.pages_added(), 0)
+
+    def test_other_errors(self):
+        """Test that other errors are raised at once and roll back."""
+        calls = []
+
+        @transactional
+        def fail():
+            calls.append(1)
+            self.add_page(self.Session)
+            raise ValueError("Invalid book")
+
+        with self.assertRaises(ValueError):
+            fail()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(metrics.counter("writes.retries"), 0)
+        self.assertEqual(self.pages_added(), 0)
+
+    def test_retry_book_save(self):
+        """Test that a book save runs again from the form's ids when busy."""
+        self.Session.add(Genre(name="Fantasy"))
+        self.Session.commit()
+        session = self.Session()
+        commit = session.commit
+        calls = []
+
+        def busy_once():
+            calls.append(1)
+            if len(calls) == 1:
+                session.flush()
+                raise OperationalError(
+                    "COMMIT", (), sqlite3.OperationalError("database is locked")
+                )
+            commit()
+
+        self.patch_sessions(*(f"librium.services.{module}" for module in SERVICES))
+
+        data = {"title": "Dune Messiah", "format": 1, "genres": [1]}
+        with patch.object(session, "commit", side_effect=busy_once):
+            BookService.add_or_update(session.get(Book, 1), data)
+
+        self.assertEqual(data, {"title": "Dune Messiah", "format": 1, "genres": [1]})
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(metrics.counter("writes.retries"), 1)
+        self.Session.remove()
+        book = self.Session.get(Book, 1)
+        self.assertEqual(book.title, "Dune Messiah")
+        self.assertEqual([genre.name for genre in book.genres], ["Fantasy"])
+
+    def test_nested(self):
+        """Test that a transactional function can call another one."""
+
+        @transactional
+        def add_page():
+            self.add_page(self.Session)
+
+        @transactional
+        def add_pages():
+            add_page()
+            add_page()
+
+        add_pages()
+        self.assertEqual(self.pages_added(), 2)
+        self.assertEqual(
+            metrics.snapshot()["timings"]["writes.lock_wait_ms"]["count"], 1
+        )
+
+    def test_retry_after_nested(self):
+        """Test that a nested write is applied once when the outer one retries."""
+        calls = []
+
+        @transactional
+        def add_page():
+            self.add_page(self.Session)
+
+        @transactional
+        def add_page_then_busy():
+            calls.append(1)
+            add_page()
+            if len(calls) == 1:
+                raise OperationalError(
+                    "UPDATE", (), sqlite3.OperationalError("database is locked")
+                )
+
+        add_page_then_busy()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.pages_added(), 1)
+        self.assertEqual(metrics.counter("writes.retries"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
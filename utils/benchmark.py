@@ -0,0 +1,1138 @@
+"""
+Performance benchmarks for the Librium database layer.
+
+The benchmarks run against a generated library in a temporary SQLite file so
+they never touch the configured database.
+
+Usage:
+    python -m utils.benchmark profiles --books 100000 --seconds 5
+    python -m utils.benchmark loading --books 100000
+    python -m utils.benchmark search --books 100000
+    python -m utils.benchmark titles --books 100000
+    python -m utils.benchmark pagination --books 100000
+    python -m utils.benchmark statistics --books 100000
+    python -m utils.benchmark saves --books 100000
+    python -m utils.benchmark summaries --books 100000
+    python -m utils.benchmark statements --books 100000
+    python -m utils.benchmark replica --books 100000 --seconds 5
+    python -m utils.benchmark analytics --books 100000
+    python -m utils.benchmark writes --books 100000 --seconds 5
+    python -m utils.benchmark tenants --seconds 5
+"""
+
+import argparse
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import (
+    bindparam,
+    create_engine,
+    event,
+    false,
+    func,
+    insert,
+    lambda_stmt,
+    select,
+    update,
+)
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.pool import QueuePool
+
+from librium.database import (
+    Author,
+    AuthorOrdering,
+    Base,
+    Book,
+    Format,
+    Genre,
+    Language,
+    Publisher,
+    Series,
+    SeriesIndex,
+)
+from librium.core.metrics import metrics
+from librium.database.sqlalchemy.db import book_genres, book_languages, book_publishers
+from librium.database.sqlalchemy import analytics
+from librium.database.sqlalchemy.instrumentation import instrument_engine
+from librium.database.sqlalchemy.loading import (
+    LOADING_PROFILES,
+    count_rows,
+    loading_options,
+)
+from librium.database.sqlalchemy.pagination import paginate
+from librium.database.sqlalchemy.profiles import (
+    CONNECTION_PROFILES,
+    use_connection_profile,
+)
+from librium.database.sqlalchemy.replica import MemoryReplica
+from librium.database.sqlalchemy.routing import create_read_engine
+from librium.database.sqlalchemy.statements import cached_statement
+from librium.database.sqlalchemy.summaries import book_summaries, summary_columns
+from librium.database.sqlalchemy.tenancy import (
+    TenantRegistry,
+    TenantSessionmaker,
+    use_tenant,
+)
+from librium.database.sqlalchemy.writes import (
+    WriteCoordinator,
+    use_immediate_transactions,
+)
+from librium.database.sqlalchemy.search import (
+    book_search,
+    search_match,
+    search_rank,
+    suspend_search_index,
+    to_match_query,
+)
+from librium.database import Session as LibrarySession
+from librium.database.sqlalchemy.statistics import (
+    _RECOMPUTE,
+    STATISTIC_TABLE,
+    _triggers as statistic_triggers,
+    library_statistic,
+)
+from librium.services import BookService
+
+BATCH_SIZE = 10_000
+
+# Books of the full listing compared by the summaries benchmark
+LISTING_SIZE = 5_000
+
+
+def make_engine(path: Path, profile: Optional[str] = None) -> Engine:
+    """
+    Create an engine for a benchmark database, configured like the app engine.
+
+    Args:
+        path: The SQLite database file
+        profile: The connection profile to apply, or None for bare connections
+
+    Returns:
+        The engine
+    """
+    engine = create_engine(
+        f"sqlite:///{path}",
+        poolclass=QueuePool,
+        pool_size=10,
+        max_overflow=20,
+        pool_timeout=30,
+    )
+    if profile is not None:
+        use_connection_profile(engine, profile)
+    return engine
+
+
+def _insert_batched(connection, table, rows) -> None:
+    for start in range(0, len(rows), BATCH_SIZE):
+        connection.execute(insert(table), rows[start : start + BATCH_SIZE])
+
+
+def _isbn(number: int) -> str:
+    """Get a valid ISBN-13 from a 12-digit number, adding its check digit."""
+    digits = f"{number:012d}"
+    check_sum = sum((3 if i % 2 else 1) * int(d) for i, d in enumerate(digits))
+    return f"{digits}{(10 - check_sum % 10) % 10}"
+
+
+def generate_library(path: Path, books: int = 100_000, seed: int = 0) -> Path:
+    """
+    Generate a library with the given number of books.
+
+    Args:
+        path: The SQLite database file to create
+        books: The number of books to generate
+        seed: The random seed, for reproducible libraries
+
+    Returns:
+        The path to the generated database
+    """
+    rng = random.Random(seed)
+    engine = make_engine(path, "bulk-import")
+    Base.metadata.create_all(engine)
+
+    authors = max(books // 4, 1)
+    series = max(books // 10, 1)
+    words = [
+        "Shadow",
+        "Star",
+        "Night",
+        "Dragon",
+        "City",
+        "River",
+        "Empire",
+        "Glass",
+        "Winter",
+        "Iron",
+        "Silent",
+        "Garden",
+        "Storm",
+        "Crown",
+        "Last",
+        "Lost",
+    ]
+
+    # Index the whole library once at the end instead of row by row
+    with engine.begin() as connection, suspend_search_index(connection):
+        connection.execute(
+            insert(Format.__table__),
+            [
+                {"id": i, "name": n}
+                for i, n in enumerate(["Hardcover", "Paperback", "E-book"], 1)
+            ],
+        )
+        connection.execute(
+            insert(Genre.__table__),
+            [{"id": i, "name": f"Genre {i}"} for i in range(1, 41)],
+        )
+        connection.execute(
+            insert(Language.__table__),
+            [{"id": i, "name": f"Language {i}"} for i in range(1, 11)],
+        )
+        connection.execute(
+            insert(Publisher.__table__),
+            [{"id": i, "name": f"Publisher {i}"} for i in range(1, 201)],
+        )
+        _insert_batched(
+            connection,
+            Author.__table__,
+            [
+                {
+                    "id": i,
+                    "first_name": f"First{i}",
+                    "last_name": f"Last{i}",
+                    "name": f"First{i} Last{i}",
+                    "uuid": f"author-{i}",
+                }
+                for i in range(1, authors + 1)
+            ],
+        )
+        _insert_batched(
+            connection,
+            Series.__table__,
+            [{"id": i, "name": f"Series {i}"} for i in range(1, series + 1)],
+        )
+        _insert_batched(
+            connection,
+            Book.__table__,
+            [
+                {
+                    "id": i,
+                    "title": " ".join(rng.sample(words, 3)) + f" {i}",
+                    "released": rng.randint(1950, 2025),
+                    "page_count": rng.randint(80, 1200),
+                    "price": round(rng.uniform(3, 60), 2),
+                    "read": rng.random() < 0.4,
+                    "has_cover": rng.random() < 0.8,
+                    "isbn": None if rng.random() < 0.2 else _isbn(978000000000 + i),
+                    "uuid": f"00000000-0000-4000-8000-{i:012d}",
+                    "format_id": rng.randint(1, 3),
+                    "deleted": rng.random() < 0.02,
+                }
+                for i in range(1, books + 1)
+            ],
+        )
+        _insert_batched(
+            connection,
+            AuthorOrdering.__table__,
+            [
+                {"book_id": i, "author_id": rng.randint(1, authors), "idx": 1}
+                for i in range(1, books + 1)
+            ],
+        )
+        _insert_batched(
+            connection,
+            SeriesIndex.__table__,
+            [
+                {
+                    "book_id": i,
+                    "series_id": rng.randint(1, series),
+                    "idx": rng.randint(1, 12),
+                }
+                for i in range(1, books + 1)
+                if rng.random() < 0.5
+            ],
+        )
+        _insert_batched(
+            connection,
+            book_genres,
+            [
+                {"book_id": i, "genre_id": g}
+                for i in range(1, books + 1)
+                for g in rng.sample(range(1, 41), rng.randint(1, 3))
+            ],
+        )
+        _insert_batched(
+            connection,
+            book_publishers,
+            [
+                {"book_id": i, "publisher_id": rng.randint(1, 200)}
+                for i in range(1, books + 1)
+            ],
+        )
+        _insert_batched(
+            connection,
+            book_languages,
+            [
+                {"book_id": i, "language_id": rng.randint(1, 10)}
+                for i in range(1, books + 1)
+            ],
+        )
+
+    engine.dispose()
+    return path
+
+
+def measure_throughput(
+    engine: Engine,
+    books: int,
+    seconds: float,
+    readers: int = 4,
+    write: bool = True,
+    read_engine: Optional[Engine] = None,
+    after_write: Optional[Callable[[], None]] = None,
+) -> Dict[str, float]:
+    """
+    Run concurrent readers and a single writer against a library.
+
+    Readers alternate between a point lookup and a title-ordered page query;
+    the writer toggles the read flag of a random book, one commit per write.
+
+    Args:
+        engine: The engine to benchmark
+        books: The number of books in the library
+        seconds: How long to run
+        readers: The number of reader threads
+        write: Whether to run the writer thread
+        read_engine: The engine of the readers (defaults to the engine)
+        after_write: Called after each committed write
+
+    Returns:
+        A mapping with reads/s, writes/s and the number of lock errors
+    """
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    read_engine = read_engine if read_engine is not None else engine
+
+    def reader(seed: int) -> None:
+        rng = random.Random(seed)
+        done = 0
+        while not stop.is_set():
+            with read_engine.connect() as connection:
+                if done % 2:
+                    connection.execute(
+                        select(Book.__table__).where(Book.id == rng.randint(1, books))
+                    ).all()
+                else:
+                    connection.execute(
+                        select(Book.__table__)
+                        .where(Book.deleted.is_(False))
+                        .order_by(Book.title)
+                        .limit(30)
+                        .offset(rng.randint(0, 100) * 30)
+                    ).all()
+            done += 1
+        with lock:
+            counts["reads"] += done
+
+    def writer() -> None:
+        rng = random.Random(-1)
+        done = errors = 0
+        while not stop.is_set():
+            try:
+                with engine.begin() as connection:
+                    connection.execute(
+                        update(Book.__table__)
+                        .where(Book.id == rng.randint(1, books))
+                        .values(read=rng.random() < 0.5)
+                    )
+                if after_write is not None:
+                    after_write()
+                done += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counts["writes"] += done
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    if write:
+        threads.append(threading.Thread(target=writer))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "reads/s": counts["reads"] / elapsed,
+        "writes/s": counts["writes"] / elapsed,
+        "errors": counts["errors"],
+    }
+
+
+def bench_profiles(path: Path, books: int, seconds: float) -> None:
+    """Compare bare connections against every connection profile."""
+    print(f"{'profile':<20} {'reads/s':>12} {'writes/s':>12} {'errors':>8}")
+    for profile in [None, *CONNECTION_PROFILES]:
+        engine = make_engine(path, profile)
+        if profile is None:
+            # journal_mode is persistent, so reset it for the baseline run
+            with engine.connect() as connection:
+                connection.exec_driver_sql("PRAGMA journal_mode=DELETE")
+        # query_only rejects writes, so the replica profiles are measured read-only
+        result = measure_throughput(
+            engine,
+            books,
+            seconds,
+            write="query_only" not in CONNECTION_PROFILES.get(profile, {}),
+        )
+        engine.dispose()
+        print(
+            f"{profile or '(none)':<20} {result['reads/s']:>12.0f} "
+            f"{result['writes/s']:>12.0f} {result['errors']:>8}"
+        )
+
+
+def bench_loading(path: Path, books: int, seconds: float) -> None:
+    """Compare joining every relationship against each loading profile."""
+    strategies = {
+        "(joined)": [
+            joinedload(Book.format),
+            joinedload(Book.authors).joinedload(AuthorOrdering.author),
+            joinedload(Book.publishers),
+            joinedload(Book.languages),
+            joinedload(Book.genres),
+            joinedload(Book.series).joinedload(SeriesIndex.series),
+        ],
+        **{name: loading_options(name, strict=False) for name in LOADING_PROFILES},
+    }
+    engine = make_engine(path, "web")
+    pages = max(min(books // 30, 100), 1)
+
+    print(f"{'loading':<12} {'statements':>12} {'rows':>12} {'ms/page':>12}")
+    for name, options in strategies.items():
+        with Session(engine) as session, count_rows() as counts:
+            started = time.perf_counter()
+            for page in range(pages):
+                session.scalars(
+                    select(Book)
+                    .where(Book.deleted.is_(False))
+                    .order_by(Book.title)
+                    .offset(page * 30)
+                    .limit(30)
+                    .options(*options)
+                ).unique().all()
+                session.expunge_all()
+            elapsed = time.perf_counter() - started
+        print(
+            f"{name:<12} {counts['statements'] / pages:>12.1f} "
+            f"{counts['rows'] / pages:>12.1f} {elapsed / pages * 1000:>12.2f}"
+        )
+    engine.dispose()
+
+
+def bench_search(path: Path, books: int, seconds: float) -> None:
+    """Compare a substring title search against the full-text search index."""
+    queries = ["dragon", "storm crown", "author 12", "lost gar"]
+    strategies = {
+        "ilike": lambda connection, q: connection.execute(
+            select(Book.id)
+            .where(Book.deleted.is_(False), Book.title.ilike(f"%{q}%"))
+            .order_by(Book.title)
+            .limit(30)
+        ).all(),
+        "fts": lambda connection, q: connection.execute(
+            select(book_search.c.rowid)
+            .where(search_match(to_match_query(q)))
+            .order_by(search_rank())
+            .limit(30)
+        ).all(),
+    }
+    engine = make_engine(path, "web")
+
+    print(f"{'search':<12} {'queries/s':>12} {'ms/query':>12}")
+    for name, run in strategies.items():
+        done = 0
+        started = time.perf_counter()
+        with engine.connect() as connection:
+            while time.perf_counter() - started < seconds:
+                run(connection, queries[done % len(queries)])
+                done += 1
+        elapsed = time.perf_counter() - started
+        print(f"{name:<12} {done / elapsed:>12.0f} {elapsed / done * 1000:>12.2f}")
+    engine.dispose()
+
+
+def bench_titles(path: Path, books: int, seconds: float) -> None:
+    """Compare ilike title matches against the trigram and reversed-title indexes."""
+    from librium.services.book import _title_ends_with, _title_like
+
+    matches = {
+        "contains": (
+            lambda q: Book.title.ilike(f"%{q}%"),
+            lambda q: _title_like(f"%{q}%", q),
+        ),
+        "starts": (
+            lambda q: Book.title.ilike(f"{q}%"),
+            lambda q: _title_like(f"{q}%", q),
+        ),
+        "ends": (
+            lambda q: Book.title.ilike(f"%{q}"),
+            _title_ends_with,
+        ),
+    }
+    queries = ["dragon", "glass river", "n 4242", "lost 17"]
+    engine = make_engine(path, "web")
+
+    print(f"{'match':<12} {'ilike ms':>12} {'index ms':>12} {'same rows':>10}")
+    with engine.connect() as connection:
+        for name, strategies in matches.items():
+            timings = []
+            results = []
+            for condition in strategies:
+                rows = []
+                done = 0
+                started = time.perf_counter()
+                while time.perf_counter() - started < seconds / 2 or done < len(
+                    queries
+                ):
+                    # Count and fetch the first page, like get_paginated()
+                    query = select(Book.id).where(
+                        Book.deleted.is_(False), condition(queries[done % len(queries)])
+                    )
+                    connection.scalar(
+                        select(func.count()).select_from(query.subquery())
+                    )
+                    result = connection.execute(
+                        query.order_by(Book.title).limit(30)
+                    ).all()
+                    if done < len(queries):
+                        rows.append(result)
+                    done += 1
+                timings.append((time.perf_counter() - started) / done * 1000)
+                results.append(rows)
+            print(
+                f"{name:<12} {timings[0]:>12.2f} {timings[1]:>12.2f} "
+                f"{str(results[0] == results[1]):>10}"
+            )
+    engine.dispose()
+
+
+def bench_pagination(path: Path, books: int, seconds: float) -> None:
+    """Compare page numbers (OFFSET) against cursors at increasing depths."""
+    engine = make_engine(path, "web")
+    query = select(Book).where(Book.deleted.is_(False))
+    pages = max(books // 30, 1)
+    depths = sorted({1, max(pages // 100, 1), max(pages // 10, 1), pages})
+    runs = 20
+
+    def timed(session, **kwargs):
+        started = time.perf_counter()
+        for _ in range(runs):
+            page = paginate(
+                session, query, Book.title, Book.id, "title", page_size=30, **kwargs
+            )
+            session.expunge_all()
+        return page, (time.perf_counter() - started) / runs * 1000
+
+    print(f"{'page':>8} {'offset ms':>12} {'cursor ms':>12}")
+    with Session(engine) as session:
+        for depth in depths:
+            # The cursor of a page is the next cursor of the page before it
+            previous = paginate(
+                session, query, Book.title, Book.id, "title", page=max(depth - 1, 1)
+            )
+            cursor = previous.next_cursor if depth > 1 else None
+            _, offset_ms = timed(session, page=depth)
+            _, cursor_ms = timed(session, cursor=cursor)
+            print(f"{depth:>8} {offset_ms:>12.2f} {cursor_ms:>12.2f}")
+    engine.dispose()
+
+
+def bench_statistics(path: Path, books: int, seconds: float) -> None:
+    """Compare recomputing the statistics against reading the materialized ones."""
+    engine = make_engine(path, "web")
+    reads = {
+        "recompute": lambda connection: connection.exec_driver_sql(_RECOMPUTE).all(),
+        "materialized": lambda connection: connection.exec_driver_sql(
+            f"SELECT kind, bucket, books, price FROM {STATISTIC_TABLE}"
+        ).all(),
+    }
+
+    def writes(connection) -> float:
+        rng = random.Random(-1)
+        done = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds / 2:
+            connection.execute(
+                update(Book.__table__)
+                .where(Book.id == rng.randint(1, books))
+                .values(read=rng.random() < 0.5, price=rng.randint(1, 5000) / 100)
+            )
+            done += 1
+        return (time.perf_counter() - started) / done * 1000
+
+    print(f"{'statistics':<14} {'read ms':>12}")
+    with engine.connect() as connection:
+        for name, run in reads.items():
+            done = 0
+            started = time.perf_counter()
+            while time.perf_counter() - started < seconds / 2 or not done:
+                run(connection)
+                done += 1
+            elapsed = time.perf_counter() - started
+            print(f"{name:<14} {elapsed / done * 1000:>12.2f}")
+
+    # The triggers are dropped in a transaction that is rolled back
+    print(f"{'triggers':<14} {'write ms':>12}")
+    with engine.connect() as connection:
+        with connection.begin() as transaction:
+            print(f"{'on':<14} {writes(connection):>12.3f}")
+            for name in statistic_triggers():
+                connection.exec_driver_sql(f"DROP TRIGGER {name}")
+            print(f"{'off':<14} {writes(connection):>12.3f}")
+            transaction.rollback()
+    engine.dispose()
+
+
+def _book_data(book: Book) -> dict:
+    """Get the data a book is saved with by the edit form."""
+    return {
+        "title": book.title,
+        "isbn": book.isbn,
+        "released": book.released,
+        "price": book.price,
+        "page_count": book.page_count,
+        "read": book.read,
+        "format": book.format_id,
+        "authors": [a.author_id for a in sorted(book.authors, key=lambda a: a.idx)],
+        "genres": [g.id for g in book.genres],
+        "publishers": [p.id for p in book.publishers],
+        "languages": [lang.id for lang in book.languages],
+        "series": [{"series": s.series_id, "idx": s.idx} for s in book.series],
+    }
+
+
+def bench_saves(path: Path, books: int, seconds: float) -> None:
+    """Count the writes of saving books through BookService.add_or_update()."""
+    engine = make_engine(path, "web")
+    writes = {"statements": 0, "rows": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_writes(conn, cursor, statement, parameters, context, executemany):
+        if statement.split(None, 1)[0].upper() in ("INSERT", "UPDATE", "DELETE"):
+            writes["statements"] += 1
+            writes["rows"] += len(parameters) if executemany else 1
+
+    ids = random.Random(0).sample(range(1, books + 1), min(books, 200))
+    LibrarySession.configure(writer=engine, reader=engine)
+    saved = {book_id: _book_data(LibrarySession.get(Book, book_id)) for book_id in ids}
+    LibrarySession.remove()
+
+    with Session(engine) as session:
+        extra = session.scalar(select(func.max(Author.id))) + 1
+        session.add(Author(id=extra, name="Benchmark Author"))
+        session.commit()
+
+    # The first pass adds an author that the second removes again, leaving
+    # every book as it was
+    changes = {
+        "unchanged": lambda data, first: data,
+        "one author": lambda data, first: (
+            dict(data, authors=[*data["authors"], extra]) if first else data
+        ),
+    }
+
+    print(f"{'saves':<12} {'statements':>12} {'rows':>12} {'ms/save':>12}")
+    for name, change in changes.items():
+        writes.update(statements=0, rows=0)
+        started = time.perf_counter()
+        for first in (True, False):
+            for book_id in ids:
+                book = LibrarySession.get(Book, book_id)
+                BookService.add_or_update(book, change(dict(saved[book_id]), first))
+        elapsed = time.perf_counter() - started
+        saves = 2 * len(ids)
+        print(
+            f"{name:<12} {writes['statements'] / saves:>12.2f} "
+            f"{writes['rows'] / saves:>12.2f} {elapsed / saves * 1000:>12.2f}"
+        )
+    with Session(engine) as session:
+        session.delete(session.get(Author, extra))
+        session.commit()
+    LibrarySession.remove()
+    engine.dispose()
+
+
+def bench_summaries(path: Path, books: int, seconds: float) -> None:
+    """Compare ORM books against BookSummary read models for pages and listings."""
+    engine = make_engine(path, "web")
+    pages = max(min(books // 30, 100), 1)
+
+    def orm(session, statement, name):
+        return (
+            session.scalars(
+                statement.with_only_columns(Book).options(
+                    *loading_options(name, strict=False)
+                )
+            )
+            .unique()
+            .all()
+        )
+
+    def summaries(session, statement, name):
+        rows = session.execute(
+            statement.with_only_columns(*summary_columns(name))
+        ).all()
+        return book_summaries(session, rows, name)
+
+    def measure(load, name, statements):
+        # Peak memory of one statement's results, and time over all of them
+        with Session(engine) as session:
+            # Compile and cache the statements before measuring
+            load(session, statements[0], name)
+            session.expunge_all()
+            tracemalloc.start()
+            load(session, statements[0], name)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            session.expunge_all()
+            started = time.perf_counter()
+            for statement in statements:
+                load(session, statement, name)
+                session.expunge_all()
+            elapsed = (time.perf_counter() - started) / len(statements)
+        return peak / 1024, elapsed * 1000
+
+    base = select(Book.id).where(Book.deleted == false()).order_by(Book.title)
+    cases = {
+        "page": [base.offset(page * 30).limit(30) for page in range(pages)],
+        # Like the full listing of a large genre
+        "listing": [base.limit(LISTING_SIZE)],
+    }
+
+    print(f"{'case':<16} {'model':<10} {'KiB peak':>12} {'ms':>12}")
+    for case, statements in cases.items():
+        for name in ["list", "api"]:
+            for model, load in [("orm", orm), ("summary", summaries)]:
+                kib, ms = measure(load, name, statements)
+                print(f"{f'{case} ({name})':<16} {model:<10} {kib:>12.0f} {ms:>12.2f}")
+    engine.dispose()
+
+
+def bench_statements(path: Path, books: int, seconds: float) -> None:
+    """Compare the per-call cost of select(), lambda_stmt() and cached statements."""
+    engine = make_engine(path, "web")
+    instrument_engine(engine)
+    runs = 2000
+    rng = random.Random(0)
+
+    with Session(engine) as session:
+        uuids = session.scalars(select(Book.uuid).limit(runs)).all()
+        names = session.scalars(select(Author.name).limit(runs)).all()
+        genres = session.scalars(select(Genre.name)).all()
+    options = loading_options("detail", strict=False)
+
+    def by_uuid():
+        return select(Book).where(Book.uuid == bindparam("value")).options(*options)
+
+    def by_author():
+        return select(Author).where(Author.name == bindparam("value"))
+
+    def by_genre():
+        return select(Genre).where(Genre.name == bindparam("value"))
+
+    # Each lookup built on every call, as a lambda statement, and prebuilt
+    lookups = {
+        "book by uuid": (
+            uuids,
+            lambda uuid: select(Book).where(Book.uuid == uuid).options(*options),
+            lambda uuid: lambda_stmt(lambda: select(Book).where(Book.uuid == uuid))
+            + (lambda s: s.options(*options)),
+            by_uuid,
+        ),
+        "author by name": (
+            names,
+            lambda name: select(Author).where(Author.name == name),
+            lambda name: lambda_stmt(lambda: select(Author).where(Author.name == name)),
+            by_author,
+        ),
+        "genre by name": (
+            genres,
+            lambda name: select(Genre).where(Genre.name == name),
+            lambda name: lambda_stmt(lambda: select(Genre).where(Genre.name == name)),
+            by_genre,
+        ),
+    }
+
+    def timed(session, call, values):
+        # The first calls compile and cache the statement; the best of a few
+        # rounds leaves out the noise of other processes
+        for value in values[:10]:
+            call(value)
+        session.expunge_all()
+        rounds = []
+        for _ in range(5):
+            started = time.perf_counter()
+            for _ in range(runs // 5):
+                call(rng.choice(values))
+            rounds.append(time.perf_counter() - started)
+            session.expunge_all()
+        return min(rounds) / (runs // 5) * 1_000_000
+
+    print(f"{'lookup':<16} {'select us':>10} {'lambda us':>10} {'cached us':>10}")
+    with Session(engine) as session:
+        for name, (values, plain, lambda_, build) in lookups.items():
+            statement = cached_statement(("benchmark", name), build)
+            timings = [
+                timed(
+                    session, lambda v: session.scalars(plain(v)).unique().all(), values
+                ),
+                timed(
+                    session,
+                    lambda v: session.scalars(lambda_(v)).unique().all(),
+                    values,
+                ),
+                timed(
+                    session,
+                    lambda v: session.scalars(statement, {"value": v}).unique().all(),
+                    values,
+                ),
+            ]
+            print(f"{name:<16} " + " ".join(f"{timing:>10.1f}" for timing in timings))
+
+    counters = metrics.snapshot()["counters"]
+    print(
+        "compiled cache: "
+        + ", ".join(
+            f"{outcome} {counters.get(f'queries.compiled_cache.{outcome}', 0)}"
+            for outcome in ("hit", "miss", "evictions")
+        )
+    )
+    engine.dispose()
+
+
+def bench_replica(path: Path, books: int, seconds: float) -> None:
+    """Compare reads from the database file against the in-memory replica."""
+    engine = make_engine(path, "web")
+    file_reader = create_read_engine(engine, pool_size=10, max_overflow=20)
+    replica = MemoryReplica(engine, pool_size=10, max_overflow=20)
+
+    print(f"{'readers':<12} {'writer':<12} {'reads/s':>12} {'writes/s':>12}")
+    for name, reader, after_write in [
+        ("file", file_reader, None),
+        ("memory", replica.engine, replica.sync),
+    ]:
+        for write in (False, True):
+            result = measure_throughput(
+                engine,
+                books,
+                seconds,
+                write=write,
+                read_engine=reader,
+                after_write=after_write,
+            )
+            print(
+                f"{name:<12} {'on' if write else 'off':<12} "
+                f"{result['reads/s']:>12.0f} {result['writes/s']:>12.0f}"
+            )
+
+    timing = metrics.snapshot()["timings"]["replica.sync_ms"]
+    print(
+        f"syncs: {replica.syncs}, mean {timing['mean']:.1f} ms, "
+        f"max {timing['max']:.1f} ms"
+    )
+    replica.close()
+    file_reader.dispose()
+    engine.dispose()
+
+
+def bench_analytics(path: Path, books: int, seconds: float) -> None:
+    """Compare the statistics suite in SQL against a NumPy snapshot."""
+    if analytics.np is None:
+        print("NumPy is not installed")
+        return
+
+    engine = make_engine(path, "web")
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+
+    def sql_suite(session):
+        session.execute(
+            select(
+                library_statistic.c.kind,
+                library_statistic.c.bucket,
+                library_statistic.c.books,
+                library_statistic.c.price,
+            )
+        ).all()
+        live = Book.deleted == false()
+        # The statistics the materialized buckets do not cover
+        session.execute(
+            select(Book.page_count / 100, func.count())
+            .where(live, Book.page_count > 0)
+            .group_by(Book.page_count / 100)
+        ).all()
+        session.execute(
+            select(Book.released / 10, func.count(), func.sum(Book.read))
+            .where(live, Book.released.is_not(None))
+            .group_by(Book.released / 10)
+        ).all()
+        priced = select(Book.price).where(live, Book.price.is_not(None))
+        count = session.scalar(select(func.count()).select_from(priced.subquery()))
+        for percentile in analytics.PERCENTILES:
+            session.scalar(
+                priced.order_by(Book.price).offset(count * percentile // 100).limit(1)
+            )
+
+    with Session(engine) as session:
+        snapshot = analytics.load_snapshot(session)
+        cases = {
+            "sql": lambda: sql_suite(session),
+            "numpy (load)": lambda: analytics.load_snapshot(session),
+            "numpy (compute)": lambda: analytics.compute_statistics(snapshot, {}, {}),
+        }
+        print(f"{'statistics':<16} {'statements':>12} {'ms':>12}")
+        for name, run in cases.items():
+            run()
+            statements.clear()
+            runs = 5
+            started = time.perf_counter()
+            for _ in range(runs):
+                run()
+            elapsed = (time.perf_counter() - started) / runs * 1000
+            print(f"{name:<16} {len(statements) / runs:>12.0f} {elapsed:>12.2f}")
+    engine.dispose()
+
+
+def bench_writes(path: Path, books: int, seconds: float) -> None:
+    """Compare uncoordinated write transactions against the write coordinator."""
+    # Two workers, like two processes of the web server, with a few request
+    # threads each; every write reads a book before changing it, like a save
+    workers = [make_engine(path, "web") for _ in range(2)]
+    for engine in workers:
+        use_immediate_transactions(engine)
+    threads_per_worker = 32
+    with Session(workers[0]) as session:
+        ids = session.scalars(select(Book.id)).all()
+
+    def save(session: Session, rng: random.Random) -> None:
+        book = session.get(Book, rng.choice(ids))
+        book.read = not book.read
+
+    def uncoordinated(engine: Engine, coordinator: WriteCoordinator, session, rng):
+        try:
+            save(session, rng)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+
+    def coordinated(engine: Engine, coordinator: WriteCoordinator, session, rng):
+        coordinator.run(session, lambda: save(session, rng))
+
+    print(
+        f"{'writes':<14} {'writes/s':>10} {'errors':>8} {'retries':>8} "
+        f"{'wait ms':>10} {'max wait':>10}"
+    )
+    for name, write in [("uncoordinated", uncoordinated), ("coordinated", coordinated)]:
+        metrics.reset()
+        stop = threading.Event()
+        counts = {"writes": 0, "errors": 0}
+        lock = threading.Lock()
+
+        def writer(engine: Engine, coordinator: WriteCoordinator, seed: int) -> None:
+            rng = random.Random(seed)
+            done = errors = 0
+            with Session(engine) as session:
+                while not stop.is_set():
+                    try:
+                        write(engine, coordinator, session, rng)
+                        done += 1
+                    except Exception:
+                        errors += 1
+            with lock:
+                counts["writes"] += done
+                counts["errors"] += errors
+
+        threads = []
+        for engine in workers:
+            coordinator = WriteCoordinator()
+            threads += [
+                threading.Thread(
+                    target=writer, args=(engine, coordinator, len(threads) + i)
+                )
+                for i in range(threads_per_worker)
+            ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        snapshot = metrics.snapshot()
+        wait = snapshot["timings"].get("writes.lock_wait_ms", {"mean": 0, "max": 0})
+        print(
+            f"{name:<14} {counts['writes'] / elapsed:>10.0f} {counts['errors']:>8} "
+            f"{snapshot['counters'].get('writes.retries', 0):>8} "
+            f"{wait['mean']:>10.2f} {wait['max']:>10.1f}"
+        )
+    for engine in workers:
+        engine.dispose()
+
+
+# Tenants of the tenants benchmark, and threads serving their requests
+TENANTS = 500
+TENANT_THREADS = 8
+
+
+def bench_tenants(path: Path, books: int, seconds: float) -> None:
+    """Compare tenant engine cache sizes, and writes to one file against many."""
+    directory = Path(tempfile.mkdtemp()) / "tenants"
+    names = [f"tenant-{i}" for i in range(TENANTS)]
+    # A few tenants make most of the requests, like on a shared host
+    weights = [1 / (rank + 1) for rank in range(TENANTS)]
+
+    def run(registry: TenantRegistry, work: Callable[[int, random.Random], None]):
+        stop = threading.Event()
+        counts = {"done": 0, "errors": 0}
+        lock = threading.Lock()
+
+        def worker(seed: int) -> None:
+            rng = random.Random(seed)
+            done = errors = 0
+            while not stop.is_set():
+                try:
+                    work(seed, rng)
+                    done += 1
+                except Exception:
+                    errors += 1
+            with lock:
+                counts["done"] += done
+                counts["errors"] += errors
+
+        threads = [
+            threading.Thread(target=worker, args=(i,)) for i in range(TENANT_THREADS)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return counts["done"] / (time.perf_counter() - started), counts["errors"]
+
+    def create_schema(engine: Engine) -> None:
+        Base.metadata.create_all(engine)
+
+    registry = TenantRegistry(directory, create_schema, create=True)
+    started = time.perf_counter()
+    for name in names:
+        registry.create_tenant(name)
+    print(
+        f"Created {TENANTS} tenants in {time.perf_counter() - started:.1f}s "
+        f"at {directory}"
+    )
+    registry.close()
+
+    print(f"{'open engines':<14} {'reads/s':>10} {'hit rate':>10} {'evicted':>10}")
+    for maxsize in (16, 64, TENANTS):
+        metrics.reset()
+        registry = TenantRegistry(directory, create_schema, maxsize=maxsize)
+        factory = TenantSessionmaker(registry)
+
+        def read(seed: int, rng: random.Random) -> None:
+            with use_tenant(rng.choices(names, weights)[0]), factory() as session:
+                session.scalar(select(func.count()).select_from(Book))
+
+        reads, errors = run(registry, read)
+        counters = metrics.snapshot()["counters"]
+        hits = counters.get("tenants.engines.hit", 0)
+        misses = counters.get("tenants.engines.miss", 0)
+        print(
+            f"{maxsize:<14} {reads:>10.0f} {hits / max(hits + misses, 1):>10.1%} "
+            f"{counters.get('tenants.engines.evicted', 0):>10}"
+        )
+        registry.close()
+
+    print(f"{'writers':<14} {'writes/s':>10} {'errors':>10}")
+    for name, tenant_of in [
+        ("one tenant", lambda seed: names[0]),
+        ("own tenants", lambda seed: names[seed]),
+    ]:
+        registry = TenantRegistry(directory, create_schema)
+        factory = TenantSessionmaker(registry)
+
+        def write(seed: int, rng: random.Random) -> None:
+            with use_tenant(tenant_of(seed)), factory() as session:
+                session.write_coordinator.run(
+                    session,
+                    lambda: session.add(Genre(name=f"Genre {rng.random()}")),
+                )
+
+        writes, errors = run(registry, write)
+        print(f"{name:<14} {writes:>10.0f} {errors:>10}")
+        registry.close()
+
+
+BENCHMARKS: Dict[str, Callable[[Path, int, float], None]] = {
+    "profiles": bench_profiles,
+    "loading": bench_loading,
+    "search": bench_search,
+    "titles": bench_titles,
+    "pagination": bench_pagination,
+    "statistics": bench_statistics,
+    "saves": bench_saves,
+    "summaries": bench_summaries,
+    "statements": bench_statements,
+    "replica": bench_replica,
+    "analytics": bench_analytics,
+    "writes": bench_writes,
+    "tenants": bench_tenants,
+}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument(
+        "--database", type=Path, help="Reuse an existing generated library"
+    )
+    args = parser.parse_args(argv)
+
+    if args.database and args.database.exists():
+        path = args.database
+    else:
+        path = args.database or Path(tempfile.mkdtemp()) / "benchmark.sqlite"
+        started = time.perf_counter()
+        generate_library(path, args.books)
+        print(
+            f"Generated {args.books} books in {time.perf_counter() - started:.1f}s "
+            f"at {path}"
+        )
+
+    BENCHMARKS[args.benchmark](path, args.books, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from typing import Literal
 from sqlalchemy import select
 
 from librium.database import *
+from librium.database.sqlalchemy.loading import loading_options, stream
 
 HEADERS = [
     "_id",
@@ -90,8 +91,14 @@ def run(export_format: Literal["csv", "json"] = "csv") -> str:
     file_extension = f".{export_format}"
     export_file = tempfile.mkstemp(suffix=file_extension)[1]
 
-    # Get all books
-    books = Session.scalars(select(Book).order_by(Book.id)).unique()
+    # Get all books, a batch at a time
+    books = stream(
+        Session,
+        select(Book)
+        .order_by(Book.id)
+        .options(*loading_options("export"))
+        .execution_options(include_deleted=True),
+    )
 
     if export_format == "csv":
         with open(export_file, "w", newline="\n") as fp:
@@ -0,0 +1,520 @@
+"""
+Bulk import of books in the export format.
+
+The file is read row by row, in the CSV or JSON format written by
+``utils/export.py``. Authors, publishers, genres, languages, series and
+formats are resolved through in-memory name-to-id maps loaded once, and the
+books and their links are inserted in batches, one transaction per batch.
+The search indexes are rebuilt once at the end instead of row by row.
+
+Books whose ``book_uuid`` is already in the library, or earlier in the file,
+are skipped, so an interrupted import can be run again.
+
+Usage:
+    python -m utils.importer library.csv
+    python -m utils.importer library.json --dry-run
+"""
+
+import argparse
+import csv
+import json
+import re
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.engine import Connection, Engine
+
+from librium.database import (
+    Author,
+    AuthorOrdering,
+    Book,
+    Format,
+    Genre,
+    Language,
+    Publisher,
+    Series,
+    SeriesIndex,
+    engine as default_engine,
+)
+from librium.database.sqlalchemy.db import book_genres, book_languages, book_publishers
+from librium.database.sqlalchemy.counts import suspend_counters
+from librium.database.sqlalchemy.search import reverse_title, suspend_search_index
+from librium.database.sqlalchemy.statistics import suspend_statistics
+from utils.export import make_author
+
+BATCH_SIZE = 5_000
+JSON_CHUNK_SIZE = 64 * 1024
+
+# The triggers maintaining derived tables are dropped during the import;
+# the tables are rebuilt once at the end
+SUSPENDED_TRIGGERS = (suspend_search_index, suspend_counters, suspend_statistics)
+
+# "Name (index)" as written by make_series()
+SERIES_DETAILS = re.compile(r"^(?P<name>.*?)\s*\((?P<idx>\d+(?:\.\d+)?)\)$")
+
+
+class RowError(ValueError):
+    """Raised for a row that cannot be imported."""
+
+
+class ImportReport:
+    """
+    The progress and outcome of an import.
+
+    Attributes:
+        rows: The number of rows read
+        books: The number of books imported (or that would be, in a dry run)
+        skipped: The number of rows skipped as already imported
+        created: The number of new entities, by table
+        errors: The (row number, message) of every rejected row
+        elapsed: The seconds since the import started
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.books = 0
+        self.skipped = 0
+        self.created: Dict[str, int] = {}
+        self.errors: List[Tuple[int, str]] = []
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def __str__(self) -> str:
+        created = ", ".join(f"{n} {table}" for table, n in self.created.items() if n)
+        return (
+            f"{self.rows} rows: {self.books} books, {self.skipped} skipped, "
+            f"{len(self.errors)} rejected; created {created or 'nothing else'} "
+            f"({self.elapsed:.1f}s)"
+        )
+
+
+class NameMap:
+    """
+    Maps names to ids, creating the missing entities a batch at a time.
+
+    Names are matched case-insensitively.
+    """
+
+    def __init__(self, table, rows: Callable[[str], Dict[str, Any]]):
+        """
+        Args:
+            table: The entity table
+            rows: Builds the insert row of a new entity from its name
+        """
+        self.table = table
+        self.rows = rows
+        self.ids: Dict[str, int] = {}
+        self.pending: Dict[str, str] = {}
+        self.created = 0
+
+    def add(self, key: str, id: int) -> None:
+        self.ids.setdefault(key.casefold(), id)
+
+    def resolve(self, name: str) -> str:
+        """Note a name, to be created with the batch if it is new."""
+        key = name.casefold()
+        if key not in self.ids:
+            self.pending.setdefault(key, name)
+        return key
+
+    def flush(self, connection: Optional[Connection]) -> None:
+        """
+        Create the pending entities.
+
+        Args:
+            connection: The connection to insert them with, or None in a dry
+                run, which only counts them
+        """
+        if not self.pending:
+            return
+        names = list(self.pending.items())
+        if connection is None:
+            ids = [-(self.created + i + 1) for i in range(len(names))]
+        else:
+            ids = connection.scalars(
+                insert(self.table).returning(
+                    self.table.c.id, sort_by_parameter_order=True
+                ),
+                [self.rows(name) for _, name in names],
+            ).all()
+        for (key, _), id in zip(names, ids):
+            self.ids[key] = id
+        self.created += len(names)
+        self.pending.clear()
+
+
+def _author_row(details: str) -> Dict[str, Any]:
+    """Build an author from "Last, First Middle", as written by make_author()."""
+    last, _, given = details.partition(",")
+    last, given = last.strip(), given.split()
+    if not given and " " in last:
+        # A plain "First Last" name
+        *given, last = last.split()
+    first = given[0] if given else None
+    middle = " ".join(given[1:]) or None
+    return {
+        "first_name": first,
+        "middle_name": middle,
+        "last_name": last or None,
+        "name": " ".join(part for part in (first, middle, last) if part),
+    }
+
+
+def load_maps(connection: Connection) -> Dict[str, NameMap]:
+    """
+    Load the name-to-id maps of every entity referenced by the export format.
+
+    Args:
+        connection: The connection to read the entities with
+
+    Returns:
+        The maps, by export column
+    """
+    maps = {
+        "author_details": NameMap(Author.__table__, _author_row),
+        "publisher": NameMap(Publisher.__table__, lambda name: {"name": name}),
+        "genre": NameMap(Genre.__table__, lambda name: {"name": name}),
+        "language": NameMap(Language.__table__, lambda name: {"name": name}),
+        "series_details": NameMap(Series.__table__, lambda name: {"name": name}),
+        "format": NameMap(Format.__table__, lambda name: {"name": name}),
+    }
+    for author in connection.execute(select(Author.__table__)):
+        # Authors are matched as exported, then by their full name
+        if author.first_name or author.last_name:
+            maps["author_details"].add(make_author(author), author.id)
+        if author.name:
+            maps["author_details"].add(author.name, author.id)
+    for column, model in [
+        ("publisher", Publisher),
+        ("genre", Genre),
+        ("language", Language),
+        ("series_details", Series),
+        ("format", Format),
+    ]:
+        for id, name in connection.execute(select(model.id, model.name)):
+            maps[column].add(name, id)
+    return maps
+
+
+def _value(row: Dict[str, Any], column: str) -> Any:
+    """Get a column value, with empty CSV cells as None."""
+    value = row.get(column)
+    return None if value == "" else value
+
+
+def _split(row: Dict[str, Any], column: str) -> List[str]:
+    value = _value(row, column)
+    if value is None:
+        return []
+    return [part.strip() for part in str(value).split("|") if part.strip()]
+
+
+def _number(row: Dict[str, Any], column: str, kind=int) -> Any:
+    value = _value(row, column)
+    if value is None:
+        return None
+    try:
+        return kind(str(value))
+    except (ValueError, InvalidOperation):
+        raise RowError(f"Invalid {column}: {value}")
+
+
+def parse_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Turn an export row into a book and the names of its related entities.
+
+    Args:
+        row: The row, as written by utils/export.py
+
+    Returns:
+        The book columns, with the related names under "links"
+
+    Raises:
+        RowError: If the row is not a valid book
+    """
+    title = _value(row, "title")
+    if not title or not str(title).strip():
+        raise RowError("Missing title")
+
+    isbn = _value(row, "isbn")
+    if isbn is not None:
+        isbn = str(isbn).replace("-", "").replace(" ", "")
+        if not Book.validate_isbn(isbn):
+            raise RowError(f"Invalid ISBN: {isbn}")
+
+    released = _number(row, "date_published")
+    if not Book.validate_released(released):
+        raise RowError(f"Invalid release year: {released}")
+
+    price = _number(row, "list_price", Decimal)
+    if price is not None and price < 0:
+        raise RowError(f"Invalid price: {price}")
+
+    formats = _split(row, "format")
+    if not formats:
+        raise RowError("Missing format")
+
+    book_uuid = _value(row, "book_uuid")
+    try:
+        book_uuid = str(uuid.UUID(str(book_uuid))) if book_uuid else str(uuid.uuid4())
+    except ValueError:
+        raise RowError(f"Invalid book_uuid: {book_uuid}")
+
+    series = []
+    for details in _split(row, "series_details"):
+        match = SERIES_DETAILS.match(details)
+        series.append(
+            (match["name"], Decimal(match["idx"])) if match else (details, Decimal(0))
+        )
+
+    return {
+        "title": str(title).strip(),
+        "isbn": isbn,
+        "released": released,
+        "page_count": _number(row, "pages"),
+        "price": price,
+        "read": str(_value(row, "read") or 0).lower() in ("1", "true"),
+        "uuid": book_uuid,
+        "format": formats[0],
+        "links": {
+            "author_details": _split(row, "author_details"),
+            "publisher": _split(row, "publisher"),
+            "genre": _split(row, "genre"),
+            "language": _split(row, "language"),
+            "series_details": series,
+        },
+    }
+
+
+def resolve_names(book: Dict[str, Any], maps: Dict[str, NameMap]) -> None:
+    """Replace the related names of a parsed book by their map keys."""
+    book["format"] = maps["format"].resolve(book["format"])
+    links = book["links"]
+    for column in ("author_details", "publisher", "genre", "language"):
+        links[column] = [maps[column].resolve(name) for name in links[column]]
+    links["series_details"] = [
+        (maps["series_details"].resolve(name), idx)
+        for name, idx in links["series_details"]
+    ]
+
+
+def _insert_batch(
+    connection: Optional[Connection],
+    books: List[Dict[str, Any]],
+    maps: Dict[str, NameMap],
+) -> None:
+    """Create the batch's new entities, then insert its books and links."""
+    for name_map in maps.values():
+        name_map.flush(connection)
+    if connection is None:
+        return
+
+    created_at = datetime.now()
+    # Rows are matched back by uuid: returning them in parameter order would
+    # make SQLite insert the books one statement at a time
+    ids = dict(
+        connection.execute(
+            insert(Book.__table__).returning(
+                Book.__table__.c.uuid, Book.__table__.c.id
+            ),
+            [
+                {
+                    **{k: v for k, v in book.items() if k not in ("format", "links")},
+                    "format_id": maps["format"].ids[book["format"]],
+                    # Given here, the defaults are not computed row by row
+                    "title_reversed": reverse_title(book["title"]),
+                    "created_at": created_at,
+                }
+                for book in books
+            ],
+        ).all()
+    )
+
+    links: Dict[Any, List[Dict[str, Any]]] = {
+        AuthorOrdering.__table__: [],
+        book_publishers: [],
+        book_genres: [],
+        book_languages: [],
+        SeriesIndex.__table__: [],
+    }
+    for book in books:
+        book_id = ids[book["uuid"]]
+        # A name listed twice is linked once
+        related = book["links"]
+        authors = dict.fromkeys(
+            maps["author_details"].ids[a] for a in related["author_details"]
+        )
+        for idx, author_id in enumerate(authors, 1):
+            links[AuthorOrdering.__table__].append(
+                {"book_id": book_id, "author_id": author_id, "idx": idx}
+            )
+        for table, column, key in [
+            (book_publishers, "publisher_id", "publisher"),
+            (book_genres, "genre_id", "genre"),
+            (book_languages, "language_id", "language"),
+        ]:
+            for id in dict.fromkeys(maps[key].ids[name] for name in related[key]):
+                links[table].append({"book_id": book_id, column: id})
+        for name, idx in dict.fromkeys(related["series_details"]):
+            links[SeriesIndex.__table__].append(
+                {
+                    "book_id": book_id,
+                    "series_id": maps["series_details"].ids[name],
+                    "idx": idx,
+                }
+            )
+    for table, rows in links.items():
+        if rows:
+            connection.execute(insert(table), rows)
+
+
+def read_rows(fp: TextIO, file_format: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read the rows of an export one at a time.
+
+    Args:
+        fp: The open file
+        file_format: "csv" or "json"
+
+    Yields:
+        The rows, as dictionaries keyed by the export HEADERS
+    """
+    if file_format == "csv":
+        yield from csv.DictReader(fp)
+        return
+
+    # The export is a single JSON array; its objects are decoded one by one
+    decoder = json.JSONDecoder(parse_float=Decimal)
+    buffer, position, eof = fp.read(JSON_CHUNK_SIZE).lstrip(), 0, False
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array of books")
+    position = 1
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            row, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = fp.read(JSON_CHUNK_SIZE)
+            eof = not chunk
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield row
+        position = end
+
+
+def run(
+    path: Path,
+    dry_run: bool = False,
+    batch_size: int = BATCH_SIZE,
+    progress: Optional[Callable[[ImportReport], None]] = None,
+    engine: Engine = default_engine,
+) -> ImportReport:
+    """
+    Import the books of an export file.
+
+    Each batch is committed on its own, so after an error the batches before
+    it stay imported; running the import again skips them.
+
+    Args:
+        path: The CSV or JSON file
+        dry_run: Check and resolve every row without writing anything
+        batch_size: The number of books inserted per transaction
+        progress: Called with the report after every batch
+        engine: The engine to import into
+
+    Returns:
+        The report of the import
+    """
+    report = ImportReport()
+    file_format = path.suffix.lstrip(".").lower()
+    if file_format not in ("csv", "json"):
+        raise ValueError(f"Unsupported file format: {path.suffix}")
+
+    def flush(connection, batch):
+        if batch:
+            _insert_batch(None if dry_run else connection, batch, maps)
+            if not dry_run:
+                connection.commit()
+            report.books += len(batch)
+            batch.clear()
+        report.created = {
+            name_map.table.name: name_map.created for name_map in maps.values()
+        }
+        if progress:
+            progress(report)
+
+    with engine.connect() as connection:
+        maps = load_maps(connection)
+        seen = set(connection.scalars(select(Book.uuid)))
+        connection.commit()
+
+        try:
+            with ExitStack() as suspended:
+                if not dry_run:
+                    for suspend in SUSPENDED_TRIGGERS:
+                        suspended.enter_context(suspend(connection))
+                    connection.commit()
+                batch: List[Dict[str, Any]] = []
+                with open(path, encoding="utf-8", newline="") as fp:
+                    for number, row in enumerate(read_rows(fp, file_format), 1):
+                        report.rows += 1
+                        try:
+                            book = parse_row(row)
+                        except RowError as e:
+                            report.errors.append((number, str(e)))
+                            continue
+                        if book["uuid"] in seen:
+                            report.skipped += 1
+                            continue
+                        seen.add(book["uuid"])
+                        resolve_names(book, maps)
+                        batch.append(book)
+                        if len(batch) >= batch_size:
+                            try:
+                                flush(connection, batch)
+                            except Exception:
+                                connection.rollback()
+                                raise
+                    flush(connection, batch)
+        finally:
+            # Keeps the recreated triggers and rebuilt tables, even after errors
+            connection.commit()
+
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", type=Path, help="The CSV or JSON export to import")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Check the file without importing"
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    report = run(
+        args.path,
+        dry_run=args.dry_run,
+        batch_size=args.batch_size,
+        progress=lambda report: print(report, flush=True),
+    )
+    for number, message in report.errors:
+        print(f"Row {number}: {message}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,597 @@
+"""
+Workload-driven index advisor for the Librium database.
+
+A workload is the set of distinct statements an application run executes,
+with how often each one ran. It is recorded while running the test suite, or
+read from the slow-query log (``SLOW_QUERY_THRESHOLD_MS=0`` logs every
+statement). Each statement is explained against an in-memory copy of a
+database, and full table scans and temporary B-trees are reported. For each
+of them, candidate indexes built from the statement's equality, range and
+ORDER BY columns are created on the copy. The candidates that remove the
+problem are proposed, and can be written as an Alembic migration together
+with the matching ``Index(...)`` declarations for db.py.
+
+The ``drift`` command compares the indexes declared in db.py with those of a
+database.
+
+Usage:
+    python -m utils.index_advisor capture workload.jsonl -- tests -q
+    python -m utils.index_advisor analyze workload.jsonl --database librium.sqlite
+    python -m utils.index_advisor analyze logs/slow_queries.log --migration
+    python -m utils.index_advisor drift --database librium.sqlite
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+
+from librium.database import Base
+from librium.database.sqlalchemy.instrumentation import (
+    EXPLAINABLE,
+    explain_query_plan,
+    normalize_sql,
+)
+
+# Statements of the database's own bookkeeping, never worth an index
+IGNORED_STATEMENTS = ("PRAGMA", "SELECT NAME FROM SQLITE_MASTER")
+
+# Candidates with more columns than this are not made covering
+MAX_COVERING_COLUMNS = 3
+
+# Tables with fewer rows are cheap to scan and get no proposals
+MIN_TABLE_ROWS = 1000
+
+# The condition of the soft-delete criteria, and of the partial indexes
+SOFT_DELETE = "deleted = 0"
+
+CANDIDATE_INDEX = "index_advisor_candidate"
+MIGRATIONS = Path(__file__).resolve().parent.parent / "alembic" / "versions"
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_WHITESPACE = re.compile(r"\s+")
+_SLOW_QUERY_HEADER = re.compile(r" ms \| route=.* \| service=")
+_TABLE_ALIAS = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+AS\s+(\w+))?", re.IGNORECASE)
+_SCAN = re.compile(r"^SCAN (\w+)( USING (?:COVERING )?INDEX \w+)?$")
+_TEMP_BTREE = re.compile(r"^USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)")
+_ORDER_BY = re.compile(
+    r"\b(?:ORDER|GROUP) BY (.+?)(?=\sLIMIT\b|\sOFFSET\b|\)|$)", re.IGNORECASE
+)
+
+MIGRATION_TEMPLATE = '''"""Add the indexes proposed by the index advisor
+
+Revision ID: {revision}
+Revises: {head}
+Create Date: {date:%Y-%m-%d %H:%M:%S.%f}
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "{revision}"
+down_revision = "{head}"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+{upgrade}
+
+
+def downgrade():
+{downgrade}
+'''
+
+
+class Workload:
+    """The distinct statements of an application run and their counts."""
+
+    def __init__(self):
+        """Initialize an empty workload."""
+        self.counts: Counter = Counter()
+        self.statements: Dict[str, str] = {}
+
+    def record(self, statement: str, count: int = 1) -> None:
+        """
+        Record executions of a statement.
+
+        Statements that only differ in their literals are recorded once, with
+        the first one seen kept as their example.
+
+        Args:
+            statement: The SQL text, with ``?`` parameters
+            count: The number of executions
+        """
+        if not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return
+        if statement.lstrip().upper().startswith(IGNORED_STATEMENTS):
+            return
+        key = normalize_sql(statement)
+        self.counts[key] += count
+        self.statements.setdefault(key, statement)
+
+    def save(self, path: Path) -> None:
+        """Write the workload as JSON lines, most executed first."""
+        with open(path, "w", encoding="utf-8") as fp:
+            for key, count in self.counts.most_common():
+                fp.write(json.dumps({"sql": self.statements[key], "count": count}))
+                fp.write("\n")
+
+    @classmethod
+    def load(cls, path: Path) -> "Workload":
+        """
+        Read a workload saved by ``save()`` or a slow-query log.
+
+        Args:
+            path: A ``.jsonl`` workload, or any other file as a slow-query log
+
+        Returns:
+            The workload
+        """
+        workload = cls()
+        with open(path, encoding="utf-8") as fp:
+            if path.suffix == ".jsonl":
+                for line in fp:
+                    if line.strip():
+                        entry = json.loads(line)
+                        workload.record(entry["sql"], entry.get("count", 1))
+                return workload
+
+            statement = None
+            for line in fp:
+                if _SLOW_QUERY_HEADER.search(line):
+                    statement = []
+                elif statement is not None:
+                    if line.startswith("parameters:"):
+                        workload.record("\n".join(statement))
+                        statement = None
+                    else:
+                        statement.append(line.rstrip("\n"))
+        return workload
+
+
+def capture(output: Path, pytest_args: List[str]) -> int:
+    """
+    Run the test suite and save the statements it executes as a workload.
+
+    Args:
+        output: The workload file to write
+        pytest_args: The arguments for pytest
+
+    Returns:
+        The exit code of pytest
+    """
+    import pytest
+
+    workload = Workload()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        workload.record(statement)
+
+    # Every engine the tests create, not only the application's
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        exit_code = pytest.main(pytest_args)
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+    workload.save(output)
+    print(f"Recorded {len(workload.counts)} distinct statements in {output}")
+    return exit_code
+
+
+def copy_database(path: Path) -> sqlite3.Connection:
+    """Copy a database into memory, so candidate indexes never touch it."""
+    source = sqlite3.connect(f"{path.absolute().as_uri()}?mode=ro", uri=True)
+    copy = sqlite3.connect(":memory:")
+    try:
+        source.backup(copy)
+    finally:
+        source.close()
+    return copy
+
+
+def explain(connection: sqlite3.Connection, statement: str) -> Optional[str]:
+    """
+    Get the query plan of a statement, with NULL for every parameter.
+
+    Returns:
+        The plan, or None if the statement cannot be explained on this
+        database, such as a statement on a table it does not have
+    """
+    parameters = [None] * _STRING_LITERAL.sub("", statement).count("?")
+    try:
+        connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    except sqlite3.Error:
+        return None
+    return explain_query_plan(connection, statement, parameters)
+
+
+def find_problems(plan: str, aliases: Dict[str, str]) -> List[Tuple[str, str]]:
+    """
+    Find the full table scans and temporary B-trees of a query plan.
+
+    Args:
+        plan: The plan, as returned by ``explain()``
+        aliases: The tables of the statement worth an index, by name or alias
+
+    Returns:
+        A list of (problem, alias) tuples, with the alias of the scanned
+        table, or "" for a temporary B-tree, which any table may remove
+    """
+    problems = []
+    for line in plan.splitlines():
+        step = line.strip()
+        scan = _SCAN.match(step)
+        if scan and not scan.group(2) and scan.group(1) in aliases:
+            problems.append((f"full scan of {aliases[scan.group(1)]}", scan.group(1)))
+        btree = _TEMP_BTREE.match(step)
+        if btree:
+            problems.append((f"temp B-tree for {btree.group(1)}", ""))
+    return problems
+
+
+def plan_cost(plan: str, aliases: Dict[str, str]) -> int:
+    """
+    Count the steps of a plan that visit a whole table or sort.
+
+    Unlike ``find_problems()``, scans through an index count too, so an
+    index only improves a statement if it turns a scan into a search or
+    removes a sort.
+    """
+    cost = 0
+    for line in plan.splitlines():
+        scan = _SCAN.match(line.strip())
+        if scan and scan.group(1) in aliases or _TEMP_BTREE.match(line.strip()):
+            cost += 1
+    return cost
+
+
+def table_aliases(statement: str, tables: Iterable[str]) -> Dict[str, str]:
+    """Map the names and aliases of the statement's tables to the tables."""
+    tables = set(tables)
+    aliases = {}
+    for table, alias in _TABLE_ALIAS.findall(statement):
+        if table in tables:
+            aliases[alias or table] = table
+    return aliases
+
+
+def _columns(statement: str, alias: str, operators: str) -> List[str]:
+    found = re.findall(rf"\b{alias}\.(\w+) {operators}", statement, re.IGNORECASE)
+    found += re.findall(rf"(?:=|<|>) {alias}\.(\w+)\b", statement)
+    return list(dict.fromkeys(found))
+
+
+def candidate_indexes(statement: str, alias: str, table: str) -> List[Dict]:
+    """
+    Build the candidate indexes for one table of a statement.
+
+    Columns compared with parameters or literals come first, then columns
+    joined to other tables, then the ORDER BY columns or a range column. A
+    candidate covering every column the statement uses of the table is added
+    when that is at most MAX_COVERING_COLUMNS columns. Statements with the
+    soft-delete condition get partial indexes on the rows that are not
+    deleted, as in db.py, and ``deleted`` itself is never indexed. The rowid
+    column ``id`` is left out too, since every index ends with it.
+
+    Args:
+        statement: The SQL text
+        alias: The name or alias of the table in the statement
+        table: The table
+
+    Returns:
+        The candidates, as dictionaries with the ``table``, ``columns`` and
+        ``where`` of the index, best first
+    """
+    statement = _WHITESPACE.sub(" ", statement)
+    where = SOFT_DELETE if f"{alias}.{SOFT_DELETE}" in statement else None
+
+    joined = re.findall(rf"\b{alias}\.(\w+) = \w+\.\w+", statement)
+    joined += re.findall(rf"\w+\.\w+ = {alias}\.(\w+)\b", statement)
+    compared = _columns(statement, alias, r"(?:= |IN \(|IS )")
+    ranged = _columns(statement, alias, r"(?:< |> |<= |>= |BETWEEN |LIKE )")
+    ordered = []
+    for clause in _ORDER_BY.findall(statement):
+        ordered += re.findall(rf"\b{alias}\.(\w+)", clause)
+    used = re.findall(rf"\b{alias}\.(\w+)\b", statement)
+
+    def columns(*groups):
+        return [
+            column
+            for column in dict.fromkeys(c for group in groups for c in group)
+            if column not in ("id", "deleted")
+        ]
+
+    base = [c for c in compared if c not in joined] + joined
+    candidates = []
+    for tail in (ordered, ranged[:1]):
+        indexed = columns(base, tail)
+        covering = columns(indexed, used)
+        if indexed and len(covering) <= MAX_COVERING_COLUMNS:
+            candidates.append(covering)
+        candidates.append(indexed)
+    return [
+        {"table": table, "columns": list(indexed), "where": where}
+        for indexed in dict.fromkeys(tuple(c) for c in candidates if c)
+    ]
+
+
+def index_name(candidate: Dict) -> str:
+    """Get the name of a proposed index."""
+    return f"idx_{candidate['table']}_{'_'.join(candidate['columns'])}"
+
+
+def _index_key(candidate: Dict) -> Tuple:
+    return candidate["table"], tuple(candidate["columns"]), candidate["where"]
+
+
+def analyze(workload: Workload, database: Path, min_rows: int = MIN_TABLE_ROWS) -> Dict:
+    """
+    Explain a workload and propose the indexes that remove its problems.
+
+    Args:
+        workload: The workload
+        database: The database the workload runs against
+        min_rows: The rows below which a table is scanned without harm
+
+    Returns:
+        A dictionary with ``problems``, a list of (statement, count, problems)
+        tuples, and ``proposals``, a list of dictionaries with the ``name``,
+        ``table``, ``columns`` and ``where`` condition of each index and the
+        number of ``executions`` it improves, most improving first
+    """
+    connection = copy_database(database)
+    tables = [
+        name
+        for (name,) in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name NOT LIKE 'sqlite_%' AND sql NOT LIKE 'CREATE VIRTUAL%'"
+        )
+        if connection.execute(f'SELECT count(*) FROM "{name}"').fetchone()[0]
+        >= min_rows
+    ]
+
+    problems = []
+    candidates: Dict[Tuple, Dict] = {}
+    statements: Dict[Tuple, List[str]] = {}
+    costs = {}
+    for key, count in workload.counts.most_common():
+        statement = workload.statements[key]
+        plan = explain(connection, statement)
+        if not plan:
+            continue
+        aliases = table_aliases(statement, tables)
+        found = find_problems(plan, aliases)
+        if not found:
+            continue
+        problems.append((statement, count, [problem for problem, _ in found]))
+        costs[key] = plan_cost(plan, aliases)
+        for _, alias in found:
+            for target in [alias] if alias else list(aliases):
+                for candidate in candidate_indexes(statement, target, aliases[target]):
+                    candidates.setdefault(_index_key(candidate), candidate)
+                    statements.setdefault(_index_key(candidate), []).append(key)
+
+    # Try each candidate on the copy against the statements it is meant for
+    improved: Dict[Tuple, int] = {}
+    for index, candidate in candidates.items():
+        where = f" WHERE {candidate['where']}" if candidate["where"] else ""
+        connection.execute(
+            f"CREATE INDEX {CANDIDATE_INDEX} ON {candidate['table']} "
+            f"({', '.join(candidate['columns'])}){where}"
+        )
+        for key in set(statements[index]):
+            statement = workload.statements[key]
+            plan = explain(connection, statement) or ""
+            if plan_cost(plan, table_aliases(statement, tables)) < costs[key]:
+                improved[index] = improved.get(index, 0) + workload.counts[key]
+        connection.execute(f"DROP INDEX {CANDIDATE_INDEX}")
+    connection.close()
+
+    # An index that starts another improving one is served by that one
+    proposals = []
+    for index, executions in sorted(improved.items(), key=lambda i: (-i[1], i[0])):
+        table, columns, where = index
+        if any(
+            other[0] == table
+            and other[2] == where
+            and len(other[1]) > len(columns)
+            and other[1][: len(columns)] == columns
+            for other in improved
+        ):
+            continue
+        proposal = dict(candidates[index], executions=executions)
+        proposal["name"] = index_name(proposal)
+        proposals.append(proposal)
+    return {"problems": problems, "proposals": proposals}
+
+
+def declared_index(proposal: Dict) -> str:
+    """Get the ``Index(...)`` declaration of a proposal for db.py."""
+    table = Base.metadata.tables[proposal["table"]]
+    mapper = next(
+        (mapper for mapper in Base.registry.mappers if mapper.local_table is table),
+        None,
+    )
+    if mapper:
+        owner = mapper.class_.__name__
+        columns = [f"{owner}.{column}" for column in proposal["columns"]]
+    else:
+        owner = f"{table.name}.c"
+        columns = [f"{owner}.{column}" for column in proposal["columns"]]
+    if proposal["where"]:
+        columns.append(f"sqlite_where={owner}.deleted == false()")
+    return f'Index("{proposal["name"]}", {", ".join(columns)})'
+
+
+def write_migration(proposals: List[Dict], directory: Path = MIGRATIONS) -> Path:
+    """
+    Write an Alembic migration creating the proposed indexes.
+
+    Args:
+        proposals: The proposals, as returned by ``analyze()``
+        directory: The Alembic versions directory
+
+    Returns:
+        The path of the migration
+    """
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config()
+    config.set_main_option("script_location", str(directory.parent))
+    head = ScriptDirectory.from_config(config).get_current_head()
+    revision = uuid.uuid4().hex[:12]
+
+    upgrade = []
+    for proposal in proposals:
+        where = (
+            f', sqlite_where=sa.text("{proposal["where"]}")'
+            if proposal["where"]
+            else ""
+        )
+        upgrade.append(
+            f'    op.create_index("{proposal["name"]}", "{proposal["table"]}", '
+            f'{proposal["columns"]!r}{where})'.replace("'", '"')
+        )
+    downgrade = [
+        f'    op.drop_index("{proposal["name"]}", table_name="{proposal["table"]}")'
+        for proposal in reversed(proposals)
+    ]
+    path = directory / f"{revision}_add_advised_indexes.py"
+    path.write_text(
+        MIGRATION_TEMPLATE.format(
+            revision=revision,
+            head=head,
+            date=datetime.now(),
+            upgrade="\n".join(upgrade),
+            downgrade="\n".join(downgrade),
+        ),
+        encoding="utf-8",
+    )
+    return path
+
+
+def drift(database: Path) -> Dict[str, List[str]]:
+    """
+    Compare the indexes declared in db.py with those of a database.
+
+    Args:
+        database: The database file
+
+    Returns:
+        A dictionary with the names of the indexes that are ``missing`` from
+        the database, ``unexpected`` in it, and ``different`` from their
+        declaration
+    """
+    dialect = sqlite.dialect()
+    declared = {
+        index.name: str(CreateIndex(index).compile(dialect=dialect))
+        for table in Base.metadata.tables.values()
+        for index in table.indexes
+    }
+    connection = sqlite3.connect(f"{database.absolute().as_uri()}?mode=ro", uri=True)
+    try:
+        existing = dict(
+            connection.execute(
+                "SELECT name, sql FROM sqlite_master "
+                "WHERE type = 'index' AND sql IS NOT NULL"
+            )
+        )
+    finally:
+        connection.close()
+
+    def same(a: str, b: str) -> bool:
+        return _WHITESPACE.sub(" ", a).strip().lower().replace('"', "") == (
+            _WHITESPACE.sub(" ", b).strip().lower().replace('"', "")
+        )
+
+    return {
+        "missing": sorted(set(declared) - set(existing)),
+        "unexpected": sorted(set(existing) - set(declared)),
+        "different": sorted(
+            name
+            for name in set(declared) & set(existing)
+            if not same(declared[name], existing[name])
+        ),
+    }
+
+
+def print_report(report: Dict) -> None:
+    for statement, count, problems in report["problems"]:
+        print(f"{count:>6}x  {'; '.join(problems)}")
+        print(f"         {_WHITESPACE.sub(' ', statement)[:200]}")
+    print()
+    if not report["proposals"]:
+        print("No index removes any of the problems")
+    for proposal in report["proposals"]:
+        print(
+            f"{proposal['name']} ON {proposal['table']} "
+            f"({', '.join(proposal['columns'])}): "
+            f"improves {proposal['executions']} executions"
+        )
+        print(f"    {declared_index(proposal)}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    capture_parser = commands.add_parser(
+        "capture", help="Record the workload of the test suite"
+    )
+    capture_parser.add_argument("output", type=Path)
+    capture_parser.add_argument("pytest_args", nargs="*", default=["tests", "-q"])
+
+    database = Path(os.getenv("SQLDATABASE") or "librium.sqlite")
+    analyze_parser = commands.add_parser(
+        "analyze", help="Report the problems of a workload and propose indexes"
+    )
+    analyze_parser.add_argument("workload", type=Path, nargs="+")
+    analyze_parser.add_argument("--database", type=Path, default=database)
+    analyze_parser.add_argument(
+        "--migration", action="store_true", help="Write the proposals as a migration"
+    )
+
+    drift_parser = commands.add_parser(
+        "drift", help="Compare the indexes of db.py with a database"
+    )
+    drift_parser.add_argument("--database", type=Path, default=database)
+    args = parser.parse_args(argv)
+
+    if args.command == "capture":
+        return capture(args.output, args.pytest_args)
+
+    if args.command == "drift":
+        for kind, names in drift(args.database).items():
+            for name in names:
+                print(f"{kind}: {name}")
+        return 0
+
+    workload = Workload()
+    for path in args.workload:
+        loaded = Workload.load(path)
+        for key, count in loaded.counts.items():
+            workload.record(loaded.statements[key], count)
+    report = analyze(workload, args.database)
+    print_report(report)
+    if args.migration and report["proposals"]:
+        print(f"\nWrote {write_migration(report['proposals'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())